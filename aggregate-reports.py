@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Offline BI Aggregates
+Rolls report files (or their columnar export) up into per-day aggregates and answers the ReportRepository
+queries from them, to cross-check dashboard totals against what the processors actually sent.
+"""
+
+import argparse
+import json
+import os
+from datetime import date
+from typing import List, Optional, Tuple
+
+from payrep_tools.aggregates import DEFAULT_AGGREGATE_PATH, QUERIES, QUERIES_BY_NAME, ROLLUPS, AggregateStore
+from payrep_tools.header_index import HeaderIndex, MappingSnapshot
+from payrep_tools.report_types import ReportType, match_report_type
+
+
+def discover_files(paths: List[str], processor: Optional[str]) -> List[Tuple[str, str, ReportType]]:
+    """Report files with a ReportRepository query, with the processor code from --processor or the drop layout"""
+    matched = []
+    for path in paths:
+        if not os.path.isdir(path):
+            report_type = match_report_type(os.path.basename(path))
+            if report_type and report_type.key in ROLLUPS:
+                parent = os.path.dirname(os.path.abspath(path))
+                if os.path.basename(parent) == "archive":
+                    parent = os.path.dirname(parent)
+                parent = os.path.basename(parent)
+                matched.append((path, processor or parent, report_type))
+            continue
+        for root, dirs, files in os.walk(path):
+            # Processed files are moved into <directoryPath>/archive; they are still part of the history
+            dirs.sort()
+            parts = [part for part in os.path.relpath(root, path).split(os.sep) if part not in (".", "archive")]
+            code = processor or (parts[0] if parts else os.path.basename(os.path.abspath(path)))
+            for name in sorted(files):
+                report_type = match_report_type(name)
+                if report_type and report_type.key in ROLLUPS:
+                    matched.append((os.path.join(root, name), code, report_type))
+    return matched
+
+
+def add(args):
+    snapshot = MappingSnapshot.load(args.mapping_snapshot) if args.mapping_snapshot else None
+    store = AggregateStore(args.db, HeaderIndex(snapshot) if snapshot else None)
+    results = []
+    if args.export_root:
+        results.extend(store.add_export(args.export_root))
+    for file_path, processor_code, report_type in discover_files(args.paths, args.processor):
+        try:
+            results.append(store.add_file(file_path, report_type, processor_code))
+        except (RuntimeError, ValueError, OSError) as e:
+            print(f"❌ {file_path}: {e}")
+    added = [r for r in results if "skipped" not in r]
+    for result in added:
+        missing = f", missing columns: {', '.join(result['missing_columns'])}" if result["missing_columns"] else ""
+        undated = f", {result['undated_rows']:,} rows without a report date" if result["undated_rows"] else ""
+        print(f"✅ {result['file']}: {result['rows']:,} rows -> {result['rollup_rows']:,} rollup rows "
+              f"in {result['elapsed_seconds']}s{undated}{missing}")
+    print(f"📊 {len(added)} files rolled up, {len(results) - len(added)} unchanged or without a query ({args.db})")
+
+
+def query(args):
+    store = AggregateStore(args.db)
+    names = [q.name for q in QUERIES] if args.name == "all" else [args.name]
+    results = {}
+    for name in names:
+        results[name] = store.query(name, args.start, args.end, args.processor)
+    if args.json:
+        print(json.dumps(results, indent=2, default=str))
+        return
+    for name, result in results.items():
+        print(f"\n📈 {QUERIES_BY_NAME[name].repository}.{name} ({args.start} .. {args.end})")
+        for row in result if isinstance(result, list) else [result]:
+            print("   " + ", ".join(f"{key}={value}" for key, value in row.items()))
+
+
+def sources(args):
+    for source in AggregateStore(args.db).sources():
+        print(f"📄 {source['path']} ({source['report_type']}, processor {source['processor_code']}): "
+              f"{source['rows']:,} rows")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline ReportRepository aggregates from report files")
+    parser.add_argument("--db", default=DEFAULT_AGGREGATE_PATH, help=f"rollup database (default: {DEFAULT_AGGREGATE_PATH})")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add_parser = commands.add_parser("add", help="roll up new or changed report files")
+    add_parser.add_argument("paths", nargs="*", help="report files or drop directories")
+    add_parser.add_argument("--processor", help="processor code for every file (default: from the drop layout)")
+    add_parser.add_argument("--export-root", help="also roll up a columnar export (analyze-tpp-901-reports.py --export)")
+    add_parser.add_argument("--mapping-snapshot", help="column mapping snapshot (default: seeded column mappings)")
+    add_parser.set_defaults(run=add)
+
+    query_parser = commands.add_parser("query", help="run a ReportRepository query on the rollups")
+    query_parser.add_argument("name", choices=["all"] + [q.name for q in QUERIES])
+    query_parser.add_argument("--start", default="1970-01-01", type=lambda s: date.fromisoformat(s).isoformat())
+    query_parser.add_argument("--end", default="9999-12-31", type=lambda s: date.fromisoformat(s).isoformat())
+    query_parser.add_argument("--processor", action="append", help="only these processor codes (repeatable)")
+    query_parser.add_argument("--json", action="store_true")
+    query_parser.set_defaults(run=query)
+
+    sources_parser = commands.add_parser("sources", help="list the rolled-up files")
+    sources_parser.set_defaults(run=sources)
+
+    args = parser.parse_args()
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
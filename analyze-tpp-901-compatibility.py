@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Report Compatibility Engine
+Checks the drop files of every configured bank/TPP in one process: quick triage from a memory-mapped scan,
+the full compatibility analysis of analyze-tpp-901-reports.py, or compact profiles. Processors come from a
+provisioning manifest, the subdirectories of a drop root, or default to TPP 901. Only the selected command's
+modules are imported, so triage starts without loading the analyzer, the admin client or the profilers.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from payrep_tools.processors import UNKNOWN_ENTITY_TYPE, Processor, entity_type_for_file_name, select_processors
+
+
+def drop_files(processors: List[Processor]) -> Tuple[List[Tuple[str, Processor, Any]], List[str]]:
+    """Files every processor's configs pick up, and files in their directories that no config picks up"""
+    matched = []
+    unmatched = set()
+    for processor in processors:
+        files, rest = processor.drop_files()
+        matched.extend((path, processor, config) for path, config in files)
+        unmatched.update(rest)
+    return matched, sorted(unmatched - {path for path, _, _ in matched})
+
+
+def ingestion_issues(matched: List[Tuple[str, Processor, Any]]) -> Dict[str, List[str]]:
+    """What the cron would do wrong with a file regardless of its contents, by file path"""
+    issues: Dict[str, List[str]] = {}
+    claims: Dict[str, List[str]] = {}
+    for path, processor, config in matched:
+        claims.setdefault(path, []).append(processor.code)
+        entity_type = entity_type_for_file_name(os.path.basename(path))
+        if entity_type == UNKNOWN_ENTITY_TYPE:
+            issues.setdefault(path, []).append("entity type Unknown, every record is dropped")
+        elif entity_type != config.file_type:
+            issues.setdefault(path, []).append(f"saved as {entity_type}, not {config.file_type}")
+        if config.report_type is None:
+            issues.setdefault(path, []).append(f"no template for {config.file_type}")
+    for path, codes in claims.items():
+        if len(set(codes)) > 1:
+            # The first config to run archives the file, so which processor gets it depends on cron order
+            issues.setdefault(path, []).append(f"picked up by several processors: {', '.join(sorted(set(codes)))}")
+    return issues
+
+
+def common_directory(processors: List[Processor]) -> str:
+    directories = [os.path.abspath(d) for processor in processors for d in processor.directories]
+    return os.path.commonpath(directories) if directories else os.getcwd()
+
+
+def triage_processors(processors: List[Processor], mapping_snapshot: Optional[str] = None,
+                      max_bytes: Optional[int] = None) -> Dict[str, Any]:
+    """Header, row count, size and entity type of every drop file, without reading the rows"""
+    from payrep_tools.fast_scan import BLOCKING_ISSUES, DEFAULT_MAX_FILE_BYTES, scan_file, triage
+    from payrep_tools.header_index import HeaderIndex, MappingSnapshot
+    from payrep_tools.report_types import REPORT_TYPES
+
+    started = time.perf_counter()
+    snapshot = MappingSnapshot.load(mapping_snapshot) if mapping_snapshot else MappingSnapshot.seeded(REPORT_TYPES)
+    header_index = HeaderIndex(snapshot)
+    matched, unmatched = drop_files(processors)
+    issues_by_file = ingestion_issues(matched)
+    base = common_directory(processors)
+
+    results: Dict[str, List[Dict[str, Any]]] = {processor.code: [] for processor in processors}
+    for path, processor, config in matched:
+        file_key = os.path.relpath(path, base)
+        try:
+            scan = scan_file(path)
+        except (OSError, ValueError) as e:
+            print(f"   ❌ {processor.code} {file_key}: {e}")
+            continue
+        scan.update(processor_code=processor.code, file_type=config.file_type,
+                    issues=triage(scan, max_bytes or DEFAULT_MAX_FILE_BYTES) + issues_by_file.get(path, []))
+        mappings = snapshot.mappings_for(os.path.basename(path), config.report_type)
+        if scan["headers"] and mappings:
+            resolution = header_index.resolve(scan["headers"], mappings)
+            if resolution["unresolved"]:
+                scan["issues"].append(f"{len(resolution['unresolved'])} mapped columns missing")
+        results[processor.code].append(scan)
+        blocking = path in issues_by_file or any(issue in BLOCKING_ISSUES for issue in scan["issues"])
+        emoji = "❌" if blocking else "⚠️" if scan["issues"] else "✅"
+        rows = f"{scan['data_rows']:,}{'' if scan['row_count_exact'] else '≤'} rows"
+        detail = f" - {', '.join(scan['issues'])}" if scan["issues"] else ""
+        print(f"   {emoji} {processor.code} {file_key}: {rows}, {scan['bytes'] / (1 << 20):.1f} MB{detail}")
+    for path in unmatched:
+        print(f"   ℹ️ {os.path.relpath(path, base)}: matches no configured fileNamePattern")
+
+    files = [scan for scans in results.values() for scan in scans]
+    summary = {
+        "processors": [{"code": processor.code, "name": processor.name, "directories": processor.directories,
+                        "files": len(results[processor.code]),
+                        "rows": sum(scan["data_rows"] for scan in results[processor.code])}
+                       for processor in processors],
+        "files_matched": len(matched),
+        "files_unmatched": unmatched,
+        "files_with_issues": sum(1 for scan in files if scan["issues"]),
+        "rows": sum(scan["data_rows"] for scan in files),
+        "bytes": sum(scan["bytes"] for scan in files),
+        "elapsed_seconds": round(time.perf_counter() - started, 3),
+        "files": files
+    }
+    print(f"\n⏱️ Triaged {len(files)} files of {len(processors)} processors ({summary['rows']:,} rows) in "
+          f"{summary['elapsed_seconds']}s; {summary['files_with_issues']} with issues, {len(unmatched)} unmatched")
+    return summary
+
+
+def _load_analyzer_class():
+    """TPP901CompatibilityAnalyzer lives in a hyphenated script, so it is loaded by path"""
+    import importlib.util
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "analyze-tpp-901-reports.py")
+    spec = importlib.util.spec_from_file_location("analyze_tpp_901_reports", path)
+    module = importlib.util.module_from_spec(spec)
+    # Process-pool workers unpickle the analyzer's job functions by module name
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module.TPP901CompatibilityAnalyzer
+
+
+def analyze_processors(processors: List[Processor], args):
+    """Full compatibility analysis of every processor's drop files in one process pool and one report"""
+    from payrep_tools.cache import DEFAULT_CACHE_PATH, AnalysisCache
+    from payrep_tools.header_history import DEFAULT_HISTORY_PATH, HeaderHistory
+
+    analyzer_class = _load_analyzer_class()
+    cache = None if args.no_cache else AnalysisCache(args.cache or DEFAULT_CACHE_PATH,
+                                                     max_bytes=args.cache_max_mb << 20)
+    history = None if args.no_header_history else HeaderHistory(args.header_history or DEFAULT_HISTORY_PATH)
+    try:
+        analyzer = analyzer_class(full_profile=args.full_profile, mapping_snapshot=args.mapping_snapshot, cache=cache,
+                                  header_history=history, processors=processors, report_path=args.output)
+        if args.latest:
+            analyzer.run_full_analysis()
+        else:
+            started = time.perf_counter()
+            matched, unmatched = drop_files(processors)
+            for path, issues in ingestion_issues(matched).items():
+                print(f"   🚫 {path}: {', '.join(issues)}")
+            base = common_directory(processors)
+            print(f"📂 Analyzing {len(processors)} processors under {base}")
+            print("=" * 50)
+            analyzer.analyze_drop_files(base, [(path, processor.code, config.report_type)
+                                               for path, processor, config in matched if config.report_type],
+                                        unmatched, args.workers, started)
+    finally:
+        if history:
+            history.close()
+        if cache:
+            cache.close()
+    return analyzer
+
+
+def profile_processors(processors: List[Processor], output: str, workers: Optional[int] = None) -> Dict[str, Any]:
+    """Compact binary profiles of every processor's drop files, written to one file"""
+    from payrep_tools.file_profile import build_profiles, write_profiles
+
+    started = time.perf_counter()
+    matched, _ = drop_files(processors)
+    jobs = [(path, config.report_type, processor.code) for path, processor, config in matched if config.report_type]
+    failed = []
+
+    def report(file_path, data, error):
+        if error:
+            failed.append({"file": file_path, "error": error})
+            print(f"   ❌ {file_path}: {error}")
+
+    profiles = build_profiles(jobs, workers, report)
+    written = write_profiles(output, profiles)
+    summary = {"processors": [processor.code for processor in processors], "output": output,
+               "profiles": len(profiles), "bytes": written, "failed": failed,
+               "elapsed_seconds": round(time.perf_counter() - started, 3)}
+    print(f"⏱️ {len(profiles)} profiles of {len(processors)} processors, {written:,} bytes, "
+          f"in {summary['elapsed_seconds']}s -> {output}")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report compatibility analysis for every bank/TPP")
+    parser.add_argument("command", nargs="?", choices=("triage", "analyze", "profiles"), default="triage",
+                        help="triage: header/row count/size scan (default); analyze: full compatibility report; "
+                             "profiles: compact binary profiles")
+    parser.add_argument("--manifest", help="provisioning manifest listing the banks/TPPs and their file configs")
+    parser.add_argument("--root", help="drop root whose subdirectories are named by processor code "
+                                       "(all seven report types each)")
+    parser.add_argument("--processor", action="append", metavar="CODE",
+                        help="only this processor (repeatable; default: every processor)")
+    parser.add_argument("--mapping-snapshot",
+                        help="column mapping / header definition snapshot exported with "
+                             "test-tpp-901.py --export-mapping-snapshot (default: seeded column mappings)")
+    parser.add_argument("--workers", type=int, default=None, help="process pool size (default: CPU count)")
+    parser.add_argument("--output", help="triage: write the result as JSON; analyze: the detailed report file "
+                                         "(default: a timestamped one in the working directory); "
+                                         "profiles: the profile file")
+    parser.add_argument("--max-file-mb", type=int, help="triage: flag files above this size (default: 100)")
+    parser.add_argument("--latest", action="store_true",
+                        help="analyze: only the newest file of each report type per processor")
+    parser.add_argument("--full-profile", action="store_true",
+                        help="analyze: stream every row of each file instead of sampling the first 5")
+    parser.add_argument("--cache", help="analyze: analysis cache database (default: the analyzer's)")
+    parser.add_argument("--cache-max-mb", type=int, default=256, help="analyze: cache size limit")
+    parser.add_argument("--no-cache", action="store_true", help="analyze: re-read every file")
+    parser.add_argument("--header-history", help="analyze: versioned header row store (default: the analyzer's)")
+    parser.add_argument("--no-header-history", action="store_true", help="analyze: do not check header rows")
+    args = parser.parse_args()
+
+    try:
+        processors = select_processors(args.manifest, args.root, args.processor)
+    except (ValueError, OSError) as e:
+        parser.error(str(e))
+    if not processors:
+        parser.error("no processors selected")
+
+    if args.command == "triage":
+        print(f"⚡ Triage of {len(processors)} processors: {', '.join(p.code for p in processors)}")
+        print("=" * 50)
+        result = triage_processors(processors, args.mapping_snapshot,
+                                   args.max_file_mb << 20 if args.max_file_mb else None)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump({"timestamp": datetime.now().isoformat(), **result}, f, indent=2)
+            print(f"📄 Triage saved to: {args.output}")
+    elif args.command == "analyze":
+        analyze_processors(processors, args)
+    else:
+        if not args.output:
+            parser.error("profiles needs --output")
+        profile_processors(processors, args.output, args.workers)
+
+
+if __name__ == "__main__":
+    main()
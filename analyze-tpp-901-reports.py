@@ -4,21 +4,78 @@ TPP 901 Compatibility Analysis Script
 Analyzes the compatibility between TPP 901 reports and template reports
 """
 
+import argparse
 import csv
 import json
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional, Tuple
+from urllib.parse import quote
+
+from payrep_tools.cache import DEFAULT_CACHE_PATH, AnalysisCache, file_state, report_digest, stored_state
+from payrep_tools.drop_watch import DEFAULT_POLL_SECONDS, DEFAULT_SETTLE_SECONDS, DropWatcher
+from payrep_tools.fast_scan import BLOCKING_ISSUES, DEFAULT_MAX_FILE_BYTES, scan_file, triage
+from payrep_tools.file_profile import VIEWS, build_profiles, merge_views, read_profiles, write_profiles
+from payrep_tools.header_history import DEFAULT_HISTORY_PATH, HeaderHistory, propose_aliases
+from payrep_tools.header_index import HeaderIndex, MappingSnapshot
+from payrep_tools.inference import infer_rows
+from payrep_tools.processors import Processor, compare_headers, tpp_901
+from payrep_tools.profiling import StreamingProfiler
+from payrep_tools.report_types import REPORT_TYPES, ReportType, match_report_type, report_type_by_key
 
 class TPP901CompatibilityAnalyzer:
-    def __init__(self):
+    def __init__(self, full_profile: bool = False, mapping_snapshot: Optional[str] = None,
+                 cache: Optional[AnalysisCache] = None, export_dir: Optional[str] = None,
+                 header_history: Optional[HeaderHistory] = None, processors: Optional[List[Processor]] = None,
+                 report_path: Optional[str] = None):
         self.analysis_results = {}
-        
-    def analyze_csv_structure(self, file_path: str) -> Dict[str, Any]:
+        # Detailed report file; None writes a timestamped one into the working directory
+        self.report_path = report_path
+        self.processors = processors or [tpp_901()]
+        self.cache = cache
+        self.header_history = header_history
+        self.header_changes = []
+        self.report_unchanged = False
+        self.full_profile = full_profile
+        self.profiler = StreamingProfiler()
+        self.drop_scan = None
+        self.export_dir = export_dir
+        self.mapping_snapshot = mapping_snapshot
+        # Without an exported snapshot, resolve against the seeded column mappings (no header definitions)
+        snapshot = MappingSnapshot.load(mapping_snapshot) if mapping_snapshot else MappingSnapshot.seeded(REPORT_TYPES)
+        self.header_index = HeaderIndex(snapshot)
+        
+    def analyze_csv_structure(self, file_path: str, report_type: Optional[ReportType] = None) -> Dict[str, Any]:
         """Analyze CSV file structure and return metadata"""
         if not os.path.exists(file_path):
             return {"error": f"File not found: {file_path}"}
         
+        settings = self._cache_settings(report_type)
+        if self.cache:
+            cached = self.cache.get(file_path, settings)
+            if cached is not None:
+                return cached
+            state = file_state(file_path)
+        
+        if self.full_profile:
+            structure = self.profile_csv_file(file_path, report_type)
+        else:
+            structure = self._sample_csv_structure(file_path)
+            if "error" not in structure:
+                structure["inference"] = infer_rows(structure["headers"], structure["sample_rows"], report_type)
+        if self.cache and "error" not in structure:
+            self.cache.put(file_path, settings, structure, stored_state(file_path, state))
+        return structure
+    
+    def _cache_settings(self, report_type: Optional[ReportType]) -> str:
+        """Cache key part for everything besides the file that shapes its structure"""
+        return AnalysisCache.settings_key(full_profile=self.full_profile,
+                                          report_type=report_type.key if report_type else None)
+    
+    def _sample_csv_structure(self, file_path: str) -> Dict[str, Any]:
+        """Read the header and the first 5 data rows"""
         try:
             with open(file_path, 'r') as f:
                 reader = csv.reader(f)
@@ -40,29 +97,35 @@ class TPP901CompatibilityAnalyzer:
         except Exception as e:
             return {"error": f"Error reading file: {e}"}
     
-    def compare_structures(self, tpp_901_structure: Dict, template_structure: Dict) -> Dict[str, Any]:
+    def profile_csv_file(self, file_path: str, report_type: Optional[ReportType] = None) -> Dict[str, Any]:
+        """Profile every row of a CSV file in one streaming pass"""
+        try:
+            return self.profiler.profile(file_path, report_type)
+        except Exception as e:
+            return {"error": f"Error profiling file: {e}"}
+    
+    def compare_structures(self, tpp_901_structure: Dict, template_structure: Dict,
+                           report_type: Optional[ReportType] = None, file_name: str = "") -> Dict[str, Any]:
         """Compare two CSV structures and return compatibility analysis"""
         if "error" in tpp_901_structure or "error" in template_structure:
             return {"error": "Cannot compare due to file read errors"}
         
-        tpp_headers = set(tpp_901_structure["headers"])
-        template_headers = set(template_structure["headers"])
-        
-        matching_headers = tpp_headers & template_headers
-        missing_in_tpp = template_headers - tpp_headers
-        extra_in_tpp = tpp_headers - template_headers
-        
-        compatibility_score = len(matching_headers) / len(tpp_headers | template_headers) if (tpp_headers | template_headers) else 0
-        
-        return {
-            "tpp_901_headers": list(tpp_headers),
-            "template_headers": list(template_headers),
-            "matching_headers": list(matching_headers),
-            "missing_in_tpp_901": list(missing_in_tpp),
-            "extra_in_tpp_901": list(extra_in_tpp),
-            "compatibility_score": compatibility_score,
+        overlap = compare_headers(tpp_901_structure["headers"], template_structure["headers"])
+        comparison = {
+            "tpp_901_headers": sorted(set(tpp_901_structure["headers"])),
+            "template_headers": sorted(set(template_structure["headers"])),
+            "matching_headers": overlap["matching"],
+            "missing_in_tpp_901": overlap["missing"],
+            "extra_in_tpp_901": overlap["extra"],
+            "compatibility_score": overlap["score"],
             "header_count_match": len(tpp_901_structure["headers"]) == len(template_structure["headers"])
         }
+        
+        # Resolve the column mappings ingestion will use against the file's header row
+        mappings = self.header_index.snapshot.mappings_for(file_name, report_type) if report_type else []
+        if mappings:
+            comparison["header_resolution"] = self.header_index.resolve(tpp_901_structure["headers"], mappings)
+        return comparison
     
     def analyze_data_compatibility(self, tpp_901_structure: Dict, template_structure: Dict) -> Dict[str, Any]:
         """Analyze data type and format compatibility"""
@@ -79,6 +142,13 @@ class TPP901CompatibilityAnalyzer:
         tpp_headers = tpp_901_structure["headers"]
         template_headers = template_structure["headers"]
         
+        if "inference" in tpp_901_structure:
+            issues = self._inference_issues(tpp_901_structure["inference"])
+            if "profile" in tpp_901_structure:
+                issues.extend(self._profile_format_issues(tpp_901_structure["profile"]))
+            data_analysis["data_format_issues"] = issues
+            return data_analysis
+        
         # Check date format consistency
         date_columns = [h for h in tpp_headers if 'date' in h.lower()]
         if date_columns and tpp_901_structure["sample_rows"]:
@@ -95,73 +165,88 @@ class TPP901CompatibilityAnalyzer:
         
         return data_analysis
     
-    def analyze_ecommerce_reports(self):
-        """Analyze E-commerce Card Activity reports"""
-        print("📊 Analyzing E-commerce Card Activity Reports...")
-        
-        tpp_file = "sample-data/901/ecommerce_card_activity_2025-07-18.csv"
-        template_file = "sample-data/reports/E-CommerceCardActivity_001_2025-08-03.csv"
-        
-        tpp_structure = self.analyze_csv_structure(tpp_file)
-        template_structure = self.analyze_csv_structure(template_file)
-        
-        compatibility = self.compare_structures(tpp_structure, template_structure)
-        data_analysis = self.analyze_data_compatibility(tpp_structure, template_structure)
-        
-        self.analysis_results["ecommerce_card_activity"] = {
-            "tpp_901_structure": tpp_structure,
-            "template_structure": template_structure,
-            "compatibility": compatibility,
-            "data_analysis": data_analysis
-        }
-        
-        self._print_analysis_summary("E-commerce Card Activity", compatibility)
+    def _inference_issues(self, inference: Dict) -> List[Dict[str, Any]]:
+        """Turn inference results into the conversions ingestion would fail on"""
+        issues = []
+        for field in inference["missing_mapper_fields"]:
+            issues.append({
+                "column": field["column"],
+                "sample_value": "",
+                "issue": f"Column missing for DataMapper key '{field['key']}': {field['outcome']}",
+                "severity": field["severity"]
+            })
+        for column in inference["columns"]:
+            for conversion in column["conversions"]:
+                examples = conversion["examples"]
+                issues.append({
+                    "column": column["name"],
+                    "sample_value": examples[0]["value"] if examples else "",
+                    "issue": f"{conversion['failures']} values fail {conversion['conversion']} -> {conversion['outcome']}",
+                    "severity": conversion["severity"]
+                })
+            if column["non_iso_date_formats"] and not column["conversions"]:
+                formats = column["non_iso_date_formats"]
+                issues.append({
+                    "column": column["name"],
+                    "sample_value": column["non_iso_date_examples"][next(iter(formats))],
+                    "issue": f"Non-ISO date formats {formats} in an unmapped column"
+                })
+        return issues
     
-    def analyze_pos_terminal_reports(self):
-        """Analyze POS Terminal Data reports"""
-        print("🏪 Analyzing POS Terminal Data Reports...")
-        
-        tpp_file = "sample-data/901/pos_terminal_data_2025-07-18.csv"
-        template_file = "sample-data/reports/POSTerminalData_001_2025-08-03.csv"
-        
-        tpp_structure = self.analyze_csv_structure(tpp_file)
-        template_structure = self.analyze_csv_structure(template_file)
-        
-        compatibility = self.compare_structures(tpp_structure, template_structure)
-        data_analysis = self.analyze_data_compatibility(tpp_structure, template_structure)
-        
-        self.analysis_results["pos_terminal_data"] = {
-            "tpp_901_structure": tpp_structure,
-            "template_structure": template_structure,
-            "compatibility": compatibility,
-            "data_analysis": data_analysis
-        }
-        
-        self._print_analysis_summary("POS Terminal Data", compatibility)
+    def _profile_format_issues(self, profile: Dict) -> List[Dict[str, Any]]:
+        """Derive completeness issues from full-file column statistics"""
+        issues = []
+        for column in profile["columns"]:
+            if column["null_count"]:
+                issues.append({
+                    "column": column["name"],
+                    "sample_value": "",
+                    "issue": f"{column['null_count']} blank values ({column['null_rate']:.2%})"
+                })
+        if profile["ragged_rows"]:
+            issues.append({
+                "column": "*",
+                "sample_value": "",
+                "issue": f"{profile['ragged_rows']} rows do not match the header column count"
+            })
+        return issues
     
-    def analyze_pos_transaction_reports(self):
-        """Analyze POS Transaction Data reports"""
-        print("💳 Analyzing POS Transaction Data Reports...")
-        
-        tpp_file = "sample-data/901/pos_transaction_data_2025-07-18.csv"
-        template_file = "sample-data/reports/POSTransactionData_001_2025-08-03.csv"
-        
-        tpp_structure = self.analyze_csv_structure(tpp_file)
-        template_structure = self.analyze_csv_structure(template_file)
-        
-        compatibility = self.compare_structures(tpp_structure, template_structure)
-        data_analysis = self.analyze_data_compatibility(tpp_structure, template_structure)
-        
-        self.analysis_results["pos_transaction_data"] = {
-            "tpp_901_structure": tpp_structure,
-            "template_structure": template_structure,
-            "compatibility": compatibility,
-            "data_analysis": data_analysis
-        }
-        
-        self._print_analysis_summary("POS Transaction Data", compatibility)
+    def analyze_processor_reports(self, processor: Processor):
+        """Analyze the newest file of every report type configured for a processor against its template"""
+        latest = processor.latest_files()
+        for config in processor.configs:
+            report_type = config.report_type
+            if report_type is None:
+                print(f"ℹ️ {processor.code} {config.file_type}: no template for this fileType, skipped\n")
+                continue
+            print(f"📊 Analyzing {processor.name} {report_type.file_type} Reports...")
+            
+            key = report_type.key if len(self.processors) == 1 else f"{processor.code}/{report_type.key}"
+            tpp_file = latest.get(config)
+            if tpp_file is None:
+                error = f"No file matching {config.file_name_pattern} in {config.directory}"
+                self.analysis_results[key] = {"processor_code": processor.code, "tpp_901_structure": {"error": error},
+                                              "compatibility": {"error": error}, "data_analysis": {"error": error}}
+                print(f"   ❌ Error: {error}\n")
+                continue
+            tpp_structure = self.analyze_csv_structure(tpp_file, report_type)
+            template_structure = self.analyze_csv_structure(report_type.template_file, report_type)
+            
+            compatibility = self.compare_structures(tpp_structure, template_structure, report_type,
+                                                    os.path.basename(tpp_file))
+            data_analysis = self.analyze_data_compatibility(tpp_structure, template_structure)
+            
+            self.analysis_results[key] = {
+                "processor_code": processor.code,
+                "tpp_901_structure": tpp_structure,
+                "template_structure": template_structure,
+                "compatibility": compatibility,
+                "data_analysis": data_analysis
+            }
+            
+            self._print_analysis_summary(report_type.file_type, compatibility, processor.code)
     
-    def _print_analysis_summary(self, report_type: str, compatibility: Dict):
+    def _print_analysis_summary(self, report_type: str, compatibility: Dict, processor_code: str = "901"):
         """Print a summary of the analysis"""
         if "error" in compatibility:
             print(f"   ❌ Error: {compatibility['error']}")
@@ -174,10 +259,17 @@ class TPP901CompatibilityAnalyzer:
             print(f"   ✅ Matching columns ({len(compatibility['matching_headers'])}): {', '.join(compatibility['matching_headers'])}")
         
         if compatibility["missing_in_tpp_901"]:
-            print(f"   ⚠️ Missing in TPP 901 ({len(compatibility['missing_in_tpp_901'])}): {', '.join(compatibility['missing_in_tpp_901'])}")
+            print(f"   ⚠️ Missing in {processor_code} ({len(compatibility['missing_in_tpp_901'])}): {', '.join(compatibility['missing_in_tpp_901'])}")
         
         if compatibility["extra_in_tpp_901"]:
-            print(f"   ℹ️ Extra in TPP 901 ({len(compatibility['extra_in_tpp_901'])}): {', '.join(compatibility['extra_in_tpp_901'])}")
+            print(f"   ℹ️ Extra in {processor_code} ({len(compatibility['extra_in_tpp_901'])}): {', '.join(compatibility['extra_in_tpp_901'])}")
+        
+        resolution = compatibility.get("header_resolution")
+        if resolution:
+            routes = ", ".join(f"{route}: {count}" for route, count in resolution["routes"].items() if count)
+            print(f"   🧭 Mapping resolution ({resolution['source']}): {routes}")
+            for entry in resolution["unresolved"]:
+                print(f"   🚫 Unresolved mapping: {entry['column_name']} -> {entry['field_name']}")
         
         print()
     
@@ -217,37 +309,117 @@ class TPP901CompatibilityAnalyzer:
                 issues.append(f"❌ {report_type}: File structure error - {compatibility['error']}")
                 continue
             
-            missing = compatibility.get("missing_in_tpp_901", [])
-            if missing:
-                issues.append(f"🚫 {report_type}: Processing will fail due to missing required columns: {', '.join(missing)}")
+            resolution = compatibility.get("header_resolution")
+            if resolution:
+                issues.extend(self._resolution_issues(report_type, resolution))
+            else:
+                missing = compatibility.get("missing_in_tpp_901", [])
+                if missing:
+                    issues.append(f"🚫 {report_type}: Processing will fail due to missing required columns: {', '.join(missing)}")
             
             # Check for data format issues
             format_issues = data_analysis.get("data_format_issues", [])
             for issue in format_issues:
-                issues.append(f"⚠️ {report_type}: {issue['issue']} in column '{issue['column']}' (sample: {issue['sample_value']})")
+                emoji = "🚫" if issue.get("severity") == "error" else "⚠️"
+                issues.append(f"{emoji} {report_type}: {issue['issue']} in column '{issue['column']}' (sample: {issue['sample_value']})")
         
         return issues
     
+    def _resolution_issues(self, report_type: str, resolution: Dict) -> List[str]:
+        """Turn unresolved column mappings into processing issues"""
+        issues = []
+        for entry in resolution["unresolved"]:
+            message = (f"🚫 {report_type}: Mapping '{entry['column_name']}' resolves to no header; "
+                       f"{entry['outcome']}")
+            missed = entry.get("missed_definition")
+            if missed:
+                message += (f" (HeaderDefinition '{missed['entity_type']}' would match '{missed['would_match']}', "
+                            f"but FileParser looks it up with entityType '{resolution['entity_type']}')")
+            issues.append(message)
+        if resolution["duplicate_headers"]:
+            issues.append(f"⚠️ {report_type}: Duplicate headers, FileParser reads the last occurrence: "
+                          f"{', '.join(resolution['duplicate_headers'])}")
+        return issues
+    
     def save_detailed_report(self) -> str:
         """Save detailed analysis report to JSON file"""
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"tpp_901_compatibility_analysis_{timestamp}.json"
+        single = self.processors[0] if len(self.processors) == 1 else None
+        filename = self.report_path or f"tpp_{single.code if single else 'all'}_compatibility_analysis_{timestamp}.json"
         
         report = {
             "timestamp": datetime.now().isoformat(),
-            "tpp_code": "901",
-            "tpp_name": "Tadawul TPP",
-            "analysis_results": self.analysis_results,
+            "tpp_code": single.code if single else None,
+            "tpp_name": single.name if single else None,
+            "processors": [{"code": processor.code, "name": processor.name} for processor in self.processors],
+            "analysis_results": self._report_results(),
             "recommendations": self.generate_recommendations(),
             "processing_issues": self.generate_processing_issues(),
             "overall_compatibility": self._calculate_overall_compatibility()
         }
+        if self.drop_scan:
+            report["drop_scan"] = self.drop_scan
+        if self.full_profile:
+            report["profiling"] = self._profiling_summary()
+        
+        if self.cache:
+            # The drop scan timing changes on every run, everything else only when a file does
+            digest = report_digest(dict(report, drop_scan={k: v for k, v in (self.drop_scan or {}).items()
+                                                           if k not in ("elapsed_seconds", "files_analyzed",
+                                                                        "files_exported")}))
+            previous = self.cache.get_meta("last_report_file")
+            # An explicit report path is only left alone when the unchanged report is that file
+            reusable = previous and os.path.exists(previous) and \
+                (not self.report_path or previous == os.path.abspath(filename))
+            if self.cache.get_meta("last_report_digest") == digest and reusable:
+                self.report_unchanged = True
+                return previous
         
         with open(filename, 'w') as f:
             json.dump(report, f, indent=2)
         
+        if self.cache:
+            self.cache.set_meta("last_report_digest", digest)
+            self.cache.set_meta("last_report_file", os.path.abspath(filename))
         return filename
     
+    def _report_results(self) -> Dict[str, Any]:
+        """Analysis results without the sample rows of files whose rows are in the columnar export"""
+        results = {}
+        for key, analysis in self.analysis_results.items():
+            if "export" in analysis:
+                analysis = dict(analysis,
+                                tpp_901_structure={k: v for k, v in analysis["tpp_901_structure"].items()
+                                                   if k != "sample_rows"},
+                                data_analysis={k: v for k, v in analysis["data_analysis"].items()
+                                               if k != "tpp_901_sample_data"})
+            results[key] = analysis
+        return results
+    
+    def _profiling_summary(self) -> Dict[str, Any]:
+        """Aggregate row throughput across every profiled file"""
+        rows = 0
+        size = 0
+        elapsed = 0.0
+        files = 0
+        for analysis in self.analysis_results.values():
+            for key in ("tpp_901_structure", "template_structure"):
+                profile = analysis.get(key, {}).get("profile")
+                if profile:
+                    files += 1
+                    rows += profile["rows"]
+                    size += profile["bytes"]
+                    elapsed += profile["elapsed_seconds"]
+        return {
+            "mode": "streaming",
+            "files_profiled": files,
+            "rows": rows,
+            "bytes": size,
+            "elapsed_seconds": round(elapsed, 3),
+            "rows_per_second": round(rows / elapsed) if elapsed else rows,
+            "mb_per_second": round(size / (1 << 20) / elapsed, 2) if elapsed else 0.0
+        }
+    
     def _calculate_overall_compatibility(self) -> float:
         """Calculate overall compatibility score"""
         scores = []
@@ -258,23 +430,19 @@ class TPP901CompatibilityAnalyzer:
         
         return sum(scores) / len(scores) if scores else 0
     
-    def run_full_analysis(self):
-        """Run complete compatibility analysis"""
-        print("🔍 TPP 901 Compatibility Analysis")
-        print("=" * 50)
-        
-        # Analyze all report types
-        self.analyze_ecommerce_reports()
-        self.analyze_pos_terminal_reports()
-        self.analyze_pos_transaction_reports()
-        
-        # Generate summary
+    def _print_overall_summary(self):
+        """Print the overall score, recommendations and issues, then save the JSON report"""
         print("📊 OVERALL ANALYSIS SUMMARY")
         print("-" * 30)
         
         overall_score = self._calculate_overall_compatibility()
         print(f"🎯 Overall Compatibility: {overall_score:.1%}")
         
+        if self.full_profile:
+            summary = self._profiling_summary()
+            print(f"⏱️ Profiled {summary['rows']:,} rows in {summary['elapsed_seconds']}s "
+                  f"({summary['rows_per_second']:,} rows/s, {summary['mb_per_second']} MB/s)")
+        
         print("\n💡 RECOMMENDATIONS:")
         recommendations = self.generate_recommendations()
         for rec in recommendations:
@@ -290,13 +458,460 @@ class TPP901CompatibilityAnalyzer:
         
         # Save detailed report
         report_file = self.save_detailed_report()
-        print(f"\n📄 Detailed report saved to: {report_file}")
+        if self.report_unchanged:
+            print(f"\n♻️ Nothing changed since the last run, report unchanged: {report_file}")
+        else:
+            print(f"\n📄 Detailed report saved to: {report_file}")
+    
+    def discover_drop_files(self, directory: str) -> Tuple[List[Tuple[str, str, ReportType]], List[str]]:
+        """Walk a drop directory and match files to report types by fileNamePattern"""
+        matched = []
+        unmatched = []
+        for root, dirs, files in os.walk(directory):
+            # Processed files are moved into <directoryPath>/archive by FileIngestionService
+            dirs[:] = sorted(d for d in dirs if d != "archive")
+            relative_root = os.path.relpath(root, directory)
+            processor_code = os.path.basename(os.path.abspath(directory)) if relative_root == "." else relative_root.split(os.sep)[0]
+            for name in sorted(files):
+                file_path = os.path.join(root, name)
+                report_type = match_report_type(name)
+                if report_type:
+                    matched.append((file_path, processor_code, report_type))
+                else:
+                    unmatched.append(file_path)
+        return matched, unmatched
+    
+    def analyze_drop_directory(self, directory: str, workers: Optional[int] = None):
+        """Analyze every report file under a drop directory in a process pool"""
+        print(f"📂 Scanning drop directory: {directory}")
+        print("=" * 50)
+        
+        started = time.perf_counter()
+        matched, unmatched = self.discover_drop_files(directory)
+        return self.analyze_drop_files(directory, matched, unmatched, workers, started)
+    
+    def analyze_drop_files(self, directory: str, matched: List[Tuple[str, str, ReportType]], unmatched: List[str],
+                           workers: Optional[int] = None, started: Optional[float] = None):
+        """Analyze matched report files of any number of processors in one process pool, keyed relative to directory"""
+        workers = workers or os.cpu_count() or 1
+        started = started or time.perf_counter()
+        print(f"   📄 {len(matched)} report files matched, {len(unmatched)} unmatched")
+        
+        templates = {report_type.key: self._sample_csv_structure(report_type.template_file) for report_type in REPORT_TYPES}
+        processors = {}
+        jobs = []
+        results = {}
+        for file_path, processor_code, report_type in matched:
+            processors[file_path] = processor_code
+            cached = self.cache.get(file_path, self._cache_settings(report_type)) if self.cache else None
+            if cached is not None:
+                # Unchanged since the last run: only the cheap comparisons are redone
+                result = self.drop_file_result(file_path, report_type, cached, templates[report_type.key])
+                result["processor_code"] = processor_code
+                results[os.path.relpath(file_path, directory)] = result
+                continue
+            jobs.append((file_path, report_type.key, templates[report_type.key], self.full_profile, self.mapping_snapshot,
+                         self.cache is not None))
+        # Largest files first so one big drop does not become the tail of the pool
+        jobs.sort(key=lambda job: os.path.getsize(job[0]), reverse=True)
+        if self.cache:
+            print(f"   🗃️ {len(results)} unchanged files served from cache, {len(jobs)} to analyze")
+        
+        if jobs:
+            with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+                futures = [pool.submit(_analyze_drop_file, job) for job in jobs]
+                for future in as_completed(futures):
+                    file_path, result, state = future.result()
+                    result["processor_code"] = processors[file_path]
+                    results[os.path.relpath(file_path, directory)] = result
+                    self._print_drop_file_summary(os.path.relpath(file_path, directory), result)
+                    if self.cache and "error" not in result["tpp_901_structure"]:
+                        self.cache.put(file_path, self._cache_settings(report_type_by_key(result["report_type"])),
+                                       result["tpp_901_structure"], state)
+        
+        for key in sorted(results):
+            self.analysis_results[key] = results[key]
+            structure = results[key]["tpp_901_structure"]
+            if self.header_history and "error" not in structure:
+                self.track_header_drift(key, results[key]["processor_code"], report_type_by_key(results[key]["report_type"]),
+                                        structure["headers"], results[key]["compatibility"].get("header_resolution"))
+        
+        exported = self.export_drop_files(directory, matched, workers) if self.export_dir else 0
+        
+        self.drop_scan = {
+            "directory": directory,
+            "workers": workers,
+            "files_matched": len(matched),
+            "files_analyzed": len(jobs),
+            "files_unmatched": unmatched,
+            "files_exported": exported,
+            "header_changes": self.header_changes,
+            "elapsed_seconds": round(time.perf_counter() - started, 3)
+        }
+        print(f"\n⏱️ Analyzed {len(jobs)} of {len(matched)} files with {workers} workers in {self.drop_scan['elapsed_seconds']}s\n")
+        
+        self._print_overall_summary()
         
         return self.analysis_results
+    
+    def fast_scan_drop_directory(self, directory: str, max_bytes: int = DEFAULT_MAX_FILE_BYTES) -> Dict[str, Any]:
+        """Triage every report file from its header, row count and size only, fast enough to run between cron cycles"""
+        print(f"⚡ Fast scan of drop directory: {directory}")
+        print("=" * 50)
+        
+        started = time.perf_counter()
+        matched, unmatched = self.discover_drop_files(directory)
+        files = []
+        for file_path, processor_code, report_type in matched:
+            try:
+                scan = scan_file(file_path)
+            except (OSError, ValueError) as e:
+                print(f"   ❌ {os.path.relpath(file_path, directory)}: {e}")
+                continue
+            mappings = self.header_index.snapshot.mappings_for(os.path.basename(file_path), report_type)
+            resolution = self.header_index.resolve(scan["headers"], mappings) if scan["headers"] else None
+            scan.update(processor_code=processor_code, report_type=report_type.key, issues=triage(scan, max_bytes))
+            if resolution and resolution["unresolved"]:
+                scan["issues"].append(f"{len(resolution['unresolved'])} mapped columns missing")
+            files.append(scan)
+            blocking = [issue for issue in scan["issues"] if issue in BLOCKING_ISSUES]
+            emoji = "❌" if blocking else "⚠️" if scan["issues"] else "✅"
+            rows = f"{scan['data_rows']:,}{'' if scan['row_count_exact'] else '≤'} rows"
+            issues = f" - {', '.join(scan['issues'])}" if scan["issues"] else ""
+            print(f"   {emoji} {os.path.relpath(file_path, directory)}: {rows}, {scan['bytes'] / (1 << 20):.1f} MB"
+                  f"{issues}")
+            if self.header_history and scan["headers"]:
+                self.track_header_drift(os.path.relpath(file_path, directory), processor_code, report_type,
+                                        scan["headers"], resolution)
+        
+        elapsed = time.perf_counter() - started
+        self.drop_scan = {
+            "directory": directory,
+            "mode": "fast_scan",
+            "files_matched": len(matched),
+            "files_unmatched": unmatched,
+            "files_blocked": sum(1 for scan in files if any(i in BLOCKING_ISSUES for i in scan["issues"])),
+            "rows": sum(scan["data_rows"] for scan in files),
+            "bytes": sum(scan["bytes"] for scan in files),
+            "elapsed_seconds": round(elapsed, 3),
+            "header_changes": self.header_changes,
+            "files": files
+        }
+        print(f"\n⏱️ Scanned {len(files)} files ({self.drop_scan['bytes'] / (1 << 30):.2f} GB, "
+              f"{self.drop_scan['rows']:,} rows) in {elapsed:.3f}s; {self.drop_scan['files_blocked']} need "
+              f"attention before the next cycle, {len(unmatched)} match no report type")
+        return self.drop_scan
+    
+    def build_compact_profiles(self, directory: str, output: str, workers: Optional[int] = None) -> Dict[str, Any]:
+        """Profile every drop file in parallel into compact binary profiles, written one after another to output"""
+        print(f"🧾 Building compact profiles of {directory}")
+        print("=" * 50)
+        started = time.perf_counter()
+        matched, unmatched = self.discover_drop_files(directory)
+        print(f"   📄 {len(matched)} report files matched, {len(unmatched)} unmatched")
+        failed = []
+        
+        def report(file_path, data, error):
+            if error:
+                failed.append({"file": file_path, "error": error})
+                print(f"   ❌ {os.path.relpath(file_path, directory)}: {error}")
+            else:
+                print(f"   ✅ {os.path.relpath(file_path, directory)}: {len(data):,} byte profile")
+        
+        profiles = build_profiles([(path, report_type, code) for path, code, report_type in matched], workers, report)
+        written = write_profiles(output, profiles)
+        summary = {"directory": directory, "output": output, "profiles": len(profiles), "bytes": written,
+                   "failed": failed, "elapsed_seconds": round(time.perf_counter() - started, 3)}
+        print(f"\n⏱️ {len(profiles)} profiles, {written:,} bytes, in {summary['elapsed_seconds']}s -> {output}")
+        return summary
+    
+    def watch_drop_directories(self, roots: List[str], settle_seconds: float = DEFAULT_SETTLE_SECONDS,
+                               max_bytes: int = DEFAULT_MAX_FILE_BYTES, poll_interval: float = DEFAULT_POLL_SECONDS,
+                               polling: bool = False, trigger=None, duration: Optional[float] = None) -> int:
+        """Write a verdict next to every report file as soon as it is fully written, until interrupted"""
+        def report_verdict(file_path: str, verdict: Dict[str, Any], latency: float):
+            root = next(r for r in roots if os.path.abspath(file_path).startswith(os.path.abspath(r) + os.sep))
+            relative = os.path.relpath(file_path, root)
+            processor_code = (relative.split(os.sep)[0] if os.sep in relative
+                              else os.path.basename(os.path.abspath(root)))
+            emoji = "❌" if verdict["status"] != "ready" else "⚠️" if verdict["issues"] else "✅"
+            issues = f" - {', '.join(verdict['issues'])}" if verdict["issues"] else ""
+            print(f"   {emoji} {relative}: {verdict['status']} {latency:.1f}s after the first write, "
+                  f"{verdict['dataRows']:,} rows, {verdict['size'] / (1 << 20):.1f} MB{issues}")
+            if self.header_history and verdict["headers"]:
+                self.track_header_drift(relative, processor_code, report_type_by_key(verdict["reportType"]),
+                                        verdict["headers"], verdict["_resolution"])
+                self.header_history.commit()
+        
+        watcher = DropWatcher(roots, self.header_index, settle_seconds, max_bytes, poll_interval, polling,
+                              on_verdict=report_verdict, on_ready=trigger)
+        print(f"👀 Watching {len(watcher.directories)} directories with {watcher.mode} "
+              f"(settle {settle_seconds:g}s); press Ctrl+C to stop")
+        print("=" * 50)
+        try:
+            watcher.run(duration)
+        except KeyboardInterrupt:
+            pass
+        print(f"\n⏹️ Stopped after writing {watcher.verdicts} verdicts")
+        return watcher.verdicts
+    
+    def track_header_drift(self, file_key: str, processor_code: str, report_type: ReportType, headers: List[str],
+                           resolution: Optional[Dict]) -> Optional[Dict[str, Any]]:
+        """Fingerprint check against the processor's current header row; diff and propose aliases only on a change"""
+        change = self.header_history.observe(processor_code, report_type.key, headers, file_key)
+        if change is None:
+            return None
+        change["alias_proposals"] = propose_aliases(resolution, self.header_index, change.get("added", ())) \
+            if resolution else []
+        self.header_changes.append(change)
+        if change["status"] == "new":
+            print(f"   🧬 {file_key}: first {report_type.key} header row from {processor_code} recorded as v1")
+        else:
+            print(f"   🧬 {file_key}: {report_type.key} header row from {processor_code} {change['status']} "
+                  f"v{change['previous_version']} → v{change['version']}: +{len(change['added'])} added, "
+                  f"-{len(change['removed'])} removed, {len(change['moved'])} moved")
+        for proposal in change["alias_proposals"]:
+            print(f"      💡 alias '{proposal['alias']}' for {proposal['entity_type']} / {proposal['key']} "
+                  f"(was '{proposal['column_name']}', similarity {proposal['similarity']:.0%})")
+        return change
+    
+    def alias_proposals(self) -> List[Dict[str, Any]]:
+        """Alias proposals of every header change, with the file that prompted them"""
+        return [dict(proposal, file=change["file"], processor_code=change["processor_code"])
+                for change in self.header_changes for proposal in change["alias_proposals"]]
+    
+    def export_drop_files(self, directory: str, matched: List[Tuple[str, str, ReportType]], workers: int) -> int:
+        """Write every analyzed drop file into the columnar dataset, skipping files exported unchanged"""
+        from payrep_tools.columnar import SIDECAR_SUFFIX, ColumnarExporter, require_pyarrow
+        require_pyarrow()
+        exporter = ColumnarExporter(self.export_dir, self.header_index)
+        jobs = []
+        for file_path, processor_code, report_type in matched:
+            file_key = os.path.relpath(file_path, directory)
+            structure = self.analysis_results[file_key]["tpp_901_structure"]
+            if "error" in structure:
+                continue
+            target = exporter.target(file_path, report_type, processor_code)
+            self.analysis_results[file_key]["export"] = {"parquet": target, "profile": target + SIDECAR_SUFFIX}
+            if not exporter.is_current(file_path, report_type, processor_code):
+                jobs.append((file_path, report_type.key, processor_code, structure, self.export_dir,
+                             self.mapping_snapshot))
+        print(f"\n🧱 Exporting {len(jobs)} files to {self.export_dir} "
+              f"({len(matched) - len(jobs)} already exported or unreadable)")
+        if jobs:
+            jobs.sort(key=lambda job: os.path.getsize(job[0]), reverse=True)
+            with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+                futures = {pool.submit(_export_drop_file, job): job[0] for job in jobs}
+                for future in as_completed(futures):
+                    file_key = os.path.relpath(futures[future], directory)
+                    try:
+                        exported = future.result()
+                    except (RuntimeError, ValueError, OSError) as e:
+                        self.analysis_results[file_key].pop("export", None)
+                        print(f"   ❌ {file_key}: export failed: {e}")
+                        continue
+                    rejected = f", {exported['rejected']:,} values did not convert" if exported["rejected"] else ""
+                    print(f"   🧱 {file_key}: {exported['rows']:,} rows, "
+                          f"{exported['bytes'] / (1 << 20):.1f} MB{rejected}")
+        return len(jobs)
+    
+    def drop_file_result(self, file_path: str, report_type: ReportType, structure: Dict,
+                         template_structure: Dict) -> Dict[str, Any]:
+        """Compare an analyzed drop file against its template"""
+        return {
+            "report_type": report_type.key,
+            "tpp_901_structure": structure,
+            "compatibility": self.compare_structures(structure, template_structure, report_type,
+                                                     os.path.basename(file_path)),
+            "data_analysis": self.analyze_data_compatibility(structure, template_structure)
+        }
+    
+    def _print_drop_file_summary(self, file_key: str, result: Dict):
+        """Print a one-line verdict for a drop file"""
+        compatibility = result["compatibility"]
+        if "error" in compatibility:
+            print(f"   ❌ {file_key}: {result['tpp_901_structure'].get('error', compatibility['error'])}")
+            return
+        score = compatibility["compatibility_score"]
+        issues = len(result["data_analysis"].get("data_format_issues", []))
+        emoji = "✅" if score >= 0.9 and not issues else "⚠️"
+        rows = result["tpp_901_structure"].get("data_row_count", 0)
+        print(f"   {emoji} {file_key}: {score:.1%} compatible, {issues} format issues ({rows:,} rows read)")
+    
+    def run_full_analysis(self):
+        """Run complete compatibility analysis"""
+        print(f"🔍 {', '.join(f'TPP {processor.code}' for processor in self.processors)} Compatibility Analysis")
+        print("=" * 50)
+        
+        for processor in self.processors:
+            self.analyze_processor_reports(processor)
+        
+        self._print_overall_summary()
+        
+        return self.analysis_results
+
+def _analyze_drop_file(job: Tuple[str, str, Dict, bool, Optional[str], bool]
+                       ) -> Tuple[str, Dict[str, Any], Optional[Tuple[int, int, str]]]:
+    """Process-pool worker: analyze one drop file against its template structure"""
+    file_path, report_key, template_structure, full_profile, mapping_snapshot, cached = job
+    # Taken before the file is read, so a drop still being written is not cached as complete
+    state = file_state(file_path) if cached else None
+    analyzer = TPP901CompatibilityAnalyzer(full_profile=full_profile, mapping_snapshot=mapping_snapshot)
+    report_type = report_type_by_key(report_key)
+    structure = analyzer.analyze_csv_structure(file_path, report_type)
+    # Hashed here rather than in the parent, so the pool hashes files in parallel
+    state = stored_state(file_path, state) if "error" not in structure else None
+    return file_path, analyzer.drop_file_result(file_path, report_type, structure, template_structure), state
+
+def _export_drop_file(job: Tuple[str, str, str, Dict, str, Optional[str]]) -> Dict[str, Any]:
+    """Process-pool worker: write one analyzed drop file into the columnar dataset"""
+    from payrep_tools.columnar import ColumnarExporter
+    file_path, report_key, processor_code, structure, export_dir, mapping_snapshot = job
+    snapshot = MappingSnapshot.load(mapping_snapshot) if mapping_snapshot else MappingSnapshot.seeded(REPORT_TYPES)
+    exporter = ColumnarExporter(export_dir, HeaderIndex(snapshot))
+    return exporter.export(file_path, report_type_by_key(report_key), processor_code, structure)
+
+def print_profile_views(paths: List[str], view: str, output: Optional[str] = None) -> Dict[str, Any]:
+    """Merge compact profiles from several files into one view and print it"""
+    started = time.perf_counter()
+    views = merge_views((profile for path in paths for profile in read_profiles(path)), view)
+    print(f"🧾 {len(views)} {view} views merged in {time.perf_counter() - started:.3f}s")
+    for merged in views.values():
+        print(f"\n📊 {merged.source}: {merged.files} files, {merged.rows:,} rows, "
+              f"{len(merged.fingerprints)} header variant(s)")
+        for column in merged.columns:
+            stats = column.to_dict()
+            quantiles = stats.get("quantiles")
+            spread = f", p50 {quantiles['p50']:.6g}, p95 {quantiles['p95']:.6g}" if quantiles else ""
+            print(f"   {stats['name']}: {stats['inferred_type']}, {stats['null_rate']:.1%} null, "
+                  f"~{stats['distinct_estimate']:,} distinct{spread}")
+    result = {"timestamp": datetime.now().isoformat(), "view": view, "sources": paths,
+              "views": [merged.to_dict() for merged in views.values()]}
+    if output:
+        with open(output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"\n📄 Views saved to: {output}")
+    return result
 
 def main():
-    analyzer = TPP901CompatibilityAnalyzer()
-    analyzer.run_full_analysis()
+    parser = argparse.ArgumentParser(description="TPP 901 compatibility analysis")
+    parser.add_argument("--full-profile", action="store_true",
+                        help="stream every row of each file instead of sampling the first 5")
+    parser.add_argument("--drop-dir",
+                        help="analyze every report file under this directory instead of the fixed TPP 901 samples")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="process pool size for --drop-dir (default: CPU count)")
+    parser.add_argument("--mapping-snapshot",
+                        help="column mapping / header definition snapshot exported with "
+                             "test-tpp-901.py --export-mapping-snapshot (default: seeded column mappings)")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH,
+                        help=f"analysis cache database (default: {DEFAULT_CACHE_PATH})")
+    parser.add_argument("--cache-max-mb", type=int, default=256,
+                        help="evict least recently used cache entries above this size")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="re-read every file and always write a new report")
+    parser.add_argument("--export",
+                        help="with --drop-dir, also write each file as Parquet partitioned by processor and report "
+                             "date under this directory (needs pyarrow; use --full-profile for exact column types)")
+    parser.add_argument("--fast-scan", action="store_true",
+                        help="with --drop-dir, only triage files from a memory-mapped header and row count scan")
+    parser.add_argument("--max-file-mb", type=int, default=DEFAULT_MAX_FILE_BYTES >> 20,
+                        help="with --fast-scan or --watch, flag files above this size as oversized")
+    parser.add_argument("--triage-output", help="with --fast-scan, write the triage as JSON")
+    parser.add_argument("--header-history", default=DEFAULT_HISTORY_PATH,
+                        help=f"with --drop-dir, versioned header row store (default: {DEFAULT_HISTORY_PATH})")
+    parser.add_argument("--no-header-history", action="store_true",
+                        help="do not check or record header rows")
+    parser.add_argument("--alias-proposals",
+                        help="with --drop-dir, write HeaderAlias proposals for changed header rows as JSON, "
+                             "for test-tpp-901.py --push-header-aliases")
+    parser.add_argument("--watch", action="store_true",
+                        help="keep running and write a <file>.verdict.json next to each report file in --drop-dir "
+                             "(or every directoryPath in --mapping-snapshot) as soon as it is fully written")
+    parser.add_argument("--settle-seconds", type=float, default=DEFAULT_SETTLE_SECONDS,
+                        help="with --watch, how long a file's size must stay unchanged to count as written")
+    parser.add_argument("--polling", action="store_true", help="with --watch, poll instead of using inotify")
+    parser.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_SECONDS,
+                        help="with --watch and polling, seconds between directory listings")
+    parser.add_argument("--trigger-ingestion", metavar="BASE_URL",
+                        help="with --watch, ask the backend at BASE_URL to ingest a directory once a file is ready")
+    parser.add_argument("--compact-profiles", metavar="OUTPUT",
+                        help="with --drop-dir, write a compact binary profile of every file to OUTPUT instead of "
+                             "the compatibility report")
+    parser.add_argument("--merge-profiles", nargs="+", metavar="PROFILES",
+                        help="merge compact profile files into per-TPP or per-day views and print them")
+    parser.add_argument("--view", choices=list(VIEWS), default="tpp", help="with --merge-profiles, how to group")
+    parser.add_argument("--views-output", help="with --merge-profiles, write the merged views as JSON")
+    args = parser.parse_args()
+    
+    if args.merge_profiles:
+        print_profile_views(args.merge_profiles, args.view, args.views_output)
+        return
+    if args.compact_profiles:
+        if not args.drop_dir:
+            parser.error("--compact-profiles needs --drop-dir")
+        TPP901CompatibilityAnalyzer(mapping_snapshot=args.mapping_snapshot).build_compact_profiles(
+            args.drop_dir, args.compact_profiles, args.workers)
+        return
+    
+    watch_roots = [args.drop_dir] if args.drop_dir else []
+    if args.watch and not watch_roots:
+        if not args.mapping_snapshot:
+            parser.error("--watch needs --drop-dir or --mapping-snapshot")
+        watch_roots = sorted({config["directoryPath"] for config in MappingSnapshot.load(args.mapping_snapshot).file_configs
+                              if config.get("directoryPath") and os.path.isdir(config["directoryPath"])})
+    history = HeaderHistory(args.header_history) if watch_roots and not args.no_header_history else None
+    if args.watch:
+        analyzer = TPP901CompatibilityAnalyzer(mapping_snapshot=args.mapping_snapshot, header_history=history)
+        trigger = None
+        if args.trigger_ingestion:
+            from payrep_tools.admin_client import AdminClient
+            client = AdminClient(args.trigger_ingestion)
+            
+            def run_ingestion(directories):
+                for directory in directories:
+                    try:
+                        response = client.post(f"/api/admin/ingestion/run?directory={quote(os.path.abspath(directory))}",
+                                               {})
+                    except (RuntimeError, OSError) as e:
+                        # Still ingesting past the client timeout, or the backend is down; the cron picks it up
+                        print(f"   ⚠️ ingestion of {directory}: {e}")
+                        continue
+                    outcome = "busy, left to the cron" if response.status_code == 409 else response.status_code
+                    print(f"   🚀 ingestion of {directory}: {outcome}")
+            trigger = run_ingestion
+        analyzer.watch_drop_directories(watch_roots, args.settle_seconds, args.max_file_mb << 20, args.poll_interval,
+                                        args.polling, trigger)
+    elif args.fast_scan:
+        if not args.drop_dir:
+            parser.error("--fast-scan needs --drop-dir")
+        analyzer = TPP901CompatibilityAnalyzer(mapping_snapshot=args.mapping_snapshot, header_history=history)
+        triage_result = analyzer.fast_scan_drop_directory(args.drop_dir, args.max_file_mb << 20)
+        if args.triage_output:
+            with open(args.triage_output, "w") as f:
+                json.dump({"timestamp": datetime.now().isoformat(), **triage_result}, f, indent=2)
+            print(f"📄 Triage saved to: {args.triage_output}")
+    else:
+        if args.export and not args.drop_dir:
+            parser.error("--export needs --drop-dir")
+        cache = None if args.no_cache else AnalysisCache(args.cache, max_bytes=args.cache_max_mb << 20)
+        analyzer = TPP901CompatibilityAnalyzer(full_profile=args.full_profile, mapping_snapshot=args.mapping_snapshot,
+                                               cache=cache, export_dir=args.export, header_history=history)
+        try:
+            if args.drop_dir:
+                analyzer.analyze_drop_directory(args.drop_dir, args.workers)
+            else:
+                analyzer.run_full_analysis()
+        finally:
+            if cache:
+                cache.close()
+    
+    if history:
+        history.close()
+    if args.alias_proposals:
+        with open(args.alias_proposals, "w") as f:
+            json.dump(analyzer.alias_proposals(), f, indent=2)
+        print(f"📄 {len(analyzer.alias_proposals())} alias proposals saved to: {args.alias_proposals}")
 
 if __name__ == "__main__":
     main()
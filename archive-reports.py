@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Report Archive Manager
+Moves the files FileIngestionService has archived into a compressed store indexed by processor, entity type, report
+date and checksum, lists what it holds, and replays a date range of a processor's files back into a drop directory
+for a backfill after a mapping fix.
+"""
+
+import argparse
+import json
+import os
+from collections import Counter
+from datetime import date, datetime
+
+from payrep_tools.archive_store import DEFAULT_STORE_PATH, DEFAULT_WORKERS, ArchiveStore
+from payrep_tools.processors import select_processors
+from payrep_tools.report_types import report_type_by_key
+
+
+def iso_date(value: str) -> str:
+    return date.fromisoformat(value).isoformat()
+
+
+def entity_type(value: str) -> str:
+    """Entity types are stored as saveData names them; a report type key such as pos_terminal_data works too"""
+    report_type = report_type_by_key(value)
+    return report_type.file_type if report_type else value
+
+
+def archived_files(processors):
+    """(path, processor code) of every archived file claimed by exactly one processor, and the ambiguous paths"""
+    claims = {}
+    for processor in processors:
+        for path, _ in processor.archived_files():
+            claims.setdefault(os.path.abspath(path), set()).add(processor.code)
+    files = sorted((path, next(iter(codes))) for path, codes in claims.items() if len(codes) == 1)
+    return files, sorted(path for path, codes in claims.items() if len(codes) > 1)
+
+
+def pack(store: ArchiveStore, args):
+    processors = select_processors(args.manifest, args.root, args.processor)
+    files, ambiguous = archived_files(processors)
+    for path in ambiguous:
+        print(f"   ⚠️ {path}: matched by several processors' configs, left in place")
+    print(f"🗜️ Packing {len(files)} archived files of {len(processors)} processors into {store.root}")
+
+    def report(entry):
+        if entry["status"] == "failed":
+            print(f"   ❌ {entry['file']}: {entry['error']}")
+        elif args.verbose:
+            print(f"   ✅ {entry['processor_code']} {entry['file']}: {entry['status']}")
+
+    summary = store.pack(files, remove=not args.keep, on_done=report)
+    summary["ambiguous"] = ambiguous
+    ratio = f", {summary['ratio']}x smaller" if summary["ratio"] else ""
+    print(f"⏱️ {summary['stored']} stored, {summary['already_stored']} already stored, {summary['failed']} failed "
+          f"in {summary['elapsed_seconds']}s ({summary['bytes'] / (1 << 20):.1f} MB -> "
+          f"{summary['stored_bytes'] / (1 << 20):.1f} MB{ratio})")
+    return summary
+
+
+def list_entries(store: ArchiveStore, args):
+    entries = store.find(args.processor, args.start, args.end, args.entity_type, args.checksum)
+    for entry in entries:
+        print(f"   {entry['report_date'] or '?':10} {entry['processor_code']:>6} {entry['entity_type']:24} "
+              f"{entry['file_name']} ({entry['bytes']:,} bytes, {entry['checksum'][:12]})")
+    by_processor = Counter(entry["processor_code"] for entry in entries)
+    print(f"📦 {len(entries)} archived files" +
+          (f": {', '.join(f'{code} {count}' for code, count in sorted(by_processor.items()))}" if entries else ""))
+    return {"files": entries}
+
+
+def replay(store: ArchiveStore, args):
+    if not args.processor:
+        raise ValueError("replay needs --processor")
+    if not (args.start and args.end):
+        raise ValueError("replay needs --start and --end")
+    entries = store.find(args.processor, args.start, args.end, args.entity_type, args.checksum)
+    names = Counter(entry["file_name"] for entry in entries)
+    if any(count > 1 for count in names.values()):
+        # Re-sent files share a name; only the newest version can sit in the drop directory at once
+        newest = {}
+        for entry in entries:
+            if entry["file_name"] not in newest or entry["archived_at"] > newest[entry["file_name"]]["archived_at"]:
+                newest[entry["file_name"]] = entry
+        print(f"   ⚠️ {len(entries) - len(newest)} older versions of re-sent files skipped")
+        entries = sorted(newest.values(), key=lambda entry: (entry["report_date"] or "", entry["file_name"]))
+    print(f"♻️ Replaying {len(entries)} files of {', '.join(args.processor)} "
+          f"({args.start} to {args.end}) into {args.to}")
+
+    def report(result):
+        if result["status"] == "failed":
+            print(f"   ❌ {result['file_name']}: {result['error']}")
+        elif result["status"] == "exists":
+            print(f"   ⚠️ {result['file_name']}: already in the drop directory, use --force to overwrite")
+        elif args.verbose:
+            print(f"   ✅ {result['file_name']}")
+
+    summary = store.replay(entries, args.to, args.force, report)
+    print(f"⏱️ {summary.get('replayed', 0)} replayed, {summary.get('exists', 0)} skipped, "
+          f"{summary.get('failed', 0)} failed in {summary['elapsed_seconds']}s ({summary['mb_per_second']} MB/s)")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compress, index and replay archived report files")
+    parser.add_argument("command", choices=("pack", "list", "replay"),
+                        help="pack: move <directoryPath>/archive files into the store; list: query the index; "
+                             "replay: decompress a date range back into a drop directory")
+    parser.add_argument("--store", default=DEFAULT_STORE_PATH,
+                        help=f"archive store directory (default: {DEFAULT_STORE_PATH})")
+    parser.add_argument("--manifest", help="pack: provisioning manifest listing the banks/TPPs and their file configs")
+    parser.add_argument("--root", help="pack: drop root whose subdirectories are named by processor code")
+    parser.add_argument("--processor", action="append", metavar="CODE",
+                        help="only this processor (repeatable; replay needs at least one)")
+    parser.add_argument("--start", type=iso_date, help="list/replay: first report date (yyyy-MM-dd)")
+    parser.add_argument("--end", type=iso_date, help="list/replay: last report date (yyyy-MM-dd)")
+    parser.add_argument("--entity-type", action="append", type=entity_type,
+                        help="list/replay: only this entity type or report type key (repeatable)")
+    parser.add_argument("--checksum", help="list/replay: only files whose checksum starts with this")
+    parser.add_argument("--to", help="replay: drop directory to write the files to")
+    parser.add_argument("--force", action="store_true", help="replay: overwrite files already in the drop directory")
+    parser.add_argument("--keep", action="store_true", help="pack: leave the originals in the archive directory")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"parallel compressions/decompressions (default: {DEFAULT_WORKERS})")
+    parser.add_argument("--verbose", action="store_true", help="print every file")
+    parser.add_argument("--output", help="write the result as JSON")
+    args = parser.parse_args()
+    if args.command == "replay" and not args.to:
+        parser.error("replay needs --to")
+
+    store = ArchiveStore(args.store, workers=args.workers)
+    try:
+        result = {"pack": pack, "list": list_entries, "replay": replay}[args.command](store, args)
+    except (ValueError, OSError) as e:
+        print(f"❌ {e}")
+        raise SystemExit(1)
+    finally:
+        store.close()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"timestamp": datetime.now().isoformat(), "command": args.command, **result}, f, indent=2)
+        print(f"📄 Results saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
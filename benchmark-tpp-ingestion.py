@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+"""
+Ingestion Load Benchmark
+Generates synthetic reports for the seven entity types and measures how long the backend takes to ingest
+them: files are dropped into a configured directory, processing is triggered, and the import logs are
+watched until each file reaches SUCCESS or FAILED. The profile command ingests the same file under each
+debug log level and splits the time into parse, institution conversion and save from the debug logs. The bulk
+command ingests each file through the cron path and the same rows through the bulk endpoint, and compares them.
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import statistics
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from payrep_tools.admin_client import AdminClient
+from payrep_tools.bulk_upload import DEFAULT_BATCH_RECORDS, BulkUploader, StandInServer
+from payrep_tools.header_index import HeaderIndex, MappingSnapshot
+from payrep_tools.import_monitor import FINAL_STATUSES, ImportLogMonitor
+from payrep_tools.report_types import REPORT_TYPES, ReportType, report_type_by_key
+from payrep_tools.stage_timings import DebugLogCapture, stage_timings
+from payrep_tools.synthetic import HEADER_SOURCES, ReportGenerator, report_file_name
+
+# PUT /api/admin/logging bodies; DEBUG is what application.yml ships with
+LOG_LEVEL_PROFILES = {
+    "debug": {"debugLogLevel": "DEBUG", "levels": {"com.payrep": "DEBUG", "org.hibernate.SQL": "DEBUG"}},
+    "info": {"debugLogLevel": "INFO", "levels": {"com.payrep": "INFO", "org.hibernate.SQL": "INFO"}},
+    "off": {"debugLogLevel": "OFF", "levels": {"com.payrep": "WARN", "org.hibernate.SQL": "WARN"}},
+}
+
+
+def _load_tester_class():
+    """TPP901Tester lives in a hyphenated script, so it is loaded by path"""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test-tpp-901.py")
+    spec = importlib.util.spec_from_file_location("test_tpp_901", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.TPP901Tester
+
+
+TPP901Tester = _load_tester_class()
+
+
+class IngestionBenchmark(TPP901Tester):
+    def __init__(self, base_url="http://localhost:8080", drop_dir="bench-data/901", poll_interval=2.0,
+                 timeout=900.0, debug_log_dir=None, max_workers=8):
+        super().__init__(base_url, max_workers=max_workers)
+        self.drop_dir = drop_dir
+        self.poll_interval = poll_interval
+        self.debug_log_dir = debug_log_dir
+        self.timeout = timeout
+        self.configs: Dict[str, int] = {}
+        self.results: List[Dict[str, Any]] = []
+
+    def configure_benchmark_processing(self, report_types: List[ReportType], cron_schedule="0 */2 * * * ?"):
+        """Create one file config per report type on the drop directory, with the seeded column mappings"""
+        print(f"\n⚙️ Configuring benchmark processing on {self.drop_dir}")
+        for report_type in report_types:
+            config_data = {
+                "bankOrTPPId": self.tpp_901_id,
+                "directoryPath": self.drop_dir,
+                "fileNamePattern": report_type.file_name_pattern,
+                "scheduleTime": cron_schedule,
+                "fileType": report_type.file_type
+            }
+            response = self.client.post("/api/admin/file-configs", config_data)
+            if response.status_code != 200:
+                print(f"❌ Failed to configure {report_type.file_type}: {response.status_code} - {response.text}")
+                continue
+            config_id = response.json()["id"]
+            self.configs[report_type.key] = config_id
+
+            # FileParser refuses configs without column mappings
+            self.client.map(lambda mapping: self.client.post(
+                f"/api/admin/file-configs/{config_id}/column-mappings", {
+                    "fileProcessingConfigId": config_id,
+                    "columnName": mapping.column_name,
+                    "entityType": report_type.entity_type,
+                    "fieldName": mapping.field_name,
+                    "transformation": mapping.transformation
+                }), report_type.mappings)
+            print(f"✅ Configured {report_type.file_type} (ID: {config_id}, {len(report_type.mappings)} mappings)")
+        return len(self.configs) > 0
+
+    def wait_for_import(self, config_id: int, file_name: str, dropped_at: float) -> Optional[Dict[str, Any]]:
+        """Watch the config's import logs until the file reaches a final status"""
+        monitor = ImportLogMonitor(self.client, max_interval=self.poll_interval,
+                                   debug_log_dir=self.debug_log_dir)
+        monitor.watch(config_id, file_name, [file_name])
+        remaining = self.timeout - (time.time() - dropped_at)
+        for result in monitor.run_sync(remaining, since=datetime.fromtimestamp(dropped_at) - timedelta(seconds=5)):
+            if result["file_name"] == file_name and result["status"] in FINAL_STATUSES:
+                return {"status": result["status"], "errorMessage": result["error_message"],
+                        "importTime": result["import_time"],
+                        "pendingToFinalSeconds": result["pending_to_final_seconds"]}
+        return None
+
+    def run_case(self, report_type: ReportType, rows: int, report_date: date, **generator_options) -> Dict[str, Any]:
+        """Generate, drop and ingest one file; returns its timings"""
+        file_name = report_file_name(report_type, report_date)
+        staging_path = os.path.join(self.drop_dir, ".staging", file_name)
+        generator = ReportGenerator(report_type, report_date=report_date, **generator_options)
+        generated = generator.write(staging_path, rows)
+
+        # Rename into place so the cron never sees a half-written file
+        os.replace(staging_path, os.path.join(self.drop_dir, file_name))
+        dropped_at = time.time()
+        self.trigger_processing()
+        log = self.wait_for_import(self.configs[report_type.key], file_name, dropped_at)
+        latency = time.time() - dropped_at
+
+        result = {
+            "report_type": report_type.key,
+            "file_name": file_name,
+            "rows": generated["rows"],
+            "bytes": generated["bytes"],
+            "bad_values": generated["bad_values"],
+            "status": log["status"] if log else "TIMEOUT",
+            "error_message": log.get("errorMessage") if log else None,
+            "end_to_end_seconds": round(latency, 2),
+            "pending_to_final_seconds": log.get("pendingToFinalSeconds") if log else None,
+            "rows_per_second": round(generated["rows"] / latency) if log and latency else 0
+        }
+        self.results.append(result)
+        status_emoji = "✅" if result["status"] == "SUCCESS" else "❌"
+        print(f"   {status_emoji} {file_name}: {rows:,} rows, {generated['bytes'] / (1 << 20):.1f} MB, "
+              f"{result['status']} after {result['end_to_end_seconds']}s ({result['rows_per_second']:,} rows/s)")
+        return result
+
+    def trigger_processing(self):
+        """Ask the backend to process the drop directory now instead of waiting for the cron"""
+        response = self.client.get("/api/bi/process-reports", params={"directory": self.drop_dir})
+        return response.json() if response.status_code == 200 else None
+
+    def run(self, report_types: List[ReportType], sizes: List[int], start_date: date, **generator_options):
+        """Run every size for every report type, smallest first"""
+        print("🚀 Starting ingestion benchmark...")
+        print("=" * 60)
+        if not self.login() or not self.setup_tpp_901():
+            return None
+        if not self.configure_benchmark_processing(report_types):
+            return None
+        os.makedirs(self.drop_dir, exist_ok=True)
+
+        # Every case gets its own report date so file names never collide with archived ones
+        report_date = start_date
+        for rows in sorted(sizes):
+            print(f"\n📦 {rows:,} rows per file")
+            for report_type in report_types:
+                if report_type.key in self.configs:
+                    self.run_case(report_type, rows, report_date, **generator_options)
+                    report_date += timedelta(days=1)
+        return self.save_results()
+
+    def set_logging(self, settings: Dict[str, Any]) -> Dict[str, Any]:
+        response = self.client.request("PUT", "/api/admin/logging", json=settings)
+        if response.status_code != 200:
+            raise RuntimeError(f"PUT /api/admin/logging failed: {response.status_code} - {response.text}")
+        return response.json()
+
+    def profile_log_levels(self, report_type: ReportType, rows: int, levels: List[str], start_date: date,
+                           repeats: int = 1, **generator_options) -> Optional[str]:
+        """Ingest the same synthetic file under each log level; per-stage timings come from the debug logs"""
+        print(f"🚀 Profiling {report_type.key} ingestion under log levels {', '.join(levels)}...")
+        print("=" * 60)
+        if not self.login() or not self.setup_tpp_901():
+            return None
+        if not self.configure_benchmark_processing([report_type]):
+            return None
+        os.makedirs(self.drop_dir, exist_ok=True)
+        os.makedirs(self.debug_log_dir, exist_ok=True)
+        original = self.client.get_json("/api/admin/logging")
+
+        # A new report date per run keeps the rows identical without tripping the unique constraints
+        report_date = start_date
+        try:
+            for repeat in range(repeats):
+                for level in levels:
+                    print(f"\n🔧 Log level {level} (run {repeat + 1} of {repeats})")
+                    self.set_logging(LOG_LEVEL_PROFILES[level])
+                    capture = DebugLogCapture(self.debug_log_dir)
+                    result = self.run_case(report_type, rows, report_date, **generator_options)
+                    lines, written = capture.read()
+                    stages = stage_timings(lines, result["file_name"])
+                    result.update({"log_level": level, "debug_log_bytes": written, "stages": stages})
+                    if stages and stages["save_phase_seconds"] is not None:
+                        conversion = stages["institution_conversion_seconds"]
+                        print(f"   ⏱️ parse {stages['parse_seconds']}s, save {stages['save_phase_seconds']}s"
+                              f"{f' (institution conversion {conversion}s)' if conversion is not None else ''}, "
+                              f"{written / (1 << 20):.1f} MB of debug logs")
+                    report_date += timedelta(days=1)
+        finally:
+            self.set_logging({"debugLogLevel": original["debugLogLevel"], "levels": original["levels"]})
+        return self.save_profile(report_type, rows, levels)
+
+    def save_profile(self, report_type: ReportType, rows: int, levels: List[str]) -> str:
+        def median(values):
+            values = [v for v in values if v is not None]
+            return round(statistics.median(values), 3) if values else None
+
+        summary = {}
+        for level in levels:
+            runs = [r for r in self.results if r.get("log_level") == level]
+            stages = [r["stages"] or {} for r in runs]
+            data_bytes = median([r["bytes"] for r in runs])
+            log_bytes = median([r["debug_log_bytes"] for r in runs])
+            summary[level] = {
+                "runs": len(runs),
+                "pending_to_final_seconds": median([r["pending_to_final_seconds"] for r in runs]),
+                "parse_seconds": median([s.get("parse_seconds") for s in stages]),
+                "save_phase_seconds": median([s.get("save_phase_seconds") for s in stages]),
+                "institution_conversion_seconds": median([s.get("institution_conversion_seconds") for s in stages]),
+                "record_p50_ms": median([s.get("record_p50_ms") for s in stages]),
+                "debug_log_bytes": log_bytes,
+                "debug_log_bytes_per_data_byte": round(log_bytes / data_bytes, 2) if log_bytes and data_bytes else 0,
+            }
+        report_file = f"log_overhead_profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        with open(report_file, "w") as f:
+            json.dump({"timestamp": datetime.now().isoformat(), "report_type": report_type.key, "rows": rows,
+                       "levels": summary, "results": self.results}, f, indent=2)
+        print("\n📊 Median processing time per log level (PENDING to final import log):")
+        for level, values in summary.items():
+            print(f"   {level}: {values['pending_to_final_seconds']}s, "
+                  f"{values['debug_log_bytes_per_data_byte']} debug log bytes per data byte")
+        print(f"📄 Profile saved to: {report_file}")
+        return report_file
+
+    def compare_bulk(self, report_types: List[ReportType], sizes: List[int], start_date: date,
+                     batch_records: int, **generator_options) -> Optional[str]:
+        """Ingest every file through the cron path, then the same rows through the bulk endpoint"""
+        print("🚀 Comparing cron ingestion with bulk upload...")
+        print("=" * 60)
+        if not self.login() or not self.setup_tpp_901():
+            return None
+        if not self.configure_benchmark_processing(report_types):
+            return None
+        os.makedirs(self.drop_dir, exist_ok=True)
+        uploader = BulkUploader(self.client, HeaderIndex(MappingSnapshot.seeded(report_types)), batch_records)
+
+        report_date = start_date
+        comparisons = []
+        for rows in sorted(sizes):
+            print(f"\n📦 {rows:,} rows per file")
+            for report_type in report_types:
+                if report_type.key not in self.configs:
+                    continue
+                cron = self.run_case(report_type, rows, report_date, **generator_options)
+                # Same seed, next report date: identical rows that do not trip the unique constraints
+                bulk_path = os.path.join(self.drop_dir, ".staging", report_file_name(report_type,
+                                                                                    report_date + timedelta(days=1)))
+                ReportGenerator(report_type, report_date=report_date + timedelta(days=1),
+                                **generator_options).write(bulk_path, rows)
+                try:
+                    bulk = uploader.upload(bulk_path, report_type, "901")
+                finally:
+                    os.remove(bulk_path)
+                comparisons.append(print_bulk_result(bulk, cron))
+                report_date += timedelta(days=2)
+
+        report_file = f"bulk_benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        with open(report_file, "w") as f:
+            json.dump({"timestamp": datetime.now().isoformat(), "batch_records": batch_records,
+                       "results": comparisons}, f, indent=2)
+        print(f"\n📄 Bulk comparison saved to: {report_file}")
+        return report_file
+
+    def save_results(self) -> str:
+        report_file = f"ingestion_benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        with open(report_file, "w") as f:
+            json.dump({"timestamp": datetime.now().isoformat(), "drop_dir": self.drop_dir,
+                       "results": self.results}, f, indent=2)
+        print(f"\n📄 Benchmark results saved to: {report_file}")
+        return report_file
+
+
+def generate(args, report_types: List[ReportType]):
+    """Only write the files, e.g. to copy them to another environment"""
+    report_date = args.start_date
+    for rows in sorted(args.rows):
+        for report_type in report_types:
+            generator = ReportGenerator(report_type, header_source=args.headers, skew=args.skew,
+                                        bad_rate=args.bad_rate, report_date=report_date, seed=args.seed)
+            path = os.path.join(args.out, str(rows), report_file_name(report_type, report_date))
+            result = generator.write(path, rows)
+            print(f"✅ {path}: {result['rows']:,} rows, {result['bytes'] / (1 << 20):.1f} MB, "
+                  f"{result['bad_values']} bad values in {result['elapsed_seconds']}s")
+
+
+def print_bulk_result(bulk: Dict[str, Any], cron: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    # Failed batches or nothing saved is a failed upload; rows skipped or refused along the way are a warning
+    if bulk["failed_batches"] or (bulk["rows"] and not bulk["saved"]):
+        status_emoji = "❌"
+    else:
+        status_emoji = "⚠️" if bulk["saved"] < bulk["rows"] else "✅"
+    skipped = sum(bulk["skipped_locally"].values())
+    print(f"   {status_emoji} bulk {os.path.basename(bulk['file'])}: {bulk['saved']:,} of {bulk['rows']:,} rows saved "
+          f"in {bulk['batches']} batches after {bulk['elapsed_seconds']}s ({bulk['rows_per_second']:,} rows/s)"
+          f"{f', {skipped:,} skipped like the cron path would' if skipped else ''}")
+    refused = {"unresolved institution": bulk["unresolved_institutions"], "duplicate": bulk["duplicates"],
+               "rejected": bulk["rejected_by_server"]}
+    if any(refused.values()):
+        reasons = ", ".join(f"{count:,} {reason}" for reason, count in refused.items() if count)
+        print(f"      ⚠️ Not saved by the backend: {reasons}")
+    for failure in bulk["failed_batches"][:3]:
+        print(f"      ❌ Batch {failure['batch']} ({failure['records']:,} records): {failure['error']}")
+    if len(bulk["failed_batches"]) > 3:
+        print(f"      ❌ ... {len(bulk['failed_batches']) - 3} more failed batches")
+    if bulk["import_log_error"]:
+        print(f"      ⚠️ No import log recorded: {bulk['import_log_error']}")
+    comparison = {"report_type": bulk["report_type"], "rows": bulk["rows"], "bulk": bulk}
+    if cron is not None:
+        comparison["cron"] = cron
+        if cron["rows_per_second"]:
+            comparison["speedup"] = round(bulk["rows_per_second"] / cron["rows_per_second"], 1)
+            print(f"   ⚡ {comparison['speedup']}x the cron path")
+    return comparison
+
+
+def bulk_stand_in(args, report_types: List[ReportType]):
+    """Bulk upload generated files to a local stand-in server, without a backend"""
+    with StandInServer() as server:
+        client = AdminClient(server.base_url, max_workers=args.workers)
+        uploader = BulkUploader(client, HeaderIndex(MappingSnapshot.seeded(report_types)), args.batch_records)
+        print(f"🚀 Bulk upload to a stand-in server at {server.base_url}")
+        report_date = args.start_date
+        for rows in sorted(args.rows):
+            print(f"\n📦 {rows:,} rows per file")
+            for report_type in report_types:
+                path = os.path.join(args.out, str(rows), report_file_name(report_type, report_date))
+                ReportGenerator(report_type, header_source=args.headers, skew=args.skew, bad_rate=args.bad_rate,
+                                report_date=report_date, seed=args.seed).write(path, rows)
+                try:
+                    print_bulk_result(uploader.upload(path, report_type, "901"))
+                except ValueError as e:
+                    print(f"   ❌ {os.path.basename(path)}: {e}")
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic report generator and ingestion load benchmark")
+    parser.add_argument("command", choices=("generate", "run", "profile", "bulk"))
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000, 1000000],
+                        help="data rows per file; one case per size and report type")
+    parser.add_argument("--types", nargs="+", default=[r.key for r in REPORT_TYPES],
+                        choices=[r.key for r in REPORT_TYPES])
+    parser.add_argument("--headers", choices=HEADER_SOURCES, default="seeded",
+                        help="header row: seeded column mappings, template file or DataMapper fields")
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent of the institution ID distribution")
+    parser.add_argument("--bad-rate", type=float, default=0.0, help="fraction of typed values replaced by bad ones")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--start-date", type=date.fromisoformat, default=date(2030, 1, 1),
+                        help="report date of the first file (later files use the following days)")
+    parser.add_argument("--out", default="bench-data/generated", help="output directory for generate")
+    parser.add_argument("--drop-dir", default="bench-data/901",
+                        help="directory the backend watches for run (must be the path the backend sees)")
+    parser.add_argument("--base-url", default="http://localhost:8080")
+    parser.add_argument("--timeout", type=float, default=900.0, help="seconds to wait for each import")
+    parser.add_argument("--debug-log-dir", default=None,
+                        help="backend debug-logs directory to tail for progress, when running next to the backend "
+                             "(profile reads its stage timings there; default: debug-logs)")
+    parser.add_argument("--log-levels", nargs="+", default=list(LOG_LEVEL_PROFILES), choices=list(LOG_LEVEL_PROFILES),
+                        help="log levels to profile, in run order")
+    parser.add_argument("--repeats", type=int, default=1, help="profile runs per log level")
+    parser.add_argument("--batch-records", type=int, default=DEFAULT_BATCH_RECORDS, help="records per bulk request")
+    parser.add_argument("--workers", type=int, default=8, help="bulk requests in flight")
+    parser.add_argument("--stand-in", action="store_true",
+                        help="bulk: upload to a local stand-in server instead of comparing against a backend")
+    args = parser.parse_args()
+
+    report_types = [report_type_by_key(key) for key in args.types]
+    if args.command == "generate":
+        generate(args, report_types)
+        return
+
+    try:
+        if args.command == "bulk":
+            if args.stand_in:
+                bulk_stand_in(args, report_types)
+                return
+            benchmark = IngestionBenchmark(args.base_url, args.drop_dir, timeout=args.timeout,
+                                           debug_log_dir=args.debug_log_dir, max_workers=args.workers)
+            # The bulk file must hold the same rows as the cron one, so the seed is fixed unless one is given
+            benchmark.compare_bulk(report_types, args.rows, args.start_date, args.batch_records,
+                                   header_source=args.headers, skew=args.skew, bad_rate=args.bad_rate,
+                                   seed=42 if args.seed is None else args.seed)
+            return
+
+        if args.command == "profile":
+            benchmark = IngestionBenchmark(args.base_url, args.drop_dir, timeout=args.timeout,
+                                           debug_log_dir=args.debug_log_dir or "debug-logs")
+            # One fixed file: the first size and type, with a fixed seed unless one is given
+            benchmark.profile_log_levels(report_types[0], args.rows[0], args.log_levels, args.start_date, args.repeats,
+                                         header_source=args.headers, skew=args.skew, bad_rate=args.bad_rate,
+                                         seed=42 if args.seed is None else args.seed)
+            return
+
+        benchmark = IngestionBenchmark(args.base_url, args.drop_dir, timeout=args.timeout,
+                                       debug_log_dir=args.debug_log_dir)
+        benchmark.run(report_types, args.rows, args.start_date, header_source=args.headers, skew=args.skew,
+                      bad_rate=args.bad_rate, seed=args.seed)
+    except RuntimeError as e:
+        # The backend refused a request the run cannot go on without, e.g. the import logs after a failed login
+        print(f"❌ {e}")
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Institution ID Coverage Pre-Check
+Streams the institution column of processor report files and reports, per distinct ID, how
+DataMapper.convertInstitutionId would resolve it and which records saveData would skip.
+"""
+
+import argparse
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from payrep_tools.header_index import MappingSnapshot
+from payrep_tools.institution_check import OUTCOMES, ConverterTable, InstitutionCoverageCheck
+from payrep_tools.report_types import REPORT_TYPES, ReportType, match_report_type, report_type_by_key
+
+
+def discover_files(paths: List[str], report_key: Optional[str]) -> Tuple[List[Tuple[str, ReportType]], List[str]]:
+    """Files given directly or found under directories, matched to report types by fileNamePattern"""
+    forced = report_type_by_key(report_key) if report_key else None
+    matched, unmatched = [], []
+    for path in paths:
+        if os.path.isdir(path):
+            candidates = []
+            for root, dirs, files in os.walk(path):
+                dirs[:] = sorted(d for d in dirs if d != "archive")
+                candidates.extend(os.path.join(root, name) for name in sorted(files))
+        else:
+            candidates = [path]
+        for file_path in candidates:
+            report_type = forced or match_report_type(os.path.basename(file_path))
+            if report_type:
+                matched.append((file_path, report_type))
+            else:
+                unmatched.append(file_path)
+    return matched, unmatched
+
+
+def print_result(result: Dict[str, Any]):
+    if "error" in result:
+        print(f"❌ {result['error']}")
+        return
+    column = result["column"]
+    dropped = result["dropped_rows"]
+    emoji = "✅" if not dropped else "❌"
+    print(f"\n{emoji} {result['file']} ({result['report_type']}, processor {result['processor_code']})")
+    if column["index"] is None:
+        print(f"   🚫 No column reaches {column['accessor']}: mapped field names {column.get('mapped_field_names')}")
+    else:
+        print(f"   Column '{column['header']}' (index {column['index']}, {column['route']}) -> {column['accessor']}")
+    print(f"   {result['rows']:,} rows, {result['distinct_ids']} distinct IDs, "
+          f"{dropped:,} would be dropped ({result['rows_per_second']:,} rows/s)")
+    if result["converter_enabled"]:
+        print(f"   Converter: {result['converter_hits']:,} hits, {result['converter_misses']:,} misses")
+    for outcome, rows in sorted(result["outcomes"].items(), key=lambda item: -item[1]):
+        print(f"   {'🚫' if OUTCOMES[outcome] else '•'} {outcome}: {rows:,}")
+    for entry in result["ids"]:
+        if entry["dropped"]:
+            examples = ", ".join(map(str, entry.get("dropped_row_examples", [])))
+            print(f"      '{entry['institution_id']}' x{entry['rows']:,} ({entry['outcome']}), records {examples}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Institution ID converter coverage pre-check")
+    parser.add_argument("paths", nargs="+", help="report files or directories")
+    parser.add_argument("--processor", required=True, help="code of the bank/TPP whose file config picks the files up")
+    parser.add_argument("--converter-table", required=True,
+                        help="table exported with test-tpp-901.py --export-converter-table, or a provisioning manifest")
+    parser.add_argument("--mapping-snapshot",
+                        help="column mapping snapshot (default: seeded column mappings)")
+    parser.add_argument("--report-type", choices=[r.key for r in REPORT_TYPES],
+                        help="report type for every file instead of matching file names")
+    parser.add_argument("--dropped-rows-dir", help="write the record numbers of every dropped row to CSVs here")
+    parser.add_argument("--output", help="write the results as JSON")
+    args = parser.parse_args()
+
+    table = ConverterTable.load(args.converter_table)
+    snapshot = MappingSnapshot.load(args.mapping_snapshot) if args.mapping_snapshot else None
+    checker = InstitutionCoverageCheck(table, snapshot)
+    matched, unmatched = discover_files(args.paths, args.report_type)
+    print(f"🔍 {len(matched)} report files, {len(unmatched)} unmatched; "
+          f"{len(table.banks)} banks/TPPs and {len(table.converters)} converter mappings from {table.source}")
+
+    if args.dropped_rows_dir:
+        os.makedirs(args.dropped_rows_dir, exist_ok=True)
+    results = []
+    for file_path, report_type in matched:
+        dropped_rows_path = None
+        if args.dropped_rows_dir:
+            dropped_rows_path = os.path.join(args.dropped_rows_dir,
+                                             os.path.splitext(os.path.basename(file_path))[0] + "_dropped.csv")
+        result = checker.check(file_path, report_type, args.processor, dropped_rows_path)
+        print_result(result)
+        results.append(result)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"timestamp": datetime.now().isoformat(), "processor_code": args.processor,
+                       "unmatched_files": unmatched, "results": results}, f, indent=2)
+        print(f"\n📄 Results saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Volume Anomaly Check
+Keeps daily per-institution, per-channel and per-MCC series of the TransactionVolume and PosTransactionData files
+each processor sent, and flags a new drop whose counts or amounts fall far outside the recent history before the
+ingestion cron picks it up.
+"""
+
+import argparse
+import json
+import os
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from payrep_tools.anomalies import (DEFAULT_MIN_HISTORY_DAYS, DEFAULT_SERIES_PATH, DEFAULT_THRESHOLD,
+                                    DEFAULT_WINDOW_DAYS, SERIES, VolumeSeriesStore)
+from payrep_tools.header_index import HeaderIndex, MappingSnapshot
+from payrep_tools.processors import select_processors
+from payrep_tools.report_types import ReportType, match_report_type
+
+
+def explicit_files(paths: List[str], processor: Optional[str]) -> List[Tuple[str, str, ReportType]]:
+    """Files given on the command line, with --processor or the drop directory they sit in as processor code"""
+    files = []
+    for path in paths:
+        report_type = match_report_type(os.path.basename(path))
+        if report_type is None or report_type.key not in SERIES:
+            print(f"ℹ️ {path}: not a TransactionVolume or PosTransactionData file")
+            continue
+        parent = os.path.dirname(os.path.abspath(path))
+        if os.path.basename(parent) == "archive":
+            parent = os.path.dirname(parent)
+        files.append((path, processor or os.path.basename(parent), report_type))
+    return files
+
+
+def processor_files(args, archived: bool) -> List[Tuple[str, str, ReportType]]:
+    """Every selected processor's archived (already ingested) or waiting drop files that have a series"""
+    files = []
+    for processor in select_processors(args.manifest, args.root, args.processor):
+        matched = processor.archived_files() if archived else processor.drop_files()[0]
+        files.extend((path, processor.code, config.report_type) for path, config in matched
+                     if config.report_type and config.report_type.key in SERIES)
+    return files
+
+
+def add(store: VolumeSeriesStore, args):
+    files = explicit_files(args.files, args.processor[0] if args.processor else None) if args.files \
+        else processor_files(args, archived=True)
+    results = []
+    for file_path, processor_code, report_type in files:
+        try:
+            result = store.add_file(file_path, report_type, processor_code)
+        except (RuntimeError, ValueError, OSError) as e:
+            print(f"❌ {file_path}: {e}")
+            continue
+        results.append(result)
+        if "skipped" not in result:
+            missing = f", missing columns: {', '.join(result['missing_columns'])}" if result["missing_columns"] else ""
+            print(f"✅ {processor_code} {file_path}: {result['rows']:,} rows -> {result['series_rows']:,} series rows "
+                  f"in {result['elapsed_seconds']}s{missing}")
+    added = sum(1 for result in results if "skipped" not in result)
+    print(f"📊 {added} files added, {len(results) - added} unchanged ({store.path})")
+    return {"files": results}
+
+
+def check(store: VolumeSeriesStore, args):
+    files = explicit_files(args.files, args.processor[0] if args.processor else None) if args.files \
+        else processor_files(args, archived=False)
+    results = []
+    for file_path, processor_code, report_type in files:
+        try:
+            result = store.check_file(file_path, report_type, processor_code, args.window, args.min_history,
+                                      args.threshold, args.add)
+        except (RuntimeError, ValueError, OSError) as e:
+            print(f"❌ {file_path}: {e}")
+            continue
+        results.append(result)
+        print(f"{'⚠️' if result['anomalies'] else '✅'} {processor_code} {file_path}: {result['rows']:,} rows, "
+              f"{result['anomalies']} anomalies in {result['elapsed_seconds']}s")
+        for day in result["dates"]:
+            if day["history_days"] < args.min_history:
+                print(f"   ℹ️ {day['report_date']}: only {day['history_days']} days of history in the "
+                      f"{args.window}-day window, not scored")
+            for flag in day["anomalies"][:args.limit]:
+                series = f" {flag['series']}" if flag["series"] else ""
+                ratio = f" ({flag['ratio']}x)" if flag["ratio"] is not None else ""
+                missing = ", missing from the file" if flag["missing_today"] else ""
+                print(f"   🚨 {day['report_date']} {flag['level']}{series} {flag['measure']}: {flag['value']:,} vs "
+                      f"median {flag['median']:,}{ratio}, score {flag['score']}{missing}")
+            if len(day["anomalies"]) > args.limit:
+                print(f"   … {len(day['anomalies']) - args.limit} more")
+    flagged = sum(1 for result in results if result["anomalies"])
+    print(f"\n📈 {len(results)} files checked, {flagged} with anomalies")
+    return {"files": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Flag TransactionVolume and PosTransactionData drops whose "
+                                                 "volumes fall outside their history")
+    parser.add_argument("command", choices=("add", "check"),
+                        help="add: store files as history (default: every processor's archive/); "
+                             "check: score files before ingestion (default: every processor's drop files)")
+    parser.add_argument("files", nargs="*")
+    parser.add_argument("--db", default=DEFAULT_SERIES_PATH, help=f"series database (default: {DEFAULT_SERIES_PATH})")
+    parser.add_argument("--manifest", help="provisioning manifest listing the banks/TPPs and their file configs")
+    parser.add_argument("--root", help="drop root whose subdirectories are named by processor code")
+    parser.add_argument("--processor", action="append", metavar="CODE",
+                        help="only this processor (repeatable); with files, their processor code")
+    parser.add_argument("--mapping-snapshot", help="column mapping snapshot (default: seeded column mappings)")
+    parser.add_argument("--window", type=int, default=DEFAULT_WINDOW_DAYS,
+                        help=f"check: days of history before each report date (default: {DEFAULT_WINDOW_DAYS})")
+    parser.add_argument("--min-history", type=int, default=DEFAULT_MIN_HISTORY_DAYS,
+                        help=f"check: days a series needs in the window to be scored "
+                             f"(default: {DEFAULT_MIN_HISTORY_DAYS})")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help=f"check: flag values this many scaled MADs from the median (default: {DEFAULT_THRESHOLD})")
+    parser.add_argument("--add", action="store_true", help="check: also store the checked files as history")
+    parser.add_argument("--limit", type=int, default=10, help="check: anomalies printed per report date")
+    parser.add_argument("--output", help="write the results as JSON")
+    args = parser.parse_args()
+
+    snapshot = MappingSnapshot.load(args.mapping_snapshot) if args.mapping_snapshot else None
+    store = VolumeSeriesStore(args.db, HeaderIndex(snapshot) if snapshot else None)
+    try:
+        result = {"add": add, "check": check}[args.command](store, args)
+    except (ValueError, OSError) as e:
+        print(f"❌ {e}")
+        raise SystemExit(1)
+    finally:
+        store.close()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"timestamp": datetime.now().isoformat(), "command": args.command, **result}, f, indent=2)
+        print(f"📄 Results saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
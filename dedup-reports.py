@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Cross-File Duplicate Check
+Reports (or strips) rows whose business key was already ingested from an earlier file or repeats within
+the file, before the file is dropped for ingestion, and records the keys of ingested files.
+"""
+
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from payrep_tools.dedup import DEFAULT_CAPACITY, DEFAULT_INDEX_DIR, DuplicateCheck, FingerprintIndex
+from payrep_tools.header_index import MappingSnapshot
+from payrep_tools.institution_check import ConverterTable
+from payrep_tools.report_types import ReportType, match_report_type
+
+
+def discover_files(paths: List[str], processor: Optional[str]) -> List[Tuple[str, str, ReportType]]:
+    """Report files under the paths, with the processor code from --processor or the drop layout"""
+    matched = []
+    for path in paths:
+        if not os.path.isdir(path):
+            report_type = match_report_type(os.path.basename(path))
+            if report_type:
+                parent = os.path.dirname(os.path.abspath(path))
+                if os.path.basename(parent) == "archive":
+                    parent = os.path.dirname(parent)
+                matched.append((path, processor or os.path.basename(parent), report_type))
+            else:
+                print(f"⚠️ {path}: no report type matches the file name")
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            parts = [part for part in os.path.relpath(root, path).split(os.sep) if part not in (".", "archive")]
+            code = processor or (parts[0] if parts else os.path.basename(os.path.abspath(path)))
+            for name in sorted(files):
+                report_type = match_report_type(name)
+                if report_type:
+                    matched.append((os.path.join(root, name), code, report_type))
+    return matched
+
+
+def make_checker(args) -> DuplicateCheck:
+    index = FingerprintIndex(args.index, capacity=args.capacity)
+    snapshot = MappingSnapshot.load(args.mapping_snapshot) if args.mapping_snapshot else None
+    table = ConverterTable.load(args.converter_table) if args.converter_table else None
+    return DuplicateCheck(index, snapshot, table)
+
+
+def check(args):
+    checker = make_checker(args)
+    if args.strip_dir:
+        os.makedirs(args.strip_dir, exist_ok=True)
+    results = []
+    for file_path, processor_code, report_type in discover_files(args.paths, args.processor):
+        started = time.perf_counter()
+        try:
+            result = checker.check(file_path, report_type, processor_code)
+        except (ValueError, OSError) as e:
+            print(f"❌ {file_path}: {e}")
+            continue
+        duplicates = result["history_duplicates"] + result["in_file_duplicates"]
+        emoji = "✅" if not duplicates else "⚠️"
+        print(f"{emoji} {file_path} ({report_type.key}, processor {processor_code}): {result['rows']:,} rows, "
+              f"{result['history_duplicates']:,} already ingested, {result['in_file_duplicates']:,} repeated in the "
+              f"file ({result['rows'] / max(time.perf_counter() - started, 1e-9):,.0f} rows/s)")
+        if result["missing_key_columns"]:
+            print(f"   🚫 No column for key fields {', '.join(result['missing_key_columns'])}; they are keyed as blank")
+        for example in result["examples"][:5]:
+            key = ", ".join(f"{k}={v}" for k, v in example["key"].items())
+            print(f"   • record {example['record']} ({example['kind']}): {key}")
+        if args.strip_dir and duplicates:
+            output = os.path.join(args.strip_dir, os.path.basename(file_path))
+            written = checker.strip(file_path, result["duplicate_records"], output)
+            print(f"   ✂️ {written:,} rows written to {output}")
+            result["stripped_file"] = output
+        if not args.output:
+            result.pop("duplicate_records")
+        results.append(result)
+
+    stats = checker.index.stats()
+    print(f"\n🗂️ Index: {stats['keys']:,} keys from {stats['files']} files, "
+          f"{checker.index.bloom_passes:,} lookups reached the shards")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"timestamp": datetime.now().isoformat(), "index": stats, "results": results}, f, indent=2)
+        print(f"📄 Results saved to: {args.output}")
+
+
+def commit(args):
+    checker = make_checker(args)
+    try:
+        for file_path, processor_code, report_type in discover_files(args.paths, args.processor):
+            try:
+                result = checker.commit(file_path, report_type, processor_code)
+            except (ValueError, OSError) as e:
+                print(f"❌ {file_path}: {e}")
+                continue
+            print(f"✅ {file_path}: {result['distinct_keys']:,} keys, {result['new_keys']:,} new")
+        stats = checker.index.stats()
+    finally:
+        checker.index.close()
+    print(f"\n🗂️ Index: {stats['keys']:,} keys (capacity {stats['capacity']:,}), {stats['runs']} runs, "
+          f"Bloom false positive rate {stats['bloom_false_positive_rate']:.2%}")
+
+
+def stats(args):
+    index = FingerprintIndex(args.index, capacity=args.capacity)
+    try:
+        print(json.dumps(index.stats(), indent=2))
+    finally:
+        index.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cross-file duplicate record detection")
+    parser.add_argument("--index", default=DEFAULT_INDEX_DIR, help=f"fingerprint index (default: {DEFAULT_INDEX_DIR})")
+    parser.add_argument("--capacity", type=int, default=DEFAULT_CAPACITY,
+                        help="expected number of keys; sizes the Bloom filter when the index is created")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    for name, run, help_text in (("check", check, "report duplicate rows before a file is dropped"),
+                                 ("commit", commit, "add the keys of ingested files (or an archive) to the index")):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument("paths", nargs="+", help="report files or drop directories")
+        command.add_argument("--processor", help="processor code for every file (default: from the drop layout)")
+        command.add_argument("--converter-table",
+                             help="key on converted institution codes like bank_or_tpp_id (exported with "
+                                  "test-tpp-901.py --export-converter-table)")
+        command.add_argument("--mapping-snapshot", help="column mapping snapshot (default: seeded column mappings)")
+        command.set_defaults(run=run)
+        if name == "check":
+            command.add_argument("--strip-dir", help="write copies without the duplicate rows here")
+            command.add_argument("--output", help="write the results, with every duplicate record number, as JSON")
+
+    stats_parser = commands.add_parser("stats", help="show index size and Bloom filter saturation")
+    stats_parser.set_defaults(run=stats)
+
+    args = parser.parse_args()
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
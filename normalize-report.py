@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Report Encoding Normalizer
+Rewrites processor drops with BOMs, Windows-1256 text, CRLF line endings, semicolon delimiters or (on request) quoted
+thousands separators as the UTF-8 comma-separated files FileParser reads, and records what was changed in each.
+"""
+
+import argparse
+import json
+from datetime import datetime
+
+from payrep_tools.normalizer import DEFAULT_FALLBACK_ENCODING, changes_for, detect_dialect, normalize_file
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Normalize report files to UTF-8 comma-separated CSV")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--out", help="drop directory to write the normalized files to (may be their own directory)")
+    parser.add_argument("--encoding", help="encoding of every file without a BOM (default: detected)")
+    parser.add_argument("--fallback-encoding", default=DEFAULT_FALLBACK_ENCODING,
+                        help=f"encoding assumed when a file is not UTF-8 (default: {DEFAULT_FALLBACK_ENCODING})")
+    parser.add_argument("--strip-thousands", action="store_true",
+                        help="remove thousands separators from quoted numbers such as \"1,234.50\" in every column; "
+                             "only for files whose text columns never hold comma-grouped digits")
+    parser.add_argument("--detect-only", action="store_true", help="print the detected dialect and planned changes")
+    parser.add_argument("--output", help="write the per-file results as JSON")
+    args = parser.parse_args()
+    if not args.out and not args.detect_only:
+        parser.error("--out is required unless --detect-only is given")
+
+    results = []
+    for file_path in args.files:
+        try:
+            if args.detect_only:
+                dialect = detect_dialect(file_path, args.fallback_encoding, args.encoding)
+                changes = changes_for(dialect)
+                results.append({"file": file_path, "dialect": vars(dialect), "changes": changes})
+                print(f"{'⚠️' if changes else '✅'} {file_path}: {dialect.encoding}"
+                      f"{' (guessed)' if dialect.guessed else ''}, delimiter {dialect.delimiter!r}, "
+                      f"{dialect.line_endings or 'no'} line endings")
+                for change in changes:
+                    print(f"   🔧 {change}")
+                continue
+            result = normalize_file(file_path, args.out, args.fallback_encoding, args.encoding,
+                                    args.strip_thousands)
+        except (ValueError, OSError, LookupError) as e:
+            print(f"❌ {file_path}: {e}")
+            continue
+        results.append(result)
+        print(f"{'🔧' if result['changed'] else '✅'} {file_path}: {len(result['changes'])} changes, "
+              f"{result['bytes'] / (1 << 20):.1f} MB in {result['elapsed_seconds']}s ({result['mb_per_second']} MB/s)"
+              f" -> {result['output']}")
+        for change in result["changes"]:
+            print(f"   🔧 {change}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"timestamp": datetime.now().isoformat(), "files": results}, f, indent=2)
+        print(f"📄 Results saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+"""
+Shared helpers for the TPP report analysis scripts.
+The hyphenated scripts at the repository root are the entry points; this package holds
+the pieces they have in common so each script stays a thin CLI around them.
+"""
@@ -0,0 +1,340 @@
+"""
+Admin API client and declarative provisioning.
+AdminClient keeps one pooled keep-alive session, refreshes the JWT before it expires (or after a 401/403),
+and submits independent requests through a bounded thread pool. ManifestProvisioner reads a manifest of
+banks/TPPs with their file configs and institution ID converters, diffs it against /api/admin/banks,
+/api/admin/file-configs and /api/admin/institution-converter, and sends only the differences.
+"""
+
+import base64
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from payrep_tools.report_types import ReportType, chunked_pattern, report_type_by_key
+
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_SCHEDULE = "0 */5 * * * ?"
+# jwt.validity.ms defaults to one hour; used when the token's exp claim cannot be read
+DEFAULT_TOKEN_VALIDITY_SECONDS = 3600
+TOKEN_REFRESH_MARGIN_SECONDS = 60
+
+
+def token_expiry(token: str) -> Optional[float]:
+    """exp claim of a JWT, read without verifying the signature"""
+    try:
+        payload = token.split(".")[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        return float(claims["exp"])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+class AdminClient:
+    """Thread-safe admin API client over one pooled session"""
+
+    def __init__(self, base_url: str = "http://localhost:8080", username: str = "admin",
+                 password: str = "admin123", max_workers: int = DEFAULT_MAX_WORKERS, timeout: float = 30.0):
+        self.base_url = base_url
+        self.username = username
+        self.password = password
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.token: Optional[str] = None
+        self.expires_at = 0.0
+        self.requests_sent = 0
+        self._lock = threading.Lock()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def login(self, username: Optional[str] = None, password: Optional[str] = None) -> requests.Response:
+        """POST /api/auth/login; the credentials are kept for later refreshes"""
+        self.username = username or self.username
+        self.password = password or self.password
+        response = self.session.post(f"{self.base_url}/api/auth/login", timeout=self.timeout,
+                                     json={"username": self.username, "password": self.password})
+        self.requests_sent += 1
+        if response.status_code == 200:
+            self.token = response.json()["token"]
+            self.expires_at = token_expiry(self.token) or time.time() + DEFAULT_TOKEN_VALIDITY_SECONDS
+        return response
+
+    def _refresh(self, stale_token: Optional[str] = None):
+        with self._lock:
+            # Another thread may already have logged in again
+            if self.token != stale_token and time.time() < self.expires_at - TOKEN_REFRESH_MARGIN_SECONDS:
+                return
+            response = self.login()
+            if response.status_code != 200:
+                raise RuntimeError(f"Login failed: {response.status_code} - {response.text}")
+
+    def headers(self) -> Dict[str, str]:
+        """Authorization headers with a token that is valid for at least the refresh margin"""
+        if self.token is None or time.time() >= self.expires_at - TOKEN_REFRESH_MARGIN_SECONDS:
+            self._refresh(self.token)
+        return {"Authorization": f"Bearer {self.token}", "Content-Type": "application/json"}
+
+    def request(self, method: str, path: str, **kwargs) -> requests.Response:
+        """Send a request; an expired or revoked token is refreshed once and the request retried"""
+        headers = self.headers()
+        token = self.token
+        response = self.session.request(method, f"{self.base_url}{path}", headers=headers,
+                                        timeout=self.timeout, **kwargs)
+        self.requests_sent += 1
+        if response.status_code in (401, 403):
+            self._refresh(token)
+            response = self.session.request(method, f"{self.base_url}{path}", headers=self.headers(),
+                                            timeout=self.timeout, **kwargs)
+            self.requests_sent += 1
+        return response
+
+    def get(self, path: str, **kwargs) -> requests.Response:
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path: str, payload: Dict[str, Any]) -> requests.Response:
+        return self.request("POST", path, json=payload)
+
+    def put(self, path: str, payload: Dict[str, Any]) -> requests.Response:
+        return self.request("PUT", path, json=payload)
+
+    def map(self, fn: Callable[[Any], Any], items: Iterable[Any]) -> List[Any]:
+        """Run fn over items with at most max_workers requests in flight; results keep the input order"""
+        items = list(items)
+        if len(items) <= 1:
+            return [fn(item) for item in items]
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(items))) as executor:
+            return list(executor.map(fn, items))
+
+    def get_json(self, path: str) -> List[Dict[str, Any]]:
+        response = self.get(path)
+        if response.status_code != 200:
+            raise RuntimeError(f"GET {path} failed: {response.status_code} - {response.text}")
+        return response.json()
+
+    def banks(self) -> List[Dict[str, Any]]:
+        return self.get_json("/api/admin/banks")
+
+    def converter_settings(self) -> List[Dict[str, Any]]:
+        """Banks/TPPs with their useConverter flag, which /api/admin/banks does not return"""
+        return self.get_json("/api/admin/institution-converter/banks-and-tpps")
+
+    def file_configs(self) -> List[Dict[str, Any]]:
+        return self.get_json("/api/admin/file-configs")
+
+    def column_mappings(self, config_id: int) -> List[Dict[str, Any]]:
+        return self.get_json(f"/api/admin/file-configs/{config_id}/column-mappings")
+
+    def converters(self) -> List[Dict[str, Any]]:
+        return self.get_json("/api/admin/institution-converter")
+
+    def close(self):
+        self.session.close()
+
+
+@dataclass
+class Change:
+    """One create or update the manifest needs"""
+    kind: str  # bank, converter-setting, file-config, column-mapping, converter
+    action: str  # create, update
+    key: Tuple[Any, ...]
+    payload: Dict[str, Any]
+    target_id: Optional[int] = None
+    bank_code: Optional[str] = None  # resolved to bankOrTPPId when the bank is created in the same run
+    config_key: Optional[Tuple[str, str]] = None  # resolved to the config id for new configs' mappings
+    status: Optional[int] = None
+    result: Any = None
+
+    def describe(self) -> str:
+        return f"{self.action} {self.kind} {' / '.join(str(part) for part in self.key)}"
+
+
+@dataclass
+class Manifest:
+    """Banks/TPPs with their file configs and converters
+
+    {"defaults": {"directoryPath": ..., "scheduleTime": ...},
+     "banks": [{"code": "901", "name": "Tadawul TPP", "type": "TPP", "useConverter": true,
+                "fileConfigs": [{"reportType": "atm_terminal_data"},
+                                {"fileType": "...", "fileNamePattern": "...", "directoryPath": "..."}],
+                "converters": [{"sourceInstitutionId": "000001", "targetBankOrTppCode": "020"}]}]}
+
+    A fileConfigs entry naming a reportType takes its fileType and pattern from the report type registry
+    and gets that type's seeded column mappings; "chunked": true widens the pattern to accept split chunks.
+    """
+    banks: List[Dict[str, Any]] = field(default_factory=list)
+    defaults: Dict[str, Any] = field(default_factory=dict)
+
+    @classmethod
+    def load(cls, path: str) -> "Manifest":
+        with open(path, "r") as f:
+            data = json.load(f)
+        return cls(banks=data.get("banks", []), defaults=data.get("defaults", {}))
+
+    def file_configs(self, bank: Dict[str, Any]) -> List[Tuple[Dict[str, Any], Optional[ReportType]]]:
+        configs = []
+        for entry in bank.get("fileConfigs", []):
+            report_type = report_type_by_key(entry["reportType"]) if entry.get("reportType") else None
+            if entry.get("reportType") and report_type is None:
+                raise ValueError(f"Unknown report type for {bank['code']}: {entry['reportType']}")
+            config = {
+                "directoryPath": entry.get("directoryPath") or self.defaults.get("directoryPath")
+                or f"data/{bank['code']}",
+                "fileNamePattern": entry.get("fileNamePattern") or (report_type and report_type.file_name_pattern),
+                "scheduleTime": entry.get("scheduleTime") or self.defaults.get("scheduleTime", DEFAULT_SCHEDULE),
+                "fileType": entry.get("fileType") or (report_type and report_type.file_type),
+            }
+            if not config["fileNamePattern"] or not config["fileType"]:
+                raise ValueError(f"File config for {bank['code']} needs a reportType or fileType and fileNamePattern")
+            if entry.get("chunked"):
+                # Also accept the <name>_partNNNN.csv chunks split-report.py writes
+                config["fileNamePattern"] = chunked_pattern(config["fileNamePattern"])
+                if config["fileNamePattern"] is None:
+                    raise ValueError(f"Pattern for {bank['code']} {config['fileType']} has no extension to widen")
+            configs.append((config, report_type))
+        return configs
+
+
+class ManifestProvisioner:
+    """Diffs a manifest against the admin API and applies only what is missing or different"""
+
+    def __init__(self, client: AdminClient, manifest: Manifest):
+        self.client = client
+        self.manifest = manifest
+        self.bank_ids: Dict[str, int] = {}
+        self.config_ids: Dict[Tuple[str, str], int] = {}
+
+    def plan(self) -> List[Change]:
+        """Changes needed, in dependency order: banks, converter flags, file configs, mappings, converters"""
+        banks, settings, configs, converters = self.client.map(lambda fetch: fetch(), [
+            self.client.banks, self.client.converter_settings, self.client.file_configs, self.client.converters])
+        existing_banks = {bank["code"]: bank for bank in banks}
+        use_converter = {setting["code"]: setting.get("useConverter", False) for setting in settings}
+        self.bank_ids = {code: bank["id"] for code, bank in existing_banks.items()}
+        codes_by_id = {bank_id: code for code, bank_id in self.bank_ids.items()}
+        # FileProcessingConfig has no natural key; (bank code, fileType) is what the scripts treat as one
+        existing_configs: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        for config in configs:
+            existing_configs.setdefault((codes_by_id.get(config["bankOrTPPId"]), config["fileType"]), config)
+        self.config_ids = {key: config["id"] for key, config in existing_configs.items()}
+        existing_converters = {(c["processorCode"], c["sourceInstitutionId"]): c for c in converters}
+
+        changes: List[Change] = []
+        mapping_checks = []
+        for bank in self.manifest.banks:
+            code = bank["code"]
+            desired = {"code": code, "name": bank["name"], "type": bank.get("type", "BANK")}
+            current = existing_banks.get(code)
+            if current is None:
+                changes.append(Change("bank", "create", (code,), dict(desired, id=None)))
+            elif any(current.get(k) != v for k, v in desired.items()):
+                changes.append(Change("bank", "update", (code,), dict(desired, id=current["id"]), current["id"]))
+
+            # PUT /banks/{id} does not carry useConverter and resets it, so the flag is applied after any update
+            wanted = bool(bank.get("useConverter", False))
+            bank_rewritten = current is None or any(c.kind == "bank" and c.key == (code,) for c in changes)
+            if use_converter.get(code, False) != wanted or (bank_rewritten and wanted):
+                changes.append(Change("converter-setting", "update", (code,), {"useConverter": wanted}))
+
+            for config, report_type in self.manifest.file_configs(bank):
+                key = (code, config["fileType"])
+                current_config = existing_configs.get(key)
+                if current_config is None:
+                    changes.append(Change("file-config", "create", key, dict(config, bankOrTPPId=None),
+                                          bank_code=code))
+                    if report_type is not None:
+                        changes.extend(self._mapping_changes(key, report_type, []))
+                    continue
+                if any(current_config.get(k) != v for k, v in config.items()):
+                    changes.append(Change("file-config", "update", key,
+                                          dict(config, id=current_config["id"], bankOrTPPId=current_config["bankOrTPPId"]),
+                                          current_config["id"]))
+                if report_type is not None:
+                    mapping_checks.append((key, report_type))
+
+            for converter in bank.get("converters", []):
+                key = (code, converter["sourceInstitutionId"])
+                desired = {"sourceInstitutionId": converter["sourceInstitutionId"],
+                           "targetBankOrTppCode": converter["targetBankOrTppCode"],
+                           "processorCode": code, "description": converter.get("description")}
+                current = existing_converters.get(key)
+                if current is None:
+                    changes.append(Change("converter", "create", key, dict(desired, id=None)))
+                elif any(current.get(k) != v for k, v in desired.items() if v is not None):
+                    changes.append(Change("converter", "update", key, dict(desired, id=current["id"]), current["id"]))
+
+        # Existing configs only need the seeded mappings they are missing
+        existing_mappings = self.client.map(lambda check: self.client.column_mappings(self.config_ids[check[0]]),
+                                            mapping_checks)
+        for (key, report_type), mappings in zip(mapping_checks, existing_mappings):
+            changes.extend(self._mapping_changes(key, report_type, mappings))
+        return sorted(changes, key=lambda change: _KIND_ORDER.index(change.kind))
+
+    def _mapping_changes(self, config_key: Tuple[str, str], report_type: ReportType,
+                         existing: List[Dict[str, Any]]) -> List[Change]:
+        present = {mapping["columnName"] for mapping in existing}
+        return [
+            Change("column-mapping", "create", config_key + (mapping.column_name,), {
+                "fileProcessingConfigId": self.config_ids.get(config_key),
+                "columnName": mapping.column_name,
+                "entityType": report_type.entity_type,
+                "fieldName": mapping.field_name,
+                "transformation": mapping.transformation,
+            }, config_key=config_key)
+            for mapping in report_type.mappings if mapping.column_name not in present
+        ]
+
+    def apply(self, changes: List[Change]) -> List[Change]:
+        """Send the changes kind by kind; changes of one kind are independent and go out concurrently"""
+        for kind in _KIND_ORDER:
+            batch = [change for change in changes if change.kind == kind]
+            self.client.map(self._send, batch)
+            for change in batch:
+                if change.status == 200 and change.action == "create":
+                    if kind == "bank":
+                        self.bank_ids[change.key[0]] = change.result["id"]
+                    elif kind == "file-config":
+                        self.config_ids[change.key] = change.result["id"]
+        return changes
+
+    def _send(self, change: Change):
+        payload = dict(change.payload)
+        if change.bank_code is not None:
+            payload["bankOrTPPId"] = self.bank_ids.get(change.bank_code)
+        if change.config_key is not None:
+            payload["fileProcessingConfigId"] = self.config_ids.get(change.config_key)
+        if None in (payload.get("bankOrTPPId", 0), payload.get("fileProcessingConfigId", 0)):
+            change.status, change.result = None, "skipped: parent was not created"
+            return change
+
+        path = _PATHS[change.kind].format(code=change.key[0], config_id=payload.get("fileProcessingConfigId"))
+        if change.action == "update" and change.target_id is not None:
+            response = self.client.put(f"{path}/{change.target_id}", payload)
+        elif change.kind == "converter-setting":
+            response = self.client.put(path, payload)
+        else:
+            response = self.client.post(path, payload)
+        change.status = response.status_code
+        try:
+            change.result = response.json() if response.content else None
+        except ValueError:
+            change.result = response.text
+        return change
+
+
+_KIND_ORDER = ("bank", "converter-setting", "file-config", "column-mapping", "converter")
+_PATHS = {
+    "bank": "/api/admin/banks",
+    "converter-setting": "/api/admin/institution-converter/converter-setting/{code}",
+    "file-config": "/api/admin/file-configs",
+    "column-mapping": "/api/admin/file-configs/{config_id}/column-mappings",
+    "converter": "/api/admin/institution-converter",
+}
@@ -0,0 +1,306 @@
+"""
+Offline replica of the ReportRepository BI queries.
+Each report file is reduced once to per-day rollups (report_date x institution_id x the query's group column,
+with the row count and the summed measure columns) stored in SQLite, keyed by source file. Adding a file only
+inserts its own rollups and a changed file replaces them, so the queries sum a few rollup rows per day instead of
+rescanning every file. Files are read through pyarrow (typed CSV batches or Parquet from the columnar export) and
+reduced with a vectorized group-by.
+"""
+
+import csv
+import json
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from payrep_tools.cache import content_hash
+from payrep_tools.columnar import SIDECAR_SUFFIX, column_plan, require_pyarrow, typed_batches
+from payrep_tools.header_index import HeaderIndex, MappingSnapshot
+from payrep_tools.report_types import REPORT_TYPES, ReportType, report_type_by_key
+
+DEFAULT_AGGREGATE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "payrep", "aggregates.sqlite3")
+MAX_MEASURES = 4
+ROWS = "rows"  # COUNT(*)
+
+
+@dataclass(frozen=True)
+class Rollup:
+    report_key: str
+    dimension: str  # record key the repository queries group by
+    measures: Tuple[str, ...]  # record keys the repository queries sum
+
+
+ROLLUPS = {rollup.report_key: rollup for rollup in (
+    Rollup("transaction_volume", "channel_code",
+           ("txn_count", "txn_total_amount", "txn_success_count", "txn_failed_count")),
+    Rollup("atm_transaction_data", "atm_id", ("total_loaded_amount", "txn_success_count", "txn_failed_count")),
+    Rollup("pos_terminal_data", "mcc_code",
+           ("terminals_active_count", "terminals_issued_count", "terminals_decom_count")),
+)}
+
+
+@dataclass(frozen=True)
+class BIQuery:
+    name: str  # repository method
+    repository: str
+    report_key: str
+    group_alias: Optional[str]  # alias of the GROUP BY column; None for single-row queries
+    outputs: Tuple[Tuple[str, str], ...]  # (alias, measure); ROWS is COUNT(*)
+    order_by: Optional[str] = None  # alias, always DESC
+
+
+QUERIES = [
+    BIQuery("getTotalTransactionsByChannel", "TransactionVolumeReportRepository", "transaction_volume", "channel",
+            (("totalTransactions", "txn_count"),), "totalTransactions"),
+    BIQuery("getTotalAmountByChannel", "TransactionVolumeReportRepository", "transaction_volume", "channel",
+            (("totalAmount", "txn_total_amount"),), "totalAmount"),
+    BIQuery("getSuccessFailureRatio", "TransactionVolumeReportRepository", "transaction_volume", None,
+            (("successfulTransactions", "txn_success_count"), ("failedTransactions", "txn_failed_count"))),
+    BIQuery("getTotalTransactions", "ATMTransactionReportRepository", "atm_transaction_data", None,
+            (("totalTransactions", ROWS),)),
+    BIQuery("getTopATMsByTransactionVolume", "ATMTransactionReportRepository", "atm_transaction_data", "atmId",
+            (("transactionCount", ROWS), ("totalAmount", "total_loaded_amount")), "transactionCount"),
+    BIQuery("getActiveTerminalsByMCC", "POSTerminalReportRepository", "pos_terminal_data", "mcc",
+            (("activeTerminals", "terminals_active_count"),), "activeTerminals"),
+    BIQuery("getTerminalLifecycleStats", "POSTerminalReportRepository", "pos_terminal_data", None,
+            (("issuedCount", "terminals_issued_count"), ("activeCount", "terminals_active_count"),
+             ("decomCount", "terminals_decom_count"))),
+]
+QUERIES_BY_NAME = {query.name: query for query in QUERIES}
+
+
+def reduce_batches(batches: Iterable[Any], rollup: Rollup, columns: Sequence[str]) -> Tuple[List[tuple], int]:
+    """Group typed batches into (report_date, institution_id, dimension, rows, *measure sums) rollup rows"""
+    return group_batches(batches, ["report_date", "institution_id", rollup.dimension], rollup.measures, columns)
+
+
+def group_batches(batches: Iterable[Any], keys: Sequence[str], measures: Sequence[str],
+                  columns: Sequence[str]) -> Tuple[List[tuple], int]:
+    """(report_date, *other keys, rows, *measure sums) per distinct key, and the count of rows without a report date"""
+    pa = require_pyarrow()
+    keys = list(keys)
+    present = [m for m in measures if m in columns]
+    count = pa.compute.CountOptions(mode="all")
+    partials = []
+    for batch in batches:
+        table = pa.Table.from_batches([batch])
+        for key in keys:
+            if key not in columns:
+                table = table.append_column(key, pa.nulls(table.num_rows, pa.string()))
+        partials.append(table.group_by(keys).aggregate([(keys[0], "count", count)] + [(m, "sum") for m in present]))
+    if not partials:
+        return [], 0
+    # Second pass over the much smaller per-batch groups, so nothing is merged in Python
+    merged = pa.concat_tables(partials).group_by(keys).aggregate(
+        [("report_date_count", "sum")] + [(f"{m}_sum", "sum") for m in present])
+    dated = pa.compute.is_valid(merged["report_date"])
+    undated = pa.compute.sum(merged.filter(pa.compute.invert(dated))["report_date_count_sum"]).as_py() or 0
+    # WHERE reportDate BETWEEN never matches a null date, so undated rows are only counted
+    merged = merged.filter(dated)
+    columns = [pa.compute.cast(merged["report_date"], pa.string())] + [merged[k] for k in keys[1:]] + \
+        [merged["report_date_count_sum"]] + [merged[f"{m}_sum_sum"] if m in present else pa.nulls(merged.num_rows)
+                                             for m in measures]
+    return list(zip(*(column.to_pylist() for column in columns))), undated
+
+
+def file_rollups(path: str, report_type: ReportType, header_index: HeaderIndex,
+                 rollup: Optional[Rollup] = None) -> Tuple[List[tuple], int, List[str]]:
+    """Stream one report CSV into rollup rows; also the undated row count and the rollup columns it lacks"""
+    rollup = rollup or ROLLUPS[report_type.key]
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        headers = next(csv.reader(f), [])
+    plan = column_plan(headers, {}, header_index, report_type, os.path.basename(path))
+    names = [column["name"] for column in plan]
+    wanted = ["report_date", "institution_id", rollup.dimension] + list(rollup.measures)
+    columns = [name for name in wanted if name in names]
+    rollup_rows, undated = reduce_batches(typed_batches(path, plan, columns=columns), rollup, columns)
+    return rollup_rows, undated, [name for name in wanted if name not in names]
+
+
+def source_key(processor_code: str, path: str) -> str:
+    """Files are identified by processor and name, so a file moved into archive/ is not counted twice"""
+    return f"{processor_code}/{os.path.basename(path)}"
+
+
+class AggregateStore:
+    """SQLite store of per-file, per-day rollups that answers the ReportRepository queries"""
+
+    def __init__(self, path: str = DEFAULT_AGGREGATE_PATH, header_index: Optional[HeaderIndex] = None):
+        self.path = path
+        # Without an exported snapshot, name columns after the seeded column mappings
+        self.header_index = header_index or HeaderIndex(MappingSnapshot.seeded(REPORT_TYPES))
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS sources (
+                id INTEGER PRIMARY KEY,
+                source_key TEXT NOT NULL UNIQUE,
+                path TEXT NOT NULL,
+                report_type TEXT NOT NULL,
+                processor_code TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                content_hash TEXT,
+                rows INTEGER NOT NULL,
+                undated_rows INTEGER NOT NULL,
+                missing_columns TEXT NOT NULL,
+                added_at REAL NOT NULL
+            )""")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        # m1..m4 hold the rollup's measures in Rollup.measures order
+        self.db.execute(f"""
+            CREATE TABLE IF NOT EXISTS rollups (
+                source_id INTEGER NOT NULL REFERENCES sources (id) ON DELETE CASCADE,
+                report_type TEXT NOT NULL,
+                report_date TEXT NOT NULL,
+                institution_id TEXT,
+                dimension TEXT,
+                rows INTEGER NOT NULL,
+                {", ".join(f"m{i}" for i in range(1, MAX_MEASURES + 1))}
+            )""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS rollups_by_date ON rollups (report_type, report_date)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS rollups_by_source ON rollups (source_id)")
+        self.db.execute("PRAGMA foreign_keys=ON")
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+    def _current(self, key: str, size: int, mtime_ns: int, file_hash: Optional[str]) -> bool:
+        row = self.db.execute("SELECT id, size, mtime_ns, content_hash FROM sources WHERE source_key = ?",
+                              (key,)).fetchone()
+        if row is None:
+            return False
+        if (row[1], row[2]) == (size, mtime_ns):
+            return True
+        # Re-copied without changes: only the mtime moved
+        if file_hash is not None and row[1] == size and row[3] == file_hash:
+            self.db.execute("UPDATE sources SET mtime_ns = ? WHERE id = ?", (mtime_ns, row[0]))
+            self.db.commit()
+            return True
+        return False
+
+    def add_file(self, file_path: str, report_type: ReportType, processor_code: str) -> Dict[str, Any]:
+        """Roll up one report CSV; unchanged files are skipped, changed ones replace their previous rollups"""
+        rollup = ROLLUPS.get(report_type.key)
+        if rollup is None:
+            return {"file": file_path, "skipped": f"no ReportRepository query reads {report_type.key}"}
+        path = os.path.abspath(file_path)
+        key = source_key(processor_code, path)
+        stat = os.stat(path)
+        if self._current(key, stat.st_size, stat.st_mtime_ns, None):
+            return {"file": file_path, "skipped": "unchanged"}
+        file_hash = content_hash(path)
+        if self._current(key, stat.st_size, stat.st_mtime_ns, file_hash):
+            return {"file": file_path, "skipped": "unchanged"}
+
+        started = time.perf_counter()
+        rollup_rows, undated, missing = file_rollups(path, report_type, self.header_index)
+        return self._store(file_path, key, path, report_type, processor_code, stat.st_size, stat.st_mtime_ns, file_hash,
+                           rollup, rollup_rows, undated, missing, started)
+
+    def add_export(self, root: str, report_keys: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        """Roll up Parquet files written by the columnar export, identified by the CSV they came from"""
+        pa = require_pyarrow()
+        results = []
+        for directory, _, files in sorted(os.walk(root)):
+            for name in sorted(files):
+                if not name.endswith(SIDECAR_SUFFIX):
+                    continue
+                with open(os.path.join(directory, name), "r") as f:
+                    meta = json.load(f)
+                rollup = ROLLUPS.get(meta["report_type"])
+                if rollup is None or (report_keys and meta["report_type"] not in report_keys):
+                    continue
+                key = source_key(meta["processor_code"], meta["source"])
+                if self._current(key, meta["source_bytes"], meta["source_mtime_ns"], None):
+                    results.append({"file": meta["source"], "skipped": "unchanged"})
+                    continue
+                started = time.perf_counter()
+                parquet = pa.parquet.ParquetFile(os.path.join(directory, meta["parquet"]))
+                names = parquet.schema_arrow.names
+                wanted = ["report_date", "institution_id", rollup.dimension] + list(rollup.measures)
+                columns = [column for column in wanted if column in names]
+                rollup_rows, undated = reduce_batches(parquet.iter_batches(columns=columns), rollup, columns)
+                results.append(self._store(meta["source"], key, meta["source"], report_type_by_key(meta["report_type"]),
+                                           meta["processor_code"], meta["source_bytes"], meta["source_mtime_ns"],
+                                           None, rollup, rollup_rows, undated,
+                                           [column for column in wanted if column not in names], started))
+        return results
+
+    def _store(self, file_path: str, key: str, path: str, report_type: ReportType, processor_code: str, size: int,
+               mtime_ns: int, file_hash: Optional[str], rollup: Rollup, rollup_rows: List[tuple], undated: int,
+               missing: List[str], started: float) -> Dict[str, Any]:
+        rows = sum(row[3] for row in rollup_rows) + undated
+        padding = (None,) * (MAX_MEASURES - len(rollup.measures))
+        with self.db:
+            self.db.execute("DELETE FROM sources WHERE source_key = ?", (key,))
+            source_id = self.db.execute(
+                "INSERT INTO sources (source_key, path, report_type, processor_code, size, mtime_ns, content_hash, "
+                "rows, undated_rows, missing_columns, added_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, path, report_type.key, processor_code, size, mtime_ns, file_hash, rows, undated, json.dumps(missing),
+                 time.time())).lastrowid
+            prefix = (source_id, report_type.key)
+            self.db.executemany(
+                f"INSERT INTO rollups VALUES (?, ?, ?, ?, ?, ?, {', '.join('?' * MAX_MEASURES)})",
+                [prefix + row + padding for row in rollup_rows])
+        return {"file": file_path, "report_type": report_type.key, "rows": rows, "undated_rows": undated,
+                "rollup_rows": len(rollup_rows), "missing_columns": missing,
+                "elapsed_seconds": round(time.perf_counter() - started, 3)}
+
+    def _measure_column(self, rollup: Rollup, measure: str) -> str:
+        return "rows" if measure == ROWS else f"m{rollup.measures.index(measure) + 1}"
+
+    def query(self, name: str, start: str, end: str, processor_codes: Optional[Sequence[str]] = None,
+              institution_ids: Optional[Sequence[str]] = None) -> Any:
+        """Result of a ReportRepository query over [start, end], shaped like the JPA projection"""
+        query = QUERIES_BY_NAME[name]
+        rollup = ROLLUPS[query.report_key]
+        selected = ", ".join(f"SUM(r.{self._measure_column(rollup, measure)})" for _, measure in query.outputs)
+        sql = (f"SELECT {'r.dimension, ' if query.group_alias else ''}{selected} FROM rollups r "
+               f"JOIN sources s ON s.id = r.source_id WHERE r.report_type = ? AND r.report_date BETWEEN ? AND ?")
+        params: List[Any] = [query.report_key, start, end]
+        for column, values in (("s.processor_code", processor_codes), ("r.institution_id", institution_ids)):
+            if values:
+                sql += f" AND {column} IN ({', '.join('?' * len(values))})"
+                params.extend(values)
+        if query.group_alias:
+            sql += " GROUP BY r.dimension"
+        aliases = [alias for alias, _ in query.outputs]
+        # The amount columns are DECIMAL(_, 2), so float sums are reported to the cent
+        rows = [tuple(round(v, 2) if isinstance(v, float) else v for v in row)
+                for row in self.db.execute(sql, params).fetchall()]
+        if not query.group_alias:
+            return dict(zip(aliases, rows[0]))
+        results = [dict(zip([query.group_alias] + aliases, row)) for row in rows]
+        if query.order_by:
+            # SQL sorts NULL sums last in DESC order on MySQL
+            results.sort(key=lambda row: (row[query.order_by] is not None, row[query.order_by] or 0), reverse=True)
+        return results
+
+    def daily(self, report_key: str, start: str, end: str, processor_codes: Optional[Sequence[str]] = None,
+              by_dimension: bool = False) -> List[Dict[str, Any]]:
+        """Row counts and measure sums per report date and institution (and group column)"""
+        rollup = ROLLUPS[report_key]
+        group = "r.report_date, r.institution_id" + (", r.dimension" if by_dimension else "")
+        sums = ", ".join(f"SUM(r.m{i + 1})" for i in range(len(rollup.measures)))
+        sql = (f"SELECT {group}, SUM(r.rows), {sums} FROM rollups r JOIN sources s ON s.id = r.source_id "
+               f"WHERE r.report_type = ? AND r.report_date BETWEEN ? AND ?")
+        params: List[Any] = [report_key, start, end]
+        if processor_codes:
+            sql += f" AND s.processor_code IN ({', '.join('?' * len(processor_codes))})"
+            params.extend(processor_codes)
+        names = ["report_date", "institution_id"] + ([rollup.dimension] if by_dimension else []) + \
+            [ROWS] + list(rollup.measures)
+        return [dict(zip(names, row)) for row in self.db.execute(f"{sql} GROUP BY {group} ORDER BY {group}", params)]
+
+    def sources(self) -> List[Dict[str, Any]]:
+        cursor = self.db.execute("SELECT path, report_type, processor_code, rows, undated_rows, missing_columns, "
+                                 "added_at FROM sources ORDER BY report_type, path")
+        names = [d[0] for d in cursor.description]
+        return [dict(zip(names, row), missing_columns=json.loads(row[5])) for row in cursor]
@@ -0,0 +1,295 @@
+"""
+Volume anomaly detection for TransactionVolume and PosTransactionData drops, before they are ingested.
+Nothing compares a day's file with history, so a half-empty or tenfold file is saved as is and the
+getTotalTransactionsByChannel dashboards stay wrong until someone notices. Each file is reduced once (the pyarrow
+group-by of the offline aggregates) to daily rows per institution and channel and MCC, stored in SQLite keyed by
+source file, so adding a day costs one pass over that day's rows and never a rescan. PosTransactionData has neither
+a transaction count nor an MCC, so its series are successes, amount and failures per transaction category. A
+candidate day is scored against the preceding window of every series at once: the medians and median absolute
+deviations come from one Arrow sort of the window table, and values more than the threshold in scaled MADs from the
+median are flagged.
+"""
+
+import csv
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from payrep_tools.aggregates import ROWS, group_batches, source_key
+from payrep_tools.cache import content_hash
+from payrep_tools.columnar import column_plan, require_pyarrow, typed_batches
+from payrep_tools.header_index import HeaderIndex, MappingSnapshot
+from payrep_tools.report_types import REPORT_TYPES, ReportType
+
+DEFAULT_SERIES_PATH = os.path.join(os.path.expanduser("~"), ".cache", "payrep", "volume_series.sqlite3")
+DEFAULT_WINDOW_DAYS = 28
+DEFAULT_MIN_HISTORY_DAYS = 7
+DEFAULT_THRESHOLD = 5.0
+MAD_SCALE = 1.4826  # MAD of normally distributed values times this is their standard deviation
+# A flat history still tolerates 5% day-to-day movement, and counts always tolerate one
+RELATIVE_FLOOR = 0.05
+ABSOLUTE_FLOOR = 1.0
+MAX_DIMENSIONS = 2
+MAX_MEASURES = 3
+LEVELS = ("processor", "institution")  # followed by one level per dimension
+
+
+@dataclass(frozen=True)
+class SeriesSpec:
+    report_key: str
+    dimensions: Tuple[str, ...]  # record keys with a series per institution and value
+    measures: Tuple[str, ...]  # record keys summed per day
+
+
+SERIES = {spec.report_key: spec for spec in (
+    SeriesSpec("transaction_volume", ("channel_code", "mcc_code"), ("txn_count", "txn_total_amount", "txn_failed_count")),
+    SeriesSpec("pos_transaction_data", ("transaction_category",),
+               ("txn_success_count", "total_transaction_amount", "txn_failed_count")),
+)}
+
+
+def file_series(path: str, report_type: ReportType,
+                header_index: HeaderIndex) -> Tuple[List[tuple], int, List[str]]:
+    """Stream one report CSV into daily series rows; also the undated row count and the series columns it lacks"""
+    spec = SERIES[report_type.key]
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        headers = next(csv.reader(f), [])
+    plan = column_plan(headers, {}, header_index, report_type, os.path.basename(path))
+    names = [column["name"] for column in plan]
+    keys = ["report_date", "institution_id"] + list(spec.dimensions)
+    wanted = keys + list(spec.measures)
+    columns = [name for name in wanted if name in names]
+    rows, undated = group_batches(typed_batches(path, plan, columns=columns), keys, spec.measures, columns)
+    # Pad to the fixed d1..d2 columns of the series table
+    padding = (None,) * (MAX_DIMENSIONS - len(spec.dimensions))
+    rows = [row[:len(keys)] + padding + row[len(keys):] for row in rows]
+    return rows, undated, [name for name in wanted if name not in names]
+
+
+def _number(value: float):
+    """Counts as integers, amounts to the cent"""
+    return int(value) if value.is_integer() else round(value, 2)
+
+
+def _group_medians(pa, table, column: str):
+    """(key, n, median) of a column per key, exact, from one sort instead of a median per group"""
+    pc = pa.compute
+    values = table.filter(pc.is_valid(table[column])).select(["key", column])
+    values = values.set_column(1, column, pc.cast(values[column], pa.float64()))
+    values = values.sort_by([("key", "ascending"), (column, "ascending")])
+    # Without threads the groups come out in first-seen order, which after the sort is key order
+    counts = values.group_by("key", use_threads=False).aggregate([(column, "count")])
+    n = counts[f"{column}_count"]
+    starts = pc.subtract(pc.cumulative_sum(n), n)
+    low = pc.take(values[column], pc.add(starts, pc.divide(pc.subtract(n, 1), 2)))
+    high = pc.take(values[column], pc.add(starts, pc.divide(n, 2)))
+    return pa.table({"key": counts["key"], "n": n, "median": pc.divide(pc.add(low, high), 2.0)})
+
+
+def robust_scores(history, current, measures: Sequence[str], days_with_data: int,
+                  min_history: int = DEFAULT_MIN_HISTORY_DAYS, threshold: float = DEFAULT_THRESHOLD):
+    """Flags, new series count and scored series count for one day; history holds the days a series was present"""
+    pa = require_pyarrow()
+    pc = pa.compute
+    stats = None
+    for measure in measures:
+        medians = _group_medians(pa, history, measure)
+        deviations = history.select(["key", measure]).join(medians.select(["key", "median"]), "key")
+        deviations = pa.table({"key": deviations["key"], "deviation": pc.abs(pc.subtract(
+            pc.cast(deviations[measure], pa.float64()), deviations["median"]))})
+        mads = _group_medians(pa, deviations, "deviation")
+        measure_stats = medians.join(mads.select(["key", "median"]).rename_columns(["key", "mad"]), "key")
+        measure_stats = measure_stats.rename_columns(["key", f"{measure}_n", f"{measure}_median", f"{measure}_mad"])
+        stats = measure_stats if stats is None else stats.join(measure_stats, "key", join_type="full outer")
+
+    scored = stats.join(current, "key", join_type="left outer")
+    present = pc.is_valid(scored["present"])
+    new_series = current.num_rows - pc.sum(pc.cast(pc.is_in(current["key"], stats["key"]), pa.int64())).as_py()
+    flags = []
+    for measure in measures:
+        n = scored[f"{measure}_n"]
+        median = scored[f"{measure}_median"]
+        # A series missing today counts as zero, unless it was only present on a minority of days
+        value = pc.fill_null(pc.cast(scored[measure], pa.float64()), 0.0)
+        scale = pc.max_element_wise(pc.multiply(scored[f"{measure}_mad"], MAD_SCALE),
+                                    pc.multiply(pc.abs(median), RELATIVE_FLOOR), ABSOLUTE_FLOOR)
+        score = pc.divide(pc.subtract(value, median), scale)
+        regular = pc.or_(present, pc.greater_equal(pc.multiply(n, 2), days_with_data))
+        flagged = pc.and_(pc.and_(pc.greater_equal(n, min_history), regular),
+                          pc.greater_equal(pc.abs(score), threshold))
+        flagged = pc.fill_null(flagged, False)
+        rows = pa.table({"key": scored["key"], "value": value, "median": median, "mad": scored[f"{measure}_mad"],
+                         "n": n, "score": score, "present": present}).filter(flagged)
+        for row in rows.to_pylist():
+            level, _, series = row["key"].partition("/")
+            flags.append({"level": level, "series": series, "measure": measure,
+                          "value": _number(row["value"]), "median": _number(row["median"]),
+                          "mad": _number(row["mad"]), "score": round(row["score"], 1),
+                          "ratio": round(row["value"] / row["median"], 3) if row["median"] else None,
+                          "history_days": row["n"], "missing_today": not row["present"]})
+    flags.sort(key=lambda flag: (LEVELS.index(flag["level"]) if flag["level"] in LEVELS else len(LEVELS),
+                                 -abs(flag["score"])))
+    return flags, new_series, stats.num_rows
+
+
+class VolumeSeriesStore:
+    """SQLite store of per-file daily volume series that scores new files against their history"""
+
+    def __init__(self, path: str = DEFAULT_SERIES_PATH, header_index: Optional[HeaderIndex] = None):
+        self.path = path
+        # Without an exported snapshot, name columns after the seeded column mappings
+        self.header_index = header_index or HeaderIndex(MappingSnapshot.seeded(REPORT_TYPES))
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS sources (
+                id INTEGER PRIMARY KEY,
+                source_key TEXT NOT NULL UNIQUE,
+                path TEXT NOT NULL,
+                report_type TEXT NOT NULL,
+                processor_code TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                content_hash TEXT,
+                rows INTEGER NOT NULL,
+                undated_rows INTEGER NOT NULL,
+                added_at REAL NOT NULL
+            )""")
+        # d1..d2 hold the spec's dimensions and m1..m3 its measures, in SeriesSpec order
+        columns = "report_date TEXT NOT NULL, institution_id TEXT, d1 TEXT, d2 TEXT, rows INTEGER NOT NULL, m1, m2, m3"
+        self.db.execute(f"""
+            CREATE TABLE IF NOT EXISTS series (
+                source_id INTEGER NOT NULL REFERENCES sources (id) ON DELETE CASCADE,
+                report_type TEXT NOT NULL,
+                processor_code TEXT NOT NULL,
+                {columns}
+            )""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS series_by_day ON series (report_type, processor_code, report_date)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS series_by_source ON series (source_id)")
+        # Rows of the file being checked, so they are summed into its day by the same SQL as stored files
+        self.db.execute(f"CREATE TEMP TABLE candidate ({columns})")
+        self.db.execute("PRAGMA foreign_keys=ON")
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+    def _current(self, key: str, size: int, mtime_ns: int, file_hash: Optional[str]) -> bool:
+        row = self.db.execute("SELECT id, size, mtime_ns, content_hash FROM sources WHERE source_key = ?",
+                              (key,)).fetchone()
+        if row is None:
+            return False
+        if (row[1], row[2]) == (size, mtime_ns):
+            return True
+        if file_hash is not None and row[1] == size and row[3] == file_hash:
+            self.db.execute("UPDATE sources SET mtime_ns = ? WHERE id = ?", (mtime_ns, row[0]))
+            self.db.commit()
+            return True
+        return False
+
+    def add_file(self, file_path: str, report_type: ReportType, processor_code: str) -> Dict[str, Any]:
+        """Store one file's daily series; unchanged files are skipped, changed ones replace their previous rows"""
+        if report_type.key not in SERIES:
+            return {"file": file_path, "skipped": f"no volume series for {report_type.key}"}
+        path = os.path.abspath(file_path)
+        key = source_key(processor_code, path)
+        stat = os.stat(path)
+        if self._current(key, stat.st_size, stat.st_mtime_ns, None):
+            return {"file": file_path, "skipped": "unchanged"}
+        file_hash = content_hash(path)
+        if self._current(key, stat.st_size, stat.st_mtime_ns, file_hash):
+            return {"file": file_path, "skipped": "unchanged"}
+        started = time.perf_counter()
+        rows, undated, missing = file_series(path, report_type, self.header_index)
+        self._store(key, path, report_type, processor_code, stat.st_size, stat.st_mtime_ns, file_hash, rows, undated)
+        return {"file": file_path, "report_type": report_type.key, "rows": sum(row[4] for row in rows) + undated,
+                "series_rows": len(rows), "undated_rows": undated, "missing_columns": missing,
+                "elapsed_seconds": round(time.perf_counter() - started, 3)}
+
+    def _store(self, key: str, path: str, report_type: ReportType, processor_code: str, size: int, mtime_ns: int,
+               file_hash: Optional[str], rows: List[tuple], undated: int):
+        padding = (None,) * (MAX_MEASURES - len(SERIES[report_type.key].measures))
+        with self.db:
+            self.db.execute("DELETE FROM sources WHERE source_key = ?", (key,))
+            source_id = self.db.execute(
+                "INSERT INTO sources (source_key, path, report_type, processor_code, size, mtime_ns, content_hash, "
+                "rows, undated_rows, added_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, path, report_type.key, processor_code, size, mtime_ns, file_hash,
+                 sum(row[4] for row in rows) + undated, undated, time.time())).lastrowid
+            self.db.executemany("INSERT INTO series VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                [(source_id, report_type.key, processor_code) + row + padding for row in rows])
+
+    def _level_totals(self, spec: SeriesSpec, processor_code: str, start: str, end: str, exclude_key: str,
+                      with_candidate: bool):
+        """Arrow table of (key, report_date, rows, *measures) per series level and day in [start, end]"""
+        pa = require_pyarrow()
+        measures = ", ".join(f"m{i + 1}" for i in range(len(spec.measures)))
+        base = (f"SELECT r.report_date, r.institution_id, r.d1, r.d2, r.rows, {measures} FROM series r "
+                f"JOIN sources s ON s.id = r.source_id WHERE r.report_type = ? AND r.processor_code = ? "
+                f"AND r.report_date BETWEEN ? AND ? AND s.source_key != ?")
+        params: List[Any] = [spec.report_key, processor_code, start, end, exclude_key]
+        if with_candidate:
+            base += f" UNION ALL SELECT report_date, institution_id, d1, d2, rows, {measures} FROM candidate"
+        institution = "COALESCE(institution_id, '')"
+        levels = [("processor", "''"), ("institution", institution)] + [
+            (dimension, f"{institution} || '/' || COALESCE(d{i + 1}, '')") for i, dimension in enumerate(spec.dimensions)]
+        sums = ", ".join(f"SUM(m{i + 1})" for i in range(len(spec.measures)))
+        sql = "WITH base AS (" + base + ") " + " UNION ALL ".join(
+            f"SELECT '{level}' || '/' || {key}, report_date, SUM(rows), {sums} FROM base GROUP BY 1, 2"
+            for level, key in levels)
+        names = ["key", "report_date", ROWS] + list(spec.measures)
+        rows = self.db.execute(sql, params).fetchall()
+        return pa.table({name: list(column) for name, column in zip(names, zip(*rows))} if rows
+                        else {name: pa.array([], pa.string() if i < 2 else pa.float64()) for i, name in enumerate(names)})
+
+    def check_file(self, file_path: str, report_type: ReportType, processor_code: str,
+                   window: int = DEFAULT_WINDOW_DAYS, min_history: int = DEFAULT_MIN_HISTORY_DAYS,
+                   threshold: float = DEFAULT_THRESHOLD, add: bool = False) -> Dict[str, Any]:
+        """Score each report date of a file, together with other stored files of that day, against the window before"""
+        pa = require_pyarrow()
+        spec = SERIES.get(report_type.key)
+        if spec is None:
+            return {"file": file_path, "skipped": f"no volume series for {report_type.key}"}
+        started = time.perf_counter()
+        path = os.path.abspath(file_path)
+        key = source_key(processor_code, path)
+        rows, undated, missing = file_series(path, report_type, self.header_index)
+        measures = [ROWS] + list(spec.measures)
+        padding = (None,) * (MAX_MEASURES - len(spec.measures))
+        dates = []
+        for report_date in sorted({row[0] for row in rows}):
+            self.db.execute("DELETE FROM candidate")
+            self.db.executemany("INSERT INTO candidate VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                [row + padding for row in rows if row[0] == report_date])
+            day = date.fromisoformat(report_date)
+            first = (day - timedelta(days=window)).isoformat()
+            history = self._level_totals(spec, processor_code, first, (day - timedelta(days=1)).isoformat(), key,
+                                         False)
+            current = self._level_totals(spec, processor_code, report_date, report_date, key, True)
+            current = current.drop_columns(["report_date"]).append_column(
+                "present", pa.repeat(True, current.num_rows))
+            days_with_data = len(set(history["report_date"].to_pylist()))
+            if history.num_rows:
+                flags, new_series, series = robust_scores(history, current, measures, days_with_data, min_history,
+                                                          threshold)
+            else:
+                flags, new_series, series = [], current.num_rows, 0
+            dates.append({"report_date": report_date, "history_days": days_with_data, "series": series,
+                          "new_series": new_series, "anomalies": flags})
+        self.db.execute("DELETE FROM candidate")
+        self.db.commit()
+        if add:
+            stat = os.stat(path)
+            self._store(key, path, report_type, processor_code, stat.st_size, stat.st_mtime_ns, content_hash(path),
+                        rows, undated)
+        return {"file": file_path, "report_type": report_type.key, "processor_code": processor_code,
+                "rows": sum(row[4] for row in rows) + undated, "undated_rows": undated, "missing_columns": missing,
+                "dates": dates, "anomalies": sum(len(day["anomalies"]) for day in dates), "added": add,
+                "elapsed_seconds": round(time.perf_counter() - started, 3)}
@@ -0,0 +1,226 @@
+"""
+Compressed, indexed store for the files FileIngestionService moves into <directoryPath>/archive.
+Each archived file is gzip-compressed into <root>/<report_type>/processor_code=<code>/file_date=<yyyy-MM-dd>/ (the
+report date in the file name, the same layout as the columnar export) and indexed in SQLite by processor code,
+entity type, report date and the blake2b checksum of its uncompressed bytes, which is computed in the same pass. A
+file already stored with the same checksum is not stored twice. Files selected by processor and date range are
+replayed into a drop directory with several decompressions in flight, verified against their checksum and renamed
+into place so the cron never picks up a partial file.
+"""
+
+import gzip
+import hashlib
+import os
+import sqlite3
+import time
+import uuid
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from payrep_tools.processors import VERDICT_SUFFIX, entity_type_for_file_name
+from payrep_tools.report_types import match_report_type
+
+DEFAULT_STORE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "payrep", "archive-store")
+INDEX_NAME = "index.sqlite3"
+STAGING_DIR = ".staging"
+REPLAY_STAGING_DIR = os.path.join(".replay", "staging")
+COPY_BUFFER_BYTES = 1 << 20
+DEFAULT_COMPRESS_LEVEL = 6
+DEFAULT_WORKERS = 4
+
+
+def _file_date(file_name: str) -> Optional[str]:
+    from payrep_tools.columnar import report_date_from_name
+    return report_date_from_name(file_name)
+
+
+def _compress(source: str, target: str, level: int) -> Tuple[str, int]:
+    """(checksum of the uncompressed bytes, uncompressed size); zlib releases the GIL, so threads run in parallel"""
+    digest = hashlib.blake2b(digest_size=16)
+    size = 0
+    with open(source, "rb", buffering=0) as f, gzip.open(target, "wb", compresslevel=level) as out:
+        for block in iter(lambda: f.read(COPY_BUFFER_BYTES), b""):
+            digest.update(block)
+            out.write(block)
+            size += len(block)
+    return digest.hexdigest(), size
+
+
+def _decompress(source: str, target: str) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    with gzip.open(source, "rb") as f, open(target, "wb", buffering=0) as out:
+        for block in iter(lambda: f.read(COPY_BUFFER_BYTES), b""):
+            digest.update(block)
+            out.write(block)
+    return digest.hexdigest()
+
+
+class ArchiveStore:
+    """Date-partitioned gzip store of archived report files with a SQLite index"""
+
+    def __init__(self, root: str, level: int = DEFAULT_COMPRESS_LEVEL, workers: int = DEFAULT_WORKERS):
+        self.root = root
+        self.level = level
+        self.workers = workers
+        os.makedirs(os.path.join(root, STAGING_DIR), exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(root, INDEX_NAME))
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS archived_files (
+                id INTEGER PRIMARY KEY,
+                processor_code TEXT NOT NULL,
+                entity_type TEXT NOT NULL,
+                report_type TEXT,
+                report_date TEXT,
+                file_name TEXT NOT NULL,
+                checksum TEXT NOT NULL,
+                bytes INTEGER NOT NULL,
+                stored_path TEXT NOT NULL,
+                stored_bytes INTEGER NOT NULL,
+                archived_at REAL NOT NULL,
+                packed_at REAL NOT NULL,
+                UNIQUE (processor_code, file_name, checksum)
+            )""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS archived_files_lookup "
+                        "ON archived_files (processor_code, report_date, entity_type)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS archived_files_checksum ON archived_files (checksum)")
+        self.db.commit()
+
+    def target(self, file_name: str, processor_code: str, checksum: str) -> str:
+        """Store path relative to the root; the checksum prefix keeps a re-sent file under the same name apart"""
+        report_type = match_report_type(file_name)
+        return os.path.join(report_type.key if report_type else "unknown", f"processor_code={processor_code}",
+                            f"file_date={_file_date(file_name) or 'unknown'}", f"{file_name}.{checksum[:8]}.gz")
+
+    def pack(self, files: Sequence[Tuple[str, str]], remove: bool = True,
+             on_done: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """Compress and index (path, processor code) pairs; originals are removed once their entry is committed"""
+        started = time.perf_counter()
+        staging = os.path.join(self.root, STAGING_DIR)
+        stored = duplicates = failed = 0
+        original_bytes = stored_bytes = 0
+
+        def compress(job):
+            path, processor_code = job
+            staged = os.path.join(staging, uuid.uuid4().hex)
+            try:
+                return job, staged, _compress(path, staged, self.level), None
+            except OSError as e:
+                if os.path.exists(staged):
+                    os.remove(staged)
+                return job, staged, None, str(e)
+
+        # Largest first so one big file does not become the tail
+        jobs = sorted(files, key=lambda job: os.path.getsize(job[0]), reverse=True)
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for (path, processor_code), staged, packed, error in pool.map(compress, jobs):
+                file_name = os.path.basename(path)
+                entry = {"file": path, "processor_code": processor_code}
+                if error:
+                    failed += 1
+                    entry.update(status="failed", error=error)
+                else:
+                    checksum, size = packed
+                    exists = self.db.execute(
+                        "SELECT stored_path FROM archived_files WHERE processor_code = ? AND file_name = ? "
+                        "AND checksum = ?", (processor_code, file_name, checksum)).fetchone()
+                    if exists:
+                        os.remove(staged)
+                        duplicates += 1
+                        entry.update(status="already stored", stored_path=exists[0])
+                    else:
+                        relative = self.target(file_name, processor_code, checksum)
+                        os.makedirs(os.path.dirname(os.path.join(self.root, relative)), exist_ok=True)
+                        os.replace(staged, os.path.join(self.root, relative))
+                        compressed = os.path.getsize(os.path.join(self.root, relative))
+                        report_type = match_report_type(file_name)
+                        self.db.execute(
+                            "INSERT INTO archived_files (processor_code, entity_type, report_type, report_date, "
+                            "file_name, checksum, bytes, stored_path, stored_bytes, archived_at, packed_at) "
+                            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                            (processor_code, entity_type_for_file_name(file_name),
+                             report_type.key if report_type else None, _file_date(file_name), file_name, checksum,
+                             size, relative, compressed, os.path.getmtime(path), time.time()))
+                        self.db.commit()
+                        stored += 1
+                        original_bytes += size
+                        stored_bytes += compressed
+                        entry.update(status="stored", stored_path=relative, bytes=size, stored_bytes=compressed)
+                    if remove:
+                        os.remove(path)
+                        verdict = path + VERDICT_SUFFIX
+                        if os.path.exists(verdict):
+                            os.remove(verdict)
+                if on_done:
+                    on_done(entry)
+        return {"files": len(jobs), "stored": stored, "already_stored": duplicates, "failed": failed,
+                "bytes": original_bytes, "stored_bytes": stored_bytes,
+                "ratio": round(original_bytes / stored_bytes, 2) if stored_bytes else None,
+                "elapsed_seconds": round(time.perf_counter() - started, 3)}
+
+    def find(self, processor_codes: Optional[Sequence[str]] = None, start: Optional[str] = None,
+             end: Optional[str] = None, entity_types: Optional[Sequence[str]] = None,
+             checksum: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Index entries matching every given filter, oldest report date first; dates are yyyy-MM-dd"""
+        clauses, params = [], []
+        for column, values in (("processor_code", processor_codes), ("entity_type", entity_types)):
+            if values:
+                clauses.append(f"{column} IN ({', '.join('?' * len(values))})")
+                params.extend(values)
+        if start:
+            clauses.append("report_date >= ?")
+            params.append(start)
+        if end:
+            clauses.append("report_date <= ?")
+            params.append(end)
+        if checksum:
+            clauses.append("checksum LIKE ?")
+            params.append(checksum + "%")
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        cursor = self.db.execute(f"SELECT * FROM archived_files {where} ORDER BY report_date, processor_code, file_name",
+                                 params)
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor]
+
+    def replay(self, entries: Iterable[Dict[str, Any]], drop_dir: str, overwrite: bool = False,
+               on_done: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """Decompress entries into drop_dir under their original names, verifying each checksum"""
+        started = time.perf_counter()
+        staging = os.path.join(drop_dir, REPLAY_STAGING_DIR)
+        os.makedirs(staging, exist_ok=True)
+
+        def restore(entry):
+            target = os.path.join(drop_dir, entry["file_name"])
+            if os.path.exists(target) and not overwrite:
+                return dict(entry, status="exists", target=target)
+            staged = os.path.join(staging, entry["file_name"])
+            try:
+                checksum = _decompress(os.path.join(self.root, entry["stored_path"]), staged)
+            except (OSError, EOFError, zlib.error) as e:
+                # A truncated or corrupted archive leaves a partial staged file behind
+                if os.path.exists(staged):
+                    os.remove(staged)
+                return dict(entry, status="failed", target=target, error=str(e))
+            if checksum != entry["checksum"]:
+                os.remove(staged)
+                return dict(entry, status="failed", target=target, error="checksum mismatch")
+            # Rename into place so the cron never sees a half-written file
+            os.replace(staged, target)
+            return dict(entry, status="replayed", target=target)
+
+        counts: Dict[str, int] = {}
+        replayed_bytes = 0
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for result in pool.map(restore, entries):
+                counts[result["status"]] = counts.get(result["status"], 0) + 1
+                if result["status"] == "replayed":
+                    replayed_bytes += result["bytes"]
+                if on_done:
+                    on_done(result)
+        elapsed = time.perf_counter() - started
+        return {"drop_dir": drop_dir, **counts, "bytes": replayed_bytes, "elapsed_seconds": round(elapsed, 3),
+                "mb_per_second": round(replayed_bytes / (1 << 20) / elapsed, 1) if elapsed else 0.0}
+
+    def close(self):
+        self.db.close()
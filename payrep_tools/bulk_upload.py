@@ -0,0 +1,371 @@
+"""
+Bulk ingestion of validated report files.
+saveData maps and saves one record at a time, with an institution lookup and an IDENTITY insert per record.
+Here a file is read once and every row is turned into the record FileParser builds (same header resolution,
+same applyTransformation) and then into the typed values the report type's DataMapper to* function reads, with
+the same strict (this["key"]!!) and lenient (getFieldAsX ?: default) semantics. Records the cron path would skip
+are counted locally; the rest go to /api/admin/bulk/<report type> in large batches, several in flight, where each
+distinct institution ID is converted once per batch and the rows are written with JDBC batch inserts. A batch that
+fails is listed in the result and the others still go out. Like processFile, every file gets one ImportLog row,
+PENDING while its batches are sent and FAILED when any of them (or the date check) failed.
+"""
+
+import csv
+import itertools
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import requests
+
+from payrep_tools.header_index import HeaderIndex
+from payrep_tools.institution_check import apply_transformation
+from payrep_tools.report_types import ReportType, report_type_by_key, snake_case
+
+BULK_PATH = "/api/admin/bulk"
+IMPORT_LOG_PATH = f"{BULK_PATH}/import-log"
+DEFAULT_BATCH_RECORDS = 5000
+JVM_INT_MIN, JVM_INT_MAX = -(1 << 31), (1 << 31) - 1
+
+# What String.toInt, String.toBigDecimal and LocalDate.parse accept
+_INT_RE = re.compile(r"[+-]?\d+")
+_DECIMAL_RE = re.compile(r"[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?")
+_DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}")
+# DateTimeFormatter.ISO_DATE also takes an offset, which the LocalDate drops
+_ISO_DATE_RE = re.compile(r"(\d{4}-\d{2}-\d{2})(Z|[+-]\d{2}:\d{2}(:\d{2})?)?")
+_DATE_TRANSFORMATION = "date:yyyy-mm-dd"
+
+LENIENT_DEFAULTS = {"string": "", "int": 0, "decimal": "0"}
+VALUE_CACHE_SIZE = 1 << 16
+_UNCACHED = object()
+
+
+def _camel_case(name: str) -> str:
+    return re.sub(r"_([a-z])", lambda m: m.group(1).upper(), name)
+
+
+def jvm_value(value: str, kind: str) -> Any:
+    """The typed value DataMapper's asX/getFieldAsX reads from a record value; ValueError where it would fail"""
+    if kind == "string":
+        return value
+    if kind == "int":
+        if _INT_RE.fullmatch(value) and JVM_INT_MIN <= int(value) <= JVM_INT_MAX:
+            return int(value)
+    elif kind == "decimal":
+        # Sent as a string so BigDecimal keeps every digit
+        if _DECIMAL_RE.fullmatch(value):
+            return value
+    elif kind == "date":
+        if _DATE_RE.fullmatch(value):
+            return date.fromisoformat(value).isoformat()
+    raise ValueError(f"not a {kind}: {value!r}")
+
+
+def transform(value: str, transformation: Optional[str]) -> str:
+    """String form of FileParser.applyTransformation's result; a bad date fails the file, as it does there"""
+    if (transformation or "").lower() == _DATE_TRANSFORMATION:
+        match = _ISO_DATE_RE.fullmatch(value)
+        try:
+            return date.fromisoformat(match.group(1)).isoformat()
+        except (AttributeError, ValueError):
+            raise ValueError(f"'{value}' is not a yyyy-MM-dd date; FileParser fails the whole file") from None
+    return apply_transformation(value, transformation)
+
+
+class RecordMapper:
+    """Turns CSV rows into the typed records a report type's DataMapper function would build"""
+
+    def __init__(self, report_type: ReportType, headers: Sequence[str], header_index: HeaderIndex,
+                 file_name: str = "", reject_defaulted: bool = False):
+        self.report_type = report_type
+        # Also skip rows where a lenient getFieldAsX would silently store its default for an unparseable value
+        self.reject_defaulted = reject_defaulted
+        mappings = header_index.snapshot.mappings_for(file_name, report_type)
+        self.resolution = header_index.resolve(headers, mappings)
+        # FileParser writes record[fieldName] for every resolved mapping in order, so a later one wins
+        sources: Dict[str, List[Tuple[int, Optional[str]]]] = {}
+        for entry in self.resolution["mappings"]:
+            if entry["index"] is not None:
+                sources.setdefault(entry["field_name"], []).append((entry["index"], entry["transformation"]))
+        self.sources = sources
+        self.date_columns = sorted({index for entries in sources.values()
+                                    for index, transformation in entries
+                                    if (transformation or "").lower() == _DATE_TRANSFORMATION})
+        today = date.today().isoformat()
+        # (record column, kind, skips the record when absent, default, sources) per mapper field
+        self.fields: List[Tuple[str, str, bool, Any, List[Tuple[int, Optional[str]]]]] = []
+        for field_ in report_type.mapper_fields:
+            # this["key"]!! reads one literal key; getField tries the key, its snake_case and its camelCase form
+            keys = [field_.key] if field_.strict else list(dict.fromkeys(
+                [field_.key, snake_case(field_.key), _camel_case(field_.key)]))
+            default = None if field_.strict else today if field_.kind == "date" else LENIENT_DEFAULTS[field_.kind]
+            self.fields.append((field_.column, field_.kind, field_.strict or field_.required, default,
+                                [source for key in keys for source in reversed(sources.get(key, []))]))
+
+        # Institution IDs, dates, codes and small counts repeat across rows, so each is converted once
+        self._cache: Dict[str, Dict[Tuple[str, Optional[str]], Any]] = {column: {} for column, *_ in self.fields}
+
+    def check_dates(self, row: Sequence[str]):
+        """Every date-transformed value FileParser parses, including columns no mapper field reads"""
+        for index in self.date_columns:
+            if index < len(row):
+                transform(row[index], _DATE_TRANSFORMATION)
+
+    def map_row(self, row: Sequence[str]) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """(record keyed by table column, None) or (None, why the cron path would skip the row)"""
+        record = {}
+        width = len(row)
+        for column, kind, required, default, sources in self.fields:
+            for index, transformation in sources:
+                if index < width:
+                    break
+            else:
+                if required:
+                    return None, f"missing {column}"
+                record[column] = default
+                continue
+            raw = row[index]
+            cache = self._cache[column]
+            value = cache.get((raw, transformation), _UNCACHED)
+            if value is _UNCACHED:
+                try:
+                    value = jvm_value(transform(raw, transformation), kind)
+                except ValueError:
+                    value = None
+                if len(cache) >= VALUE_CACHE_SIZE:
+                    cache.clear()
+                cache[(raw, transformation)] = value
+            if value is None:
+                if default is None or self.reject_defaulted:
+                    return None, f"bad {kind} {column}"
+                value = default
+            record[column] = value
+        return record, None
+
+
+class BulkUploader:
+    """Maps validated files and submits them to the bulk endpoint in concurrent batches"""
+
+    def __init__(self, client, header_index: HeaderIndex, batch_records: int = DEFAULT_BATCH_RECORDS):
+        self.client = client
+        self.header_index = header_index
+        self.batch_records = batch_records
+
+    def _open(self, file_path: str, report_type: ReportType):
+        # FileReader keeps a BOM, so it stays in the first header here too
+        f = open(file_path, "r", newline="", encoding="utf-8", errors="replace", buffering=1 << 20)
+        reader = csv.reader(f)
+        headers = next(reader, None)
+        if headers is None:
+            f.close()
+            raise ValueError(f"Empty file: {file_path}")
+        return f, reader, RecordMapper(report_type, headers, self.header_index, os.path.basename(file_path))
+
+    def check_dates(self, file_path: str, report_type: ReportType):
+        """A bad date fails the file before FileParser returns a single record, so nothing may be sent first"""
+        f, reader, mapper = self._open(file_path, report_type)
+        with f:
+            if not mapper.date_columns:
+                return
+            for record_number, row in enumerate(reader, 1):
+                try:
+                    mapper.check_dates(row)
+                except ValueError as e:
+                    raise ValueError(f"Record {record_number}: {e}") from None
+
+    def batches(self, file_path: str, report_type: ReportType, rejected: Counter) -> Iterator[List[Dict[str, Any]]]:
+        """Record batches of one file; rows the cron path would skip are counted in rejected"""
+        f, reader, mapper = self._open(file_path, report_type)
+        with f:
+            while True:
+                rows = list(itertools.islice(reader, self.batch_records))
+                if not rows:
+                    break
+                batch = []
+                for row in rows:
+                    record, reason = mapper.map_row(row)
+                    if record is None:
+                        rejected[reason] += 1
+                    else:
+                        batch.append(record)
+                if batch:
+                    yield batch
+
+    def _start_import(self, report_type: ReportType, processor_code: str, file_name: str
+                      ) -> Tuple[Optional[int], Optional[str]]:
+        """(id of the file's PENDING ImportLog, None) or (None, why it could not be saved)"""
+        try:
+            response = self.client.post(f"{BULK_PATH}/{report_type.key}/import-log",
+                                        {"processorCode": processor_code, "fileName": file_name})
+        except (requests.RequestException, RuntimeError) as e:
+            return None, str(e)
+        if response.status_code != 200:
+            return None, f"{response.status_code} - {response.text[:200]}"
+        return response.json()["importLogId"], None
+
+    def _finish_import(self, import_log_id: Optional[int], error: Optional[str]) -> Optional[str]:
+        """Mark the ImportLog SUCCESS, or FAILED with error; returns why it could not be updated"""
+        if import_log_id is None:
+            return None
+        try:
+            response = self.client.put(f"{IMPORT_LOG_PATH}/{import_log_id}",
+                                       {"status": "FAILED" if error else "SUCCESS", "errorMessage": error})
+        except (requests.RequestException, RuntimeError) as e:
+            return str(e)
+        return None if response.status_code == 200 else f"{response.status_code} - {response.text[:200]}"
+
+    def upload(self, file_path: str, report_type: ReportType, processor_code: str) -> Dict[str, Any]:
+        """Map and submit one file; the file is read while earlier batches are being inserted
+
+        A bad date raises ValueError before any record is sent, after the file's ImportLog is marked FAILED.
+        """
+        started = time.perf_counter()
+        file_name = os.path.basename(file_path)
+        import_log_id, import_log_error = self._start_import(report_type, processor_code, file_name)
+        try:
+            self.check_dates(file_path, report_type)
+        except ValueError as e:
+            self._finish_import(import_log_id, str(e))
+            raise
+        checked = time.perf_counter()
+        rejected: Counter = Counter()
+        totals: Counter = Counter()
+        failures: List[Dict[str, Any]] = []
+        path = f"{BULK_PATH}/{report_type.key}"
+
+        def send(records):
+            return self.client.post(path, {"processorCode": processor_code, "fileName": file_name,
+                                           "records": records})
+
+        def collect(future, batch_number, records):
+            # One failed batch must not stop the others, so every error is kept with its batch
+            try:
+                response = future.result()
+                if response.status_code == 200:
+                    totals.update({key: value for key, value in response.json().items() if isinstance(value, int)})
+                    return
+                error = f"{response.status_code} - {response.text[:200]}"
+            except (requests.RequestException, RuntimeError, ValueError) as e:
+                error = f"{type(e).__name__}: {e}"
+            failures.append({"batch": batch_number, "records": records, "error": error})
+
+        sent = batches = 0
+        with ThreadPoolExecutor(max_workers=self.client.max_workers) as executor:
+            in_flight: Dict[Any, Tuple[int, int]] = {}
+            for batch in self.batches(file_path, report_type, rejected):
+                # Bounded, so a large file is never held in memory as a whole
+                if len(in_flight) >= 2 * self.client.max_workers:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        collect(future, *in_flight.pop(future))
+                batches += 1
+                in_flight[executor.submit(send, batch)] = (batches, len(batch))
+                sent += len(batch)
+            for future, (batch_number, records) in in_flight.items():
+                collect(future, batch_number, records)
+
+        failures.sort(key=lambda failure: failure["batch"])
+        error = None
+        if failures:
+            lost = sum(failure["records"] for failure in failures)
+            error = f"{len(failures)} of {batches} bulk batches failed ({lost:,} records): {failures[0]['error']}"
+        import_log_error = import_log_error or self._finish_import(import_log_id, error)
+
+        elapsed = time.perf_counter() - started
+        rows = sent + sum(rejected.values())
+        return {"file": file_path, "report_type": report_type.key, "processor_code": processor_code,
+                "rows": rows, "records_sent": sent, "batches": batches, "skipped_locally": dict(rejected),
+                "saved": totals["saved"], "unresolved_institutions": totals["unresolvedInstitutions"],
+                "duplicates": totals["duplicates"], "rejected_by_server": totals["rejected"],
+                "failed_batches": failures, "import_log_id": import_log_id, "import_log_error": import_log_error,
+                "date_check_seconds": round(checked - started, 3), "elapsed_seconds": round(elapsed, 3),
+                "rows_per_second": round(rows / elapsed) if elapsed else 0}
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    server: "StandInServer"
+    protocol_version = "HTTP/1.1"  # keep-alive, like the backend
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status: int, body: Dict[str, Any]):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _payload(self) -> Dict[str, Any]:
+        return json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+
+    def do_POST(self):
+        payload = self._payload()
+        if self.path == "/api/auth/login":
+            return self._reply(200, {"token": "stand-in"})
+        if self.path.startswith(BULK_PATH) and self.path.endswith("/import-log"):
+            return self._reply(200, self.server.start_import(payload))
+        report_type = report_type_by_key(self.path[len(BULK_PATH) + 1:]) if self.path.startswith(BULK_PATH) else None
+        if report_type is None:
+            return self._reply(404, {"message": f"No handler for {self.path}"})
+        self._reply(200, self.server.ingest(report_type, payload))
+
+    def do_PUT(self):
+        payload = self._payload()
+        if not self.path.startswith(IMPORT_LOG_PATH + "/"):
+            return self._reply(404, {"message": f"No handler for {self.path}"})
+        self._reply(200, self.server.finish_import(int(self.path.rsplit("/", 1)[1]), payload))
+
+
+class StandInServer(ThreadingHTTPServer):
+    """Local stand-in for the login, bulk and import-log endpoints; checks record types and counts, stores nothing"""
+
+    daemon_threads = True
+
+    def __init__(self, port: int = 0):
+        super().__init__(("127.0.0.1", port), _StandInHandler)
+        self.base_url = f"http://127.0.0.1:{self.server_address[1]}"
+        self.totals: Counter = Counter()
+        self.import_logs: Dict[int, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def ingest(self, report_type: ReportType, payload: Dict[str, Any]) -> Dict[str, Any]:
+        types = {"string": str, "int": int, "decimal": str, "date": str}
+        records = payload.get("records", [])
+        rejected = sum(1 for record in records if not all(
+            isinstance(record.get(f.column), types[f.kind]) for f in report_type.mapper_fields))
+        result = {"received": len(records), "saved": len(records) - rejected, "unresolvedInstitutions": 0,
+                  "duplicates": 0, "rejected": rejected}
+        with self._lock:
+            self.totals.update({f"{report_type.key}.{key}": value for key, value in result.items()})
+        return result
+
+    def start_import(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            import_log_id = len(self.import_logs) + 1
+            self.import_logs[import_log_id] = {"fileName": payload.get("fileName"), "status": "PENDING"}
+        return {"importLogId": import_log_id}
+
+    def finish_import(self, import_log_id: int, payload: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            self.import_logs.setdefault(import_log_id, {}).update(status=payload.get("status"),
+                                                   errorMessage=payload.get("errorMessage"))
+        return {"importLogId": import_log_id, "status": payload.get("status")}
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
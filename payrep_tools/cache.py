@@ -0,0 +1,164 @@
+"""
+Persistent analysis cache for processor report files.
+Entries are keyed by path and analysis settings, and validated by size and mtime; when only the
+mtime changed (a re-copied drop) the content hash decides. The hash is taken only when a result is stored, once
+the file is confirmed unchanged since its analysis started. Results are stored zlib-compressed in
+SQLite and evicted least recently used once the entry or size limit is exceeded.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import zlib
+from typing import Any, Dict, Optional, Tuple
+
+# Bump when the shape or meaning of cached structures changes
+CACHE_VERSION = 1
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "payrep", "analysis.sqlite3")
+DEFAULT_MAX_ENTRIES = 5000
+DEFAULT_MAX_BYTES = 256 << 20
+HASH_CHUNK_BYTES = 1 << 20
+
+
+def content_hash(file_path: str) -> str:
+    """blake2b digest of the file contents, read in 1 MB chunks"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb", buffering=0) as f:
+        buffer = bytearray(HASH_CHUNK_BYTES)
+        view = memoryview(buffer)
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            digest.update(view[:n])
+    return digest.hexdigest()
+
+
+def file_state(file_path: str) -> Optional[Tuple[int, int]]:
+    """Size and mtime of a file, taken before it is analyzed so a write during analysis is not cached"""
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def stored_state(file_path: str, state: Optional[Tuple[int, int]]) -> Optional[Tuple[int, int, str]]:
+    """file_state() plus the content hash put() stores; None when the file changed since the state was taken"""
+    # Hashing reads the whole file, so it only happens for a result that is about to be stored
+    if state is None or file_state(file_path) != state:
+        return None
+    try:
+        return state + (content_hash(file_path),)
+    except OSError:
+        return None
+
+
+def report_digest(report: Dict[str, Any], volatile=("timestamp",)) -> str:
+    """Digest of a report with run-specific fields removed, to detect unchanged reports"""
+    stable = {k: v for k, v in report.items() if k not in volatile}
+    return hashlib.blake2b(json.dumps(stable, sort_keys=True, default=str).encode(), digest_size=16).hexdigest()
+
+
+class AnalysisCache:
+    """SQLite-backed cache of per-file analysis results"""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                path TEXT NOT NULL,
+                settings TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                content_hash TEXT NOT NULL,
+                result BLOB NOT NULL,
+                result_bytes INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (path, settings)
+            )""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self.db.commit()
+
+    @staticmethod
+    def settings_key(**settings: Any) -> str:
+        return json.dumps(dict(settings, cache_version=CACHE_VERSION), sort_keys=True)
+
+    def get(self, file_path: str, settings: str) -> Optional[Dict[str, Any]]:
+        """Return the cached result if the file is unchanged since it was stored"""
+        path = os.path.abspath(file_path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        row = self.db.execute(
+            "SELECT size, mtime_ns, content_hash, result FROM entries WHERE path = ? AND settings = ?",
+            (path, settings)).fetchone()
+        if row is None or row[0] != stat.st_size:
+            self.misses += 1
+            return None
+        size, mtime_ns, digest, result = row
+        if mtime_ns != stat.st_mtime_ns:
+            # Same size, new mtime: only re-read when the contents actually changed
+            if content_hash(path) != digest:
+                self.misses += 1
+                return None
+            self.db.execute("UPDATE entries SET mtime_ns = ? WHERE path = ? AND settings = ?",
+                            (stat.st_mtime_ns, path, settings))
+        self.db.execute("UPDATE entries SET last_used = ? WHERE path = ? AND settings = ?",
+                        (time.time(), path, settings))
+        self.db.commit()
+        self.hits += 1
+        return json.loads(zlib.decompress(result))
+
+    def put(self, file_path: str, settings: str, result: Dict[str, Any], state: Optional[Tuple[int, int, str]]):
+        """Store a result for the file as stored_state() confirmed it unchanged since the analysis started"""
+        if state is None:
+            return
+        size, mtime_ns, digest = state
+        blob = zlib.compress(json.dumps(result).encode(), 6)
+        self.db.execute(
+            "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (os.path.abspath(file_path), settings, size, mtime_ns, digest, blob, len(blob), time.time()))
+        self._evict()
+        self.db.commit()
+
+    def _evict(self):
+        count, total = self.db.execute("SELECT COUNT(*), COALESCE(SUM(result_bytes), 0) FROM entries").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        excess_entries = max(0, count - self.max_entries)
+        excess_bytes = total - self.max_bytes
+        evict = []
+        for path, settings, size in self.db.execute(
+                "SELECT path, settings, result_bytes FROM entries ORDER BY last_used"):
+            if excess_entries <= 0 and excess_bytes <= 0:
+                break
+            evict.append((path, settings))
+            excess_entries -= 1
+            excess_bytes -= size
+        self.db.executemany("DELETE FROM entries WHERE path = ? AND settings = ?", evict)
+
+    def get_meta(self, name: str) -> Optional[str]:
+        row = self.db.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, name: str, value: str):
+        self.db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (name, value))
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,255 @@
+"""
+Columnar export of analyzed report files.
+Each file is written as a zstd-compressed Parquet file with typed columns under
+<root>/<report_type>/processor_code=<code>/file_date=<yyyy-MM-dd>/ (the report date in the file name; the
+report_date column stays a typed column inside the file), with header names normalized to the record keys
+FileParser produces (snake_case) and the mapping transformations applied. Column types come from the inference
+result; values that do not convert become nulls and are counted. A compact JSON sidecar next to each Parquet
+file carries the profile summary, so the analysis report no longer needs to embed rows. pyarrow is only
+imported when an export or scan actually runs.
+"""
+
+import glob
+import json
+import os
+import re
+from datetime import date, datetime
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from payrep_tools.header_index import HeaderIndex
+from payrep_tools.inference import JVM_INT_MAX, JVM_INT_MIN, SENTINELS
+from payrep_tools.report_types import ReportType, snake_case
+
+SIDECAR_SUFFIX = ".profile.json"
+DEFAULT_BLOCK_BYTES = 16 << 20
+_DATE_IN_NAME_RE = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+
+def require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.csv
+        import pyarrow.parquet
+    except ImportError as e:
+        raise RuntimeError("Columnar export needs pyarrow (pip install pyarrow)") from e
+    return pyarrow
+
+
+def normalized_name(header: str) -> str:
+    """Header -> snake_case record key: 'Terminal ID' -> terminal_id, transactionCount -> transaction_count"""
+    name = re.sub(r"[^0-9A-Za-z]+", "_", snake_case(header.strip())).strip("_").lower()
+    return name or "column"
+
+
+def report_date_from_name(file_name: str) -> Optional[str]:
+    match = _DATE_IN_NAME_RE.search(file_name)
+    return match.group(0) if match else None
+
+
+def column_plan(headers: Sequence[str], inference: Dict[str, Any], header_index: HeaderIndex,
+                report_type: Optional[ReportType], file_name: str) -> List[Dict[str, Any]]:
+    """Output name, type and transformation per source column; DataMapper's field types win over inference"""
+    resolved = {}
+    fields = {f.column: f for f in report_type.mapper_fields} if report_type is not None else {}
+    if report_type is not None:
+        mappings = header_index.snapshot.mappings_for(file_name, report_type)
+        for entry in header_index.resolve(headers, mappings)["mappings"]:
+            if entry["index"] is not None:
+                resolved.setdefault(entry["index"], entry)
+    inferred = {column["name"]: column for column in inference.get("columns", [])}
+
+    plan = []
+    used = set()
+    for index, header in enumerate(headers):
+        entry = resolved.get(index)
+        name = normalized_name(entry["field_name"]) if entry else normalized_name(header)
+        unique, n = name, 2
+        while unique in used:
+            unique, n = f"{name}_{n}", n + 1
+        used.add(unique)
+        field = fields.get(header) or fields.get(unique)
+        if field:
+            # Identifiers such as institution_id keep their leading zeros as strings
+            kind = field.kind
+        else:
+            column = inferred.get(header, {})
+            kind = column.get("inferred_type", "string")
+            if kind == "integer":
+                kind = "long" if column.get("kinds", {}).get("long") else "int"
+            elif kind not in ("decimal", "date"):
+                kind = "string"
+        plan.append({"name": unique, "source_header": header, "type": kind,
+                     "transformation": entry["transformation"] if entry else None})
+    return plan
+
+
+def _arrow_type(pa, kind: str):
+    return {"int": pa.int32(), "long": pa.int64(), "decimal": pa.float64(), "date": pa.date32()}.get(kind, pa.string())
+
+
+def _convert_value(value: Optional[str], kind: str):
+    """Per-value fallback for batches the vectorized cast rejects; None for values the JVM would reject"""
+    if value is None:
+        return None
+    try:
+        if kind in ("int", "long"):
+            number = int(value)
+            if kind == "int" and not JVM_INT_MIN <= number <= JVM_INT_MAX:
+                return None
+            return number
+        if kind == "decimal":
+            return float(value)
+        if kind == "date":
+            return date.fromisoformat(value)
+    except ValueError:
+        return None
+    return value
+
+
+class ColumnarExporter:
+    """Writes analyzed files into a Hive-partitioned Parquet dataset with profile sidecars"""
+
+    def __init__(self, root: str, header_index: HeaderIndex, compression: str = "zstd",
+                 block_bytes: int = DEFAULT_BLOCK_BYTES):
+        self.root = root
+        self.header_index = header_index
+        self.compression = compression
+        self.block_bytes = block_bytes
+
+    def target(self, file_path: str, report_type: ReportType, processor_code: str) -> str:
+        file_date = report_date_from_name(os.path.basename(file_path)) or "unknown"
+        stem = os.path.splitext(os.path.basename(file_path))[0]
+        return os.path.join(self.root, report_type.key, f"processor_code={processor_code}",
+                            f"file_date={file_date}", f"{stem}.parquet")
+
+    def is_current(self, file_path: str, report_type: ReportType, processor_code: str) -> bool:
+        """True if the sidecar was written from the file as it is on disk now"""
+        sidecar = self.target(file_path, report_type, processor_code) + SIDECAR_SUFFIX
+        try:
+            with open(sidecar, "r") as f:
+                meta = json.load(f)
+            stat = os.stat(file_path)
+        except (OSError, ValueError):
+            return False
+        return (meta.get("source_bytes"), meta.get("source_mtime_ns")) == (stat.st_size, stat.st_mtime_ns)
+
+    def export(self, file_path: str, report_type: ReportType, processor_code: str,
+               structure: Dict[str, Any]) -> Dict[str, Any]:
+        """Stream the CSV through pyarrow and write one Parquet file plus its sidecar"""
+        pa = require_pyarrow()
+        pq = pa.parquet
+        started = datetime.now()
+        stat = os.stat(file_path)
+        headers = structure["headers"]
+        plan = column_plan(headers, structure.get("inference", {}), self.header_index, report_type,
+                           os.path.basename(file_path))
+        schema = pa.schema([(column["name"], _arrow_type(pa, column["type"])) for column in plan])
+        stats = {column["name"]: {"nulls": 0, "rejected": 0, "min": None, "max": None} for column in plan}
+
+        ragged = []
+        path = self.target(file_path, report_type, processor_code)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f"{path}.tmp"
+        rows = 0
+        with pq.ParquetWriter(temporary, schema, compression=self.compression) as writer:
+            for batch in typed_batches(file_path, plan, stats, ragged, block_bytes=self.block_bytes):
+                writer.write_batch(batch)
+                rows += batch.num_rows
+        os.replace(temporary, path)
+
+        sidecar = {
+            "source": os.path.abspath(file_path),
+            "source_bytes": stat.st_size,
+            "source_mtime_ns": stat.st_mtime_ns,
+            "report_type": report_type.key,
+            "processor_code": processor_code,
+            "file_date": report_date_from_name(os.path.basename(file_path)),
+            "parquet": os.path.basename(path),
+            "parquet_bytes": os.path.getsize(path),
+            "rows": rows,
+            "ragged_rows_skipped": len(ragged),
+            "ragged_row_examples": ragged[:5],
+            "columns": [dict(column, **stats[column["name"]]) for column in plan],
+            "inference": {k: v for k, v in structure.get("inference", {}).items() if k != "columns"},
+            "written_at": started.isoformat(),
+        }
+        with open(path + SIDECAR_SUFFIX, "w") as f:
+            json.dump(sidecar, f, separators=(",", ":"), default=str)
+        return {"file": file_path, "parquet": path, "rows": rows, "bytes": sidecar["parquet_bytes"],
+                "rejected": sum(s["rejected"] for s in stats.values()),
+                "elapsed_seconds": round((datetime.now() - started).total_seconds(), 3)}
+
+
+def typed_batches(file_path: str, plan: List[Dict[str, Any]], stats: Optional[Dict[str, Dict[str, Any]]] = None,
+                  ragged: Optional[List[int]] = None, columns: Optional[Sequence[str]] = None,
+                  block_bytes: int = DEFAULT_BLOCK_BYTES) -> Iterator[Any]:
+    """Stream a CSV as typed RecordBatches following column_plan, converting only the requested columns"""
+    pa = require_pyarrow()
+    pc, pcsv = pa.compute, pa.csv
+    wanted = [column for column in plan if columns is None or column["name"] in columns]
+    stats = stats if stats is not None else {}
+    ragged = ragged if ragged is not None else []
+    schema = pa.schema([(column["name"], _arrow_type(pa, column["type"])) for column in wanted])
+    reader = pcsv.open_csv(
+        file_path,
+        read_options=pcsv.ReadOptions(column_names=[c["name"] for c in plan], skip_rows=1, block_size=block_bytes),
+        parse_options=pcsv.ParseOptions(newlines_in_values=True,
+                                        invalid_row_handler=lambda row: ragged.append(row.number) or "skip"),
+        convert_options=pcsv.ConvertOptions(column_types={c["name"]: pa.string() for c in wanted},
+                                            include_columns=[c["name"] for c in wanted],
+                                            null_values=[""] + sorted(SENTINELS), strings_can_be_null=True))
+    for batch in reader:
+        arrays = [_convert_array(pa, pc, batch.column(i), column,
+                                 stats.setdefault(column["name"], {"nulls": 0, "rejected": 0, "min": None, "max": None}))
+                  for i, column in enumerate(wanted)]
+        yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def _convert_array(pa, pc, array, column: Dict[str, Any], stats: Dict[str, Any]):
+    transformation = (column["transformation"] or "").lower()
+    if column["type"] != "string" or transformation == "trim":
+        array = pc.utf8_trim_whitespace(array)
+    if transformation == "uppercase":
+        array = pc.utf8_upper(array)
+    nulls = array.null_count
+    if column["type"] != "string":
+        target = _arrow_type(pa, column["type"])
+        try:
+            array = pc.cast(array, target)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            array = pa.array([_convert_value(value, column["type"]) for value in array.to_pylist()], target)
+        stats["rejected"] += array.null_count - nulls
+        if len(array) > array.null_count:
+            bounds = pc.min_max(array).as_py()
+            if stats["min"] is None or bounds["min"] < stats["min"]:
+                stats["min"] = bounds["min"]
+            if stats["max"] is None or bounds["max"] > stats["max"]:
+                stats["max"] = bounds["max"]
+    stats["nulls"] += array.null_count
+    return array
+
+
+def read_dataset(root: str, report_type: ReportType, columns: Optional[Sequence[str]] = None,
+                 start: Optional[str] = None, end: Optional[str] = None,
+                 processor_codes: Optional[Sequence[str]] = None):
+    """Load exported rows for a date range, reading only the requested columns and partitions"""
+    pa = require_pyarrow()
+    import pyarrow.dataset as ds
+    partitioning = ds.partitioning(pa.schema([("processor_code", pa.string()), ("file_date", pa.string())]),
+                                   flavor="hive")
+    base = os.path.join(root, report_type.key)
+    # Sidecars live next to the Parquet files, so list the data files explicitly
+    files = sorted(glob.glob(os.path.join(base, "*", "*", "*.parquet")))
+    if not files:
+        raise ValueError(f"No exported {report_type.key} files under {root}")
+    dataset = ds.dataset(files, format="parquet", partitioning=partitioning, partition_base_dir=base)
+    condition = None
+    for clause in (
+        ds.field("file_date") >= start if start else None,
+        ds.field("file_date") <= end if end else None,
+        ds.field("processor_code").isin(list(processor_codes)) if processor_codes else None,
+    ):
+        if clause is not None:
+            condition = clause if condition is None else condition & clause
+    return dataset.to_table(columns=list(columns) if columns else None, filter=condition)
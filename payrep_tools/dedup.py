@@ -0,0 +1,445 @@
+"""
+Pre-ingestion duplicate detection across report files.
+FileIngestionService.saveData saves record by record, so a re-sent or overlapping file either double counts
+(tables created before their unique constraints) or has its rows rejected one by one. Each row's business
+key (the columns of the entity's @Table uniqueConstraints) is hashed to a 64-bit fingerprint and looked up in
+a persistent index: a memory-mapped Bloom filter in front of 256 shards of sorted fingerprint runs, also
+memory-mapped and binary searched, so the index never has to fit in memory. New keys collect in a pending log
+until there are enough of them for one run per shard, and runs are merged per shard once enough of them pile up.
+A file's fingerprints are spilled to per-shard files in fixed-size batches and checked one shard at a time, so
+memory follows the shard size rather than the file's row count.
+"""
+
+import bisect
+import csv
+import hashlib
+import heapq
+import itertools
+import json
+import math
+import mmap
+import operator
+import os
+import tempfile
+from array import array
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from payrep_tools.cache import content_hash
+from payrep_tools.columnar import column_plan
+from payrep_tools.header_index import HeaderIndex, MappingSnapshot
+from payrep_tools.institution_check import ConverterTable
+from payrep_tools.report_types import REPORT_TYPES, ReportType
+from payrep_tools.splitter import READ_BUFFER_BYTES, iter_records
+
+DEFAULT_INDEX_DIR = os.path.join(os.path.expanduser("~"), ".cache", "payrep", "dedup-index")
+DEFAULT_CAPACITY = 100_000_000
+DEFAULT_FALSE_POSITIVE_RATE = 0.01
+SHARD_BITS = 8
+MAX_RUNS_PER_SHARD = 8
+# New keys wait in the pending log until a run per shard is worth writing (8 bytes each)
+PENDING_MAX_KEYS = 1 << 16
+SPILL_BATCH_ROWS = 100_000
+INDEX_VERSION = 1
+DUPLICATE_EXAMPLES = 20
+
+# The record keys of each entity's @Table uniqueConstraints; bank_or_tpp_id is the (converted) institution ID
+BUSINESS_KEYS = {
+    "atm_terminal_data": ("institution_id", "report_date"),
+    "atm_transaction_data": ("atm_id", "institution_id", "report_date"),
+    "pos_terminal_data": ("institution_id", "mcc_code", "report_date"),
+    "pos_transaction_data": ("institution_id", "transaction_category", "report_date"),
+    "card_lifecycle": ("institution_id", "report_date"),
+    "ecommerce_card_activity": ("institution_id", "report_date"),
+    "transaction_volume": ("institution_id", "channel_code", "transaction_type_code", "mcc_code",
+                           "transaction_category", "report_date"),
+}
+
+
+_KEY_TRANSFORMS = {"trim": str.strip, "uppercase": str.upper}
+
+
+def fingerprint(report_key: str, values: Iterable[str]) -> int:
+    """64-bit blake2b fingerprint of one business key"""
+    data = "\x1f".join((report_key, *values)).encode()
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little")
+
+
+class BloomFilter:
+    """Memory-mapped Bloom filter over 64-bit fingerprints (double hashing from the two 32-bit halves)"""
+
+    def __init__(self, path: str, bits: int, hashes: int):
+        self.bits = bits
+        self.hashes = hashes
+        if not os.path.exists(path):
+            with open(path, "wb") as f:
+                f.truncate((bits + 7) // 8)
+        self._file = open(path, "r+b")
+        self._map = mmap.mmap(self._file.fileno(), 0)
+
+    @staticmethod
+    def sized(capacity: int, false_positive_rate: float) -> Tuple[int, int]:
+        bits = math.ceil(-capacity * math.log(false_positive_rate) / math.log(2) ** 2)
+        return bits, max(1, round(bits / capacity * math.log(2)))
+
+    def __contains__(self, fp: int) -> bool:
+        data, bits = self._map, self.bits
+        position, step = fp & 0xFFFFFFFF, fp >> 32
+        for _ in range(self.hashes):
+            p = position % bits
+            if not data[p >> 3] & (1 << (p & 7)):
+                return False
+            position += step
+        return True
+
+    def add(self, fp: int):
+        data, bits = self._map, self.bits
+        position, step = fp & 0xFFFFFFFF, fp >> 32
+        for _ in range(self.hashes):
+            p = position % bits
+            data[p >> 3] |= 1 << (p & 7)
+            position += step
+
+    def flush(self):
+        self._map.flush()
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+class _Run:
+    """One sorted run of fingerprints, memory-mapped"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self.keys = memoryview(self._map).cast("Q") if self._map else memoryview(array("Q"))
+
+    def __contains__(self, fp: int) -> bool:
+        i = bisect.bisect_left(self.keys, fp)
+        return i < len(self.keys) and self.keys[i] == fp
+
+    def intersection(self, fps: Set[int]) -> Set[int]:
+        # Binary search per key until one sequential pass over the run is cheaper
+        if len(fps) * max(len(self.keys).bit_length(), 1) < len(self.keys):
+            return {fp for fp in fps if fp in self}
+        return fps.intersection(self.keys)
+
+    def close(self):
+        self.keys.release()
+        if self._map:
+            self._map.close()
+        self._file.close()
+
+
+class FingerprintIndex:
+    """Persistent set of business key fingerprints: Bloom filter front, sharded sorted runs behind it"""
+
+    def __init__(self, directory: str = DEFAULT_INDEX_DIR, capacity: int = DEFAULT_CAPACITY,
+                 false_positive_rate: float = DEFAULT_FALSE_POSITIVE_RATE):
+        self.directory = directory
+        self.meta_path = os.path.join(directory, "index.json")
+        os.makedirs(os.path.join(directory, "shards"), exist_ok=True)
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, "r") as f:
+                self.meta = json.load(f)
+            if self.meta["version"] != INDEX_VERSION:
+                raise ValueError(f"{directory} was written by index version {self.meta['version']}")
+        else:
+            bits, hashes = BloomFilter.sized(capacity, false_positive_rate)
+            self.meta = {"version": INDEX_VERSION, "capacity": capacity, "bloom_bits": bits, "bloom_hashes": hashes,
+                         "keys": 0, "next_run": 1, "files": {}}
+            self._save_meta()
+        self.bloom = BloomFilter(os.path.join(directory, "bloom.bits"), self.meta["bloom_bits"],
+                                 self.meta["bloom_hashes"])
+        self.pending_path = os.path.join(directory, "pending.u64")
+        self._pending: Set[int] = set()
+        if os.path.exists(self.pending_path):
+            keys = array("Q")
+            with open(self.pending_path, "rb") as f:
+                data = f.read()
+            # A crash mid-append leaves a partial key at the end
+            keys.frombytes(data[:len(data) - len(data) % keys.itemsize])
+            self._pending.update(keys)
+        self._runs: Dict[int, List[_Run]] = {}
+        self.bloom_passes = 0
+
+    def _save_meta(self):
+        temporary = f"{self.meta_path}.tmp"
+        with open(temporary, "w") as f:
+            json.dump(self.meta, f, indent=2)
+        os.replace(temporary, self.meta_path)
+
+    def _shard_dir(self, shard: int) -> str:
+        return os.path.join(self.directory, "shards", f"{shard:02x}")
+
+    def _shard_runs(self, shard: int) -> List[_Run]:
+        runs = self._runs.get(shard)
+        if runs is None:
+            directory = self._shard_dir(shard)
+            names = sorted(n for n in os.listdir(directory) if n.endswith(".u64")) if os.path.isdir(directory) else []
+            runs = self._runs[shard] = [_Run(os.path.join(directory, name)) for name in names]
+        return runs
+
+    def _close_shard(self, shard: int):
+        for run in self._runs.pop(shard, []):
+            run.close()
+
+    def contains(self, fps: Iterable[int]) -> Set[int]:
+        """The fingerprints already in the index"""
+        by_shard: Dict[int, List[int]] = defaultdict(list)
+        found = set()
+        for fp in fps:
+            if fp in self.bloom:
+                if fp in self._pending:
+                    found.add(fp)
+                else:
+                    by_shard[fp >> (64 - SHARD_BITS)].append(fp)
+        for shard, candidates in by_shard.items():
+            self.bloom_passes += len(candidates)
+            pending = set(candidates)
+            for run in self._shard_runs(shard):
+                hits = run.intersection(pending)
+                found |= hits
+                pending -= hits
+                if not pending:
+                    break
+        return found
+
+    def add(self, fps: Iterable[int]) -> int:
+        """Add fingerprints not yet in the index to the pending log; returns how many were new"""
+        fps = set(fps)
+        new = fps - self.contains(fps)
+        if not new:
+            return 0
+        # Bloom filter first: a crash before the keys are stored only costs a false positive
+        for fp in new:
+            self.bloom.add(fp)
+        self.bloom.flush()
+        with open(self.pending_path, "ab") as f:
+            array("Q", new).tofile(f)
+        self._pending |= new
+        self.meta["keys"] += len(new)
+        if len(self._pending) >= PENDING_MAX_KEYS:
+            self.flush()
+        return len(new)
+
+    def flush(self):
+        """Move the pending keys into one new run per shard"""
+        if not self._pending:
+            return
+        # The run name is reserved before any run is written, so a crash can never reuse it for other keys
+        run_name = f"run-{self.meta['next_run']:08d}.u64"
+        self.meta["next_run"] += 1
+        self._save_meta()
+        by_shard: Dict[int, array] = defaultdict(lambda: array("Q"))
+        for fp in sorted(self._pending):
+            by_shard[fp >> (64 - SHARD_BITS)].append(fp)
+        for shard, keys in by_shard.items():
+            directory = self._shard_dir(shard)
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, run_name)
+            with open(f"{path}.tmp", "wb") as f:
+                keys.tofile(f)
+            os.replace(f"{path}.tmp", path)
+            self._close_shard(shard)
+            if len(os.listdir(directory)) > MAX_RUNS_PER_SHARD:
+                self._compact(shard)
+        # A crash before this leaves the keys both pending and in a run, which lookups and compaction tolerate
+        with open(f"{self.pending_path}.tmp", "wb"):
+            pass
+        os.replace(f"{self.pending_path}.tmp", self.pending_path)
+        self._pending.clear()
+
+    def record_file(self, file_key: str, checksum: Optional[str], keys: int, new_keys: int):
+        """Note a committed file and persist the key count"""
+        self.meta["files"][file_key] = {"checksum": checksum, "keys": keys, "new_keys": new_keys,
+                                        "committed_at": datetime.now().isoformat()}
+        self._save_meta()
+
+    def _compact(self, shard: int):
+        """Merge every run of a shard into one"""
+        directory = self._shard_dir(shard)
+        names = sorted(n for n in os.listdir(directory) if n.endswith(".u64"))
+        runs = []
+        for name in names:
+            keys = array("Q")
+            with open(os.path.join(directory, name), "rb") as f:
+                keys.frombytes(f.read())
+            runs.append(keys)
+        # Keys of a flush interrupted after its runs were written can be in two runs
+        merged = array("Q", (key for key, _ in itertools.groupby(heapq.merge(*runs))))
+        # Written under the newest run's name: a crash leaves duplicates across runs at worst, never a gap
+        path = os.path.join(directory, names[-1])
+        with open(f"{path}.tmp", "wb") as f:
+            merged.tofile(f)
+        os.replace(f"{path}.tmp", path)
+        for name in names[:-1]:
+            os.remove(os.path.join(directory, name))
+
+    def stats(self) -> Dict[str, Any]:
+        keys = self.meta["keys"]
+        bits, hashes = self.meta["bloom_bits"], self.meta["bloom_hashes"]
+        runs = sum(len([n for n in os.listdir(os.path.join(self.directory, "shards", d)) if n.endswith(".u64")])
+                   for d in os.listdir(os.path.join(self.directory, "shards")))
+        return {
+            "directory": self.directory,
+            "keys": keys,
+            "capacity": self.meta["capacity"],
+            "files": len(self.meta["files"]),
+            "runs": runs,
+            "pending_keys": len(self._pending),
+            "bloom_bytes": (bits + 7) // 8,
+            # Past capacity the filter lets more new keys through to the shards; lookups stay exact
+            "bloom_false_positive_rate": round((1 - math.exp(-hashes * keys / bits)) ** hashes, 6),
+        }
+
+    def close(self):
+        self._save_meta()
+        for shard in list(self._runs):
+            self._close_shard(shard)
+        self.bloom.close()
+
+
+class DuplicateCheck:
+    """Finds rows whose business key repeats within a file or is already in the index"""
+
+    def __init__(self, index: FingerprintIndex, snapshot: Optional[MappingSnapshot] = None,
+                 converter_table: Optional[ConverterTable] = None):
+        self.index = index
+        self.header_index = HeaderIndex(snapshot or MappingSnapshot.seeded(REPORT_TYPES))
+        self.converter_table = converter_table
+
+    def key_values(self, file_path: str, report_type: ReportType, processor_code: str,
+                   columns: Dict[str, Any]) -> Iterator[List[str]]:
+        """Business key values of every record; fills columns with the key columns and those not found"""
+        key_columns = BUSINESS_KEYS[report_type.key]
+        with open(file_path, "r", newline="", encoding="utf-8-sig", errors="replace", buffering=READ_BUFFER_BYTES) as f:
+            reader = csv.reader(f)
+            headers = next(reader, None)
+            if headers is None:
+                raise ValueError(f"Empty file: {file_path}")
+            plan = {column["name"]: (i, column["transformation"]) for i, column in
+                    enumerate(column_plan(headers, {}, self.header_index, report_type, os.path.basename(file_path)))}
+            located = [plan.get(name) for name in key_columns]
+            columns.update(key_columns=list(key_columns),
+                           missing_key_columns=[name for name, c in zip(key_columns, located) if c is None])
+            indices = [c[0] for c in located if c]
+            get_values = operator.itemgetter(*indices) if len(indices) > 1 else (
+                (lambda row: (row[indices[0]],)) if indices else (lambda row: ()))
+            # Trim and uppercase are the only transformations key columns carry in practice
+            transforms = [_KEY_TRANSFORMS.get((c[1] or "").lower()) if c else None for c in located]
+            positions = [i for i, c in enumerate(located) if c]
+            needed = max(indices) + 1 if indices else 0
+            institution = key_columns.index("institution_id")
+            resolved: Dict[str, str] = {}
+            for row in reader:
+                values = [""] * len(key_columns)
+                found = get_values(row) if len(row) >= needed else [row[i] if i < len(row) else "" for i in indices]
+                for position, value in zip(positions, found):
+                    transform = transforms[position]
+                    values[position] = transform(value) if transform else value
+                if self.converter_table is not None:
+                    raw = values[institution]
+                    if raw not in resolved:
+                        # Unresolvable IDs are dropped by DataMapper anyway; keep them keyed by the raw value
+                        resolved[raw] = self.converter_table.resolve(raw, processor_code)[1] or raw
+                    values[institution] = resolved[raw]
+                yield values
+
+    def spill(self, file_path: str, report_type: ReportType, processor_code: str,
+              directory: str) -> Tuple[int, Dict[str, Any]]:
+        """Append (fingerprint, record) pairs to one file per shard, SPILL_BATCH_ROWS records at a time"""
+        columns: Dict[str, Any] = {}
+        prefix, join, blake2b, from_bytes = report_type.key + "\x1f", "\x1f".join, hashlib.blake2b, int.from_bytes
+        batch: Dict[int, array] = defaultdict(lambda: array("Q"))
+        records = 0
+        for records, values in enumerate(self.key_values(file_path, report_type, processor_code, columns), start=1):
+            # fingerprint() inlined: this loop runs once per row
+            fp = from_bytes(blake2b((prefix + join(values)).encode(), digest_size=8).digest(), "little")
+            batch[fp >> (64 - SHARD_BITS)].extend((fp, records))
+            if records % SPILL_BATCH_ROWS == 0:
+                _write_spill(batch, directory)
+        _write_spill(batch, directory)
+        return records, columns
+
+    def check(self, file_path: str, report_type: ReportType, processor_code: str) -> Dict[str, Any]:
+        """Duplicate record numbers; the first occurrence of a key within the file is kept, like the first save"""
+        duplicates: Dict[int, str] = {}
+        distinct = 0
+        with tempfile.TemporaryDirectory(prefix="payrep-dedup-") as spill_dir:
+            rows, columns = self.spill(file_path, report_type, processor_code, spill_dir)
+            for fps, records in _spilled_shards(spill_dir):
+                keys = set(fps)
+                distinct += len(keys)
+                history = self.index.contains(keys)
+                seen: Set[int] = set()
+                for fp, record in zip(fps, records):
+                    if fp in history:
+                        duplicates[record] = "history"
+                    elif fp in seen:
+                        duplicates[record] = "file"
+                    else:
+                        seen.add(fp)
+        duplicate_records = sorted(duplicates)
+        # The example keys are read again, only up to the last example record
+        wanted = duplicate_records[:DUPLICATE_EXAMPLES]
+        examples = []
+        if wanted:
+            values = self.key_values(file_path, report_type, processor_code, {})
+            for record, key in enumerate(itertools.islice(values, wanted[-1]), start=1):
+                if record in duplicates and len(examples) < len(wanted):
+                    examples.append({"record": record, "kind": duplicates[record],
+                                     "key": dict(zip(columns["key_columns"], key))})
+            values.close()
+        kinds = list(duplicates.values())
+        return dict(columns, file=file_path, report_type=report_type.key, processor_code=processor_code,
+                    rows=rows, distinct_keys=distinct, history_duplicates=kinds.count("history"),
+                    in_file_duplicates=kinds.count("file"), duplicate_records=duplicate_records, examples=examples)
+
+    def strip(self, file_path: str, duplicate_records: Iterable[int], output_path: str) -> int:
+        """Copy the file without the given records, byte for byte otherwise; returns the records written"""
+        skip = set(duplicate_records)
+        written = 0
+        temporary = f"{output_path}.tmp"
+        with open(file_path, "rb", buffering=READ_BUFFER_BYTES) as f, \
+                open(temporary, "wb", buffering=READ_BUFFER_BYTES) as out:
+            for record, (_, raw) in enumerate(iter_records(f, 0)):
+                if record == 0 or record not in skip:
+                    out.write(raw)
+                    written += record > 0
+        os.replace(temporary, output_path)
+        return written
+
+    def commit(self, file_path: str, report_type: ReportType, processor_code: str) -> Dict[str, Any]:
+        """Add the keys of an ingested file to the index"""
+        distinct = new = 0
+        with tempfile.TemporaryDirectory(prefix="payrep-dedup-") as spill_dir:
+            rows, columns = self.spill(file_path, report_type, processor_code, spill_dir)
+            for fps, _ in _spilled_shards(spill_dir):
+                keys = set(fps)
+                distinct += len(keys)
+                new += self.index.add(keys)
+        self.index.record_file(f"{processor_code}/{os.path.basename(file_path)}", content_hash(file_path),
+                               distinct, new)
+        return dict(columns, file=file_path, rows=rows, distinct_keys=distinct, new_keys=new)
+
+
+def _write_spill(batch: Dict[int, array], directory: str):
+    for shard, pairs in batch.items():
+        with open(os.path.join(directory, f"{shard:02x}.pairs"), "ab") as f:
+            pairs.tofile(f)
+    batch.clear()
+
+
+def _spilled_shards(directory: str) -> Iterator[Tuple[array, array]]:
+    """(fingerprints, record numbers) of each spilled shard, in record order"""
+    for name in sorted(os.listdir(directory)):
+        pairs = array("Q")
+        with open(os.path.join(directory, name), "rb") as f:
+            pairs.frombytes(f.read())
+        yield pairs[0::2], pairs[1::2]
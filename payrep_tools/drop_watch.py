@@ -0,0 +1,314 @@
+"""
+Long-running watch of drop directories.
+On Linux the directories are watched with inotify (through ctypes, no extra dependency); elsewhere, or when inotify
+is unavailable, each directory is polled. A file counts as fully written when it is closed after writing, renamed
+into place, or its size and mtime stop changing for the settle time. It is then fast-scanned and a
+<name>.verdict.json is written next to it; FileIngestionService skips files whose verdict is missing (when
+required), stale or not "ready".
+"""
+
+import ctypes
+import ctypes.util
+import json
+import os
+import select
+import struct
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from payrep_tools.fast_scan import BLOCKING_ISSUES, DEFAULT_MAX_FILE_BYTES, scan_file, triage
+from payrep_tools.header_index import HeaderIndex
+from payrep_tools.report_types import ReportType, match_report_type
+
+VERDICT_SUFFIX = ".verdict.json"
+DEFAULT_SETTLE_SECONDS = 2.0
+DEFAULT_POLL_SECONDS = 1.0
+
+_IN_MODIFY = 0x2
+_IN_CLOSE_WRITE = 0x8
+_IN_MOVED_FROM = 0x40
+_IN_MOVED_TO = 0x80
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_Q_OVERFLOW = 0x4000
+_IN_ISDIR = 0x40000000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_WATCH_MASK = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+_EVENT = struct.Struct("iIII")
+
+# Event kinds: "written" (closed after writing or renamed into place) is final, "changed" still needs to settle
+WRITTEN, CHANGED, REMOVED, RESCAN = "written", "changed", "removed", "rescan"
+
+
+def is_candidate(name: str) -> bool:
+    """Report files only; verdicts, hidden and temporary files never are"""
+    return not name.startswith(".") and not name.endswith(VERDICT_SUFFIX) and match_report_type(name) is not None
+
+
+def watched_directories(root: str) -> List[str]:
+    """The drop directory and its processor subdirectories, without the archive/ the cron moves files into"""
+    directories = []
+    for current, dirs, _ in os.walk(root):
+        dirs[:] = sorted(d for d in dirs if d != "archive" and not d.startswith("."))
+        directories.append(current)
+    return directories
+
+
+class InotifyWatcher:
+    """inotify watches on a set of directories, read without blocking longer than the timeout"""
+
+    def __init__(self, directories: Iterable[str]):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._libc = libc
+        self.fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._paths: Dict[int, str] = {}
+        for directory in directories:
+            self.add(directory)
+
+    def add(self, directory: str):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), _WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {directory}")
+        self._paths[wd] = directory
+
+    def events(self, timeout: float) -> List[Tuple[str, str]]:
+        """(kind, path) events, waiting at most timeout seconds for the first"""
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        try:
+            data = os.read(self.fd, 64 << 10)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            name = data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b"\0").decode("utf-8", "replace")
+            offset += _EVENT.size + length
+            if mask & _IN_Q_OVERFLOW:
+                events.append((RESCAN, ""))
+                continue
+            directory = self._paths.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, name)
+            if mask & _IN_ISDIR:
+                if mask & (_IN_CREATE | _IN_MOVED_TO) and name != "archive" and not name.startswith("."):
+                    # A new processor directory; files may already be in it
+                    self.add(path)
+                    events.append((RESCAN, path))
+            elif mask & (_IN_CLOSE_WRITE | _IN_MOVED_TO):
+                events.append((WRITTEN, path))
+            elif mask & (_IN_DELETE | _IN_MOVED_FROM):
+                events.append((REMOVED, path))
+            else:
+                events.append((CHANGED, path))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """Fallback that lists the directories every interval and reports files whose size or mtime changed"""
+
+    def __init__(self, directories: Iterable[str], interval: float = DEFAULT_POLL_SECONDS):
+        self.roots = list(directories)
+        self.interval = interval
+        self._directories = set(self.roots)
+        self._state: Dict[str, Tuple[int, int]] = self._snapshot()
+
+    def _snapshot(self) -> Dict[str, Tuple[int, int]]:
+        state = {}
+        for root in self.roots:
+            try:
+                entries = list(os.scandir(root))
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.is_file() and is_candidate(entry.name):
+                    stat = entry.stat()
+                    state[entry.path] = (stat.st_size, stat.st_mtime_ns)
+                elif entry.is_dir() and entry.name != "archive" and not entry.name.startswith("."):
+                    self._directories.add(entry.path)
+        return state
+
+    def events(self, timeout: float) -> List[Tuple[str, str]]:
+        time.sleep(min(timeout, self.interval))
+        state = self._snapshot()
+        # A new processor directory; files may already be in it
+        events = [(RESCAN, directory) for directory in sorted(self._directories - set(self.roots))]
+        self.roots.extend(directory for _, directory in events)
+        events += [(CHANGED, path) for path, stat in state.items() if self._state.get(path) != stat]
+        events += [(REMOVED, path) for path in self._state if path not in state]
+        self._state = state
+        return events
+
+    def close(self):
+        pass
+
+
+def open_watcher(directories: List[str], poll_interval: float = DEFAULT_POLL_SECONDS, polling: bool = False):
+    """inotify where the platform has it, else polling"""
+    if not polling:
+        try:
+            return InotifyWatcher(directories)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(directories, poll_interval)
+
+
+def verdict_path(file_path: str) -> str:
+    return file_path + VERDICT_SUFFIX
+
+
+def read_verdict(file_path: str) -> Optional[Dict[str, Any]]:
+    """The verdict next to a file if it was written for the file as it is now"""
+    try:
+        with open(verdict_path(file_path), "r") as f:
+            verdict = json.load(f)
+        stat = os.stat(file_path)
+    except (OSError, ValueError):
+        return None
+    if verdict.get("size") != stat.st_size or verdict.get("mtimeMs") != stat.st_mtime_ns // 1_000_000:
+        return None
+    return verdict
+
+
+def file_verdict(file_path: str, report_type: ReportType, header_index: HeaderIndex,
+                 max_bytes: int = DEFAULT_MAX_FILE_BYTES) -> Optional[Dict[str, Any]]:
+    """Fast-scan verdict of a file; None when the file changed while it was being scanned"""
+    before = os.stat(file_path)
+    scan = scan_file(file_path)
+    issues = triage(scan, max_bytes)
+    mappings = header_index.snapshot.mappings_for(os.path.basename(file_path), report_type)
+    resolution = header_index.resolve(scan["headers"], mappings) if scan["headers"] else None
+    if resolution and resolution["unresolved"]:
+        issues.append(f"{len(resolution['unresolved'])} mapped columns missing")
+    after = os.stat(file_path)
+    if (before.st_size, before.st_mtime_ns) != (after.st_size, after.st_mtime_ns):
+        return None
+    blocking = [issue for issue in issues if issue in BLOCKING_ISSUES]
+    return {"file": os.path.basename(file_path), "reportType": report_type.key,
+            "status": "blocked" if blocking else "ready", "issues": issues,
+            # FileIngestionService compares these with File.length() and File.lastModified()
+            "size": after.st_size, "mtimeMs": after.st_mtime_ns // 1_000_000,
+            "dataRows": scan["data_rows"], "rowCountExact": scan["row_count_exact"], "headers": scan["headers"],
+            "checkedAt": time.strftime("%Y-%m-%dT%H:%M:%S"), "_resolution": resolution}
+
+
+def write_verdict(file_path: str, verdict: Dict[str, Any]) -> str:
+    """Write atomically, so ingestion never reads half a verdict"""
+    path = verdict_path(file_path)
+    temporary = os.path.join(os.path.dirname(path), "." + os.path.basename(path) + ".tmp")
+    with open(temporary, "w") as f:
+        json.dump({k: v for k, v in verdict.items() if not k.startswith("_")}, f, indent=2)
+    os.replace(temporary, path)
+    return path
+
+
+class DropWatcher:
+    """Writes a verdict for every report file in the watched directories as soon as it is fully written"""
+
+    def __init__(self, roots: List[str], header_index: HeaderIndex, settle_seconds: float = DEFAULT_SETTLE_SECONDS,
+                 max_bytes: int = DEFAULT_MAX_FILE_BYTES, poll_interval: float = DEFAULT_POLL_SECONDS,
+                 polling: bool = False, on_verdict: Optional[Callable[[str, Dict[str, Any], float], None]] = None,
+                 on_ready: Optional[Callable[[List[str]], None]] = None):
+        self.roots = roots
+        self.header_index = header_index
+        self.settle_seconds = settle_seconds
+        self.max_bytes = max_bytes
+        self.on_verdict = on_verdict
+        self.on_ready = on_ready
+        self.directories = [d for root in roots for d in watched_directories(root)]
+        self.watcher = open_watcher(self.directories, poll_interval, polling)
+        self.mode = "inotify" if isinstance(self.watcher, InotifyWatcher) else "polling"
+        # path -> (size, mtime_ns, last change seen, first event seen)
+        self.pending: Dict[str, Tuple[int, int, float, float]] = {}
+        self.verdicts = 0
+
+    def _track(self, path: str, first_seen: Optional[float] = None):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self.pending.pop(path, None)
+            return
+        now = time.monotonic()
+        previous = self.pending.get(path)
+        if previous is None or (previous[0], previous[1]) != (stat.st_size, stat.st_mtime_ns):
+            started = previous[3] if previous else first_seen or now
+            self.pending[path] = (stat.st_size, stat.st_mtime_ns, now, started)
+
+    def _rescan(self, directory: Optional[str] = None):
+        for folder in [directory] if directory else self.directories:
+            try:
+                entries = list(os.scandir(folder))
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.is_file() and is_candidate(entry.name) and read_verdict(entry.path) is None:
+                    self._track(entry.path)
+
+    def _check(self, path: str) -> Optional[Dict[str, Any]]:
+        first_seen = self.pending.pop(path)[3]
+        report_type = match_report_type(os.path.basename(path))
+        try:
+            verdict = file_verdict(path, report_type, self.header_index, self.max_bytes)
+        except (OSError, ValueError):
+            return None
+        if verdict is None:
+            # Written to while it was scanned: wait for it to settle again
+            self._track(path, first_seen)
+            return None
+        write_verdict(path, verdict)
+        self.verdicts += 1
+        if self.on_verdict:
+            self.on_verdict(path, verdict, time.monotonic() - first_seen)
+        return verdict
+
+    def poll(self, timeout: float) -> List[str]:
+        """Handle one batch of events; returns the directories that got a ready file"""
+        for kind, path in self.watcher.events(timeout):
+            if kind == RESCAN:
+                if path and path not in self.directories:
+                    self.directories.append(path)
+                self._rescan(path or None)
+                continue
+            if not is_candidate(os.path.basename(path)):
+                continue
+            if kind == REMOVED:
+                self.pending.pop(path, None)
+            elif kind == WRITTEN:
+                if path not in self.pending and read_verdict(path) is not None:
+                    # Closed after a pause the verdict was already written in
+                    continue
+                # Closed after writing or renamed into place: no need to wait for it to settle
+                self._track(path)
+                if path in self.pending:
+                    size, mtime_ns, _, first_seen = self.pending[path]
+                    self.pending[path] = (size, mtime_ns, float("-inf"), first_seen)
+            else:
+                self._track(path)
+        now = time.monotonic()
+        ready = set()
+        for path in [p for p, state in self.pending.items() if now - state[2] >= self.settle_seconds]:
+            verdict = self._check(path)
+            if verdict and verdict["status"] == "ready":
+                ready.add(os.path.dirname(path))
+        if ready and self.on_ready:
+            self.on_ready(sorted(ready))
+        return sorted(ready)
+
+    def run(self, duration: Optional[float] = None):
+        """Watch until interrupted, or for duration seconds"""
+        self._rescan()
+        deadline = time.monotonic() + duration if duration else None
+        try:
+            while deadline is None or time.monotonic() < deadline:
+                timeout = self.settle_seconds / 2 if self.pending else DEFAULT_POLL_SECONDS
+                self.poll(timeout)
+        finally:
+            self.watcher.close()
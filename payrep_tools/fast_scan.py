@@ -0,0 +1,128 @@
+"""
+Memory-mapped fast scan of report files.
+Only the first line is decoded; the row count comes from bulk newline counting over the mapped bytes, so a
+multi-GB drop is sized up in milliseconds instead of being read through csv.reader. Also reports the byte size,
+line endings, BOM and encoding of the header and a sample, and whether the last row looks cut off.
+"""
+
+import codecs
+import csv
+import mmap
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+COUNT_CHUNK_BYTES = 1 << 20  # cache-sized slices count faster than large ones
+SAMPLE_BYTES = 64 << 10
+DEFAULT_MAX_FILE_BYTES = 100 << 20  # file.processing.max.file.size in application.yml
+DELIMITERS = (",", ";", "\t", "|")
+
+BOMS = ((codecs.BOM_UTF8, "utf-8-sig"), (codecs.BOM_UTF16_LE, "utf-16-le"), (codecs.BOM_UTF16_BE, "utf-16-be"))
+# Issues that fail the file or lose rows; oversized is only a warning, since the backend never enforces the size limit
+BLOCKING_ISSUES = ("empty", "truncated", "utf16")
+
+
+def _count(mm: mmap.mmap, needle: bytes) -> int:
+    return sum(mm[start:start + COUNT_CHUNK_BYTES].count(needle) for start in range(0, len(mm), COUNT_CHUNK_BYTES))
+
+
+def sample_encoding(sample: bytes, bom: Optional[str]) -> str:
+    """The BOM's encoding, else ascii or utf-8 when the sample decodes as such"""
+    if bom:
+        return bom
+    # A multi-byte character may straddle the end of the sample
+    for cut in range(4):
+        try:
+            text = sample[:len(sample) - cut].decode("utf-8")
+        except UnicodeDecodeError:
+            continue
+        return "ascii" if text.isascii() else "utf-8"
+    return "unknown (not UTF-8)"
+
+
+def _line_endings(sample: bytes) -> Optional[str]:
+    crlf = sample.count(b"\r\n")
+    lf = sample.count(b"\n") - crlf
+    cr = sample.count(b"\r") - crlf
+    kinds = [name for name, count in (("CRLF", crlf), ("LF", lf), ("CR", cr)) if count]
+    return "mixed" if len(kinds) > 1 else kinds[0] if kinds else None
+
+
+def scan_file(file_path: str) -> Dict[str, Any]:
+    """Header, data row count, size, line endings and encoding of a CSV without parsing its rows"""
+    started = time.perf_counter()
+    size = os.path.getsize(file_path)
+    result: Dict[str, Any] = {"file": file_path, "bytes": size, "encoding": None, "bom": None, "line_endings": None,
+                              "headers": [], "delimiter": None, "data_rows": 0, "row_count_exact": True,
+                              "trailing_newline": False, "last_row_fields": None}
+    if size == 0:
+        result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        return result
+
+    with open(file_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        sample = mm[:SAMPLE_BYTES]
+        bom = next(((marker, name) for marker, name in BOMS if sample.startswith(marker)), None)
+        result["bom"] = bom[1] if bom else None
+        result["encoding"] = sample_encoding(sample[len(bom[0]):] if bom else sample, bom[1] if bom else None)
+        result["line_endings"] = _line_endings(sample)
+        newline = b"\n\x00" if result["bom"] == "utf-16-le" else b"\x00\n" if result["bom"] == "utf-16-be" else b"\n"
+
+        header_end = mm.find(newline)
+        header_bytes = mm[len(bom[0]) if bom else 0:header_end if header_end >= 0 else size]
+        header = header_bytes.decode(result["bom"] or "utf-8", "replace").rstrip("\r")
+        counts = {d: header.count(d) for d in DELIMITERS}
+        delimiter = max(counts, key=counts.get) if any(counts.values()) else ","
+        result["delimiter"] = delimiter
+        result["headers"] = next(csv.reader([header], delimiter=delimiter), [])
+
+        lines = _count(mm, newline)
+        carriage_return = newline.replace(b"\n", b"\r")
+        # Trailing blank lines are skipped by CSVReader, so they are neither rows nor the last row
+        end, blank_lines = size, 0
+        while end > header_end and mm[end - len(newline):end] == newline:
+            end -= len(newline)
+            if mm[end - len(carriage_return):end] == carriage_return:
+                end -= len(carriage_return)
+            blank_lines += 1
+        result["trailing_newline"] = blank_lines > 0
+        # A last line without a newline is still a row; the header line is not
+        result["data_rows"] = max(lines - blank_lines, 0)
+        # Newlines inside quoted fields are counted as rows too
+        result["row_count_exact"] = mm.find(b'"', header_end + 1 if header_end >= 0 else size) < 0
+
+        if result["data_rows"]:
+            start = mm.rfind(newline, 0, end)
+            # Odd quote parity means the last line continues a quoted field; step back to the record start
+            while start > header_end and end - start < SAMPLE_BYTES and mm[start + len(newline):end].count(b'"') % 2:
+                start = mm.rfind(newline, 0, start)
+            last = mm[start + len(newline) if start >= 0 else 0:end].decode(result["bom"] or "utf-8", "replace")
+            result["last_row_fields"] = len(next(csv.reader([last.replace("\r\n", "\n")], delimiter=delimiter), []))
+    result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 3)
+    return result
+
+
+def triage(scan: Dict[str, Any], max_bytes: int = DEFAULT_MAX_FILE_BYTES) -> List[str]:
+    """Problems FileParser would run into, most serious first"""
+    issues = []
+    if scan["bytes"] == 0:
+        return ["empty"]
+    headers = scan["headers"]
+    if scan["last_row_fields"] is not None and scan["last_row_fields"] < len(headers):
+        # The writer stopped mid-row; a short row on a newline is just as incomplete
+        issues.append("truncated")
+    if scan["bytes"] > max_bytes:
+        issues.append("oversized")
+    if scan["bom"] in ("utf-16-le", "utf-16-be"):
+        issues.append("utf16")
+    if scan["data_rows"] == 0:
+        issues.append("header_only")
+    if scan["bom"] == "utf-8-sig":
+        # CSVReader keeps the BOM, so the first header no longer matches its column mapping
+        issues.append("bom")
+    if scan["delimiter"] != ",":
+        issues.append(f"delimiter {scan['delimiter']!r}")
+    if scan["encoding"] == "unknown (not UTF-8)":
+        issues.append("not_utf8")
+    if scan["line_endings"] in ("mixed", "CR"):
+        issues.append(f"{scan['line_endings']} line endings")
+    return issues
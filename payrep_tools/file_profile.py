@@ -0,0 +1,569 @@
+"""
+Compact, mergeable per-file profiles.
+A FileProfile holds fixed-schema state per column and no sample rows. That state is value kind counts in a fixed
+kind order, numeric and text bounds, a distinct-count sketch and a log-bucketed quantile sketch. The distinct
+sketch keeps exact 64-bit hashes while small and HyperLogLog registers beyond that; the quantile sketch has 1%
+relative error. Counters are arrays, and a profile serializes to a few KB of zlib-compressed binary. Profiles built
+in parallel merge into per-TPP or per-day views in memory, without rereading any file.
+"""
+
+import array
+import csv
+import io
+import itertools
+import math
+import os
+import re
+import struct
+import sys
+import time
+import zlib
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from payrep_tools.header_history import header_fingerprint
+from payrep_tools.inference import DATE_FORMATS, NUMERIC_KINDS, ColumnBatch, inferred_type
+from payrep_tools.profiling import DEFAULT_BATCH_ROWS, HyperLogLog
+from payrep_tools.report_types import ReportType, report_type_by_key
+
+MAGIC = b"PRPF"
+FORMAT_VERSION = 1  # bump when KINDS or the layout changes
+# Fixed counter layout; a kind outside it (none today) is counted as string
+KINDS = ("blank", "sentinel", "integer", "long", "decimal", "date", "date_offset", "invalid_date") + \
+    tuple(f"date:{label}" for label, _ in DATE_FORMATS[1:]) + ("string",)
+_KIND_INDEX = {kind: index for index, kind in enumerate(KINDS)}
+EXACT_DISTINCT_HASHES = 512
+QUANTILE_ACCURACY = 0.01
+QUANTILES = (0.5, 0.95, 0.99)
+MIN_TRACKED_MAGNITUDE = 1e-9  # smaller magnitudes count as zero, so one tiny value cannot widen the buckets
+MAX_TEXT_BOUND = 256
+
+_GAMMA = (1 + QUANTILE_ACCURACY) / (1 - QUANTILE_ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+_REPORT_DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+# View name -> profile attributes a merged view is keyed by; report type is always part of the key
+VIEWS: Dict[str, Tuple[str, ...]] = {
+    "tpp": ("processor_code", "report_type"),
+    "day": ("report_date", "report_type"),
+    "tpp_day": ("processor_code", "report_date", "report_type"),
+    "report_type": ("report_type",),
+}
+
+
+def _counts(values: Sequence[int] = (), length: int = 0) -> "array.array[int]":
+    return array.array("Q", values or bytes(8 * length))
+
+
+def _le_bytes(counters: "array.array") -> bytes:
+    if sys.byteorder == "big":
+        counters = array.array(counters.typecode, counters)
+        counters.byteswap()
+    return counters.tobytes()
+
+
+def _le_array(typecode: str, data: bytes) -> "array.array":
+    counters = array.array(typecode)
+    counters.frombytes(data)
+    if sys.byteorder == "big":
+        counters.byteswap()
+    return counters
+
+
+class _Writer:
+    __slots__ = ("buffer",)
+
+    def __init__(self):
+        self.buffer = io.BytesIO()
+
+    def pack(self, fmt: str, *values):
+        self.buffer.write(struct.pack("<" + fmt, *values))
+
+    def text(self, value: str):
+        data = value.encode("utf-8", "surrogatepass")
+        self.pack("I", len(data))
+        self.buffer.write(data)
+
+    def counters(self, counters: "array.array"):
+        self.pack("I", len(counters))
+        self.buffer.write(_le_bytes(counters))
+
+
+class _Reader:
+    __slots__ = ("data", "offset")
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.offset = 0
+
+    def unpack(self, fmt: str) -> tuple:
+        fmt = "<" + fmt
+        values = struct.unpack_from(fmt, self.data, self.offset)
+        self.offset += struct.calcsize(fmt)
+        return values
+
+    def raw(self, size: int) -> bytes:
+        data = self.data[self.offset:self.offset + size]
+        self.offset += size
+        return data
+
+    def text(self) -> str:
+        return self.raw(self.unpack("I")[0]).decode("utf-8", "surrogatepass")
+
+    def counters(self, typecode: str = "Q") -> "array.array":
+        length = self.unpack("I")[0]
+        return _le_array(typecode, self.raw(length * array.array(typecode).itemsize))
+
+
+class DistinctSketch:
+    """Exact 64-bit value hashes up to EXACT_DISTINCT_HASHES, HyperLogLog registers beyond that"""
+
+    __slots__ = ("hashes", "hll")
+
+    def __init__(self):
+        self.hashes: Optional[set] = set()
+        self.hll: Optional[HyperLogLog] = None
+
+    def add_many(self, values: Iterable[str]):
+        hashes = map(HyperLogLog.hash_value, values)
+        if self.hll is not None:
+            for h in hashes:
+                self.hll.add_hash(h)
+            return
+        self.hashes.update(hashes)
+        if len(self.hashes) > EXACT_DISTINCT_HASHES:
+            self._promote()
+
+    def _promote(self):
+        self.hll = HyperLogLog()
+        for h in self.hashes:
+            self.hll.add_hash(h)
+        self.hashes = None
+
+    def merge(self, other: "DistinctSketch"):
+        if other.hll is None:
+            if self.hll is None:
+                self.hashes |= other.hashes
+                if len(self.hashes) > EXACT_DISTINCT_HASHES:
+                    self._promote()
+            else:
+                for h in other.hashes:
+                    self.hll.add_hash(h)
+            return
+        if self.hll is None:
+            self._promote()
+        self.hll.merge(other.hll)
+
+    @property
+    def exact(self) -> bool:
+        return self.hll is None
+
+    def estimate(self) -> int:
+        return len(self.hashes) if self.hll is None else self.hll.estimate()
+
+    def write(self, out: _Writer):
+        if self.hll is None:
+            out.pack("B", 0)
+            out.counters(array.array("Q", sorted(self.hashes)))
+        else:
+            out.pack("BB", 1, self.hll.precision)
+            out.buffer.write(bytes(self.hll.registers))
+
+    @classmethod
+    def read(cls, source: _Reader) -> "DistinctSketch":
+        sketch = cls()
+        if source.unpack("B")[0] == 0:
+            sketch.hashes = set(source.counters())
+        else:
+            precision = source.unpack("B")[0]
+            sketch.hll = HyperLogLog(precision, bytearray(source.raw(1 << precision)))
+            sketch.hashes = None
+        return sketch
+
+
+class _Buckets:
+    """Dense bucket counts from offset upwards, grown on demand"""
+
+    __slots__ = ("offset", "counts")
+
+    def __init__(self, offset: int = 0, counts: Optional["array.array"] = None):
+        self.offset = offset
+        self.counts = counts if counts is not None else _counts()
+
+    def add(self, index: int, count: int):
+        if not self.counts:
+            self.offset = index
+            self.counts = _counts(length=1)
+        elif index < self.offset:
+            self.counts = _counts(length=self.offset - index) + self.counts
+            self.offset = index
+        elif index >= self.offset + len(self.counts):
+            self.counts.extend(_counts(length=index - self.offset - len(self.counts) + 1))
+        self.counts[index - self.offset] += count
+
+    def merge(self, other: "_Buckets"):
+        for position, count in enumerate(other.counts):
+            if count:
+                self.add(other.offset + position, count)
+
+    def items(self) -> Iterator[Tuple[int, int]]:
+        return ((self.offset + position, count) for position, count in enumerate(self.counts) if count)
+
+
+class QuantileSketch:
+    """Log-bucketed quantile sketch: every quantile is within QUANTILE_ACCURACY of a value in the data"""
+
+    __slots__ = ("positive", "negative", "zeros")
+
+    def __init__(self):
+        self.positive = _Buckets()
+        self.negative = _Buckets()
+        self.zeros = 0
+
+    @property
+    def count(self) -> int:
+        return self.zeros + sum(self.positive.counts) + sum(self.negative.counts)
+
+    def add_counts(self, counts: Dict[float, int]):
+        """Add each value count times"""
+        for value, count in counts.items():
+            magnitude = abs(value)
+            if not math.isfinite(magnitude):
+                continue
+            if magnitude < MIN_TRACKED_MAGNITUDE:
+                self.zeros += count
+                continue
+            index = math.ceil(math.log(magnitude) / _LOG_GAMMA)
+            (self.positive if value > 0 else self.negative).add(index, count)
+
+    def merge(self, other: "QuantileSketch"):
+        self.positive.merge(other.positive)
+        self.negative.merge(other.negative)
+        self.zeros += other.zeros
+
+    def quantile(self, q: float) -> Optional[float]:
+        total = self.count
+        if not total:
+            return None
+        rank = q * (total - 1)
+        seen = 0
+        # Most negative first: negative buckets by descending magnitude, then zero, then positive ascending
+        for index, count in sorted(self.negative.items(), reverse=True):
+            seen += count
+            if seen > rank:
+                return -2 * _GAMMA ** index / (_GAMMA + 1)
+        seen += self.zeros
+        if seen > rank:
+            return 0.0
+        for index, count in self.positive.items():
+            seen += count
+            if seen > rank:
+                return 2 * _GAMMA ** index / (_GAMMA + 1)
+        return None
+
+    def write(self, out: _Writer):
+        out.pack("Q", self.zeros)
+        for buckets in (self.positive, self.negative):
+            out.pack("i", buckets.offset)
+            out.counters(buckets.counts)
+
+    @classmethod
+    def read(cls, source: _Reader) -> "QuantileSketch":
+        sketch = cls()
+        sketch.zeros = source.unpack("Q")[0]
+        for name in ("positive", "negative"):
+            offset = source.unpack("i")[0]
+            setattr(sketch, name, _Buckets(offset, source.counters()))
+        return sketch
+
+
+class ColumnProfile:
+    """Fixed-schema statistics of one column"""
+
+    __slots__ = ("name", "kinds", "numeric_min", "numeric_max", "text_min", "text_max", "distinct", "quantiles")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.kinds = _counts(length=len(KINDS))
+        self.numeric_min: Optional[float] = None
+        self.numeric_max: Optional[float] = None
+        self.text_min: Optional[str] = None
+        self.text_max: Optional[str] = None
+        self.distinct = DistinctSketch()
+        self.quantiles = QuantileSketch()
+
+    def update(self, batch: ColumnBatch):
+        for kind, count in batch.counts.items():
+            self.kinds[_KIND_INDEX.get(kind, _KIND_INDEX["string"])] += count
+        if batch.blank == batch.rows:
+            return
+        non_blank = [v for v in batch.values if v] if batch.blank else batch.values
+        distinct = set(non_blank)
+        self.distinct.add_many(distinct)
+        low, high = min(distinct)[:MAX_TEXT_BOUND], max(distinct)[:MAX_TEXT_BOUND]
+        self.text_min = low if self.text_min is None or low < self.text_min else self.text_min
+        self.text_max = high if self.text_max is None or high > self.text_max else self.text_max
+
+        numeric = sum(batch.counts[kind] for kind in NUMERIC_KINDS)
+        if numeric:
+            values = batch.numeric_values
+            if len(values) != numeric:
+                # Mixed batches only list each numeric value once
+                wanted = set(values)
+                values = [v for v in non_blank if v in wanted]
+            counts = Counter(values)
+            numbers: Dict[float, int] = Counter()
+            for value, count in counts.items():
+                numbers[float(value)] += count
+            low, high = min(numbers), max(numbers)
+            self.numeric_min = low if self.numeric_min is None else min(self.numeric_min, low)
+            self.numeric_max = high if self.numeric_max is None else max(self.numeric_max, high)
+            self.quantiles.add_counts(numbers)
+
+    def merge(self, other: "ColumnProfile"):
+        for index, count in enumerate(other.kinds):
+            self.kinds[index] += count
+        for attribute, pick in (("numeric_min", min), ("numeric_max", max), ("text_min", min), ("text_max", max)):
+            mine, theirs = getattr(self, attribute), getattr(other, attribute)
+            setattr(self, attribute, theirs if mine is None else mine if theirs is None else pick(mine, theirs))
+        self.distinct.merge(other.distinct)
+        self.quantiles.merge(other.quantiles)
+
+    def kind_counts(self) -> Counter:
+        return Counter({kind: count for kind, count in zip(KINDS, self.kinds) if count})
+
+    def to_dict(self) -> Dict[str, Any]:
+        kinds = self.kind_counts()
+        rows = sum(self.kinds)
+        inferred = inferred_type(kinds)
+        numeric = inferred in ("integer", "decimal")
+        result = {
+            "name": self.name,
+            "inferred_type": inferred,
+            "rows": rows,
+            "null_count": kinds["blank"],
+            "null_rate": kinds["blank"] / rows if rows else 0.0,
+            "min": self.numeric_min if numeric else self.text_min,
+            "max": self.numeric_max if numeric else self.text_max,
+            "distinct_estimate": self.distinct.estimate(),
+            "distinct_exact": self.distinct.exact,
+            "kinds": dict(kinds),
+        }
+        if self.quantiles.count:
+            result["quantiles"] = {f"p{round(q * 100)}": self.quantiles.quantile(q) for q in QUANTILES}
+        return result
+
+    def write(self, out: _Writer):
+        out.text(self.name)
+        out.counters(self.kinds)
+        flags = (self.numeric_min is not None) | (self.text_min is not None) << 1
+        out.pack("B", flags)
+        if flags & 1:
+            out.pack("dd", self.numeric_min, self.numeric_max)
+        if flags & 2:
+            out.text(self.text_min)
+            out.text(self.text_max)
+        self.distinct.write(out)
+        self.quantiles.write(out)
+
+    @classmethod
+    def read(cls, source: _Reader) -> "ColumnProfile":
+        column = cls(source.text())
+        column.kinds = source.counters()
+        if len(column.kinds) != len(KINDS):
+            raise ValueError(f"Column {column.name!r} has {len(column.kinds)} kind counters, expected {len(KINDS)}")
+        flags = source.unpack("B")[0]
+        if flags & 1:
+            column.numeric_min, column.numeric_max = source.unpack("dd")
+        if flags & 2:
+            column.text_min = source.text()
+            column.text_max = source.text()
+        column.distinct = DistinctSketch.read(source)
+        column.quantiles = QuantileSketch.read(source)
+        return column
+
+
+class FileProfile:
+    """Per-file (or merged) profile: counts, header variants and one ColumnProfile per column name"""
+
+    __slots__ = ("source", "processor_code", "report_type", "report_date", "files", "rows", "ragged_rows", "bytes",
+                 "elapsed_seconds", "fingerprints", "columns", "_index")
+
+    def __init__(self, source: str, processor_code: str = "", report_type: str = "", report_date: str = ""):
+        self.source = source
+        self.processor_code = processor_code
+        self.report_type = report_type
+        self.report_date = report_date
+        self.files = 0
+        self.rows = 0
+        self.ragged_rows = 0
+        self.bytes = 0
+        self.elapsed_seconds = 0.0
+        self.fingerprints: set = set()
+        self.columns: List[ColumnProfile] = []
+        self._index: Dict[str, ColumnProfile] = {}
+
+    def column(self, name: str) -> ColumnProfile:
+        column = self._index.get(name)
+        if column is None:
+            column = self._index[name] = ColumnProfile(name)
+            self.columns.append(column)
+        return column
+
+    def merge(self, other: "FileProfile") -> "FileProfile":
+        """Fold another profile into this one; columns are matched by header name"""
+        for attribute in ("processor_code", "report_type", "report_date"):
+            if getattr(self, attribute) != getattr(other, attribute):
+                setattr(self, attribute, "")
+        self.files += other.files
+        self.rows += other.rows
+        self.ragged_rows += other.ragged_rows
+        self.bytes += other.bytes
+        self.elapsed_seconds += other.elapsed_seconds
+        self.fingerprints |= other.fingerprints
+        for column in other.columns:
+            self.column(column.name).merge(column)
+        return self
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "source": self.source,
+            "processor_code": self.processor_code,
+            "report_type": self.report_type,
+            "report_date": self.report_date,
+            "files": self.files,
+            "rows": self.rows,
+            "ragged_rows": self.ragged_rows,
+            "bytes": self.bytes,
+            "header_variants": len(self.fingerprints),
+            "columns": [column.to_dict() for column in self.columns],
+        }
+
+    def to_bytes(self) -> bytes:
+        out = _Writer()
+        for value in (self.source, self.processor_code, self.report_type, self.report_date):
+            out.text(value)
+        out.pack("QQQQd", self.files, self.rows, self.ragged_rows, self.bytes, self.elapsed_seconds)
+        out.counters(array.array("q", sorted(self.fingerprints)))
+        out.pack("I", len(self.columns))
+        for column in self.columns:
+            column.write(out)
+        return MAGIC + struct.pack("<B", FORMAT_VERSION) + zlib.compress(out.buffer.getvalue())
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "FileProfile":
+        if data[:4] != MAGIC:
+            raise ValueError("Not a compact profile")
+        if data[4] > FORMAT_VERSION:
+            raise ValueError(f"Compact profile format {data[4]} is newer than {FORMAT_VERSION}")
+        source = _Reader(zlib.decompress(data[5:]))
+        profile = cls(source.text(), source.text(), source.text(), source.text())
+        profile.files, profile.rows, profile.ragged_rows, profile.bytes, profile.elapsed_seconds = \
+            source.unpack("QQQQd")
+        profile.fingerprints = set(source.counters("q"))
+        for _ in range(source.unpack("I")[0]):
+            column = ColumnProfile.read(source)
+            profile.columns.append(column)
+            profile._index[column.name] = column
+        return profile
+
+
+def build_profile(file_path: str, report_type: Optional[ReportType] = None, processor_code: str = "",
+                  batch_rows: int = DEFAULT_BATCH_ROWS) -> FileProfile:
+    """Stream one CSV into a compact profile"""
+    started = time.perf_counter()
+    name = os.path.basename(file_path)
+    report_date = _REPORT_DATE_RE.search(name)
+    profile = FileProfile(name, processor_code, report_type.key if report_type else "",
+                          report_date.group(0) if report_date else "")
+    profile.files = 1
+    profile.bytes = os.path.getsize(file_path)
+    with open(file_path, "r", newline="", encoding="utf-8-sig", errors="replace", buffering=1 << 20) as f:
+        reader = csv.reader(f)
+        headers = next(reader, None)
+        if headers is None:
+            raise ValueError(f"Empty file: {file_path}")
+        profile.fingerprints.add(header_fingerprint(headers))
+        # A duplicated header is one column read from its last index, like FileParser's header -> index map
+        indexes = {header: index for index, header in enumerate(headers)}
+        columns = [(index, profile.column(header)) for header, index in indexes.items()]
+        width = len(headers)
+        while True:
+            batch = list(itertools.islice(reader, batch_rows))
+            if not batch:
+                break
+            # Blank lines hold no record, so they are neither rows nor ragged
+            batch = [row for row in batch if row]
+            if not batch:
+                continue
+            profile.rows += len(batch)
+            ragged = sum(1 for row in batch if len(row) != width)
+            if ragged:
+                profile.ragged_rows += ragged
+                batch = [row if len(row) == width else (row + [""] * width)[:width] for row in batch]
+            values_by_index = list(zip(*batch))
+            for index, column in columns:
+                column.update(ColumnBatch(values_by_index[index]))
+    profile.elapsed_seconds = time.perf_counter() - started
+    return profile
+
+
+def _profile_job(job: Tuple[str, str, str]) -> Tuple[str, Optional[bytes], Optional[str]]:
+    """Process-pool worker; profiles cross the process boundary in their binary form"""
+    file_path, report_key, processor_code = job
+    try:
+        return file_path, build_profile(file_path, report_type_by_key(report_key), processor_code).to_bytes(), None
+    except (OSError, ValueError, csv.Error) as e:
+        return file_path, None, str(e)
+
+
+def build_profiles(jobs: Sequence[Tuple[str, ReportType, str]], workers: Optional[int] = None,
+                   on_done: Optional[Callable[[str, Optional[bytes], Optional[str]], None]] = None) -> List[bytes]:
+    """Profile (file, report type, processor code) jobs in a process pool; returns the serialized profiles"""
+    jobs = sorted(((path, report_type.key, code) for path, report_type, code in jobs),
+                  key=lambda job: os.path.getsize(job[0]), reverse=True)
+    profiles = []
+    if not jobs:
+        return profiles
+    with ProcessPoolExecutor(max_workers=min(workers or os.cpu_count() or 1, len(jobs))) as pool:
+        for file_path, data, error in pool.map(_profile_job, jobs):
+            if data is not None:
+                profiles.append(data)
+            if on_done:
+                on_done(file_path, data, error)
+    return profiles
+
+
+def write_profiles(path: str, profiles: Iterable[bytes], append: bool = False) -> int:
+    """Length-prefixed serialized profiles, one after another; returns the bytes written"""
+    written = 0
+    with open(path, "ab" if append else "wb") as f:
+        for data in profiles:
+            f.write(struct.pack("<I", len(data)))
+            f.write(data)
+            written += 4 + len(data)
+    return written
+
+
+def read_profiles(path: str) -> Iterator[FileProfile]:
+    with open(path, "rb") as f:
+        while True:
+            prefix = f.read(4)
+            if len(prefix) < 4:
+                return
+            yield FileProfile.from_bytes(f.read(struct.unpack("<I", prefix)[0]))
+
+
+def merge_views(profiles: Iterable[FileProfile], view: str) -> Dict[Tuple[str, ...], FileProfile]:
+    """Merge profiles into one per view key, e.g. (processor code, report type) for the tpp view"""
+    attributes = VIEWS[view]
+    merged: Dict[Tuple[str, ...], FileProfile] = {}
+    for profile in profiles:
+        key = tuple(getattr(profile, attribute) for attribute in attributes)
+        target = merged.get(key)
+        if target is None:
+            target = merged[key] = FileProfile("/".join(k or "-" for k in key),
+                                               **dict(zip(attributes, key)))
+        target.merge(profile)
+    return dict(sorted(merged.items()))
@@ -0,0 +1,243 @@
+"""
+Versioned history of the header rows each processor sends per report type.
+Every distinct header row is stored once as a numbered version under an 8-byte fingerprint; the current version
+of each (processor, report type) is kept in memory, so an unchanged file costs one hash and one dict lookup. Only
+a new fingerprint is diffed against the previous version, and unresolved column mappings are paired with the
+headers that replaced them to propose HeaderAlias entries for /api/admin/headers.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import time
+from collections import defaultdict
+from difflib import SequenceMatcher
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import quote
+
+from payrep_tools.header_index import HeaderIndex, canonical_entity_type
+
+DEFAULT_HISTORY_PATH = os.path.join(os.path.expanduser("~"), ".cache", "payrep", "header-history.sqlite3")
+HEADERS_PATH = "/api/admin/headers"
+MIN_ALIAS_SIMILARITY = 0.6
+
+
+def header_fingerprint(headers: Sequence[str]) -> int:
+    """Signed 64-bit blake2b of the header row, order-sensitive, stored as a SQLite INTEGER"""
+    digest = hashlib.blake2b("\x1f".join(headers).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def header_diff(previous: Sequence[str], headers: Sequence[str]) -> Dict[str, Any]:
+    """Headers added, removed and moved relative to each other between two header rows"""
+    previous_set, current_set = set(previous), set(headers)
+    kept_before = [h for h in previous if h in current_set]
+    kept_after = [h for h in headers if h in previous_set]
+    return {"added": [h for h in headers if h not in previous_set],
+            "removed": [h for h in previous if h not in current_set],
+            "moved": [h for h, before in zip(kept_after, kept_before) if h != before]}
+
+
+def _tokens(name: str) -> List[str]:
+    spaced = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", name)
+    return re.findall(r"[a-z0-9]+", spaced.lower())
+
+
+def _abbreviates(short: str, long: str) -> bool:
+    """'id' for 'ident' (a prefix), 'amt' for 'amount' (three or more letters, in order, same first letter)"""
+    if long.startswith(short):
+        return True
+    if len(short) < 3 or short[0] != long[0]:
+        return False
+    rest = iter(long[1:])
+    return all(char in rest for char in short[1:])
+
+
+def name_similarity(a: str, b: str) -> float:
+    """Share of name tokens that match, where a token matches its own abbreviation"""
+    left, right = _tokens(a), _tokens(b)
+    if not left or not right:
+        return 0.0
+    unmatched = list(right)
+    matched = 0
+    for token in left:
+        for other in unmatched:
+            short, long = sorted((token, other), key=len)
+            if _abbreviates(short, long):
+                unmatched.remove(other)
+                matched += 1
+                break
+    return 2 * matched / (len(left) + len(right))
+
+
+def propose_aliases(resolution: Dict[str, Any], header_index: HeaderIndex,
+                    added: Sequence[str] = ()) -> List[Dict[str, Any]]:
+    """Pair every unresolved mapping with the most similar unmapped header; headers new in this version win ties"""
+    if not resolution["unresolved"] or not resolution["unmapped_headers"]:
+        return []
+    entity_type = canonical_entity_type(resolution["entity_type"] or "")
+    candidates = []
+    for entry in resolution["unresolved"]:
+        definition = header_index.canonical_definitions.get((entity_type, entry["field_name"]))
+        known = [entry["column_name"]] + ([definition.display_name, *definition.aliases] if definition else [])
+        for header in resolution["unmapped_headers"]:
+            score = max(name_similarity(name, header) for name in known)
+            if score >= MIN_ALIAS_SIMILARITY:
+                # Character similarity only breaks ties between equally good token matches
+                closeness = SequenceMatcher(None, entry["column_name"].lower(), header.lower()).ratio()
+                candidates.append((score, header in added, closeness, entry, definition, header))
+
+    proposals = []
+    taken_fields, taken_headers = set(), set()
+    for score, _, _, entry, definition, header in sorted(candidates, key=lambda c: c[:3], reverse=True):
+        if entry["field_name"] in taken_fields or header in taken_headers:
+            continue
+        taken_fields.add(entry["field_name"])
+        taken_headers.add(header)
+        proposals.append({"entity_type": entity_type, "key": entry["field_name"],
+                          "display_name": definition.display_name if definition else entry["column_name"],
+                          "alias": header, "column_name": entry["column_name"], "similarity": round(score, 3),
+                          "definition_exists": definition is not None,
+                          # FileParser only consults definitions stored under the mapping's literal entityType
+                          "used_by_file_parser": resolution["definition_lookup_entity_type_matches"]
+                          or resolution["entity_type"] == entity_type})
+    return proposals
+
+
+class HeaderHistory:
+    """SQLite store of header row versions per processor and report type"""
+
+    def __init__(self, path: str = DEFAULT_HISTORY_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS header_versions (
+                processor_code TEXT NOT NULL,
+                report_type TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                fingerprint INTEGER NOT NULL,
+                headers TEXT NOT NULL,
+                first_file TEXT NOT NULL,
+                first_seen REAL NOT NULL,
+                last_seen REAL NOT NULL,
+                observations INTEGER NOT NULL,
+                PRIMARY KEY (processor_code, report_type, version)
+            )""")
+        self.db.execute("CREATE UNIQUE INDEX IF NOT EXISTS header_versions_fingerprint "
+                        "ON header_versions (processor_code, report_type, fingerprint)")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS current_versions (
+                processor_code TEXT NOT NULL,
+                report_type TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                PRIMARY KEY (processor_code, report_type)
+            )""")
+        self.db.commit()
+        self._current: Dict[Tuple[str, str], Tuple[int, int]] = {
+            (processor_code, report_type): (fingerprint, version)
+            for processor_code, report_type, fingerprint, version in self.db.execute(
+                "SELECT c.processor_code, c.report_type, v.fingerprint, v.version FROM current_versions c "
+                "JOIN header_versions v USING (processor_code, report_type, version)")}
+        self._seen: Dict[Tuple[str, str, int], int] = defaultdict(int)
+
+    def observe(self, processor_code: str, report_type: str, headers: Sequence[str],
+                file_name: str) -> Optional[Dict[str, Any]]:
+        """Record a file's header row; None when it matches the current version, else what changed"""
+        key = (processor_code, report_type)
+        fingerprint = header_fingerprint(headers)
+        current = self._current.get(key)
+        if current is not None and current[0] == fingerprint:
+            self._seen[key + (current[1],)] += 1
+            return None
+
+        now = time.time()
+        row = self.db.execute(
+            "SELECT version FROM header_versions WHERE processor_code = ? AND report_type = ? AND fingerprint = ?",
+            (processor_code, report_type, fingerprint)).fetchone()
+        if row is not None:
+            version, status = row[0], "reverted"
+        else:
+            version = 1 + self.db.execute(
+                "SELECT COALESCE(MAX(version), 0) FROM header_versions WHERE processor_code = ? AND report_type = ?",
+                key).fetchone()[0]
+            status = "new" if current is None else "changed"
+            self.db.execute("INSERT INTO header_versions VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0)",
+                            (processor_code, report_type, version, fingerprint, json.dumps(list(headers)),
+                             file_name, now, now))
+        self.db.execute("INSERT OR REPLACE INTO current_versions VALUES (?, ?, ?)", key + (version,))
+        self._seen[key + (version,)] += 1
+        self._current[key] = (fingerprint, version)
+
+        change = {"processor_code": processor_code, "report_type": report_type, "file": file_name,
+                  "status": status, "version": version, "previous_version": current[1] if current else None}
+        if current is not None:
+            change.update(header_diff(self.headers(processor_code, report_type, current[1]), headers))
+        return change
+
+    def headers(self, processor_code: str, report_type: str, version: int) -> List[str]:
+        row = self.db.execute(
+            "SELECT headers FROM header_versions WHERE processor_code = ? AND report_type = ? AND version = ?",
+            (processor_code, report_type, version)).fetchone()
+        return json.loads(row[0]) if row else []
+
+    def versions(self, processor_code: str, report_type: str) -> List[Dict[str, Any]]:
+        """Every stored version, oldest first"""
+        return [{"version": version, "headers": json.loads(headers), "first_file": first_file,
+                 "first_seen": first_seen, "last_seen": last_seen, "observations": observations}
+                for version, headers, first_file, first_seen, last_seen, observations in self.db.execute(
+                    "SELECT version, headers, first_file, first_seen, last_seen, observations FROM header_versions "
+                    "WHERE processor_code = ? AND report_type = ? ORDER BY version", (processor_code, report_type))]
+
+    def commit(self):
+        """Write the per-version file counts gathered since the last commit"""
+        now = time.time()
+        self.db.executemany(
+            "UPDATE header_versions SET observations = observations + ?, last_seen = ? "
+            "WHERE processor_code = ? AND report_type = ? AND version = ?",
+            [(count, now) + key for key, count in self._seen.items()])
+        self._seen.clear()
+        self.db.commit()
+
+    def close(self):
+        self.commit()
+        self.db.close()
+
+
+def push_aliases(client, proposals: Sequence[Dict[str, Any]], dry_run: bool = False) -> List[Dict[str, Any]]:
+    """Add proposed aliases through the admin API, creating header definitions that do not exist yet"""
+    # The same rename usually shows up in several files
+    proposals = list({(p["entity_type"], p["key"], p["alias"]): p for p in proposals}.values())
+    entity_types = sorted({proposal["entity_type"] for proposal in proposals})
+    definitions = {}
+    for entity_type, listed in zip(entity_types, client.map(
+            lambda entity_type: client.get_json(f"{HEADERS_PATH}?entityType={quote(entity_type)}"), entity_types)):
+        for definition in listed:
+            definitions[(entity_type, definition["key"])] = definition
+
+    actions = []
+    for proposal in proposals:
+        definition = definitions.get((proposal["entity_type"], proposal["key"]))
+        if definition is None:
+            actions.append({"proposal": proposal, "action": "create definition", "method": "POST",
+                            "path": HEADERS_PATH,
+                            "payload": {"entityType": proposal["entity_type"], "key": proposal["key"],
+                                        "displayName": proposal["display_name"], "aliases": [proposal["alias"]]}})
+        elif proposal["alias"] in {a["alias"] for a in definition.get("aliases", [])}:
+            actions.append({"proposal": proposal, "action": "exists", "status": 200})
+        else:
+            actions.append({"proposal": proposal, "action": "add alias", "method": "POST",
+                            "path": f"{HEADERS_PATH}/{definition['id']}/aliases",
+                            "payload": {"alias": proposal["alias"]}})
+    pending = [action for action in actions if "method" in action]
+    if not dry_run:
+        for action, response in zip(pending, client.map(lambda a: client.post(a["path"], a["payload"]), pending)):
+            action["status"] = response.status_code
+            if response.status_code != 200:
+                action["error"] = response.text
+    return actions
@@ -0,0 +1,200 @@
+"""
+Header resolution index mirroring FileParser.parseCsvFile.
+FileParser resolves every column mapping on every row: exact columnName, then the HeaderDefinition
+(looked up by the first mapping's entityType and the mapping's fieldName) displayName, then its
+HeaderAlias rows, then a case-insensitive scan. The index below is built once from a JSON snapshot of
+the admin API and resolves a file's header row once, reporting the route each mapping takes.
+"""
+
+import json
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from payrep_tools.report_types import ReportType
+
+ROUTES = ("exact", "displayName", "alias", "case-insensitive", "unresolved")
+
+# Canonical entity types written by HeaderDefinitionSeederService
+_CANONICAL_ENTITY_TYPES = {
+    "atm terminal data": "ATM Terminal Data",
+    "atm transaction data": "ATM Transaction Data",
+    "pos terminal data": "POS Terminal Data",
+    "pos transaction data": "POS Transaction Data",
+    "card lifecycle": "Card Lifecycle",
+    "e commerce card activity": "E-Commerce Card Activity",
+    "ecommerce card activity": "E-Commerce Card Activity",
+    "transaction volume": "Transaction Volume",
+}
+
+
+def canonical_entity_type(raw: str) -> str:
+    """Same normalization as HeaderDefinitionSeederService.canonicalEntityType"""
+    spaced = re.sub(r"([A-Z]+)([A-Z][a-z])", r"\1 \2", re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", raw.strip()))
+    normalized = re.sub(r"\s+", " ", re.sub(r"[_-]", " ", spaced)).lower()
+    return _CANONICAL_ENTITY_TYPES.get(normalized, raw.strip())
+
+
+@dataclass(frozen=True)
+class MappingEntry:
+    """ColumnMappingDto fields FileParser reads"""
+    column_name: str
+    entity_type: str
+    field_name: str
+    transformation: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class HeaderDefinitionEntry:
+    """HeaderDefinitionDto with its aliases flattened"""
+    entity_type: str
+    key: str
+    display_name: str
+    aliases: Tuple[str, ...] = ()
+
+
+@dataclass
+class MappingSnapshot:
+    """File configs with their column mappings plus every header definition, as exported from the admin API"""
+    file_configs: List[Dict[str, Any]] = field(default_factory=list)
+    mappings: Dict[Any, List[MappingEntry]] = field(default_factory=dict)  # config id -> mappings
+    definitions: List[HeaderDefinitionEntry] = field(default_factory=list)
+    source: str = "snapshot"
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], source: str = "snapshot") -> "MappingSnapshot":
+        snapshot = cls(source=source)
+        for config in data.get("fileConfigs", []):
+            snapshot.file_configs.append({k: v for k, v in config.items() if k != "columnMappings"})
+            snapshot.mappings[config.get("id")] = [
+                MappingEntry(m["columnName"], m["entityType"], m["fieldName"], m.get("transformation"))
+                for m in config.get("columnMappings", [])
+            ]
+        for definition in data.get("headerDefinitions", []):
+            snapshot.definitions.append(HeaderDefinitionEntry(
+                definition["entityType"], definition["key"], definition["displayName"],
+                tuple(a["alias"] for a in definition.get("aliases", []))))
+        return snapshot
+
+    @classmethod
+    def load(cls, path: str) -> "MappingSnapshot":
+        with open(path, "r") as f:
+            return cls.from_dict(json.load(f), source=path)
+
+    @classmethod
+    def seeded(cls, report_types: Sequence[ReportType]) -> "MappingSnapshot":
+        """Snapshot of the mappings ColumnMappingSeederService writes, without header definitions"""
+        snapshot = cls(source="seeded column mappings")
+        for report_type in report_types:
+            snapshot.file_configs.append({"id": report_type.key, "fileType": report_type.file_type,
+                                          "fileNamePattern": report_type.file_name_pattern})
+            snapshot.mappings[report_type.key] = [
+                MappingEntry(m.column_name, report_type.entity_type, m.field_name, m.transformation)
+                for m in report_type.mappings
+            ]
+        return snapshot
+
+    def mappings_for(self, file_name: str, report_type: Optional[ReportType] = None) -> List[MappingEntry]:
+        """Mappings of the first config whose fileNamePattern matches the file, else of the report type's fileType"""
+        for config in self.file_configs:
+            pattern = config.get("fileNamePattern")
+            if pattern and self.mappings.get(config.get("id")) and re.fullmatch(pattern, file_name):
+                return self.mappings[config["id"]]
+        if report_type is not None:
+            for config in self.file_configs:
+                if config.get("fileType") == report_type.file_type and self.mappings.get(config.get("id")):
+                    return self.mappings[config["id"]]
+        return []
+
+
+class HeaderIndex:
+    """Precomputed (entityType, key) -> header lookup built once per snapshot"""
+
+    def __init__(self, snapshot: MappingSnapshot):
+        self.snapshot = snapshot
+        self.definitions: Dict[Tuple[str, str], HeaderDefinitionEntry] = {}
+        self.canonical_definitions: Dict[Tuple[str, str], HeaderDefinitionEntry] = {}
+        for definition in snapshot.definitions:
+            self.definitions.setdefault((definition.entity_type, definition.key), definition)
+            self.canonical_definitions.setdefault(
+                (canonical_entity_type(definition.entity_type), definition.key), definition)
+
+    def resolve(self, headers: Sequence[str], mappings: Sequence[MappingEntry]) -> Dict[str, Any]:
+        """Resolve every mapping against one header row the way FileParser does"""
+        # headers.mapIndexed { ... }.toMap(): a duplicated header keeps the index of its last occurrence
+        column_indices: Dict[str, int] = {}
+        for index, header in enumerate(headers):
+            column_indices[header] = index
+        lowered: Dict[str, int] = {}
+        for header, index in column_indices.items():
+            lowered.setdefault(header.lower(), index)
+
+        # FileParser uses the first mapping's entityType for every definition lookup
+        entity_type = mappings[0].entity_type if mappings else None
+        routes = {route: 0 for route in ROUTES}
+        resolved = []
+        for mapping in mappings:
+            entry = self._resolve_mapping(mapping, entity_type, column_indices, lowered, headers)
+            routes[entry["route"]] += 1
+            resolved.append(entry)
+
+        used = {entry["index"] for entry in resolved if entry["index"] is not None}
+        return {
+            "source": self.snapshot.source,
+            "entity_type": entity_type,
+            "definition_lookup_entity_type_matches": entity_type is not None and any(
+                e == entity_type for e, _ in self.definitions),
+            "routes": routes,
+            "mappings": resolved,
+            "unresolved": [entry for entry in resolved if entry["route"] == "unresolved"],
+            "unmapped_headers": [h for i, h in enumerate(headers) if i not in used],
+            "duplicate_headers": sorted(h for h, n in Counter(headers).items() if n > 1),
+        }
+
+    def _resolve_mapping(self, mapping: MappingEntry, entity_type: Optional[str], column_indices: Dict[str, int],
+                         lowered: Dict[str, int], headers: Sequence[str]) -> Dict[str, Any]:
+        entry = {"column_name": mapping.column_name, "field_name": mapping.field_name,
+                 "transformation": mapping.transformation, "route": "unresolved", "header": None, "index": None}
+
+        index = column_indices.get(mapping.column_name)
+        if index is not None:
+            return dict(entry, route="exact", header=headers[index], index=index)
+
+        definition = self.definitions.get((entity_type, mapping.field_name)) if entity_type else None
+        if definition is not None:
+            index = column_indices.get(definition.display_name)
+            if index is not None:
+                return dict(entry, route="displayName", header=headers[index], index=index)
+            for alias in definition.aliases:
+                index = column_indices.get(alias)
+                if index is not None:
+                    return dict(entry, route="alias", header=headers[index], index=index)
+        elif entity_type:
+            # The stored definitions carry canonical entity types, which FileParser's literal lookup misses
+            canonical = self.canonical_definitions.get((canonical_entity_type(entity_type), mapping.field_name))
+            if canonical is not None:
+                for name in (canonical.display_name,) + canonical.aliases:
+                    if name in column_indices:
+                        entry["missed_definition"] = {"entity_type": canonical.entity_type, "would_match": name}
+                        break
+
+        index = lowered.get(mapping.column_name.lower())
+        if index is not None:
+            return dict(entry, route="case-insensitive", header=headers[index], index=index)
+        entry["outcome"] = f"'{mapping.field_name}' silently missing from every record"
+        return entry
+
+
+def export_snapshot(file_configs: List[Dict[str, Any]], column_mappings: Dict[Any, List[Dict[str, Any]]],
+                    header_definitions: List[Dict[str, Any]], path: str) -> str:
+    """Write admin API responses (FileProcessingConfigDto, ColumnMappingDto, HeaderDefinitionDto) as a snapshot"""
+    data = {
+        "exportedAt": datetime.now().isoformat(),
+        "fileConfigs": [dict(config, columnMappings=column_mappings.get(config["id"], [])) for config in file_configs],
+        "headerDefinitions": header_definitions,
+    }
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+    return path
@@ -0,0 +1,282 @@
+"""
+Asyncio import-log monitor.
+Polls /api/admin/import-logs/config/{id} for every watched file config through the pooled AdminClient, which
+keeps the JWT fresh, backing off while nothing changes and tightening while a file is PENDING. Auth and client
+errors stop the run; network and server errors are retried a few times first. When the monitor runs next to
+the backend it can also tail the debug-logs/file-processing-*.log files FileParser and FileIngestionService
+write; their parse start and "Processing record N of M" lines report progress and wake the pollers as soon
+as a file's last record is saved.
+"""
+
+import asyncio
+import glob
+import os
+import re
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+import requests
+
+from payrep_tools.admin_client import AdminClient
+
+FINAL_STATUSES = ("SUCCESS", "FAILED")
+DEBUG_LOG_PATTERN = "file-processing-*.log"
+FETCH_ATTEMPTS = 3
+
+# Debug log lines FileParser and FileIngestionService write; stage_timings reads them too
+LINE_RE = re.compile(r"^\[(?P<ts>\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}\.\d{3})\] (?P<message>.*)$")
+PARSE_START_RE = re.compile(r"^Parser: File=(?P<file>.+?), ConfigId=(?P<config>\d+),")
+SAVE_START_RE = re.compile(r"^File: (?P<file>.+?), Processor: (?P<processor>[^,]+), Entity Type: (?P<entity>.+)$")
+PROGRESS_RE = re.compile(r"^Processing record (?P<done>\d+) of (?P<total>\d+)$")
+
+
+@dataclass
+class FileTransition:
+    """One file's way through ImportLog PENDING -> SUCCESS/FAILED"""
+    config_id: int
+    file_name: str
+    label: str = ""
+    watched_at: float = field(default_factory=time.time)
+    pending_seen_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    status: Optional[str] = None
+    error_message: Optional[str] = None
+    import_time: Optional[str] = None
+    records_done: int = 0
+    records_total: Optional[int] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINAL_STATUSES
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "config_id": self.config_id,
+            "label": self.label,
+            "file_name": self.file_name,
+            "status": self.status or "NOT SEEN",
+            "error_message": self.error_message,
+            "import_time": self.import_time,
+            "records_total": self.records_total,
+            "time_to_processed_seconds": round(self.finished_at - self.watched_at, 2) if self.finished_at else None,
+            "pending_to_final_seconds": round(self.finished_at - self.pending_seen_at, 2)
+            if self.finished_at and self.pending_seen_at else None,
+        }
+
+
+class ImportLogMonitor:
+    """Watches the import logs of many file configs (across TPPs) concurrently"""
+
+    def __init__(self, client: AdminClient, min_interval: float = 0.5, max_interval: float = 15.0,
+                 pending_interval: float = 2.0, backoff: float = 1.6, max_connections: Optional[int] = None,
+                 debug_log_dir: Optional[str] = None,
+                 on_transition: Optional[Callable[[FileTransition], None]] = None):
+        self.client = client
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.pending_interval = pending_interval
+        self.backoff = backoff
+        self.max_connections = max_connections or client.max_workers
+        self.debug_log_dir = debug_log_dir
+        self.on_transition = on_transition or (lambda transition: None)
+
+        self.labels: Dict[int, str] = {}
+        self.transitions: Dict[tuple, FileTransition] = {}
+        self.seen_log_ids: Set[Any] = set()
+        self.polls = 0
+        self._wake: Dict[int, asyncio.Event] = {}
+        self._tail_offsets: Dict[str, int] = {}
+        self._tail_file: Optional[str] = None
+        self._error: Optional[RuntimeError] = None
+
+    def watch(self, config_id: int, label: str = "", files: Iterable[str] = ()):
+        """Watch a file config; files listed up front count as expected until they reach a final status"""
+        self.labels[config_id] = label
+        for file_name in files:
+            self._transition(config_id, file_name)
+
+    def _transition(self, config_id: int, file_name: str) -> FileTransition:
+        key = (config_id, file_name)
+        if key not in self.transitions:
+            self.transitions[key] = FileTransition(config_id, file_name, self.labels.get(config_id, ""))
+        return self.transitions[key]
+
+    def _pending(self) -> List[FileTransition]:
+        return [t for t in self.transitions.values() if not t.finished]
+
+    async def run(self, timeout: float = 600.0, since: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Monitor until every expected file is final or the timeout expires; returns per-file results
+
+        Raises RuntimeError when the import logs cannot be read, e.g. after a failed login or a 4xx/5xx.
+        """
+        # Logs from earlier runs are ignored; a small margin absorbs clock skew with the backend
+        since = since or datetime.now() - timedelta(seconds=5)
+        semaphore = asyncio.Semaphore(self.max_connections)
+        self._wake = {config_id: asyncio.Event() for config_id in self.labels}
+        self._error = None
+        done = asyncio.Event()
+
+        # Every config is polled once before any poller may decide that nothing is left to wait for
+        seeded = await asyncio.gather(*(self._fetch_async(config_id, semaphore) for config_id in self.labels))
+        for config_id, logs in zip(self.labels, seeded):
+            self._apply_logs(config_id, logs, since)
+
+        tasks = [asyncio.create_task(self._poll_config(config_id, since, semaphore, done))
+                 for config_id in self.labels]
+        if self.debug_log_dir:
+            tasks.append(asyncio.create_task(self._tail_debug_logs(done)))
+        try:
+            if self._pending():
+                await asyncio.wait_for(done.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        if self._error is not None:
+            raise self._error
+        return [t.to_dict() for t in sorted(self.transitions.values(), key=lambda t: (t.config_id, t.file_name))]
+
+    def run_sync(self, timeout: float = 600.0, since: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        return asyncio.run(self.run(timeout, since))
+
+    async def _poll_config(self, config_id: int, since: datetime, semaphore: asyncio.Semaphore,
+                           done: asyncio.Event):
+        interval = self.min_interval
+        wake = self._wake[config_id]
+        while True:
+            try:
+                logs = await self._fetch_async(config_id, semaphore)
+            except RuntimeError as e:
+                self._error = e
+                done.set()
+                return
+            changed = self._apply_logs(config_id, logs, since)
+            if not self._pending():
+                done.set()
+                return
+
+            # Back off while nothing happens, but keep a PENDING file on a short leash
+            interval = self.min_interval if changed else min(self.max_interval, interval * self.backoff)
+            if any(t.config_id == config_id and t.status == "PENDING" for t in self.transitions.values()):
+                interval = min(interval, self.pending_interval)
+            try:
+                await asyncio.wait_for(wake.wait(), interval)
+                interval = self.min_interval
+            except asyncio.TimeoutError:
+                pass
+            wake.clear()
+
+    async def _fetch_async(self, config_id: int, semaphore: asyncio.Semaphore) -> List[Dict[str, Any]]:
+        async with semaphore:
+            return await asyncio.to_thread(self._fetch, config_id)
+
+    def _fetch(self, config_id: int) -> List[Dict[str, Any]]:
+        """Import logs of one config; network errors and 5xx are retried, anything else raises right away"""
+        path = f"/api/admin/import-logs/config/{config_id}"
+        for attempt in range(1, FETCH_ATTEMPTS + 1):
+            self.polls += 1
+            try:
+                # AdminClient logs in again before the token expires and once after a 401/403
+                response = self.client.get(path)
+            except requests.RequestException as e:
+                error = f"{type(e).__name__}: {e}"
+            else:
+                if response.status_code == 200:
+                    return response.json()
+                error = f"{response.status_code} - {response.text}"
+                if response.status_code < 500:
+                    break
+            if attempt < FETCH_ATTEMPTS:
+                time.sleep(self.min_interval * attempt)
+        raise RuntimeError(f"GET {path} failed: {error}")
+
+    def _apply_logs(self, config_id: int, logs: List[Dict[str, Any]], since: datetime) -> bool:
+        changed = False
+        # A failed import is saved as a new row, so the highest id per file carries the latest status
+        for log in sorted(logs, key=lambda log: log.get("id") or 0):
+            # SUCCESS updates the PENDING row in place, so a row counts as new once per status
+            seen_key = (log.get("id"), log.get("status"))
+            if seen_key in self.seen_log_ids:
+                continue
+            self.seen_log_ids.add(seen_key)
+            try:
+                if datetime.fromisoformat(log["importTime"]) < since:
+                    continue
+            except (KeyError, TypeError, ValueError):
+                pass
+            transition = self._transition(config_id, log["fileName"])
+            if transition.finished:
+                continue
+            transition.import_time = log.get("importTime")
+            if log["status"] == "PENDING":
+                if transition.pending_seen_at is None:
+                    transition.pending_seen_at = time.time()
+                    transition.status = "PENDING"
+                    self.on_transition(transition)
+            elif log["status"] in FINAL_STATUSES:
+                transition.status = log["status"]
+                transition.error_message = log.get("errorMessage")
+                transition.finished_at = time.time()
+                self.on_transition(transition)
+            changed = True
+        return changed
+
+    async def _tail_debug_logs(self, done: asyncio.Event):
+        """Follow the newest debug logs and turn parse/save lines into progress"""
+        while not done.is_set():
+            for path in sorted(glob.glob(os.path.join(self.debug_log_dir, DEBUG_LOG_PATTERN))):
+                for line in self._read_new_lines(path):
+                    self._apply_debug_line(line)
+            await asyncio.sleep(0.25)
+
+    def _read_new_lines(self, path: str) -> List[str]:
+        offset = self._tail_offsets.get(path)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return []
+        if offset is None:
+            # Only lines written after the monitor started matter
+            self._tail_offsets[path] = size
+            return []
+        if size <= offset:
+            return []
+        with open(path, "rb") as f:
+            f.seek(offset)
+            data = f.read(size - offset)
+        # Keep a partial last line for the next round
+        end = data.rfind(b"\n") + 1
+        self._tail_offsets[path] = offset + end
+        return data[:end].decode("utf-8", "replace").splitlines()
+
+    def _apply_debug_line(self, line: str):
+        match = LINE_RE.match(line)
+        if not match:
+            return
+        message = match.group("message")
+        start = PARSE_START_RE.match(message)
+        if start:
+            config_id = int(start.group("config"))
+            if config_id in self.labels:
+                self._tail_file = start.group("file")
+                transition = self._transition(config_id, self._tail_file)
+                if transition.pending_seen_at is None:
+                    transition.pending_seen_at = time.time()
+            return
+        save = SAVE_START_RE.match(message)
+        if save:
+            self._tail_file = save.group("file")
+            return
+        progress = PROGRESS_RE.match(message)
+        if progress and self._tail_file:
+            done, total = int(progress.group("done")), int(progress.group("total"))
+            for transition in self.transitions.values():
+                if transition.file_name == self._tail_file and not transition.finished:
+                    transition.records_done, transition.records_total = done, total
+                    if done == total:
+                        # The last record is saved; the SUCCESS row follows right away
+                        self._wake[transition.config_id].set()
@@ -0,0 +1,406 @@
+"""
+Columnar type and format inference for processor report files.
+Each column batch is first checked as a whole with one anchored regex per type (the common case:
+every value in the batch has the same type); only mixed batches fall back to classifying their
+distinct values. Reports the values the JVM ingestion path would reject: FileParser.applyTransformation
+and the asInt/asBigDecimal/asLocalDate helpers (or their lenient getFieldAs* variants) in DataMapper.
+"""
+
+import csv
+import itertools
+import re
+from collections import Counter
+from datetime import date
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+from payrep_tools.report_types import MapperField, ReportType
+
+# Date layouts seen in processor drops; only the first one is accepted by DataMapper.asLocalDate
+DATE_FORMATS = [
+    ("yyyy-MM-dd", r"\d{4}-(?:0[1-9]|1[0-2])-(?:0[1-9]|[12]\d|3[01])"),
+    ("yyyy-MM-dd HH:mm:ss", r"\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?"),
+    ("yyyy/MM/dd", r"\d{4}/\d{2}/\d{2}"),
+    ("dd/MM/yyyy", r"\d{1,2}/\d{1,2}/\d{4}"),
+    ("dd-MM-yyyy", r"\d{1,2}-\d{1,2}-\d{4}"),
+    ("dd.MM.yyyy", r"\d{1,2}\.\d{1,2}\.\d{4}"),
+]
+
+SENTINELS = frozenset(("N/A", "n/a", "NA", "NULL", "null", "None", "#N/A", "-"))
+MAX_EXAMPLES = 5
+DEFAULT_CHUNK_ROWS = 50000
+
+JVM_INT_MIN = -2 ** 31
+JVM_INT_MAX = 2 ** 31 - 1
+
+# Integer.parseInt / BigDecimal(String) / LocalDate.parse syntax
+_INT_BODY = r"[+-]?\d+"
+_DECIMAL_BODY = r"[+-]?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?"
+# Only the ISO shape; a value with an impossible month or day still matches and the calendar check reports it
+# as invalid_date instead of letting it fall through to string
+_ISO_DATE_BODY = r"\d{4}-\d{2}-\d{2}"
+# DateTimeFormatter.ISO_DATE, used by the date:yyyy-MM-dd transformation, also allows an offset
+_ISO_DATE_OFFSET_BODY = _ISO_DATE_BODY + r"(?:Z|[+-]\d{2}:\d{2}(?::\d{2})?)"
+
+# Value kinds: blank, sentinel, integer (fits a JVM int), long, decimal, date (ISO), date_offset,
+# invalid_date (ISO shape, impossible calendar date), date:<format> for the other DATE_FORMATS, string
+NUMERIC_KINDS = ("integer", "long", "decimal")
+
+
+def _all_lines(body: str) -> "re.Pattern[str]":
+    """Matches a newline-joined batch whose every line is blank or matches body"""
+    return re.compile(rf"(?:(?:{body})?\n)*(?:{body})?")
+
+
+_UNIFORM_CHECKS = [
+    ("integer", _all_lines(_INT_BODY)),
+    ("decimal", _all_lines(_DECIMAL_BODY)),
+    ("date", _all_lines(_ISO_DATE_BODY)),
+    ("date_offset", _all_lines(_ISO_DATE_OFFSET_BODY)),
+] + [(f"date:{label}", _all_lines(body)) for label, body in DATE_FORMATS[1:]]
+
+_INT_FULL = re.compile(_INT_BODY)
+_DECIMAL_FULL = re.compile(_DECIMAL_BODY)
+_ISO_DATE_FULL = re.compile(_ISO_DATE_BODY)
+_ISO_DATE_OFFSET_FULL = re.compile(_ISO_DATE_OFFSET_BODY)
+_OTHER_DATE_FULL = [(f"date:{label}", re.compile(body)) for label, body in DATE_FORMATS[1:]]
+_LONG_DIGITS = re.compile(r"\d{10}")
+
+
+def _valid_calendar_date(value: str) -> bool:
+    try:
+        date.fromisoformat(value[:10])
+        return True
+    except ValueError:
+        return False
+
+
+def is_jvm_int(value: str) -> bool:
+    return _INT_FULL.fullmatch(value) is not None and JVM_INT_MIN <= int(value) <= JVM_INT_MAX
+
+
+def is_jvm_decimal(value: str) -> bool:
+    return _DECIMAL_FULL.fullmatch(value) is not None
+
+
+def is_iso_date(value: str) -> bool:
+    return _ISO_DATE_FULL.fullmatch(value) is not None and _valid_calendar_date(value)
+
+
+def is_iso_date_with_offset(value: str) -> bool:
+    return (_ISO_DATE_FULL.fullmatch(value) is not None or _ISO_DATE_OFFSET_FULL.fullmatch(value) is not None) \
+        and _valid_calendar_date(value)
+
+
+def classify_value(value: str) -> str:
+    """Kind of a single value, using the same syntax rules as the JVM parsers"""
+    if value == "":
+        return "blank"
+    if value in SENTINELS:
+        return "sentinel"
+    if _INT_FULL.fullmatch(value):
+        return "integer" if JVM_INT_MIN <= int(value) <= JVM_INT_MAX else "long"
+    if _DECIMAL_FULL.fullmatch(value):
+        return "decimal"
+    if _ISO_DATE_FULL.fullmatch(value):
+        return "date" if _valid_calendar_date(value) else "invalid_date"
+    if _ISO_DATE_OFFSET_FULL.fullmatch(value):
+        return "date_offset" if _valid_calendar_date(value) else "invalid_date"
+    for kind, pattern in _OTHER_DATE_FULL:
+        if pattern.fullmatch(value):
+            return kind
+    return "string"
+
+
+class ColumnBatch:
+    """Value kind counts for one batch of a column, shared by the profiler and the inference engine"""
+
+    def __init__(self, values: Sequence[str]):
+        self.values = values
+        self.rows = len(values)
+        self.blank = values.count("")
+        self.counts: Counter = Counter()
+        self.examples: Dict[str, str] = {}
+        self.numeric_values: Sequence[str] = ()
+        if self.blank:
+            self.counts["blank"] = self.blank
+        if self.blank < self.rows:
+            self._count()
+
+    def _count(self):
+        joined = "\n".join(self.values)
+        if joined.count("\n") != self.rows - 1:
+            # Quoted values with embedded newlines would break the line-based batch match
+            joined = "\n".join(v.replace("\n", " ").replace("\r", " ") for v in self.values)
+        for kind, pattern in _UNIFORM_CHECKS:
+            # A failing check usually stops at the first value of another type
+            if pattern.fullmatch(joined):
+                self._count_uniform(kind, joined)
+                return
+        self._count_distinct()
+
+    def _count_uniform(self, kind: str, joined: str):
+        present = self.rows - self.blank
+        non_blank = [v for v in self.values if v] if self.blank else self.values
+        example = non_blank[0]
+        if kind == "integer" and _LONG_DIGITS.search(joined):
+            longs = [v for v in non_blank if len(v) > 9 and not JVM_INT_MIN <= int(v) <= JVM_INT_MAX]
+            if longs:
+                self.counts["long"] = len(longs)
+                self.examples["long"] = longs[0]
+                present -= len(longs)
+        elif kind in ("date", "date_offset"):
+            # Report dates have very few distinct values per batch, so the calendar check is per distinct value
+            invalid = [v for v in set(non_blank) if not _valid_calendar_date(v)]
+            if invalid:
+                count = sum(self.values.count(v) for v in invalid)
+                self.counts["invalid_date"] = count
+                self.examples["invalid_date"] = invalid[0]
+                present -= count
+                if present:
+                    example = next(v for v in non_blank if v not in invalid)
+        elif kind == "decimal":
+            # The integer check failed on at least one value; the rest may still be integers, which asInt accepts
+            integers = [v for v in non_blank if "." not in v and "e" not in v and "E" not in v]
+            for value in integers:
+                integer_kind = "integer" if JVM_INT_MIN <= int(value) <= JVM_INT_MAX else "long"
+                self.counts[integer_kind] += 1
+                self.examples.setdefault(integer_kind, value)
+            present -= len(integers)
+            if integers and present:
+                example = next(v for v in non_blank if "." in v or "e" in v or "E" in v)
+        if present:
+            self.counts[kind] += present
+            self.examples.setdefault(kind, example)
+        if kind in NUMERIC_KINDS:
+            self.numeric_values = non_blank
+
+    def _count_distinct(self):
+        numeric = []
+        for value, count in Counter(self.values).items():
+            if value == "":
+                continue
+            kind = classify_value(value)
+            self.counts[kind] += count
+            self.examples.setdefault(kind, value)
+            if kind in NUMERIC_KINDS:
+                numeric.append(value)
+        self.numeric_values = numeric
+
+
+def inferred_type(counts: Counter) -> str:
+    """Narrowest type every present (non-blank, non-sentinel) value fits"""
+    present = sum(counts.values()) - counts["blank"] - counts["sentinel"]
+    if present <= 0:
+        return "empty"
+    integers = counts["integer"] + counts["long"]
+    if integers == present:
+        return "integer"
+    if integers + counts["decimal"] == present:
+        return "decimal"
+    if counts["date"] == present:
+        return "date"
+    dates = sum(n for kind, n in counts.items() if kind.startswith("date") or kind == "invalid_date")
+    if dates == present:
+        return "date (non-ISO)"
+    return "string"
+
+
+class _Conversion:
+    """One JVM conversion a column goes through, with its failure count and examples"""
+
+    def __init__(self, name: str, outcome: str, severity: str,
+                 ok_count: Callable[[ColumnBatch], int], accepts: Callable[[str], bool]):
+        self.name = name
+        self.outcome = outcome
+        self.severity = severity
+        self.ok_count = ok_count
+        self.accepts = accepts
+        self.failures = 0
+        self.examples: List[Dict[str, Any]] = []
+
+    def update(self, batch: ColumnBatch, first_row: int):
+        failed = batch.rows - self.ok_count(batch)
+        if failed <= 0:
+            return
+        self.failures += failed
+        if len(self.examples) < MAX_EXAMPLES:
+            # Per-value checks only run inside batches known to contain failures
+            for offset, value in enumerate(batch.values):
+                if not self.accepts(value):
+                    self.examples.append({"row": first_row + offset, "value": value})
+                    if len(self.examples) >= MAX_EXAMPLES:
+                        break
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "conversion": self.name,
+            "failures": self.failures,
+            "outcome": self.outcome,
+            "severity": self.severity,
+            "examples": self.examples,
+        }
+
+
+def _conversions_for(transformation: Optional[str], mapper_field: Optional[MapperField]) -> List[_Conversion]:
+    """Build the conversion chain FileParser and DataMapper apply to one column"""
+    conversions = []
+    transformation = (transformation or "").lower()
+    date_transform = transformation == "date:yyyy-mm-dd"
+    number_transform = transformation == "number"
+
+    if date_transform:
+        conversions.append(_Conversion(
+            "applyTransformation(date:yyyy-MM-dd)", "file FAILED (LocalDate.parse throws in FileParser)", "error",
+            lambda b: b.counts["date"] + b.counts["date_offset"], is_iso_date_with_offset))
+
+    if mapper_field is None:
+        return conversions
+
+    if mapper_field.key in ("institutionId", "institution_id"):
+        conversions.append(_Conversion(
+            "convertInstitutionId", "record dropped (blank institution ID)", "warning",
+            lambda b: b.rows - b.blank, bool))
+
+    kind = mapper_field.kind
+    if mapper_field.strict:
+        helper = {"int": "asInt", "decimal": "asBigDecimal", "date": "asLocalDate"}.get(kind)
+        outcome = f"record skipped ({helper} throws in DataMapper)"
+        severity = "error"
+    else:
+        helper = {"int": "getFieldAsInt", "decimal": "getFieldAsBigDecimal", "date": "getFieldAsLocalDate"}.get(kind)
+        default = {"int": "0", "decimal": "BigDecimal.ZERO", "date": "LocalDate.now()"}.get(kind)
+        outcome = f"silently defaulted to {default}"
+        severity = "warning"
+    if helper is None:
+        return conversions
+
+    if kind == "int":
+        if number_transform:
+            # applyTransformation("number") yields a Double, whose toString ("40.0") never parses as Int
+            conversions.append(_Conversion(
+                f"{helper} after number transformation", outcome, severity,
+                lambda b: 0, lambda v: False))
+        else:
+            conversions.append(_Conversion(helper, outcome, severity, lambda b: b.counts["integer"], is_jvm_int))
+    elif kind == "decimal":
+        conversions.append(_Conversion(
+            helper, outcome, severity,
+            lambda b: b.counts["integer"] + b.counts["long"] + b.counts["decimal"], is_jvm_decimal))
+    elif kind == "date" and not date_transform:
+        conversions.append(_Conversion(helper, outcome, severity, lambda b: b.counts["date"], is_iso_date))
+    return conversions
+
+
+class ColumnInference:
+    """Accumulated inference for one column"""
+
+    def __init__(self, name: str, transformation: Optional[str] = None, mapper_field: Optional[MapperField] = None):
+        self.name = name
+        self.transformation = transformation
+        self.trim = (transformation or "").lower() == "trim"
+        self.mapper_field = mapper_field
+        self.conversions = _conversions_for(transformation, mapper_field)
+        self.counts: Counter = Counter()
+        self.examples: Dict[str, str] = {}
+
+    def update(self, batch: ColumnBatch, first_row: int):
+        if self.trim and batch.counts["string"] and any(v != v.strip() for v in batch.values):
+            batch = ColumnBatch(tuple(map(str.strip, batch.values)))
+        self.counts.update(batch.counts)
+        for kind, value in batch.examples.items():
+            self.examples.setdefault(kind, value)
+        for conversion in self.conversions:
+            conversion.update(batch, first_row)
+
+    def to_dict(self) -> Dict[str, Any]:
+        non_iso = {kind[5:]: n for kind, n in self.counts.items() if kind.startswith("date:")}
+        return {
+            "name": self.name,
+            "inferred_type": inferred_type(self.counts),
+            "transformation": self.transformation,
+            "mapper_field": self.mapper_field.key if self.mapper_field else None,
+            "kinds": dict(self.counts),
+            "blank": self.counts["blank"],
+            "sentinels": self.counts["sentinel"],
+            "non_iso_date_formats": non_iso,
+            "non_iso_date_examples": {label: self.examples[f"date:{label}"] for label in non_iso},
+            "conversions": [c.to_dict() for c in self.conversions if c.failures],
+        }
+
+
+class ColumnarInferenceEngine:
+    """Runs batched inference over the columns of one file"""
+
+    def __init__(self, headers: Sequence[str], report_type: Optional[ReportType] = None):
+        self.headers = list(headers)
+        transformations = report_type.transformations() if report_type else {}
+        fields = {f.column: f for f in report_type.mapper_fields} if report_type else {}
+        self.columns = [ColumnInference(name, transformations.get(name), fields.get(name)) for name in self.headers]
+        self.missing_fields = [f for f in fields.values() if f.column not in self.headers]
+        self.report_type = report_type
+        self.rows = 0
+
+    def update_batches(self, batches: Sequence[ColumnBatch]):
+        """Fold one ColumnBatch per column into the inference"""
+        if not batches:
+            return
+        # Data starts on line 2 of the file
+        first_row = self.rows + 2
+        for column, batch in zip(self.columns, batches):
+            column.update(batch, first_row)
+        self.rows += batches[0].rows
+
+    def update(self, columns: Sequence[Sequence[str]]):
+        """Fold one transposed batch (one sequence of values per column) into the inference"""
+        self.update_batches([ColumnBatch(values) for values in columns])
+
+    def update_rows(self, rows: Sequence[Sequence[str]]):
+        width = len(self.headers)
+        padded = [row if len(row) == width else (list(row) + [""] * width)[:width] for row in rows]
+        if padded:
+            self.update(list(zip(*padded)))
+
+    def result(self) -> Dict[str, Any]:
+        missing = []
+        for f in self.missing_fields:
+            if f.strict:
+                outcome = "every record skipped (NullPointerException on missing key)"
+            elif f.required:
+                outcome = "every record dropped (missing institution ID)"
+            else:
+                outcome = "silently defaulted on every record"
+            missing.append({"key": f.key, "column": f.column, "outcome": outcome,
+                            "severity": "error" if f.strict or f.required else "warning"})
+        columns = [column.to_dict() for column in self.columns]
+        return {
+            "report_type": self.report_type.key if self.report_type else None,
+            "rows": self.rows,
+            "columns": columns,
+            "missing_mapper_fields": missing,
+            "file_would_fail": any(c["severity"] == "error" and c["conversion"].startswith("applyTransformation")
+                                   for column in columns for c in column["conversions"]),
+        }
+
+
+def infer_rows(headers: Sequence[str], rows: Iterable[Sequence[str]],
+               report_type: Optional[ReportType] = None, chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Dict[str, Any]:
+    """Run the engine over an iterable of rows in fixed-size chunks"""
+    engine = ColumnarInferenceEngine(headers, report_type)
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, chunk_rows))
+        if not chunk:
+            break
+        engine.update_rows(chunk)
+    return engine.result()
+
+
+def infer_file(file_path: str, report_type: Optional[ReportType] = None,
+               chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Dict[str, Any]:
+    """Stream a CSV file through the engine"""
+    with open(file_path, "r", newline="", encoding="utf-8-sig", errors="replace", buffering=1 << 20) as f:
+        reader = csv.reader(f)
+        headers = next(reader, None)
+        if headers is None:
+            return {"error": f"Empty file: {file_path}"}
+        return infer_rows(headers, reader, report_type, chunk_rows)
@@ -0,0 +1,277 @@
+"""
+Institution ID coverage pre-check mirroring DataMapper.convertInstitutionId.
+The JVM resolves every record with two BankOrTPP lookups and a converter lookup, and dumps every
+mapping and bank to the log on a miss. Here the converter table and the bank list are loaded into
+dicts once, the institution column is streamed in a single pass, and every distinct ID is resolved
+once, so files with tens of millions of rows show their drops before they reach the backend.
+"""
+
+import csv
+import itertools
+import json
+import operator
+import os
+import re
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from payrep_tools.header_index import HeaderIndex, MappingSnapshot
+from payrep_tools.report_types import INSTITUTION_CODES, REPORT_TYPES, ReportType
+
+DEFAULT_BATCH_ROWS = 50000
+DROPPED_ROW_EXAMPLES = 20
+
+# Outcome -> whether saveData skips the record
+OUTCOMES = {
+    "converted": False,  # converter mapping found, target bank exists
+    "as_is": False,  # converter disabled, the ID is a bank code
+    "unmapped_as_is": False,  # converter enabled but no mapping; the ID happens to be a bank code
+    "missing": True,  # no institution column in the record (unresolved mapping or short row)
+    "blank": True,
+    "unknown_processor": True,
+    "duplicate_mapping": True,  # findBySourceInstitutionIdAndProcessorCode throws on two rows
+    "unknown_target": True,  # converter target code is not a bank
+    "unmapped_unknown": True,  # converter enabled, no mapping, and the ID is not a bank code
+    "unknown_code": True,  # converter disabled and the ID is not a bank code
+}
+
+
+def jvm_double_string(value: float) -> str:
+    """Kotlin Double.toString for the values applyTransformation("number") produces"""
+    if value != value or value in (float("inf"), float("-inf")):
+        return "NaN" if value != value else ("Infinity" if value > 0 else "-Infinity")
+    if value == 0 or 1e-3 <= abs(value) < 1e7:
+        return repr(value)
+    # Outside [1e-3, 1e7) Java switches to computerized scientific notation: 1.2345678E7
+    sign, digits, exponent = Decimal(repr(value)).as_tuple()
+    digits = "".join(map(str, digits)).rstrip("0") or "0"
+    scientific = len(Decimal(repr(abs(value))).as_tuple().digits) + exponent - 1
+    return f"{'-' if sign else ''}{digits[0]}.{digits[1:] or '0'}E{scientific}"
+
+
+def apply_transformation(value: str, transformation: Optional[str]) -> str:
+    """String form of FileParser.applyTransformation's result, as DataMapper's toString sees it"""
+    transformation = (transformation or "").lower()
+    if transformation == "trim":
+        return value.strip()
+    if transformation == "uppercase":
+        return value.upper()
+    if transformation == "number" and _JVM_DOUBLE_RE.fullmatch(value):
+        return jvm_double_string(float(value.rstrip("fFdD")))
+    return value
+
+
+# What String.toDoubleOrNull accepts, besides hex literals
+_JVM_DOUBLE_RE = re.compile(r"[+-]?(NaN|Infinity|(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?[fFdD]?)")
+
+
+@dataclass
+class ConverterTable:
+    """BankOrTPP codes and institution ID converter rows, indexed the way convertInstitutionId looks them up"""
+    banks: Dict[str, str] = field(default_factory=dict)  # code -> name
+    use_converter: Dict[str, bool] = field(default_factory=dict)
+    converters: Dict[Tuple[str, str], str] = field(default_factory=dict)  # (processor, source ID) -> target code
+    duplicates: Set[Tuple[str, str]] = field(default_factory=set)
+    source: str = "converter table"
+
+    def add_converter(self, processor_code: str, source_id: str, target_code: str):
+        key = (processor_code, source_id)
+        if key in self.converters:
+            self.duplicates.add(key)
+        self.converters[key] = target_code
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], source: str = "converter table") -> "ConverterTable":
+        """Exported table ({"banks": [...], "converters": [...]}) or a provisioning manifest"""
+        table = cls(source=source)
+        if any("fileConfigs" in bank or "converters" in bank for bank in data.get("banks", [])):
+            # Manifest: its banks/TPPs on top of the banks DataSeederService creates
+            for code in INSTITUTION_CODES:
+                table.banks[code] = code
+            for bank in data["banks"]:
+                table.banks[bank["code"]] = bank.get("name", bank["code"])
+                table.use_converter[bank["code"]] = bool(bank.get("useConverter", False))
+                for converter in bank.get("converters", []):
+                    table.add_converter(bank["code"], converter["sourceInstitutionId"],
+                                        converter["targetBankOrTppCode"])
+            return table
+        for bank in data.get("banks", []):
+            table.banks[bank["code"]] = bank.get("name", bank["code"])
+            table.use_converter[bank["code"]] = bool(bank.get("useConverter", False))
+        for converter in data.get("converters", []):
+            table.add_converter(converter["processorCode"], converter["sourceInstitutionId"],
+                                converter["targetBankOrTppCode"])
+        return table
+
+    @classmethod
+    def load(cls, path: str) -> "ConverterTable":
+        with open(path, "r") as f:
+            return cls.from_dict(json.load(f), source=path)
+
+    @classmethod
+    def from_api(cls, client) -> "ConverterTable":
+        """Read /api/admin/institution-converter and its banks-and-tpps list through an AdminClient"""
+        settings, converters = client.map(lambda fetch: fetch(), [client.converter_settings, client.converters])
+        return cls.from_dict({"banks": settings, "converters": converters}, source=client.base_url)
+
+    def resolve(self, value: Optional[str], processor_code: str) -> Tuple[str, Optional[str]]:
+        """(outcome, resolved bank code) for one transformed institution ID"""
+        if value is None:
+            return "missing", None
+        if not value.strip():
+            return "blank", None
+        if processor_code not in self.banks:
+            return "unknown_processor", None
+        if self.use_converter.get(processor_code, False):
+            key = (processor_code, value)
+            if key in self.duplicates:
+                return "duplicate_mapping", None
+            target = self.converters.get(key)
+            if target is not None:
+                return ("converted", target) if target in self.banks else ("unknown_target", target)
+            return ("unmapped_as_is", value) if value in self.banks else ("unmapped_unknown", value)
+        return ("as_is", value) if value in self.banks else ("unknown_code", value)
+
+
+def export_converter_table(banks: List[Dict[str, Any]], converters: List[Dict[str, Any]], path: str) -> str:
+    """Write banks-and-tpps and InstitutionIdConverterDto responses as a converter table"""
+    with open(path, "w") as f:
+        json.dump({"exportedAt": datetime.now().isoformat(), "banks": banks, "converters": converters}, f, indent=2)
+    return path
+
+
+def institution_column(headers: List[str], report_type: ReportType, header_index: HeaderIndex,
+                       file_name: str = "") -> Dict[str, Any]:
+    """Which column ends up under the record key the report type's DataMapper reads the institution ID from"""
+    field_ = next(f for f in report_type.mapper_fields if f.column == "institution_id")
+    if field_.strict:
+        # this["institution_id"]!! - a literal key, anything else throws and the record is skipped
+        keys = [field_.key]
+        accessor = f'this["{field_.key}"]!!'
+    else:
+        # getFieldAsString("institutionId") tries the key, its snake_case and its camelCase form
+        keys = list(dict.fromkeys([field_.key, field_.column]))
+        accessor = f'getFieldAsString("{field_.key}")'
+
+    mappings = header_index.snapshot.mappings_for(file_name, report_type)
+    resolution = header_index.resolve(headers, mappings)
+    by_field = {entry["field_name"]: entry for entry in resolution["mappings"] if entry["index"] is not None}
+    for key in keys:
+        entry = by_field.get(key)
+        if entry is not None:
+            return {"accessor": accessor, "record_key": key, "header": entry["header"], "index": entry["index"],
+                    "route": entry["route"], "transformation": entry["transformation"]}
+    candidates = [e["field_name"] for e in resolution["mappings"] if e["column_name"] == "institution_id"]
+    return {"accessor": accessor, "record_key": None, "header": None, "index": None, "route": "unresolved",
+            "transformation": None, "mapped_field_names": candidates}
+
+
+class InstitutionCoverageCheck:
+    """Single-pass institution ID coverage for report files"""
+
+    def __init__(self, table: ConverterTable, snapshot: Optional[MappingSnapshot] = None,
+                 batch_rows: int = DEFAULT_BATCH_ROWS, examples: int = DROPPED_ROW_EXAMPLES):
+        self.table = table
+        self.header_index = HeaderIndex(snapshot or MappingSnapshot.seeded(REPORT_TYPES))
+        self.batch_rows = batch_rows
+        self.examples = examples
+
+    def check(self, file_path: str, report_type: ReportType, processor_code: str,
+              dropped_rows_path: Optional[str] = None) -> Dict[str, Any]:
+        """Stream the file once; dropped record numbers match FileIngestionService's 'Processing record N'"""
+        started = time.perf_counter()
+        with open(file_path, "r", newline="", encoding="utf-8-sig", errors="replace", buffering=1 << 20) as f:
+            reader = csv.reader(f)
+            headers = next(reader, None)
+            if headers is None:
+                return {"error": f"Empty file: {file_path}"}
+            column = institution_column(headers, report_type, self.header_index, os.path.basename(file_path))
+            index = column["index"]
+            get_value = operator.itemgetter(index) if index is not None else None
+            transformation = column["transformation"]
+
+            counts: Counter = Counter()
+            resolved: Dict[Optional[str], Tuple[str, Optional[str]]] = {}
+            dropping: Set[Optional[str]] = set()
+            examples: Dict[Optional[str], List[int]] = defaultdict(list)
+            dropped_out = open(dropped_rows_path, "w", newline="") if dropped_rows_path else None
+            dropped_writer = csv.writer(dropped_out) if dropped_out else None
+            if dropped_writer:
+                dropped_writer.writerow(["record", "institution_id", "outcome"])
+            rows = 0
+            try:
+                while True:
+                    batch = list(itertools.islice(reader, self.batch_rows))
+                    if not batch:
+                        break
+                    if index is None:
+                        values = [None] * len(batch)
+                    else:
+                        try:
+                            values = list(map(get_value, batch))
+                        except IndexError:
+                            # FileParser leaves the key out of records whose row is too short
+                            values = [row[index] if index < len(row) else None for row in batch]
+                    batch_counts = Counter(values)
+                    counts.update(batch_counts)
+
+                    # Each distinct raw value is transformed and looked up once per file
+                    for value in batch_counts.keys() - resolved.keys():
+                        outcome = self.table.resolve(
+                            apply_transformation(value, transformation) if value is not None else None, processor_code)
+                        resolved[value] = outcome
+                        if OUTCOMES[outcome[0]]:
+                            dropping.add(value)
+                    # Record numbers are only collected while they are still needed
+                    wanted = {value for value in dropping.intersection(batch_counts)
+                              if dropped_writer or len(examples[value]) < self.examples}
+                    if wanted:
+                        for offset, value in enumerate(values):
+                            if value in wanted:
+                                record = rows + offset + 1
+                                if len(examples[value]) < self.examples:
+                                    examples[value].append(record)
+                                if dropped_writer:
+                                    dropped_writer.writerow([record, value if value is not None else "",
+                                                             resolved[value][0]])
+                    rows += len(batch)
+            finally:
+                if dropped_out:
+                    dropped_out.close()
+
+        outcomes: Counter = Counter()
+        ids = []
+        for value, count in counts.most_common():
+            outcome, code = resolved[value]
+            outcomes[outcome] += count
+            entry = {"institution_id": value, "rows": count, "outcome": outcome, "resolved_code": code,
+                     "bank_name": self.table.banks.get(code) if code else None, "dropped": OUTCOMES[outcome]}
+            if value in examples:
+                entry["dropped_row_examples"] = examples[value]
+            ids.append(entry)
+
+        converter_enabled = self.table.use_converter.get(processor_code, False)
+        dropped = sum(count for outcome, count in outcomes.items() if OUTCOMES[outcome])
+        elapsed = time.perf_counter() - started
+        return {
+            "file": file_path,
+            "report_type": report_type.key,
+            "processor_code": processor_code,
+            "converter_enabled": converter_enabled,
+            "table_source": self.table.source,
+            "column": column,
+            "rows": rows,
+            "distinct_ids": len(counts),
+            "converter_hits": outcomes["converted"] + outcomes["unknown_target"] if converter_enabled else 0,
+            "converter_misses": outcomes["unmapped_as_is"] + outcomes["unmapped_unknown"] if converter_enabled else 0,
+            "outcomes": dict(outcomes),
+            "dropped_rows": dropped,
+            "dropped_rows_file": dropped_rows_path,
+            "ids": ids,
+            "elapsed_seconds": round(elapsed, 3),
+            "rows_per_second": round(rows / elapsed) if elapsed else rows,
+        }
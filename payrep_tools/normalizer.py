@@ -0,0 +1,216 @@
+"""
+Streaming encoding and dialect normalizer for processor files.
+FileParser.parseCsvFile reads with a default-charset FileReader and opencsv defaults (comma, double quote), so a BOM
+ends up in the first header, Windows-1256 text is garbled, a semicolon file is one column wide, and a quoted
+"1,234.50" fails BigDecimal. The encoding and dialect are detected from a byte sample and the file is rewritten as
+UTF-8, comma-separated, LF-terminated, in chunks that hold at most one read buffer in memory. Comma files are
+transcoded chunk by chunk without parsing records; other delimiters go through csv so fields get requoted. What was
+changed is returned per file, so the fast scan, compare_structures and the cron all see the same format.
+Thousands separators are only stripped on request: the quoted field is not typed here, and a "002,004" code list
+looks like a grouped number.
+"""
+
+import codecs
+import csv
+import io
+import os
+import re
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional
+
+from payrep_tools.fast_scan import BOMS, DELIMITERS, SAMPLE_BYTES, sample_encoding
+
+STAGING_DIR = os.path.join(".normalize", "staging")
+READ_BUFFER_BYTES = 1 << 20
+# Processors outside UTF-8 send Arabic text in the Windows code page
+DEFAULT_FALLBACK_ENCODING = "cp1256"
+DIALECT_SAMPLE_RECORDS = 100
+# A quoted field holding a grouped number, e.g. "1,234" or "-12,345.50"; the field start is checked per match,
+# since a leading lookbehind makes the search several times slower
+_QUOTED_GROUPED_NUMBER = re.compile(r'"(-?\d{1,3}(?:,\d{3})+(?:\.\d+)?)"(?![^,\r\n])')
+# The codec that decodes each BOM also drops it
+_BOM_CODECS = {"utf-8-sig": "utf-8-sig", "utf-16-le": "utf-16", "utf-16-be": "utf-16"}
+
+
+@dataclass
+class Dialect:
+    encoding: str  # codec the file is decoded with
+    bom: Optional[str]
+    guessed: bool  # not UTF-8 and no BOM: the fallback encoding is assumed
+    delimiter: str
+    line_endings: Optional[str]
+
+
+def _text_line_endings(text: str) -> Optional[str]:
+    crlf = text.count("\r\n")
+    lf = text.count("\n") - crlf
+    cr = text.count("\r") - crlf
+    kinds = [name for name, count in (("CRLF", crlf), ("LF", lf), ("CR", cr)) if count]
+    return "mixed" if len(kinds) > 1 else kinds[0] if kinds else None
+
+
+def _delimiter(text: str) -> str:
+    """The candidate giving the most records with the header's field count, then the widest header"""
+    best, best_score = ",", (0, 0)
+    for delimiter in DELIMITERS:
+        rows = []
+        for row in csv.reader(io.StringIO(text, newline=""), delimiter=delimiter):
+            rows.append(row)
+            if len(rows) > DIALECT_SAMPLE_RECORDS:
+                break
+        if not rows or len(rows[0]) < 2:
+            continue
+        score = (sum(1 for row in rows[1:] if len(row) == len(rows[0])), len(rows[0]))
+        if score > best_score:
+            best, best_score = delimiter, score
+    return best
+
+
+def detect_dialect(file_path: str, fallback_encoding: str = DEFAULT_FALLBACK_ENCODING,
+                   encoding: Optional[str] = None) -> Dialect:
+    """Encoding, delimiter and line endings from the first SAMPLE_BYTES of a file"""
+    with open(file_path, "rb") as f:
+        sample = f.read(SAMPLE_BYTES)
+    bom = next((name for marker, name in BOMS if sample.startswith(marker)), None)
+    guessed = False
+    if bom:
+        # A BOM settles the encoding, and only its codec drops the BOM
+        encoding = _BOM_CODECS[bom]
+    elif encoding is None:
+        if sample_encoding(sample, None) in ("ascii", "utf-8"):
+            encoding = "utf-8"
+        else:
+            encoding, guessed = fallback_encoding, True
+    text = sample.decode(encoding, "replace")
+    if len(sample) == SAMPLE_BYTES and "\n" in text:
+        # The last line of a full sample is cut off
+        text = text[:text.rindex("\n") + 1]
+    return Dialect(encoding, bom, guessed, _delimiter(text), _text_line_endings(text))
+
+
+def changes_for(dialect: Dialect) -> List[str]:
+    """What normalizing a file in this dialect changes, before looking at its values"""
+    changes = []
+    if dialect.bom:
+        changes.append(f"removed {dialect.bom} BOM")
+    if codecs.lookup(dialect.encoding).name not in ("utf-8", "utf-8-sig"):
+        changes.append(f"transcoded {dialect.encoding}{' (guessed)' if dialect.guessed else ''} to utf-8")
+    if dialect.delimiter != ",":
+        changes.append(f"delimiter {dialect.delimiter!r} to ','")
+    if dialect.line_endings in ("CRLF", "CR", "mixed"):
+        changes.append(f"{dialect.line_endings} line endings to LF")
+    return changes
+
+
+def normalize_file(file_path: str, output_dir: str, fallback_encoding: str = DEFAULT_FALLBACK_ENCODING,
+                   encoding: Optional[str] = None, strip_thousands: bool = False) -> Dict[str, Any]:
+    """Write output_dir/<name> as UTF-8 comma-separated LF-terminated CSV and return what changed"""
+    started = time.perf_counter()
+    dialect = detect_dialect(file_path, fallback_encoding, encoding)
+    file_name = os.path.basename(file_path)
+    staging_dir = os.path.join(output_dir, STAGING_DIR)
+    os.makedirs(staging_dir, exist_ok=True)
+    staged = os.path.join(staging_dir, file_name)
+
+    with open(staged, "wb", buffering=READ_BUFFER_BYTES) as out:
+        if dialect.delimiter == "," and dialect.line_endings != "CR":
+            counts = _transcode(file_path, out, dialect, strip_thousands)
+            mode = "stream"
+        else:
+            counts = _rewrite(file_path, out, dialect, strip_thousands)
+            mode = "records"
+    # Rename into place only when complete, so the cron never picks up a half-written file
+    output_path = os.path.join(output_dir, file_name)
+    os.replace(staged, output_path)
+
+    changes = changes_for(dialect)
+    if counts["thousands_separators"]:
+        changes.append(f"removed thousands separators from {counts['thousands_separators']:,} quoted numbers")
+    if counts["replacement_characters"]:
+        changes.append(f"{counts['replacement_characters']:,} undecodable bytes replaced with U+FFFD")
+    elapsed = time.perf_counter() - started
+    size = os.path.getsize(file_path)
+    return {
+        "file": file_path,
+        "output": output_path,
+        "dialect": asdict(dialect),
+        "mode": mode,
+        "changes": changes,
+        "changed": bool(changes),
+        **counts,
+        "bytes": size,
+        "output_bytes": os.path.getsize(output_path),
+        "elapsed_seconds": round(elapsed, 3),
+        "mb_per_second": round(size / (1 << 20) / elapsed, 1) if elapsed else 0.0
+    }
+
+
+def _transcode(file_path: str, out, dialect: Dialect, strip_thousands: bool) -> Dict[str, int]:
+    """Comma files: decode, fix and re-encode whole lines per read buffer, without parsing records"""
+    decoder = codecs.getincrementaldecoder(dialect.encoding)("replace")
+    counts = {"thousands_separators": 0, "replacement_characters": 0}
+    crlf = dialect.line_endings in ("CRLF", "mixed")
+    pending = ""
+
+    def strip(match) -> str:
+        start = match.start()
+        if start and match.string[start - 1] not in ",\n":
+            return match.group()
+        counts["thousands_separators"] += 1
+        return match.group(1).replace(",", "")
+
+    def convert(text: str) -> bytes:
+        counts["replacement_characters"] += text.count("\ufffd")
+        if crlf:
+            text = text.replace("\r\n", "\n")
+        if strip_thousands and '"' in text:
+            text = _QUOTED_GROUPED_NUMBER.sub(strip, text)
+        return text.encode("utf-8")
+
+    with open(file_path, "rb", buffering=0) as f:
+        for block in iter(lambda: f.read(READ_BUFFER_BYTES), b""):
+            text = pending + decoder.decode(block)
+            # Cut after the last newline so a CRLF pair or a quoted number never straddles two buffers
+            cut = text.rfind("\n") + 1
+            if cut:
+                out.write(convert(text[:cut]))
+                text = text[cut:]
+            pending = text
+        pending += decoder.decode(b"", final=True)
+        if pending:
+            out.write(convert(pending))
+    return counts
+
+
+def _rewrite(file_path: str, out, dialect: Dialect, strip_thousands: bool) -> Dict[str, int]:
+    """Other delimiters and CR line endings: parse records so fields with commas get quoted"""
+    counts = {"thousands_separators": 0, "replacement_characters": 0}
+    # Only quoted numbers are stripped: csv.reader drops the quotes, so they are unquoted in the raw lines first.
+    # An unquoted 12,500 in a semicolon file is a decimal comma, not a thousands separator
+    delimiter = re.escape(dialect.delimiter)
+    quoted_number = re.compile(r'"(-?\d{1,3}(?:,\d{3})+(?:\.\d+)?)"(?![^' + delimiter + r'\r\n])')
+
+    def strip(match) -> str:
+        start = match.start()
+        if start and match.string[start - 1] != dialect.delimiter:
+            return match.group()
+        counts["thousands_separators"] += 1
+        return match.group(1).replace(",", "")
+
+    def lines(f):
+        for line in f:
+            yield quoted_number.sub(strip, line) if '"' in line else line
+
+    text_out = io.TextIOWrapper(out, encoding="utf-8", newline="", write_through=False)
+    with open(file_path, "r", encoding=dialect.encoding, errors="replace", newline="",
+              buffering=READ_BUFFER_BYTES) as f:
+        writer = csv.writer(text_out, lineterminator="\n")
+        for row in csv.reader(lines(f) if strip_thousands else f, delimiter=dialect.delimiter):
+            for value in row:
+                if "\ufffd" in value:
+                    counts["replacement_characters"] += value.count("\ufffd")
+            writer.writerow(row)
+    text_out.flush()
+    text_out.detach()
+    return counts
@@ -0,0 +1,148 @@
+"""
+Banks/TPPs and the drop files the ingestion cron would pick up for them.
+A processor is its code, name and file configs (directory, fileNamePattern, fileType). Processors come from a
+provisioning manifest, from the subdirectories of a drop root, or default to TPP 901, so one run of the analysis
+engine covers every processor instead of one script copy per TPP. Files are listed the way
+FileIngestionService.processConfig lists them and classified the way determineEntityTypeFromFileName does.
+"""
+
+import os
+import re
+from dataclasses import dataclass, replace
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from payrep_tools.report_types import (REPORT_TYPES, TPP_901_FILE_TYPES, ReportType, report_type_by_file_type,
+                                       report_type_by_key)
+
+# determineEntityTypeFromFileName checks these substrings in this order, ignoring case
+ENTITY_TYPE_TOKENS = ("atm_terminal_data", "atm_transaction_data", "card_lifecycle", "ecommerce_card_activity",
+                      "pos_terminal_data", "pos_transaction_data", "transaction_volume")
+UNKNOWN_ENTITY_TYPE = "Unknown"
+REPORT_DATE_RE = re.compile(r"\d{4}-?\d{2}-?\d{2}")
+VERDICT_SUFFIX = ".verdict.json"  # drop_watch writes these next to the report files
+ARCHIVE_DIR = "archive"  # processFile moves ingested files into <directoryPath>/archive
+
+
+def entity_type_for_file_name(file_name: str) -> str:
+    """The entity type saveData stores a file's records as; "Unknown" means every record is dropped"""
+    name = file_name.lower()
+    for token in ENTITY_TYPE_TOKENS:
+        if token in name:
+            return report_type_by_key(token).file_type
+    return UNKNOWN_ENTITY_TYPE
+
+
+def compare_headers(headers: Sequence[str], template_headers: Sequence[str]) -> Dict[str, Any]:
+    """Header names shared with, missing from and extra to the template, with their Jaccard score"""
+    present, expected = set(headers), set(template_headers)
+    union = present | expected
+    return {"matching": sorted(present & expected), "missing": sorted(expected - present),
+            "extra": sorted(present - expected), "score": len(present & expected) / len(union) if union else 0}
+
+
+@dataclass(frozen=True)
+class FileConfig:
+    directory: str
+    file_name_pattern: str
+    file_type: str
+    report_type: Optional[ReportType]  # None for fileTypes outside the report type registry
+
+    def matches(self, file_name: str) -> bool:
+        return re.fullmatch(self.file_name_pattern, file_name) is not None
+
+
+@dataclass(frozen=True)
+class Processor:
+    code: str
+    name: str
+    configs: Tuple[FileConfig, ...]
+
+    @property
+    def directories(self) -> List[str]:
+        return sorted({config.directory for config in self.configs})
+
+    @property
+    def report_types(self) -> List[ReportType]:
+        return [config.report_type for config in self.configs if config.report_type]
+
+    def drop_files(self) -> Tuple[List[Tuple[str, FileConfig]], List[str]]:
+        """Files each config picks up (top level of its directory only, like processConfig) and files none does"""
+        matched = []
+        claimed = set()
+        listings = {}
+        for config in self.configs:
+            if config.directory not in listings:
+                try:
+                    listings[config.directory] = sorted(
+                        entry.name for entry in os.scandir(config.directory) if entry.is_file())
+                except OSError:
+                    listings[config.directory] = []
+            for name in listings[config.directory]:
+                if config.matches(name):
+                    path = os.path.join(config.directory, name)
+                    matched.append((path, config))
+                    claimed.add(path)
+        unmatched = [os.path.join(directory, name) for directory, names in listings.items() for name in names
+                     if os.path.join(directory, name) not in claimed and not name.endswith(VERDICT_SUFFIX)]
+        return matched, unmatched
+
+    def archived_files(self) -> List[Tuple[str, FileConfig]]:
+        """Files each config's archive directory holds, matched the same way as drop files"""
+        archive = Processor(self.code, self.name, tuple(
+            replace(config, directory=os.path.join(config.directory, ARCHIVE_DIR)) for config in self.configs))
+        return archive.drop_files()[0]
+
+    def latest_files(self) -> Dict[FileConfig, str]:
+        """Newest file per config, by the report date in its name"""
+        latest = {}
+        for path, config in self.drop_files()[0]:
+            name = os.path.basename(path)
+            dated = REPORT_DATE_RE.search(name)
+            key = (dated.group().replace("-", "") if dated else "", name)
+            if config not in latest or key > latest[config][0]:
+                latest[config] = (key, path)
+        return {config: path for config, (_, path) in latest.items()}
+
+
+def tpp_901(directory: str = "sample-data/901") -> Processor:
+    """TPP 901 (Tadawul) with the report types it sends, as TPP901Tester configures it"""
+    return Processor("901", "Tadawul TPP", tuple(
+        FileConfig(directory, report_type.file_name_pattern, report_type.file_type, report_type)
+        for report_type in map(report_type_by_file_type, TPP_901_FILE_TYPES)))
+
+
+def processors_from_manifest(path: str) -> List[Processor]:
+    """Every bank/TPP in a provisioning manifest with the file configs it would provision"""
+    from payrep_tools.admin_client import Manifest
+    manifest = Manifest.load(path)
+    processors = []
+    for bank in manifest.banks:
+        configs = tuple(
+            FileConfig(config["directoryPath"], config["fileNamePattern"], config["fileType"],
+                       report_type or report_type_by_file_type(config["fileType"]))
+            for config, report_type in manifest.file_configs(bank))
+        processors.append(Processor(bank["code"], bank.get("name", bank["code"]), configs))
+    return processors
+
+
+def processors_from_root(root: str) -> List[Processor]:
+    """One processor per subdirectory of a drop root, named by its code, with all seven report types"""
+    processors = []
+    for entry in sorted(os.scandir(root), key=lambda e: e.name):
+        if entry.is_dir() and entry.name != ARCHIVE_DIR:
+            processors.append(Processor(entry.name, entry.name, tuple(
+                FileConfig(entry.path, report_type.file_name_pattern, report_type.file_type, report_type)
+                for report_type in REPORT_TYPES)))
+    return processors
+
+
+def select_processors(manifest: Optional[str] = None, root: Optional[str] = None,
+                      codes: Optional[Sequence[str]] = None) -> List[Processor]:
+    """Processors of a manifest, else of a drop root, else TPP 901; narrowed to codes if given"""
+    if manifest:
+        processors = processors_from_manifest(manifest)
+    elif root:
+        processors = processors_from_root(root)
+    else:
+        processors = [tpp_901()]
+    return [processor for processor in processors if not codes or processor.code in codes]
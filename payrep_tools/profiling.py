@@ -0,0 +1,203 @@
+"""
+Streaming column profiler for processor report files.
+Reads a CSV once in fixed-size row batches and keeps per-column statistics in bounded memory,
+so multi-GB daily drops can be profiled end to end instead of from the first few rows.
+"""
+
+import csv
+import hashlib
+import itertools
+import math
+import os
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from payrep_tools.inference import ColumnarInferenceEngine, ColumnBatch, inferred_type
+from payrep_tools.report_types import ReportType
+
+DEFAULT_BATCH_ROWS = 20000
+EXACT_DISTINCT_LIMIT = 4096
+HLL_PRECISION = 12
+
+_DATE_LABELS = {"date": "yyyy-MM-dd", "date_offset": "yyyy-MM-dd+offset", "invalid_date": "yyyy-MM-dd (invalid)"}
+
+
+class HyperLogLog:
+    """Fixed-size distinct-count sketch; registers are mergeable across files and processes"""
+
+    def __init__(self, precision: int = HLL_PRECISION, registers: Optional[bytearray] = None):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = registers if registers is not None else bytearray(self.size)
+
+    @staticmethod
+    def hash_value(value: str) -> int:
+        return int.from_bytes(hashlib.blake2b(value.encode("utf-8", "surrogatepass"), digest_size=8).digest(), "big")
+
+    def add(self, value: str):
+        self.add_hash(self.hash_value(value))
+
+    def add_hash(self, h: int):
+        """Add a 64-bit hash from hash_value"""
+        index = h >> (64 - self.precision)
+        rest = h & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog"):
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def estimate(self) -> int:
+        m = self.size
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if raw <= 2.5 * m and zeros:
+            return round(m * math.log(m / zeros))
+        return round(raw)
+
+
+class ColumnStats:
+    """Running statistics for one CSV column"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.count = 0
+        self.kinds: Counter = Counter()
+        self.examples: Dict[str, str] = {}
+        self.numeric_min: Optional[float] = None
+        self.numeric_max: Optional[float] = None
+        self.text_min: Optional[str] = None
+        self.text_max: Optional[str] = None
+        self.distinct: Optional[set] = set()
+        self.sketch: Optional[HyperLogLog] = None
+
+    def update(self, batch: ColumnBatch):
+        """Fold one batch of column values into the statistics"""
+        self.count += batch.rows
+        self.kinds.update(batch.counts)
+        for kind, value in batch.examples.items():
+            self.examples.setdefault(kind, value)
+        if batch.blank == batch.rows:
+            return
+        values = batch.values
+        non_null = [v for v in values if v] if batch.blank else values
+
+        if batch.numeric_values:
+            numbers = list(map(float, batch.numeric_values))
+            low, high = min(numbers), max(numbers)
+            self.numeric_min = low if self.numeric_min is None else min(self.numeric_min, low)
+            self.numeric_max = high if self.numeric_max is None else max(self.numeric_max, high)
+
+        low, high = min(non_null), max(non_null)
+        self.text_min = low if self.text_min is None or low < self.text_min else self.text_min
+        self.text_max = high if self.text_max is None or high > self.text_max else self.text_max
+
+        if self.distinct is not None:
+            self.distinct.update(non_null)
+            if len(self.distinct) > EXACT_DISTINCT_LIMIT:
+                self.sketch = HyperLogLog()
+                for value in self.distinct:
+                    self.sketch.add(value)
+                self.distinct = None
+        else:
+            for value in set(non_null):
+                self.sketch.add(value)
+
+    @property
+    def null_count(self) -> int:
+        return self.kinds["blank"]
+
+    def inferred_type(self) -> str:
+        return inferred_type(self.kinds)
+
+    def _date_kinds(self) -> Dict[str, str]:
+        """date kind -> format label for the date kinds seen in this column"""
+        return {kind: _DATE_LABELS.get(kind, kind[5:]) for kind in self.kinds
+                if kind in _DATE_LABELS or kind.startswith("date:")}
+
+    def to_dict(self) -> Dict[str, Any]:
+        inferred = self.inferred_type()
+        numeric = inferred in ("integer", "decimal")
+        date_kinds = self._date_kinds()
+        return {
+            "name": self.name,
+            "inferred_type": inferred,
+            "null_count": self.null_count,
+            "null_rate": self.null_count / self.count if self.count else 0.0,
+            "min": self.numeric_min if numeric else self.text_min,
+            "max": self.numeric_max if numeric else self.text_max,
+            "distinct_estimate": len(self.distinct) if self.distinct is not None else self.sketch.estimate(),
+            "distinct_exact": self.distinct is not None,
+            "date_formats": {label: self.kinds[kind] for kind, label in date_kinds.items()},
+            "date_examples": {label: self.examples[kind] for kind, label in date_kinds.items()},
+        }
+
+
+class StreamingProfiler:
+    """Profiles a whole CSV file in one pass with bounded memory"""
+
+    def __init__(self, batch_rows: int = DEFAULT_BATCH_ROWS, sample_size: int = 5):
+        self.batch_rows = batch_rows
+        self.sample_size = sample_size
+
+    def profile(self, file_path: str, report_type: Optional[ReportType] = None) -> Dict[str, Any]:
+        """Return headers, the first few rows, per-column statistics and JVM conversion checks for the file"""
+        started = time.perf_counter()
+        file_size = os.path.getsize(file_path)
+
+        with open(file_path, "r", newline="", encoding="utf-8-sig", errors="replace", buffering=1 << 20) as f:
+            reader = csv.reader(f)
+            headers = next(reader, None)
+            if headers is None:
+                return {"error": f"Empty file: {file_path}"}
+
+            width = len(headers)
+            columns = [ColumnStats(name) for name in headers]
+            inference = ColumnarInferenceEngine(headers, report_type)
+            sample_rows: List[List[str]] = []
+            row_count = 0
+            ragged_rows = 0
+
+            while True:
+                batch = list(itertools.islice(reader, self.batch_rows))
+                if not batch:
+                    break
+                # Blank lines, trailing ones included, hold no record: they are neither rows nor ragged
+                batch = [row for row in batch if row]
+                if not batch:
+                    continue
+                if len(sample_rows) < self.sample_size:
+                    sample_rows.extend(batch[:self.sample_size - len(sample_rows)])
+                row_count += len(batch)
+
+                ragged = sum(1 for row in batch if len(row) != width)
+                if ragged:
+                    ragged_rows += ragged
+                    # FileParser skips indices past the end of short rows, so pad them as blanks
+                    batch = [row if len(row) == width else (row + [""] * width)[:width] for row in batch]
+
+                batches = [ColumnBatch(values) for values in zip(*batch)]
+                for stats, column_batch in zip(columns, batches):
+                    stats.update(column_batch)
+                inference.update_batches(batches)
+
+        elapsed = time.perf_counter() - started
+        return {
+            "headers": headers,
+            "header_count": width,
+            "sample_rows": sample_rows,
+            "data_row_count": row_count,
+            "profile": {
+                "rows": row_count,
+                "ragged_rows": ragged_rows,
+                "bytes": file_size,
+                "elapsed_seconds": round(elapsed, 3),
+                "rows_per_second": round(row_count / elapsed) if elapsed else row_count,
+                "mb_per_second": round(file_size / (1 << 20) / elapsed, 2) if elapsed else 0.0,
+                "columns": [stats.to_dict() for stats in columns],
+            },
+            "inference": inference.result(),
+        }
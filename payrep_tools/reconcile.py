@@ -0,0 +1,206 @@
+"""
+Reconciliation of processed report files against the ingested tables.
+An import log SUCCESS only means the file was read; DataMapper silently drops every record it returns null for.
+Each file is streamed once into per-day rollups (the same vectorized reduction as the offline aggregates), its
+institution IDs are resolved to the BankOrTPP codes convertInstitutionId saves them under, and the ingested row
+counts and sums come from /api/admin/reconciliation in a few concurrent calls per report type (one per date
+window and institution batch), never per row.
+"""
+
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from payrep_tools.aggregates import ROLLUPS, ROWS, Rollup, file_rollups
+from payrep_tools.header_index import HeaderIndex, MappingSnapshot
+from payrep_tools.institution_check import ConverterTable
+from payrep_tools.report_types import REPORT_TYPES, ReportType, match_report_type
+
+RECONCILIATION_PATH = "/api/admin/reconciliation"
+INSTITUTION_BATCH = 50
+DATE_WINDOW_DAYS = 31
+# Outcomes for which convertInstitutionId returns a BankOrTPP; every other row is dropped by DataMapper
+INGESTED_OUTCOMES = ("converted", "as_is", "unmapped_as_is")
+# The BI query rollups plus the tables only the reconciliation endpoint sums; the measures match its getDailyTotals
+RECONCILE_ROLLUPS = {**ROLLUPS, **{rollup.report_key: rollup for rollup in (
+    Rollup("pos_transaction_data", "transaction_category",
+           ("txn_success_count", "txn_failed_count", "total_transaction_amount")),
+    Rollup("ecommerce_card_activity", "card_product_code", ("ecommerce_enabled_cards", "ecommerce_activity_cards")),
+)}}
+
+
+def api_field(measure: str) -> str:
+    """Entity property (and response key) for a rollup column"""
+    if measure == ROWS:
+        return "rowCount"
+    head, *rest = measure.split("_")
+    return head + "".join(part.capitalize() for part in rest)
+
+
+def date_windows(dates: Sequence[str], days: int = DATE_WINDOW_DAYS) -> List[Tuple[str, str]]:
+    """Cover the dates with few [start, end] windows of at most `days` days, split at gaps"""
+    windows: List[Tuple[str, str]] = []
+    for value in sorted(set(dates)):
+        day = date.fromisoformat(value)
+        if windows:
+            start, end = (date.fromisoformat(d) for d in windows[-1])
+            if day - end <= timedelta(days=1) and day - start < timedelta(days=days):
+                windows[-1] = (windows[-1][0], value)
+                continue
+        windows.append((value, value))
+    return windows
+
+
+@dataclass
+class Totals:
+    rows: int = 0
+    measures: Optional[List[Optional[float]]] = None
+
+    def add(self, rows: int, measures: Sequence[Optional[float]]):
+        self.rows += rows
+        if self.measures is None:
+            self.measures = list(measures)
+            return
+        self.measures = [None if a is None or b is None else a + b for a, b in zip(self.measures, measures)]
+
+
+class Reconciler:
+    """Compares per-day, per-institution file totals with what the ingestion tables hold"""
+
+    def __init__(self, client, table: ConverterTable, snapshot: Optional[MappingSnapshot] = None,
+                 file_workers: int = 4):
+        self.client = client
+        self.table = table
+        self.header_index = HeaderIndex(snapshot or MappingSnapshot.seeded(REPORT_TYPES))
+        self.file_workers = file_workers
+        self.batches_sent = 0
+        self._resolved: Dict[Tuple[str, Optional[str]], Tuple[str, Optional[str]]] = {}
+
+    def _resolve(self, value: Optional[str], processor_code: str) -> Tuple[str, Optional[str]]:
+        key = (processor_code, value)
+        if key not in self._resolved:
+            self._resolved[key] = self.table.resolve(value, processor_code)
+        return self._resolved[key]
+
+    def _read(self, job: Tuple[str, ReportType, str]) -> Dict[str, Any]:
+        file_path, report_type, _ = job
+        started = time.perf_counter()
+        rollup_rows, undated, missing = file_rollups(file_path, report_type, self.header_index,
+                                                     RECONCILE_ROLLUPS[report_type.key])
+        return {"rollup_rows": rollup_rows, "undated": undated, "missing": missing,
+                "elapsed_seconds": round(time.perf_counter() - started, 3)}
+
+    def collect(self, files: Sequence[Tuple[str, ReportType, str]]) -> Tuple[Dict, List[Dict[str, Any]], List[str]]:
+        """Stream (path, report type, processor code) files; totals keyed by (report type, date, bank code)"""
+        totals: Dict[Tuple[str, str, str], Totals] = defaultdict(Totals)
+        summaries = []
+        # Report types the endpoint has no daily totals for are listed, not silently dropped
+        skipped = [file_path for file_path, report_type, _ in files if report_type.key not in RECONCILE_ROLLUPS]
+        files = [job for job in files if job[1].key in RECONCILE_ROLLUPS]
+        # pyarrow parses and groups outside the GIL, so a few threads keep several files streaming
+        with ThreadPoolExecutor(max_workers=max(1, min(self.file_workers, len(files)))) as executor:
+            for (file_path, report_type, processor_code), read in zip(files, executor.map(self._read, files)):
+                dropped: Dict[str, int] = defaultdict(int)
+                rows = read["undated"]
+                for report_date, institution_id, _, count, *measures in read["rollup_rows"]:
+                    rows += count
+                    outcome, code = self._resolve(institution_id, processor_code)
+                    if outcome not in INGESTED_OUTCOMES:
+                        dropped[f"{institution_id} ({outcome})"] += count
+                        continue
+                    totals[(report_type.key, report_date, code)].add(count, measures)
+                summaries.append({"file": file_path, "report_type": report_type.key, "processor_code": processor_code,
+                                  "rows": rows, "undated_rows": read["undated"], "missing_columns": read["missing"],
+                                  "unresolved_institutions": dict(dropped), "elapsed_seconds": read["elapsed_seconds"]})
+        return totals, summaries, skipped
+
+    def _fetch(self, batch: Tuple[str, str, str, Tuple[str, ...]]) -> List[Dict[str, Any]]:
+        report_key, start, end, institutions = batch
+        return self.client.get_json(f"{RECONCILIATION_PATH}/{report_key}?startDate={start}&endDate={end}"
+                                    f"&institutions={','.join(institutions)}")
+
+    def fetch(self, keys) -> Dict[Tuple[str, str, str], Totals]:
+        """Ingested totals for the (report type, date, bank code) keys, batched by date window and institutions"""
+        by_report: Dict[str, Tuple[set, set]] = defaultdict(lambda: (set(), set()))
+        for report_key, report_date, code in keys:
+            by_report[report_key][0].add(report_date)
+            by_report[report_key][1].add(code)
+        batches = []
+        for report_key, (dates, codes) in by_report.items():
+            codes = sorted(codes)
+            for start, end in date_windows(sorted(dates)):
+                for i in range(0, len(codes), INSTITUTION_BATCH):
+                    batches.append((report_key, start, end, tuple(codes[i:i + INSTITUTION_BATCH])))
+        ingested: Dict[Tuple[str, str, str], Totals] = {}
+        for batch, rows in zip(batches, self.client.map(self._fetch, batches)):
+            fields = [api_field(measure) for measure in RECONCILE_ROLLUPS[batch[0]].measures]
+            for row in rows:
+                report_date = row["reportDate"]
+                if isinstance(report_date, list):  # WRITE_DATES_AS_TIMESTAMPS serializes [y, m, d]
+                    report_date = date(*report_date).isoformat()
+                totals = Totals()
+                totals.add(row["rowCount"], [row.get(field) for field in fields])
+                ingested[(batch[0], report_date, row["institution"])] = totals
+        self.batches_sent += len(batches)
+        return ingested
+
+    def reconcile(self, files: Sequence[Tuple[str, ReportType, str]]) -> Dict[str, Any]:
+        """File totals versus ingested totals for every report date and institution the files contain"""
+        started = time.perf_counter()
+        expected, summaries, skipped = self.collect(files)
+        read_seconds = time.perf_counter() - started
+        ingested = self.fetch(expected)
+        file_dates = {(report_key, report_date) for report_key, report_date, _ in expected}
+
+        differences = []
+        matched = 0
+        for key in sorted(set(expected) | {k for k in ingested if k[:2] in file_dates}):
+            report_key, report_date, code = key
+            measures = RECONCILE_ROLLUPS[report_key].measures
+            in_files, in_db = expected.get(key), ingested.get(key)
+            delta = {}
+            if in_files is None or in_db is None:
+                kind = "only_in_db" if in_files is None else "not_ingested"
+            else:
+                kind = "mismatch"
+                if in_files.rows != in_db.rows:
+                    delta[api_field(ROWS)] = in_files.rows - in_db.rows
+                for measure, file_sum, db_sum in zip(measures, in_files.measures, in_db.measures):
+                    # Amount columns are DECIMAL(_, 2); compare to the cent
+                    if file_sum is not None and db_sum is not None and round(file_sum - db_sum, 2) != 0:
+                        delta[api_field(measure)] = round(file_sum - db_sum, 2)
+                if not delta:
+                    matched += 1
+                    continue
+            differences.append({
+                "report_type": report_key, "report_date": report_date, "institution": code, "kind": kind,
+                "files": _as_dict(in_files, measures), "ingested": _as_dict(in_db, measures), "delta": delta})
+        return {"files": summaries, "skipped_files": skipped, "keys": len(expected), "matched": matched,
+                "differences": differences, "api_batches": self.batches_sent, "read_seconds": round(read_seconds, 3),
+                "elapsed_seconds": round(time.perf_counter() - started, 3)}
+
+
+def _as_dict(totals: Optional[Totals], measures: Sequence[str]) -> Optional[Dict[str, Any]]:
+    if totals is None:
+        return None
+    values = {api_field(ROWS): totals.rows}
+    for measure, value in zip(measures, totals.measures or []):
+        values[api_field(measure)] = round(value, 2) if isinstance(value, float) else value
+    return values
+
+
+def processed_files(directory: str, processor_code: str) -> List[Tuple[str, ReportType, str]]:
+    """Report files in a drop directory and its archive/, where the cron moves processed files"""
+    files = []
+    for folder in (directory, os.path.join(directory, "archive")):
+        if not os.path.isdir(folder):
+            continue
+        for name in sorted(os.listdir(folder)):
+            report_type = match_report_type(name)
+            if report_type and os.path.isfile(os.path.join(folder, name)):
+                files.append((os.path.join(folder, name), report_type, processor_code))
+    return files
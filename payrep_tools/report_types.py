@@ -0,0 +1,203 @@
+"""
+Report types processed by FileIngestionService.
+Patterns mirror FileProcessingConfigSeederService and the configs TPP901Tester registers,
+so the analyzer matches files exactly the way the ingestion cron does. Column mappings mirror
+ColumnMappingSeederService and mapper fields mirror the to* extension functions in DataMapper.
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+
+def snake_case(name: str) -> str:
+    """camelCase -> snake_case, the same conversion DataMapper.getField falls back to"""
+    return re.sub(r"([a-z])([A-Z])", lambda m: f"{m.group(1)}_{m.group(2).lower()}", name)
+
+
+@dataclass(frozen=True)
+class SeededMapping:
+    column_name: str
+    field_name: str
+    transformation: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class MapperField:
+    key: str  # record key DataMapper reads
+    kind: str  # string | int | decimal | date
+    strict: bool  # this["key"]!!.asX() throws; getFieldAsX() falls back to a default
+    required: bool = False  # lenient fields whose null makes the mapper return null
+
+    @property
+    def column(self) -> str:
+        return snake_case(self.key)
+
+
+def _strict(*fields: Tuple[str, str]) -> Tuple[MapperField, ...]:
+    return tuple(MapperField(key, kind, strict=True) for key, kind in fields)
+
+
+def _lenient(*fields: Tuple[str, str]) -> Tuple[MapperField, ...]:
+    return (MapperField("institutionId", "string", strict=False, required=True),) + \
+        tuple(MapperField(key, kind, strict=False) for key, kind in fields)
+
+
+def _mappings(*columns: Tuple[str, str, Optional[str]]) -> Tuple[SeededMapping, ...]:
+    return tuple(SeededMapping(*column) for column in columns)
+
+
+@dataclass(frozen=True)
+class ReportType:
+    key: str  # file name token, also used by determineEntityTypeFromFileName
+    file_type: str  # FileProcessingConfig.fileType / entity type name
+    file_name_pattern: str
+    template_file: str
+    entity_type: str  # ColumnMapping.entityType written by ColumnMappingSeederService
+    mappings: Tuple[SeededMapping, ...]
+    mapper_fields: Tuple[MapperField, ...]
+    regex: "re.Pattern[str]" = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, "regex", re.compile(self.file_name_pattern))
+
+    def matches(self, file_name: str) -> bool:
+        """Same semantics as Kotlin's String.matches: the whole name must match"""
+        return self.regex.fullmatch(file_name) is not None
+
+    def transformations(self) -> Dict[str, Optional[str]]:
+        """columnName -> transformation for the seeded column mappings"""
+        return {mapping.column_name: mapping.transformation for mapping in self.mappings}
+
+
+REPORT_TYPES: List[ReportType] = [
+    ReportType("atm_terminal_data", "ATM Terminal Data",
+               r"atm_terminal_data_\d{4}-\d{2}-\d{2}\.csv",
+               "sample-data/reports/ATMTerminalData_001_2025-08-03.csv",
+               "AtmTerminalData",
+               _mappings(("atm_id", "atmId", "trim"), ("institution_id", "institutionId", "trim"),
+                         ("location", "location", "trim"), ("status", "status", "trim"),
+                         ("last_maintenance_date", "lastMaintenanceDate", "date:yyyy-MM-dd"),
+                         ("uptime_percentage", "uptimePercentage", "number"),
+                         ("report_date", "reportDate", "date:yyyy-MM-dd")),
+               _strict(("institution_id", "string"), ("atm_new_count", "int"), ("atm_active_count", "int"),
+                       ("atm_inactive_count", "int"), ("atm_maintenance_count", "int"),
+                       ("atm_location_type", "string"), ("atm_total_count", "int"), ("report_date", "date"))),
+    ReportType("atm_transaction_data", "ATM Transaction Data",
+               r"atm_transaction_data_\d{4}-\d{2}-\d{2}\.csv",
+               "sample-data/reports/ATMTransactionData_001_2025-08-03.csv",
+               "AtmTransactionData",
+               _mappings(("transaction_id", "transactionId", "trim"), ("atm_id", "atmId", "trim"),
+                         ("institution_id", "institutionId", "trim"), ("transaction_type", "transactionType", "trim"),
+                         ("amount", "amount", "number"), ("status", "status", "trim"),
+                         ("transaction_date", "transactionDate", "date:yyyy-MM-dd"),
+                         ("report_date", "reportDate", "date:yyyy-MM-dd")),
+               _strict(("atm_id", "string"), ("institution_id", "string"), ("branch_name", "string"),
+                       ("txn_success_count", "int"), ("txn_failed_count", "int"), ("total_loaded_amount", "decimal"),
+                       ("transaction_category", "string"), ("report_date", "date"))),
+    ReportType("pos_terminal_data", "POS Terminal Data",
+               r"pos_terminal_data_\d{4}-\d{2}-\d{2}\.csv",
+               "sample-data/reports/POSTerminalData_001_2025-08-03.csv",
+               "PosTerminalData",
+               _mappings(("terminal_id", "terminalId", "trim"), ("institution_id", "institutionId", "trim"),
+                         ("merchant_id", "merchantId", "trim"), ("location", "location", "trim"),
+                         ("status", "status", "trim"),
+                         ("terminals_delivered_count", "terminalsDeliveredCount", "number"),
+                         ("terminals_active_count", "terminalsActiveCount", "number"),
+                         ("uptime_percentage", "uptimePercentage", "number"),
+                         ("report_date", "reportDate", "date:yyyy-MM-dd")),
+               _lenient(("mccCode", "string"), ("mccDescription", "string"), ("terminalsIssuedCount", "int"),
+                        ("terminalsDeliveredCount", "int"), ("terminalsReissuedCount", "int"),
+                        ("terminalsDecomCount", "int"), ("terminalsActiveCount", "int"),
+                        ("terminalsActivityCount", "int"), ("terminalsTotalCount", "int"), ("reportDate", "date"))),
+    ReportType("pos_transaction_data", "POS Transaction Data",
+               r"pos_transaction_data_\d{4}-\d{2}-\d{2}\.csv",
+               "sample-data/reports/POSTransactionData_001_2025-08-03.csv",
+               "PosTransactionData",
+               _mappings(("transaction_id", "transactionId", "trim"), ("terminal_id", "terminalId", "trim"),
+                         ("institution_id", "institutionId", "trim"), ("amount", "amount", "number"),
+                         ("status", "status", "trim"),
+                         ("transaction_date", "transactionDate", "date:yyyy-MM-dd"),
+                         ("report_date", "reportDate", "date:yyyy-MM-dd")),
+               _lenient(("txnSuccessCount", "int"), ("txnFailedCount", "int"), ("totalTransactionAmount", "decimal"),
+                        ("transactionCategory", "string"), ("reportDate", "date"))),
+    ReportType("card_lifecycle", "Card Lifecycle",
+               r"card_lifecycle_\d{4}-\d{2}-\d{2}\.csv",
+               "sample-data/reports/CardLifecycle_001_2025-08-03.csv",
+               "CardLifecycle",
+               _mappings(("card_id", "cardId", "trim"), ("institution_id", "institutionId", "trim"),
+                         ("card_type", "cardType", "trim"), ("status", "status", "trim"),
+                         ("issue_date", "issueDate", "date:yyyy-MM-dd"),
+                         ("expiry_date", "expiryDate", "date:yyyy-MM-dd"),
+                         ("activation_date", "activationDate", "date:yyyy-MM-dd"),
+                         ("report_date", "reportDate", "date:yyyy-MM-dd")),
+               _strict(("institution_id", "string"), ("card_product_code", "string"), ("card_product_type", "string"),
+                       ("card_technology_type", "string"), ("cards_issued_count", "int"),
+                       ("cards_delivered_count", "int"), ("cards_activated_count", "int"),
+                       ("cards_renewed_count", "int"), ("cards_reissued_count", "int"),
+                       ("cards_deactivated_count", "int"), ("cards_activity_count", "int"), ("report_date", "date"))),
+    ReportType("ecommerce_card_activity", "E-Commerce Card Activity",
+               r"ecommerce_card_activity_\d{4}-\d{2}-\d{2}\.csv",
+               "sample-data/reports/E-CommerceCardActivity_001_2025-08-03.csv",
+               "ECommerceCardActivity",
+               _mappings(("card_id", "cardId", "trim"), ("institution_id", "institutionId", "trim"),
+                         ("transaction_count", "transactionCount", "number"), ("total_volume", "totalVolume", "number"),
+                         ("status", "status", "trim"),
+                         ("last_activity_date", "lastActivityDate", "date:yyyy-MM-dd"),
+                         ("report_date", "reportDate", "date:yyyy-MM-dd")),
+               _lenient(("cardProductCode", "string"), ("ecommerceEnabledCards", "int"),
+                        ("ecommerceActivityCards", "int"), ("reportDate", "date"))),
+    ReportType("transaction_volume", "Transaction Volume",
+               r"transaction_volume_\d{4}-\d{2}-\d{2}\.csv",
+               "sample-data/reports/TransactionVolume_001_2025-08-03.csv",
+               "TransactionVolume",
+               _mappings(("institution_id", "institutionId", "trim"), ("transaction_type", "transactionType", "trim"),
+                         ("transaction_count", "transactionCount", "number"), ("total_amount", "totalAmount", "number"),
+                         ("average_amount", "averageAmount", "number"),
+                         ("report_date", "reportDate", "date:yyyy-MM-dd")),
+               _strict(("institution_id", "string"), ("channel_code", "string"), ("transaction_type_code", "string"),
+                       ("transaction_type_desc", "string"), ("mcc_code", "string"), ("mcc_description", "string"),
+                       ("txn_count", "int"), ("txn_total_amount", "decimal"), ("txn_success_count", "int"),
+                       ("txn_failed_count", "int"), ("transaction_category", "string"), ("report_date", "date"))),
+]
+
+# split-report.py names the chunks of an oversized drop <name>_partNNNN.csv
+CHUNK_SUFFIX_RE = re.compile(r"_part\d{4}(?=\.[^.]+$)")
+
+# Report types TPP 901 (Tadawul) sends
+TPP_901_FILE_TYPES = ("E-Commerce Card Activity", "POS Terminal Data", "POS Transaction Data")
+
+# Bank codes seeded by DataSeederService
+INSTITUTION_CODES = ("002", "004", "005", "006", "007", "010", "012", "013", "014", "015",
+                     "016", "017", "018", "020", "021", "023", "025", "026", "027")
+
+
+def report_type_by_key(key: str) -> Optional[ReportType]:
+    for report_type in REPORT_TYPES:
+        if report_type.key == key:
+            return report_type
+    return None
+
+
+def report_type_by_file_type(file_type: str) -> Optional[ReportType]:
+    for report_type in REPORT_TYPES:
+        if report_type.file_type == file_type:
+            return report_type
+    return None
+
+
+def match_report_type(file_name: str) -> Optional[ReportType]:
+    """Return the report type whose fileNamePattern matches the file name (or the file it was split from), if any"""
+    for name in dict.fromkeys([file_name, CHUNK_SUFFIX_RE.sub("", file_name, count=1)]):
+        for report_type in REPORT_TYPES:
+            if report_type.matches(name):
+                return report_type
+    return None
+
+
+def chunked_pattern(pattern: str) -> Optional[str]:
+    """fileNamePattern that also accepts chunk names; None if the pattern does not end in a literal extension"""
+    match = re.search(r"\\\.\w+\$?$", pattern)
+    if match is None:
+        return None
+    return f"{pattern[:match.start()]}(_part\\d{{4}})?{pattern[match.start():]}"
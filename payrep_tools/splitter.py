@@ -0,0 +1,292 @@
+"""
+Header-preserving, resumable CSV splitter for oversized processor drops.
+FileParser.parseCsvFile holds a whole file as records in memory and processFile fails the whole file on
+any exception, so large drops are cut into <name>_partNNNN.csv chunks that each repeat the header row.
+Chunks are cut on record boundaries (quote parity, so quoted newlines stay intact) and written through a
+staging directory, so the ingestion cron never sees a partial chunk. A JSON manifest records every
+chunk's record range, source byte offsets and checksum; an interrupted split resumes after the last
+finished chunk, and a single chunk can be cut again from the source without redoing the others.
+"""
+
+import hashlib
+import json
+import os
+import re
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from payrep_tools.report_types import chunked_pattern
+
+DEFAULT_CHUNK_ROWS = 250000
+MANIFEST_DIR = ".split"
+MANIFEST_VERSION = 1
+READ_BUFFER_BYTES = 1 << 20
+
+
+def chunk_file_name(file_name: str, index: int) -> str:
+    stem, extension = os.path.splitext(file_name)
+    return f"{stem}_part{index:04d}{extension}"
+
+
+def check_chunk_names(file_name: str, pattern: str, chunks: int = 1) -> None:
+    """Raise ValueError unless the chunk names match the config's fileNamePattern the way Kotlin's matches does"""
+    regex = re.compile(pattern)
+    for index in {1, max(chunks, 1)}:
+        name = chunk_file_name(file_name, index)
+        if regex.fullmatch(name) is None:
+            widened = chunked_pattern(pattern)
+            hint = f"; set the file config's fileNamePattern to {widened}" if widened else ""
+            raise ValueError(f"Chunk name {name} does not match fileNamePattern {pattern}{hint}")
+
+
+def iter_records(f, start: int) -> Iterator[Tuple[int, bytes]]:
+    """(end offset, raw record bytes) from start; a record only ends on a newline outside quotes"""
+    f.seek(start)
+    offset = start
+    pending: List[bytes] = []
+    quotes = 0
+    for line in f:
+        offset += len(line)
+        # A doubled quote inside a quoted field adds two, so odd parity means the field continues
+        quotes += line.count(b'"')
+        if quotes % 2:
+            pending.append(line)
+            continue
+        if pending:
+            pending.append(line)
+            line = b"".join(pending)
+            pending = []
+        quotes = 0
+        yield offset, line
+    if pending:
+        yield offset, b"".join(pending)
+
+
+def _blake2b() -> "hashlib._Hash":
+    return hashlib.blake2b(digest_size=16)
+
+
+@dataclass
+class Chunk:
+    index: int
+    file: str
+    first_record: int  # 1-based record numbers of the source file
+    last_record: int
+    source_start: int  # byte range of the records in the source file
+    source_end: int
+    bytes: int
+    checksum: str
+
+    @property
+    def rows(self) -> int:
+        return self.last_record - self.first_record + 1
+
+
+@dataclass
+class SplitManifest:
+    source: str
+    source_size: int
+    source_mtime_ns: int
+    header_end: int
+    chunk_rows: int
+    pattern: str
+    output_dir: str
+    chunks: List[Chunk] = field(default_factory=list)
+    complete: bool = False
+    records: int = 0
+    version: int = MANIFEST_VERSION
+
+    @classmethod
+    def load(cls, path: str) -> "SplitManifest":
+        with open(path, "r") as f:
+            data = json.load(f)
+        data.pop("updated_at", None)
+        data["chunks"] = [Chunk(**{k: v for k, v in chunk.items() if k != "rows"}) for chunk in data["chunks"]]
+        return cls(**data)
+
+    def save(self, path: str):
+        """Write atomically, so a crash never leaves a manifest that points past the finished chunks"""
+        data = asdict(self)
+        data["updated_at"] = datetime.now().isoformat()
+        for chunk, entry in zip(self.chunks, data["chunks"]):
+            entry["rows"] = chunk.rows
+        temporary = f"{path}.tmp"
+        with open(temporary, "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(temporary, path)
+
+    def chunk_path(self, chunk: Chunk) -> str:
+        return os.path.join(self.output_dir, chunk.file)
+
+    def archived_path(self, chunk: Chunk) -> str:
+        # FileIngestionService moves successfully processed files to <directoryPath>/archive
+        return os.path.join(self.output_dir, "archive", chunk.file)
+
+
+def manifest_path_for(source: str, output_dir: str) -> str:
+    return os.path.join(output_dir, MANIFEST_DIR, os.path.basename(source) + ".manifest.json")
+
+
+class CsvSplitter:
+    """Splits one CSV into header-preserving chunks of at most chunk_rows records"""
+
+    def __init__(self, output_dir: str, pattern: str, chunk_rows: int = DEFAULT_CHUNK_ROWS):
+        self.output_dir = output_dir
+        self.pattern = pattern
+        self.chunk_rows = chunk_rows
+
+    def split(self, source: str, manifest_path: Optional[str] = None) -> SplitManifest:
+        """Split source, resuming from an existing manifest for the same unchanged source"""
+        manifest_path = manifest_path or manifest_path_for(source, self.output_dir)
+        staging_dir = os.path.join(self.output_dir, MANIFEST_DIR, "staging")
+        os.makedirs(staging_dir, exist_ok=True)
+        check_chunk_names(os.path.basename(source), self.pattern)
+
+        stat = os.stat(source)
+        manifest = self._resumable(manifest_path, source, stat)
+        if manifest is not None and manifest.complete:
+            return manifest
+
+        with open(source, "rb", buffering=READ_BUFFER_BYTES) as f:
+            header = self._read_header(f)
+            if manifest is None:
+                manifest = SplitManifest(os.path.abspath(source), stat.st_size, stat.st_mtime_ns, len(header),
+                                         self.chunk_rows, self.pattern, os.path.abspath(self.output_dir))
+            else:
+                # Listed chunks must still be in the drop directory or its archive
+                self._verify_chunks(manifest)
+
+            start = manifest.chunks[-1].source_end if manifest.chunks else manifest.header_end
+            record = manifest.chunks[-1].last_record if manifest.chunks else 0
+            index = len(manifest.chunks)
+            out = None
+            for end, raw in iter_records(f, start):
+                if out is None:
+                    index += 1
+                    name = chunk_file_name(os.path.basename(source), index)
+                    staging_path = os.path.join(staging_dir, name)
+                    out = open(staging_path, "wb", buffering=READ_BUFFER_BYTES)
+                    digest = _blake2b()
+                    out.write(header)
+                    digest.update(header)
+                    first_record, chunk_start, written = record + 1, start, len(header)
+                out.write(raw)
+                digest.update(raw)
+                written += len(raw)
+                record += 1
+                start = end
+                if record - first_record + 1 >= self.chunk_rows:
+                    self._publish(manifest, manifest_path, out, staging_path,
+                                  Chunk(index, name, first_record, record, chunk_start, end, written,
+                                        digest.hexdigest()))
+                    out = None
+            if out is not None:
+                self._publish(manifest, manifest_path, out, staging_path,
+                              Chunk(index, name, first_record, record, chunk_start, start, written, digest.hexdigest()))
+
+        manifest.records = record
+        manifest.complete = True
+        manifest.save(manifest_path)
+        return manifest
+
+    def _resumable(self, manifest_path: str, source: str, stat: os.stat_result) -> Optional[SplitManifest]:
+        if not os.path.exists(manifest_path):
+            return None
+        manifest = SplitManifest.load(manifest_path)
+        if (manifest.source_size, manifest.source_mtime_ns) != (stat.st_size, stat.st_mtime_ns):
+            raise ValueError(f"{source} changed since {manifest_path} was written; remove the manifest and its "
+                             f"chunks to split it again")
+        if manifest.chunk_rows != self.chunk_rows or manifest.pattern != self.pattern:
+            raise ValueError(f"{manifest_path} was written with {manifest.chunk_rows} rows per chunk and pattern "
+                             f"{manifest.pattern}")
+        return manifest
+
+    @staticmethod
+    def _read_header(f) -> bytes:
+        for end, raw in iter_records(f, 0):
+            return raw
+        raise ValueError("Empty file")
+
+    def _verify_chunks(self, manifest: SplitManifest):
+        for chunk in manifest.chunks:
+            if any(os.path.exists(path) for path in (manifest.chunk_path(chunk), manifest.archived_path(chunk))):
+                continue
+            if os.path.exists(os.path.join(manifest.output_dir, MANIFEST_DIR, "staging", chunk.file)):
+                # Interrupted between recording the chunk and renaming it into place
+                recut(manifest, chunk.index)
+            else:
+                raise ValueError(f"{chunk.file} is listed in the manifest but missing; recut it first")
+
+    def _publish(self, manifest: SplitManifest, manifest_path: str, out, staging_path: str, chunk: Chunk):
+        out.close()
+        manifest.chunks.append(chunk)
+        manifest.save(manifest_path)
+        # Rename into place so the cron never sees a half-written chunk
+        os.replace(staging_path, manifest.chunk_path(chunk))
+
+
+def chunk_checksum(path: str) -> str:
+    digest = _blake2b()
+    with open(path, "rb", buffering=0) as f:
+        for block in iter(lambda: f.read(READ_BUFFER_BYTES), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def verify(manifest: SplitManifest) -> List[Dict[str, Any]]:
+    """State of every chunk on disk: waiting (in the drop directory), archived, corrupt or missing"""
+    states = []
+    for chunk in manifest.chunks:
+        for state, path in (("waiting", manifest.chunk_path(chunk)), ("archived", manifest.archived_path(chunk))):
+            if os.path.exists(path):
+                if chunk_checksum(path) != chunk.checksum:
+                    state = "corrupt"
+                break
+        else:
+            state, path = "missing", None
+        states.append({"index": chunk.index, "file": chunk.file, "rows": chunk.rows, "state": state, "path": path})
+    return states
+
+
+def recut(manifest: SplitManifest, index: int) -> Chunk:
+    """Cut one chunk again from its source byte range, e.g. to retry it after fixing a failed import"""
+    chunk = next((c for c in manifest.chunks if c.index == index), None)
+    if chunk is None:
+        raise ValueError(f"not in the manifest of {manifest.source}")
+    stat = os.stat(manifest.source)
+    if (stat.st_size, stat.st_mtime_ns) != (manifest.source_size, manifest.source_mtime_ns):
+        raise ValueError(f"{manifest.source} changed since it was split")
+    staging_path = os.path.join(manifest.output_dir, MANIFEST_DIR, "staging", chunk.file)
+    os.makedirs(os.path.dirname(staging_path), exist_ok=True)
+    digest = _blake2b()
+    with open(manifest.source, "rb") as f, open(staging_path, "wb") as out:
+        header = f.read(manifest.header_end)
+        out.write(header)
+        digest.update(header)
+        f.seek(chunk.source_start)
+        remaining = chunk.source_end - chunk.source_start
+        while remaining:
+            block = f.read(min(READ_BUFFER_BYTES, remaining))
+            if not block:
+                break
+            out.write(block)
+            digest.update(block)
+            remaining -= len(block)
+    if digest.hexdigest() != chunk.checksum:
+        os.remove(staging_path)
+        raise ValueError(f"{chunk.file} cut from {manifest.source} does not match its recorded checksum")
+    os.replace(staging_path, manifest.chunk_path(chunk))
+    return chunk
+
+
+def import_statuses(manifest: SplitManifest, logs: List[Dict[str, Any]]) -> Dict[str, str]:
+    """Latest ImportLog status per chunk file; FAILED chunks stay in the drop directory and are retried by the cron"""
+    names = {chunk.file for chunk in manifest.chunks}
+    statuses = {}
+    # A failed import is saved as a new row, so the highest id carries the latest status
+    for log in sorted(logs, key=lambda log: log.get("id") or 0):
+        if log.get("fileName") in names:
+            statuses[log["fileName"]] = log["status"]
+    return statuses
+
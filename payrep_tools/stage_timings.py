@@ -0,0 +1,113 @@
+"""
+Per-stage timings of one ingested file, rebuilt from the backend's debug logs.
+FileParser and FileIngestionService append to debug-logs/file-processing-*.log and DataMapper to
+debug-logs/institution-conversion-*.log, all with millisecond timestamps. The parser's start line and the save
+start line bound the parse; after that every "Processing record N of M" line starts one record, whose interval
+covers mapping, institution conversion (a DataMapper conversion block) and the repository save.
+"""
+
+import glob
+import os
+import re
+import statistics
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from payrep_tools.import_monitor import LINE_RE, PARSE_START_RE, PROGRESS_RE, SAVE_START_RE
+
+CONVERSION_LOG_PREFIX = "institution-conversion-"
+_CONVERSION_START = "=== INSTITUTION CONVERSION DEBUG ==="
+_CONVERSION_END = "=== END CONVERSION DEBUG ==="
+_SAVE_END_RE = re.compile(r"^Completed saving (?P<records>\d+) records")
+
+
+class DebugLogCapture:
+    """Remembers the size of every debug log, to read back only what one ingestion run appends"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.offsets = {path: os.path.getsize(path) for path in self._paths()}
+
+    def _paths(self) -> List[str]:
+        return sorted(glob.glob(os.path.join(self.directory, "*.log")))
+
+    def read(self) -> Tuple[List[Tuple[datetime, bool, str]], int]:
+        """(timestamp, from the conversion log, message) lines appended since the capture, and their bytes"""
+        lines = []
+        written = 0
+        for path in self._paths():
+            with open(path, "rb") as f:
+                f.seek(self.offsets.get(path, 0))
+                data = f.read()
+            written += len(data)
+            conversion = os.path.basename(path).startswith(CONVERSION_LOG_PREFIX)
+            for line in data.decode("utf-8", "replace").splitlines():
+                match = LINE_RE.match(line)
+                if match:
+                    timestamp = datetime.strptime(match.group("ts"), "%Y-%m-%d %H:%M:%S.%f")
+                    lines.append((timestamp, conversion, match.group("message")))
+        # Sorting is stable, so lines with the same millisecond keep their order within each log
+        lines.sort(key=lambda line: line[0])
+        return lines, written
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def stage_timings(lines: List[Tuple[datetime, bool, str]], file_name: str) -> Optional[Dict[str, Any]]:
+    """Parse, institution conversion and save timings of one file; None when no debug lines were written"""
+    parse_start = save_start = save_end = None
+    record_starts: List[datetime] = []
+    conversions: List[float] = []
+    conversion_start = None
+    parse_lines = save_lines = 0
+    for timestamp, conversion_log, message in lines:
+        if parse_start is None:
+            match = PARSE_START_RE.match(message)
+            if match and match.group("file") == file_name:
+                parse_start = timestamp
+            continue
+        if save_start is None:
+            match = SAVE_START_RE.match(message)
+            if match and match.group("file") == file_name:
+                save_start = timestamp
+            else:
+                parse_lines += 1
+            continue
+        save_lines += 1
+        if conversion_log:
+            if message == _CONVERSION_START:
+                conversion_start = timestamp
+            elif message == _CONVERSION_END and conversion_start is not None:
+                conversions.append((timestamp - conversion_start).total_seconds())
+                conversion_start = None
+        elif PROGRESS_RE.match(message):
+            record_starts.append(timestamp)
+        elif _SAVE_END_RE.match(message):
+            save_end = timestamp
+            break
+    if parse_start is None:
+        return None
+
+    timings: Dict[str, Any] = {"parse_seconds": (save_start - parse_start).total_seconds() if save_start else None,
+                               "save_phase_seconds": None, "records_logged": len(record_starts),
+                               "record_p50_ms": None, "record_p95_ms": None,
+                               "institution_conversion_seconds": round(sum(conversions), 3) if conversions else None,
+                               "map_and_save_seconds": None,
+                               "log_lines": {"parse": parse_lines, "save": save_lines}}
+    if save_start and save_end:
+        save_phase = (save_end - save_start).total_seconds()
+        timings["save_phase_seconds"] = save_phase
+        if conversions:
+            timings["map_and_save_seconds"] = round(save_phase - sum(conversions), 3)
+        if record_starts:
+            bounds = record_starts + [save_end]
+            intervals = [(b - a).total_seconds() * 1000 for a, b in zip(bounds, bounds[1:])]
+            timings["record_p50_ms"] = round(statistics.median(intervals), 3)
+            timings["record_p95_ms"] = _percentile(intervals, 0.95)
+            timings["log_lines_per_record"] = round(save_lines / len(record_starts), 2)
+    return timings
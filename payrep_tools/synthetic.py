@@ -0,0 +1,192 @@
+"""
+Synthetic processor report generator.
+Writes CSVs for the seven entity types FileIngestionService.saveData handles, with the seeded column
+mapping headers (or the template / DataMapper ones), a Zipf-skewed institution ID distribution and an
+optional rate of injected bad values. Values are generated column-wise per chunk from small
+precomputed pools, so million-row files take seconds rather than minutes.
+"""
+
+import csv
+import os
+import random
+import time
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from payrep_tools.report_types import INSTITUTION_CODES, ReportType
+
+HEADER_SOURCES = ("seeded", "template", "mapper")
+DEFAULT_CHUNK_ROWS = 50000
+
+# Values the ingestion path rejects or silently defaults, per column kind
+BAD_VALUES = {
+    "institution": ("", " ", "999X"),
+    "date": ("18/07/2025", "2025-02-30", "N/A", ""),
+    "int": ("N/A", "4000000000", "12.5", ""),
+    "decimal": ("N/A", "1,234.50", ""),
+    "id": ("",),
+}
+
+_VOCABULARY = {
+    "status": ("ACTIVE", "INACTIVE", "MAINTENANCE", "SUCCESS", "FAILED"),
+    "location": ("Tripoli", "Benghazi", "Misrata", "Zawiya", "Sabha", "Sirte", "Bayda", "Tobruk"),
+    "atm_location_type": ("BRANCH", "OFFSITE", "MALL", "AIRPORT"),
+    "mcc_code": ("5411", "5812", "5541", "5999", "4111", "5732", "6011"),
+    "mcc_description": ("Grocery Stores", "Restaurants", "Service Stations", "Retail", "Transit", "Electronics", "ATM"),
+    "channel_code": ("ATM", "POS", "ECOM", "MOBILE"),
+    "transaction_type": ("PURCHASE", "WITHDRAWAL", "TRANSFER", "REFUND"),
+    "transaction_type_code": ("01", "02", "03", "04"),
+    "transaction_type_desc": ("Purchase", "Withdrawal", "Transfer", "Refund"),
+    "transaction_category": ("ON_US", "OFF_US", "INTERNATIONAL"),
+    "card_type": ("DEBIT", "CREDIT", "PREPAID"),
+    "card_product_type": ("DEBIT", "CREDIT", "PREPAID"),
+    "card_technology_type": ("CHIP", "CONTACTLESS", "MAGSTRIPE"),
+    "branch_name": ("Main Branch", "Downtown", "Airport Road", "University"),
+}
+
+
+def zipf_cum_weights(count: int, skew: float) -> List[float]:
+    """Cumulative weights for random.choices; skew 0 is uniform, larger values favour the first codes"""
+    total = 0.0
+    cumulative = []
+    for rank in range(1, count + 1):
+        total += 1.0 / rank ** skew
+        cumulative.append(total)
+    return cumulative
+
+
+def template_headers(report_type: ReportType) -> List[str]:
+    with open(report_type.template_file, "r", newline="", encoding="utf-8-sig") as f:
+        return next(csv.reader(f))
+
+
+def report_headers(report_type: ReportType, header_source: str = "seeded") -> List[str]:
+    if header_source == "seeded":
+        return [mapping.column_name for mapping in report_type.mappings]
+    if header_source == "template":
+        return template_headers(report_type)
+    if header_source == "mapper":
+        return list(dict.fromkeys(field.column for field in report_type.mapper_fields))
+    raise ValueError(f"Unknown header source: {header_source}")
+
+
+class ReportGenerator:
+    """Generates one report type's rows column by column"""
+
+    def __init__(self, report_type: ReportType, header_source: str = "seeded",
+                 institutions: Sequence[str] = INSTITUTION_CODES, skew: float = 1.1, bad_rate: float = 0.0,
+                 report_date: Optional[date] = None, seed: Optional[int] = None):
+        self.report_type = report_type
+        self.headers = report_headers(report_type, header_source)
+        self.institutions = list(institutions)
+        self.cum_weights = zipf_cum_weights(len(self.institutions), skew)
+        self.bad_rate = bad_rate
+        self.report_date = report_date or date.today()
+        self.rng = random.Random(seed)
+        self.sequence = 0
+        self.kinds = {name: self._column_kind(name) for name in self.headers}
+        self.pools = self._build_pools()
+
+    def _column_kind(self, name: str) -> str:
+        transformation = (self.report_type.transformations().get(name) or "").lower()
+        kind = next((field.kind for field in self.report_type.mapper_fields if field.column == name), None)
+        if name == "institution_id":
+            return "institution"
+        if kind == "date" or transformation.startswith("date") or name.endswith("_date"):
+            return "date"
+        if name.endswith("_percentage"):
+            return "percentage"
+        if kind == "decimal" or "amount" in name or "volume" in name:
+            return "decimal"
+        if kind == "int" or transformation == "number" or name.endswith("_count") or name.endswith("_cards"):
+            return "int"
+        if name.endswith("_id"):
+            return "id"
+        return "text"
+
+    def _build_pools(self) -> Dict[str, Sequence[str]]:
+        rng = self.rng
+        start = self.report_date - timedelta(days=3 * 365)
+        pools = {
+            "date": [(start + timedelta(days=rng.randrange(3 * 365))).isoformat() for _ in range(1000)],
+            "int": [str(rng.randrange(500)) for _ in range(1000)],
+            "decimal": ["%.2f" % (rng.lognormvariate(6, 1.5)) for _ in range(5000)],
+            "percentage": ["%.2f" % rng.uniform(80, 100) for _ in range(500)],
+        }
+        for name in self.headers:
+            if self.kinds[name] == "text":
+                pools[name] = _VOCABULARY.get(name) or tuple(f"{name.upper()}_{i}" for i in range(20))
+        return pools
+
+    def _column(self, name: str, n: int) -> List[str]:
+        kind = self.kinds[name]
+        rng = self.rng
+        if kind == "institution":
+            values = rng.choices(self.institutions, cum_weights=self.cum_weights, k=n)
+        elif kind == "date" and name == "report_date":
+            values = [self.report_date.isoformat()] * n
+        elif kind == "id":
+            prefix = name[:-3].upper()[:4]
+            values = [f"{prefix}{i:09d}" for i in range(self.sequence, self.sequence + n)]
+        elif kind == "text":
+            values = rng.choices(self.pools[name], k=n)
+        else:
+            values = rng.choices(self.pools[kind], k=n)
+        return values
+
+    def _inject(self, name: str, values: List[str]) -> int:
+        bad = BAD_VALUES.get(self.kinds[name])
+        if not bad or self.bad_rate <= 0:
+            return 0
+        expected = len(values) * self.bad_rate
+        count = int(expected) + (1 if self.rng.random() < expected - int(expected) else 0)
+        for index in self.rng.sample(range(len(values)), min(count, len(values))):
+            values[index] = self.rng.choice(bad)
+        return count
+
+    def chunk(self, n: int) -> Dict[str, Any]:
+        """Generate n rows; returns the rows and the number of injected bad values"""
+        bad_values = 0
+        columns = []
+        for name in self.headers:
+            values = self._column(name, n)
+            bad_values += self._inject(name, values)
+            columns.append(values)
+        self.sequence += n
+        return {"rows": list(zip(*columns)), "bad_values": bad_values}
+
+    def write(self, file_path: str, rows: int, chunk_rows: int = DEFAULT_CHUNK_ROWS,
+              progress: Optional[Callable[[int], None]] = None) -> Dict[str, Any]:
+        """Write a CSV with a header row and the requested number of data rows"""
+        started = time.perf_counter()
+        directory = os.path.dirname(file_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        written = 0
+        bad_values = 0
+        with open(file_path, "w", newline="", encoding="utf-8", buffering=1 << 20) as f:
+            writer = csv.writer(f)
+            writer.writerow(self.headers)
+            while written < rows:
+                chunk = self.chunk(min(chunk_rows, rows - written))
+                writer.writerows(chunk["rows"])
+                written += len(chunk["rows"])
+                bad_values += chunk["bad_values"]
+                if progress:
+                    progress(written)
+        return {
+            "file": file_path,
+            "report_type": self.report_type.key,
+            "rows": written,
+            "bytes": os.path.getsize(file_path),
+            "bad_values": bad_values,
+            "elapsed_seconds": round(time.perf_counter() - started, 3),
+        }
+
+
+def report_file_name(report_type: ReportType, report_date: date) -> str:
+    """File name matching the report type's fileNamePattern"""
+    name = f"{report_type.key}_{report_date.isoformat()}.csv"
+    if not report_type.matches(name):
+        raise ValueError(f"{name} does not match {report_type.file_name_pattern}")
+    return name
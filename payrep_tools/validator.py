@@ -0,0 +1,157 @@
+"""
+Row-level validation that splits a report file into a clean file for ingestion and a reject file.
+processFile is all-or-nothing: one value FileParser's date transformation cannot parse fails the whole file, which
+stays in the drop directory and fails again every cron cycle, and records DataMapper cannot map are skipped one log
+line at a time. Every record is checked here against the rules bulk_upload.RecordMapper replays (date
+transformations, the strict and lenient field reads of the target entity, and optionally the institution ID
+conversion). Passing records are copied byte for byte to the clean file, the rest go to the reject file with a
+reason code, in one pass that holds one record in memory at a time.
+"""
+
+import csv
+import io
+import os
+import time
+from collections import Counter
+from typing import Any, Dict, Optional, Set, Tuple
+
+from payrep_tools.bulk_upload import VALUE_CACHE_SIZE, RecordMapper, transform
+from payrep_tools.header_index import HeaderIndex
+from payrep_tools.institution_check import OUTCOMES, ConverterTable
+from payrep_tools.report_types import ReportType
+from payrep_tools.splitter import READ_BUFFER_BYTES, iter_records
+
+STAGING_DIR = os.path.join(".validate", "staging")
+REJECTS_DIR = "rejects"
+REJECT_COLUMNS = ("reject_reason", "reject_field", "reject_record")
+# A value in a date-transformed column that FileParser cannot parse; it fails the whole file, not one record
+FILE_FAILING_REASON = "unparseable_date"
+DATE_TRANSFORMATION = "date:yyyy-MM-dd"
+
+
+def rejects_path_for(file_name: str, output_dir: str) -> str:
+    stem, extension = os.path.splitext(file_name)
+    return os.path.join(output_dir, REJECTS_DIR, f"{stem}.rejects{extension or '.csv'}")
+
+
+def _line_ending(raw: bytes) -> Tuple[bytes, bytes]:
+    """(record without its line ending, the line ending)"""
+    if raw.endswith(b"\r\n"):
+        return raw[:-2], b"\r\n"
+    if raw.endswith(b"\n"):
+        return raw[:-1], b"\n"
+    return raw, b"\n"
+
+
+def _csv_fields(*values: str) -> bytes:
+    out = io.StringIO()
+    csv.writer(out, lineterminator="").writerow(values)
+    return out.getvalue().encode()
+
+
+class RowValidator:
+    """Splits report files into clean and reject files by what the cron path would do with each record"""
+
+    def __init__(self, header_index: HeaderIndex, converter_table: Optional[ConverterTable] = None,
+                 reject_defaulted: bool = False):
+        self.header_index = header_index
+        self.converter_table = converter_table
+        self.reject_defaulted = reject_defaulted
+        self._valid_dates: Set[str] = set()
+
+    def validate(self, file_path: str, report_type: ReportType, output_dir: str,
+                 processor_code: Optional[str] = None) -> Dict[str, Any]:
+        """Write output_dir/<name> with the passing records and the reject file beside it in rejects/"""
+        if self.converter_table is not None and processor_code is None:
+            raise ValueError("Checking institution IDs needs the processor code")
+        started = time.perf_counter()
+        file_name = os.path.basename(file_path)
+        staging_dir = os.path.join(output_dir, STAGING_DIR)
+        os.makedirs(staging_dir, exist_ok=True)
+        os.makedirs(os.path.join(output_dir, REJECTS_DIR), exist_ok=True)
+        clean_path = os.path.join(output_dir, file_name)
+        rejects_path = rejects_path_for(file_name, output_dir)
+        staged_clean = os.path.join(staging_dir, file_name)
+        staged_rejects = os.path.join(staging_dir, os.path.basename(rejects_path))
+
+        reasons: Counter = Counter()
+        institutions: Dict[Any, str] = {}
+        records = clean = 0
+        with open(file_path, "rb", buffering=READ_BUFFER_BYTES) as f, \
+                open(staged_clean, "wb", buffering=READ_BUFFER_BYTES) as clean_out, \
+                open(staged_rejects, "wb", buffering=READ_BUFFER_BYTES) as rejects_out:
+            header = next(iter_records(f, 0), (0, b""))[1]
+            if not header.strip():
+                raise ValueError(f"Empty file: {file_path}")
+            # FileReader keeps a BOM, so it stays in the first header here too
+            headers = next(csv.reader([header.decode("utf-8", "replace")]))
+            mapper = RecordMapper(report_type, headers, self.header_index, file_name, self.reject_defaulted)
+            date_headers = {index: headers[index] for index in mapper.date_columns}
+            clean_out.write(header)
+            header_body, header_ending = _line_ending(header)
+            rejects_out.write(header_body + b"," + _csv_fields(*REJECT_COLUMNS) + header_ending)
+
+            raw_record = b""
+
+            def texts():
+                nonlocal raw_record
+                for _, raw in iter_records(f, len(header)):
+                    raw_record = raw
+                    yield raw.decode("utf-8", "replace")
+
+            for row in csv.reader(texts()):
+                records += 1
+                reason, field_ = self._check(mapper, row, date_headers, institutions, processor_code)
+                if reason is None:
+                    clean_out.write(raw_record)
+                    clean += 1
+                    continue
+                reasons[(reason, field_)] += 1
+                body, ending = _line_ending(raw_record)
+                rejects_out.write(body + b"," + _csv_fields(reason, field_, str(records)) + ending)
+
+        # Rename into place only when complete, so the cron never picks up a half-written clean file
+        os.replace(staged_clean, clean_path)
+        os.replace(staged_rejects, rejects_path)
+        elapsed = time.perf_counter() - started
+        return {
+            "file": file_path,
+            "report_type": report_type.key,
+            "clean_file": clean_path,
+            "rejects_file": rejects_path,
+            "records": records,
+            "clean": clean,
+            "rejected": records - clean,
+            "reasons": [{"reason": reason, "field": field_, "records": count}
+                        for (reason, field_), count in reasons.most_common()],
+            "file_would_fail": any(reason == FILE_FAILING_REASON for reason, _ in reasons),
+            "unresolved_mappings": [entry["column_name"] for entry in mapper.resolution["unresolved"]],
+            "elapsed_seconds": round(elapsed, 3),
+            "records_per_second": round(records / elapsed) if elapsed else records
+        }
+
+    def _check(self, mapper: RecordMapper, row, date_headers: Dict[int, str], institutions: Dict[Any, str],
+               processor_code: Optional[str]) -> Tuple[Optional[str], str]:
+        """(reason code, field) of the first check a record fails, or (None, "")"""
+        for index, header in date_headers.items():
+            if index < len(row) and row[index] not in self._valid_dates:
+                try:
+                    transform(row[index], DATE_TRANSFORMATION)
+                except ValueError:
+                    return FILE_FAILING_REASON, header
+                if len(self._valid_dates) >= VALUE_CACHE_SIZE:
+                    self._valid_dates.clear()
+                self._valid_dates.add(row[index])
+        record, reason = mapper.map_row(row)
+        if record is None:
+            # "missing txn_count" / "bad decimal txn_total_amount"
+            words = reason.split()
+            return "_".join(words[:-1]), words[-1]
+        if self.converter_table is not None:
+            value = record.get("institution_id")
+            outcome = institutions.get(value)
+            if outcome is None:
+                outcome = institutions[value] = self.converter_table.resolve(value, processor_code)[0]
+            if OUTCOMES[outcome]:
+                return f"institution_{outcome}", "institution_id"
+        return None, ""
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Oversized Report Splitter
+Cuts large processor drops into header-preserving chunks the ingestion cron can process in bounded
+memory, and tracks each chunk through the drop directory, its archive and the import logs.
+"""
+
+import argparse
+import os
+import time
+
+from payrep_tools.report_types import chunked_pattern, match_report_type
+from payrep_tools.splitter import (DEFAULT_CHUNK_ROWS, CsvSplitter, SplitManifest, import_statuses,
+                                   manifest_path_for, recut, verify)
+
+
+def split(args):
+    for source in args.files:
+        pattern = args.pattern
+        if pattern is None:
+            report_type = match_report_type(os.path.basename(source))
+            if report_type is None:
+                print(f"❌ {source}: no report type matches the file name; pass --pattern")
+                continue
+            # The seeded patterns end in the date, so chunk names need the widened form
+            pattern = chunked_pattern(report_type.file_name_pattern)
+            print(f"ℹ️ Chunk names checked against {pattern}; the file config needs the same fileNamePattern")
+
+        started = time.perf_counter()
+        try:
+            manifest = CsvSplitter(args.out, pattern, args.rows).split(source)
+        except ValueError as e:
+            print(f"❌ {source}: {e}")
+            continue
+        elapsed = time.perf_counter() - started
+        print(f"✅ {source}: {manifest.records:,} records in {len(manifest.chunks)} chunks of up to "
+              f"{manifest.chunk_rows:,} ({manifest.source_size / (1 << 20) / elapsed:.0f} MB/s)")
+        print(f"   Manifest: {manifest_path_for(source, args.out)}")
+
+
+def status(args):
+    manifest = SplitManifest.load(args.manifest)
+    statuses = {}
+    if args.config_id is not None:
+        from payrep_tools.admin_client import AdminClient
+        client = AdminClient(args.base_url)
+        statuses = import_statuses(manifest, client.get_json(f"/api/admin/import-logs/config/{args.config_id}"))
+
+    print(f"📄 {manifest.source}: {manifest.records:,} records, {len(manifest.chunks)} chunks"
+          f"{'' if manifest.complete else ' (split not finished)'}")
+    for state in verify(manifest):
+        import_status = statuses.get(state["file"], "")
+        emoji = {"archived": "✅", "waiting": "⏳", "corrupt": "❌", "missing": "❌"}[state["state"]]
+        if import_status == "FAILED":
+            emoji = "❌"
+        print(f"   {emoji} {state['file']}: {state['rows']:,} rows, {state['state']} {import_status}".rstrip())
+
+
+def recut_chunks(args):
+    manifest = SplitManifest.load(args.manifest)
+    for index in args.chunks:
+        try:
+            chunk = recut(manifest, index)
+        except (ValueError, OSError) as e:
+            print(f"❌ Chunk {index}: {e}")
+            continue
+        print(f"✅ {chunk.file} cut again (records {chunk.first_record:,}-{chunk.last_record:,})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Split oversized processor reports into ingestible chunks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    split_parser = commands.add_parser("split", help="split files into <name>_partNNNN.csv chunks")
+    split_parser.add_argument("files", nargs="+")
+    split_parser.add_argument("--out", required=True, help="drop directory the file config watches")
+    split_parser.add_argument("--rows", type=int, default=DEFAULT_CHUNK_ROWS, help="records per chunk")
+    split_parser.add_argument("--pattern", help="the file config's fileNamePattern (default: the report type's, "
+                                                "widened to accept chunk names)")
+    split_parser.set_defaults(run=split)
+
+    status_parser = commands.add_parser("status", help="show where every chunk of a split is")
+    status_parser.add_argument("manifest")
+    status_parser.add_argument("--config-id", type=int, help="also read the config's import logs")
+    status_parser.add_argument("--base-url", default="http://localhost:8080")
+    status_parser.set_defaults(run=status)
+
+    recut_parser = commands.add_parser("recut", help="cut chunks again from the source file")
+    recut_parser.add_argument("manifest")
+    recut_parser.add_argument("chunks", type=int, nargs="+", help="chunk numbers")
+    recut_parser.set_defaults(run=recut_chunks)
+
+    args = parser.parse_args()
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
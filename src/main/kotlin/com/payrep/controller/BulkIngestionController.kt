@@ -0,0 +1,48 @@
+package com.payrep.controller
+
+import com.payrep.dto.BulkImportFinishDto
+import com.payrep.dto.BulkImportStartDto
+import com.payrep.dto.BulkRecordsDto
+import com.payrep.service.BulkIngestionService
+import org.springframework.http.ResponseEntity
+import org.springframework.security.access.prepost.PreAuthorize
+import org.springframework.web.bind.annotation.*
+
+/**
+ * Bulk path for validated files: the Python uploader maps and types the records, this endpoint batch-inserts them.
+ */
+@RestController
+@RequestMapping("/api/admin/bulk")
+@PreAuthorize("hasRole('ADMIN')")
+class BulkIngestionController(
+    private val bulkIngestionService: BulkIngestionService
+) {
+
+    @PostMapping("/{reportType}")
+    fun ingest(@PathVariable reportType: String, @RequestBody batch: BulkRecordsDto): ResponseEntity<Map<String, Any>> {
+        val result = bulkIngestionService.ingest(reportType, batch.processorCode, batch.fileName, batch.records)
+            ?: return ResponseEntity.notFound().build()
+        return ResponseEntity.ok(result)
+    }
+
+    @PostMapping("/{reportType}/import-log")
+    fun startImport(@PathVariable reportType: String,
+                    @RequestBody file: BulkImportStartDto): ResponseEntity<Map<String, Any>> {
+        val result = bulkIngestionService.startImport(reportType, file.processorCode, file.fileName)
+            ?: return ResponseEntity.notFound().build()
+        return ResponseEntity.ok(result)
+    }
+
+    @PutMapping("/import-log/{importLogId}")
+    fun finishImport(@PathVariable importLogId: Long,
+                     @RequestBody outcome: BulkImportFinishDto): ResponseEntity<Map<String, Any>> {
+        val success = when (outcome.status.uppercase()) {
+            "SUCCESS" -> true
+            "FAILED" -> false
+            else -> return ResponseEntity.badRequest().body(mapOf("message" to "Unknown status: ${outcome.status}"))
+        }
+        val result = bulkIngestionService.finishImport(importLogId, success, outcome.errorMessage)
+            ?: return ResponseEntity.notFound().build()
+        return ResponseEntity.ok(result)
+    }
+}
@@ -0,0 +1,28 @@
+package com.payrep.controller
+
+import com.payrep.service.FileIngestionService
+import org.springframework.http.HttpStatus
+import org.springframework.http.ResponseEntity
+import org.springframework.security.access.prepost.PreAuthorize
+import org.springframework.web.bind.annotation.*
+
+/**
+ * Lets the drop watcher start ingestion of a directory as soon as a file is ready, instead of waiting for the
+ * next cron tick.
+ */
+@RestController
+@RequestMapping("/api/admin/ingestion")
+@PreAuthorize("hasRole('ADMIN')")
+class IngestionController(
+    private val fileIngestionService: FileIngestionService
+) {
+
+    @PostMapping("/run")
+    fun run(@RequestParam("directory") directory: String): ResponseEntity<Map<String, Any>> {
+        val configs = fileIngestionService.processDirectory(directory)
+            ?: return ResponseEntity.status(HttpStatus.CONFLICT)
+                .body(mapOf("directory" to directory, "message" to "A processing run is already in progress"))
+        if (configs == 0) return ResponseEntity.notFound().build()
+        return ResponseEntity.ok(mapOf("directory" to directory, "configsProcessed" to configs))
+    }
+}
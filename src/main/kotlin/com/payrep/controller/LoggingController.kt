@@ -0,0 +1,42 @@
+package com.payrep.controller
+
+import com.payrep.service.DebugLogLevel
+import com.payrep.service.DebugLogSettings
+import org.springframework.boot.logging.LogLevel
+import org.springframework.boot.logging.LoggingSystem
+import org.springframework.http.ResponseEntity
+import org.springframework.security.access.prepost.PreAuthorize
+import org.springframework.web.bind.annotation.*
+
+data class LoggingSettingsDto(
+    val debugLogLevel: String? = null,
+    val levels: Map<String, String> = emptyMap()
+)
+
+@RestController
+@RequestMapping("/api/admin/logging")
+@PreAuthorize("hasRole('ADMIN')")
+class LoggingController(
+    private val loggingSystem: LoggingSystem
+) {
+    private val reportedLoggers = listOf("com.payrep", "org.hibernate.SQL", "org.hibernate.orm.jdbc.bind")
+
+    @GetMapping
+    fun getLogging(): ResponseEntity<LoggingSettingsDto> {
+        val levels = reportedLoggers.associateWith { name ->
+            loggingSystem.getLoggerConfiguration(name)?.effectiveLevel?.name ?: "UNKNOWN"
+        }
+        return ResponseEntity.ok(LoggingSettingsDto(DebugLogSettings.level.name, levels))
+    }
+
+    @PutMapping
+    fun updateLogging(@RequestBody dto: LoggingSettingsDto): ResponseEntity<LoggingSettingsDto> {
+        try {
+            dto.debugLogLevel?.let { DebugLogSettings.level = DebugLogLevel.valueOf(it.uppercase()) }
+            dto.levels.forEach { (name, level) -> loggingSystem.setLogLevel(name, LogLevel.valueOf(level.uppercase())) }
+        } catch (e: IllegalArgumentException) {
+            return ResponseEntity.badRequest().build()
+        }
+        return getLogging()
+    }
+}
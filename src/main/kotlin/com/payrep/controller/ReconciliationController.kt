@@ -0,0 +1,46 @@
+package com.payrep.controller
+
+import com.payrep.repository.AtmTransactionDataRepository
+import com.payrep.repository.ECommerceCardActivityRepository
+import com.payrep.repository.PosTerminalDataRepository
+import com.payrep.repository.PosTransactionDataRepository
+import com.payrep.repository.TransactionVolumeRepository
+import org.springframework.format.annotation.DateTimeFormat
+import org.springframework.http.ResponseEntity
+import org.springframework.security.access.prepost.PreAuthorize
+import org.springframework.web.bind.annotation.*
+import java.time.LocalDate
+
+/**
+ * Ingested row counts and amount sums per report date and institution, so source files can be
+ * reconciled against what DataMapper actually saved.
+ */
+@RestController
+@RequestMapping("/api/admin/reconciliation")
+@PreAuthorize("hasRole('ADMIN')")
+class ReconciliationController(
+    private val transactionVolumeRepository: TransactionVolumeRepository,
+    private val atmTransactionDataRepository: AtmTransactionDataRepository,
+    private val posTerminalDataRepository: PosTerminalDataRepository,
+    private val posTransactionDataRepository: PosTransactionDataRepository,
+    private val eCommerceCardActivityRepository: ECommerceCardActivityRepository
+) {
+
+    @GetMapping("/{reportType}")
+    fun getDailyTotals(
+        @PathVariable reportType: String,
+        @RequestParam("startDate") @DateTimeFormat(iso = DateTimeFormat.ISO.DATE) startDate: LocalDate,
+        @RequestParam("endDate") @DateTimeFormat(iso = DateTimeFormat.ISO.DATE) endDate: LocalDate,
+        @RequestParam("institutions") institutions: List<String>
+    ): ResponseEntity<List<Map<String, Any>>> {
+        val totals = when (reportType) {
+            "transaction_volume" -> transactionVolumeRepository.getDailyTotals(startDate, endDate, institutions)
+            "atm_transaction_data" -> atmTransactionDataRepository.getDailyTotals(startDate, endDate, institutions)
+            "pos_terminal_data" -> posTerminalDataRepository.getDailyTotals(startDate, endDate, institutions)
+            "pos_transaction_data" -> posTransactionDataRepository.getDailyTotals(startDate, endDate, institutions)
+            "ecommerce_card_activity" -> eCommerceCardActivityRepository.getDailyTotals(startDate, endDate, institutions)
+            else -> return ResponseEntity.notFound().build()
+        }
+        return ResponseEntity.ok(totals)
+    }
+}
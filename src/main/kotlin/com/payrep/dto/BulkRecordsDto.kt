@@ -0,0 +1,26 @@
+package com.payrep.dto
+
+/**
+ * One batch of pre-mapped records, keyed by table column, as the bulk uploader sends them.
+ */
+data class BulkRecordsDto(
+    val processorCode: String,
+    val fileName: String,
+    val records: List<Map<String, Any?>>
+)
+
+/**
+ * A file the bulk uploader is about to send, for its PENDING ImportLog.
+ */
+data class BulkImportStartDto(
+    val processorCode: String,
+    val fileName: String
+)
+
+/**
+ * How a bulk upload ended; errorMessage explains a FAILED one.
+ */
+data class BulkImportFinishDto(
+    val status: String,
+    val errorMessage: String? = null
+)
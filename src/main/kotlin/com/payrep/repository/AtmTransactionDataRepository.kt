@@ -3,6 +3,7 @@ package com.payrep.repository
 import com.payrep.domain.AtmTransactionData
 import org.springframework.data.jpa.repository.JpaRepository
 import org.springframework.data.jpa.repository.Query
+import org.springframework.data.repository.query.Param
 import org.springframework.stereotype.Repository
 import java.time.LocalDate
 
@@ -10,4 +11,7 @@ import java.time.LocalDate
 interface AtmTransactionDataRepository : JpaRepository<AtmTransactionData, Long> {
     @Query("SELECT a FROM AtmTransactionData a WHERE a.reportDate BETWEEN :startDate AND :endDate")
     fun findByReportDateBetween(startDate: LocalDate, endDate: LocalDate): List<AtmTransactionData>
+
+    @Query("SELECT a.reportDate as reportDate, a.bankOrTPP.code as institution, COUNT(a) as rowCount, SUM(a.totalLoadedAmount) as totalLoadedAmount, SUM(a.txnSuccessCount) as txnSuccessCount, SUM(a.txnFailedCount) as txnFailedCount FROM AtmTransactionData a WHERE a.reportDate BETWEEN :startDate AND :endDate AND a.bankOrTPP.code IN :institutions GROUP BY a.reportDate, a.bankOrTPP.code")
+    fun getDailyTotals(@Param("startDate") startDate: LocalDate, @Param("endDate") endDate: LocalDate, @Param("institutions") institutions: Collection<String>): List<Map<String, Any>>
 }
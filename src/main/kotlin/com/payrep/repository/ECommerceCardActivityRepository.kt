@@ -3,6 +3,7 @@ package com.payrep.repository
 import com.payrep.domain.ECommerceCardActivity
 import org.springframework.data.jpa.repository.JpaRepository
 import org.springframework.data.jpa.repository.Query
+import org.springframework.data.repository.query.Param
 import org.springframework.stereotype.Repository
 import java.time.LocalDate
 
@@ -10,4 +11,7 @@ import java.time.LocalDate
 interface ECommerceCardActivityRepository : JpaRepository<ECommerceCardActivity, Long> {
     @Query("SELECT e FROM ECommerceCardActivity e WHERE e.reportDate BETWEEN :startDate AND :endDate")
     fun findByReportDateBetween(startDate: LocalDate, endDate: LocalDate): List<ECommerceCardActivity>
+
+    @Query("SELECT e.reportDate as reportDate, e.bankOrTPP.code as institution, COUNT(e) as rowCount, SUM(e.ecommerceEnabledCards) as ecommerceEnabledCards, SUM(e.ecommerceActivityCards) as ecommerceActivityCards FROM ECommerceCardActivity e WHERE e.reportDate BETWEEN :startDate AND :endDate AND e.bankOrTPP.code IN :institutions GROUP BY e.reportDate, e.bankOrTPP.code")
+    fun getDailyTotals(@Param("startDate") startDate: LocalDate, @Param("endDate") endDate: LocalDate, @Param("institutions") institutions: Collection<String>): List<Map<String, Any>>
 }
@@ -3,6 +3,7 @@ package com.payrep.repository
 import com.payrep.domain.PosTerminalData
 import org.springframework.data.jpa.repository.JpaRepository
 import org.springframework.data.jpa.repository.Query
+import org.springframework.data.repository.query.Param
 import org.springframework.stereotype.Repository
 import java.time.LocalDate
 
@@ -10,4 +11,7 @@ import java.time.LocalDate
 interface PosTerminalDataRepository : JpaRepository<PosTerminalData, Long> {
     @Query("SELECT p FROM PosTerminalData p WHERE p.reportDate BETWEEN :startDate AND :endDate")
     fun findByReportDateBetween(startDate: LocalDate, endDate: LocalDate): List<PosTerminalData>
+
+    @Query("SELECT p.reportDate as reportDate, p.bankOrTPP.code as institution, COUNT(p) as rowCount, SUM(p.terminalsActiveCount) as terminalsActiveCount, SUM(p.terminalsIssuedCount) as terminalsIssuedCount, SUM(p.terminalsDecomCount) as terminalsDecomCount FROM PosTerminalData p WHERE p.reportDate BETWEEN :startDate AND :endDate AND p.bankOrTPP.code IN :institutions GROUP BY p.reportDate, p.bankOrTPP.code")
+    fun getDailyTotals(@Param("startDate") startDate: LocalDate, @Param("endDate") endDate: LocalDate, @Param("institutions") institutions: Collection<String>): List<Map<String, Any>>
 }
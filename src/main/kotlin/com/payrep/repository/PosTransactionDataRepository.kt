@@ -3,6 +3,7 @@ package com.payrep.repository
 import com.payrep.domain.PosTransactionData
 import org.springframework.data.jpa.repository.JpaRepository
 import org.springframework.data.jpa.repository.Query
+import org.springframework.data.repository.query.Param
 import org.springframework.stereotype.Repository
 import java.time.LocalDate
 
@@ -10,4 +11,7 @@ import java.time.LocalDate
 interface PosTransactionDataRepository : JpaRepository<PosTransactionData, Long> {
     @Query("SELECT p FROM PosTransactionData p WHERE p.reportDate BETWEEN :startDate AND :endDate")
     fun findByReportDateBetween(startDate: LocalDate, endDate: LocalDate): List<PosTransactionData>
+
+    @Query("SELECT p.reportDate as reportDate, p.bankOrTPP.code as institution, COUNT(p) as rowCount, SUM(p.txnSuccessCount) as txnSuccessCount, SUM(p.txnFailedCount) as txnFailedCount, SUM(p.totalTransactionAmount) as totalTransactionAmount FROM PosTransactionData p WHERE p.reportDate BETWEEN :startDate AND :endDate AND p.bankOrTPP.code IN :institutions GROUP BY p.reportDate, p.bankOrTPP.code")
+    fun getDailyTotals(@Param("startDate") startDate: LocalDate, @Param("endDate") endDate: LocalDate, @Param("institutions") institutions: Collection<String>): List<Map<String, Any>>
 }
@@ -3,6 +3,7 @@ package com.payrep.repository
 import com.payrep.domain.TransactionVolume
 import org.springframework.data.jpa.repository.JpaRepository
 import org.springframework.data.jpa.repository.Query
+import org.springframework.data.repository.query.Param
 import org.springframework.stereotype.Repository
 import java.time.LocalDate
 
@@ -10,4 +11,7 @@ import java.time.LocalDate
 interface TransactionVolumeRepository : JpaRepository<TransactionVolume, Long> {
     @Query("SELECT t FROM TransactionVolume t WHERE t.reportDate BETWEEN :startDate AND :endDate")
     fun findByReportDateBetween(startDate: LocalDate, endDate: LocalDate): List<TransactionVolume>
+
+    @Query("SELECT t.reportDate as reportDate, t.bankOrTPP.code as institution, COUNT(t) as rowCount, SUM(t.txnCount) as txnCount, SUM(t.txnTotalAmount) as txnTotalAmount, SUM(t.txnSuccessCount) as txnSuccessCount, SUM(t.txnFailedCount) as txnFailedCount FROM TransactionVolume t WHERE t.reportDate BETWEEN :startDate AND :endDate AND t.bankOrTPP.code IN :institutions GROUP BY t.reportDate, t.bankOrTPP.code")
+    fun getDailyTotals(@Param("startDate") startDate: LocalDate, @Param("endDate") endDate: LocalDate, @Param("institutions") institutions: Collection<String>): List<Map<String, Any>>
 }
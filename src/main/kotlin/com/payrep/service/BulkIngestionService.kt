@@ -0,0 +1,190 @@
+package com.payrep.service
+
+import com.payrep.domain.ImportLog
+import com.payrep.repository.BankOrTPPRepository
+import com.payrep.repository.FileProcessingConfigRepository
+import com.payrep.repository.ImportLogRepository
+import org.slf4j.LoggerFactory
+import org.springframework.beans.factory.annotation.Value
+import org.springframework.dao.DataIntegrityViolationException
+import org.springframework.dao.DuplicateKeyException
+import org.springframework.jdbc.core.JdbcTemplate
+import org.springframework.stereotype.Service
+import org.springframework.transaction.support.TransactionTemplate
+import java.math.BigDecimal
+import java.sql.Timestamp
+import java.time.LocalDate
+import java.time.LocalDateTime
+
+/**
+ * Inserts records the bulk uploader has already mapped and typed the way DataMapper would. Each distinct
+ * institution ID of a batch is converted once, and rows go in as JDBC batches instead of one repository.save
+ * per record, which IDENTITY ids otherwise force. Like processFile, each uploaded file gets one ImportLog row:
+ * PENDING before its first batch, then SUCCESS or FAILED once the uploader has sent every batch.
+ */
+@Service
+class BulkIngestionService(
+    private val jdbcTemplate: JdbcTemplate,
+    private val transactionTemplate: TransactionTemplate,
+    private val dataMapper: DataMapper,
+    private val bankOrTPPRepository: BankOrTPPRepository,
+    private val fileConfigRepository: FileProcessingConfigRepository,
+    private val importLogRepository: ImportLogRepository,
+    @Value("\${payrep.bulk.chunk-size:1000}") private val chunkSize: Int
+) {
+    private val logger = LoggerFactory.getLogger(BulkIngestionService::class.java)
+
+    private enum class Kind { STRING, INT, DECIMAL, DATE }
+
+    private class TableSpec(val table: String, val columns: List<Pair<String, Kind>>, val withFileName: Boolean = false) {
+        // transaction_volume also stores the file name, the default currency and the creation time
+        val sql = "INSERT INTO $table (bank_or_tpp_id, ${columns.joinToString(", ") { it.first }}" +
+            (if (withFileName) ", currency, created_at, file_name" else "") + ") VALUES (" +
+            List(columns.size + 1 + (if (withFileName) 3 else 0)) { "?" }.joinToString(", ") + ")"
+    }
+
+    companion object {
+        private fun columns(vararg columns: Pair<String, Kind>) = columns.toList()
+
+        // Columns of the entities the DataMapper to* functions build, keyed by report type
+        private val TABLES = mapOf(
+            "atm_terminal_data" to TableSpec("atm_terminal_data", columns(
+                "atm_new_count" to Kind.INT, "atm_active_count" to Kind.INT, "atm_inactive_count" to Kind.INT,
+                "atm_maintenance_count" to Kind.INT, "atm_location_type" to Kind.STRING,
+                "atm_total_count" to Kind.INT, "report_date" to Kind.DATE)),
+            "atm_transaction_data" to TableSpec("atm_transaction_data", columns(
+                "atm_id" to Kind.STRING, "branch_name" to Kind.STRING, "txn_success_count" to Kind.INT,
+                "txn_failed_count" to Kind.INT, "total_loaded_amount" to Kind.DECIMAL,
+                "transaction_category" to Kind.STRING, "report_date" to Kind.DATE)),
+            "pos_terminal_data" to TableSpec("pos_terminal_data", columns(
+                "mcc_code" to Kind.STRING, "mcc_description" to Kind.STRING,
+                "terminals_issued_count" to Kind.INT, "terminals_delivered_count" to Kind.INT,
+                "terminals_reissued_count" to Kind.INT, "terminals_decom_count" to Kind.INT,
+                "terminals_active_count" to Kind.INT, "terminals_activity_count" to Kind.INT,
+                "terminals_total_count" to Kind.INT, "report_date" to Kind.DATE)),
+            "pos_transaction_data" to TableSpec("pos_transaction_data", columns(
+                "txn_success_count" to Kind.INT, "txn_failed_count" to Kind.INT,
+                "total_transaction_amount" to Kind.DECIMAL, "transaction_category" to Kind.STRING,
+                "report_date" to Kind.DATE)),
+            "card_lifecycle" to TableSpec("card_lifecycle", columns(
+                "card_product_code" to Kind.STRING, "card_product_type" to Kind.STRING,
+                "card_technology_type" to Kind.STRING, "cards_issued_count" to Kind.INT,
+                "cards_delivered_count" to Kind.INT, "cards_activated_count" to Kind.INT,
+                "cards_renewed_count" to Kind.INT, "cards_reissued_count" to Kind.INT,
+                "cards_deactivated_count" to Kind.INT, "cards_activity_count" to Kind.INT,
+                "report_date" to Kind.DATE)),
+            "ecommerce_card_activity" to TableSpec("ecommerce_card_activity", columns(
+                "card_product_code" to Kind.STRING, "ecommerce_enabled_cards" to Kind.INT,
+                "ecommerce_activity_cards" to Kind.INT, "report_date" to Kind.DATE)),
+            "transaction_volume" to TableSpec("transaction_volume", columns(
+                "channel_code" to Kind.STRING, "transaction_type_code" to Kind.STRING,
+                "transaction_type_desc" to Kind.STRING, "mcc_code" to Kind.STRING,
+                "mcc_description" to Kind.STRING, "txn_count" to Kind.INT, "txn_total_amount" to Kind.DECIMAL,
+                "txn_success_count" to Kind.INT, "txn_failed_count" to Kind.INT,
+                "transaction_category" to Kind.STRING, "report_date" to Kind.DATE), withFileName = true)
+        )
+    }
+
+    /**
+     * Same parsing as DataMapper; INT goes through the string like asInt, so 12.5 or 3000000000 is rejected
+     * instead of being truncated or wrapped by Number.toInt().
+     */
+    private fun convert(value: Any?, kind: Kind): Any = when (kind) {
+        Kind.STRING -> value!!.toString()
+        Kind.INT -> value!!.toString().toInt()
+        Kind.DECIMAL -> BigDecimal(value!!.toString())
+        Kind.DATE -> java.sql.Date.valueOf(LocalDate.parse(value!!.toString()))
+    }
+
+    /**
+     * Save a PENDING ImportLog for a file about to be uploaded, under the processor's config whose pattern
+     * matches the file name, as the cron run would pick it up; null when there is no such config.
+     */
+    fun startImport(reportType: String, processorCode: String, fileName: String): Map<String, Any>? {
+        if (reportType !in TABLES) return null
+        val bank = bankOrTPPRepository.findByCode(processorCode) ?: return null
+        val config = fileConfigRepository.findByBankOrTPPId(bank.id!!)
+            .firstOrNull { fileName.matches(it.fileNamePattern.toRegex()) } ?: return null
+        val importLog = importLogRepository.save(ImportLog(
+            fileProcessingConfig = config,
+            fileName = fileName,
+            importTime = LocalDateTime.now(),
+            status = ImportLog.ImportStatus.PENDING
+        ))
+        return mapOf("importLogId" to importLog.id!!, "fileProcessingConfigId" to config.id!!)
+    }
+
+    /**
+     * Mark a bulk upload's ImportLog SUCCESS, or FAILED with the error message; null when there is no such log.
+     */
+    fun finishImport(importLogId: Long, success: Boolean, errorMessage: String?): Map<String, Any>? {
+        val importLog = importLogRepository.findById(importLogId).orElse(null) ?: return null
+        val status = if (success) ImportLog.ImportStatus.SUCCESS else ImportLog.ImportStatus.FAILED
+        importLogRepository.save(importLog.copy(status = status, errorMessage = if (success) null else errorMessage))
+        logger.info("Bulk upload of ${importLog.fileName} finished with $status")
+        return mapOf("importLogId" to importLogId, "status" to status.name)
+    }
+
+    /**
+     * Insert one batch; null when the report type has no table.
+     */
+    fun ingest(reportType: String, processorCode: String, fileName: String,
+               records: List<Map<String, Any?>>): Map<String, Any>? {
+        val spec = TABLES[reportType] ?: return null
+        val started = System.currentTimeMillis()
+
+        // Same conversion as convertInstitutionId per record in saveData, once per distinct ID
+        val bankIds = records.mapNotNull { it["institution_id"]?.toString() }.distinct()
+            .associateWith { dataMapper.convertInstitutionId(it, processorCode)?.id }
+
+        var unresolved = 0
+        var rejected = 0
+        val createdAt = Timestamp.valueOf(LocalDateTime.now())
+        val rows = ArrayList<Array<Any?>>(records.size)
+        for (record in records) {
+            val bankId = bankIds[record["institution_id"]?.toString()]
+            if (bankId == null) {
+                unresolved++
+                continue
+            }
+            try {
+                val values = spec.columns.map { (column, kind) -> convert(record[column], kind) }
+                rows.add((listOf<Any?>(bankId) + values +
+                    (if (spec.withFileName) listOf("LYD", createdAt, fileName) else emptyList())).toTypedArray())
+            } catch (e: Exception) {
+                rejected++
+            }
+        }
+
+        var saved = 0
+        var duplicates = 0
+        for (chunk in rows.chunked(chunkSize)) {
+            try {
+                transactionTemplate.executeWithoutResult { jdbcTemplate.batchUpdate(spec.sql, chunk) }
+                saved += chunk.size
+            } catch (e: DataIntegrityViolationException) {
+                // One duplicate fails the whole batch; saveData would have saved the other records
+                for (row in chunk) {
+                    try {
+                        jdbcTemplate.update(spec.sql, *row)
+                        saved++
+                    } catch (e: DuplicateKeyException) {
+                        duplicates++
+                    } catch (e: DataIntegrityViolationException) {
+                        rejected++
+                    }
+                }
+            }
+        }
+
+        logger.info("Bulk ingested $saved of ${records.size} $reportType records from $fileName " +
+            "(processor $processorCode) in ${System.currentTimeMillis() - started} ms")
+        return mapOf(
+            "received" to records.size,
+            "saved" to saved,
+            "unresolvedInstitutions" to unresolved,
+            "duplicates" to duplicates,
+            "rejected" to rejected
+        )
+    }
+}
@@ -55,6 +55,7 @@ class DataMapper(
     private val logFileName = "debug-logs/institution-conversion-${LocalDateTime.now().format(DateTimeFormatter.ofPattern("yyyy-MM-dd-HH-mm-ss"))}.log"
     
     private fun logToFileAndConsole(message: String) {
+        if (!DebugLogSettings.isEnabled(DebugLogLevel.DEBUG)) return
         val timestamp = LocalDateTime.now().format(DateTimeFormatter.ofPattern("yyyy-MM-dd HH:mm:ss.SSS"))
         val logMessage = "[$timestamp] $message"
         
@@ -76,7 +77,7 @@ class DataMapper(
     /**
      * Convert external institution ID to BankOrTPP entity using converter layer
      */
-    private fun convertInstitutionId(externalInstitutionId: String?, processorCode: String): BankOrTPP? {
+    fun convertInstitutionId(externalInstitutionId: String?, processorCode: String): BankOrTPP? {
         try {
             logToFileAndConsole("=== INSTITUTION CONVERSION DEBUG ===")
             logToFileAndConsole("External ID: '$externalInstitutionId', Processor: '$processorCode'")
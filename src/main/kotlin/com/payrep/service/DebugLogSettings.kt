@@ -0,0 +1,40 @@
+package com.payrep.service
+
+import jakarta.annotation.PostConstruct
+import org.slf4j.LoggerFactory
+import org.springframework.beans.factory.annotation.Value
+import org.springframework.stereotype.Component
+
+/**
+ * Threshold for the debug-logs/ files written by FileParser, FileIngestionService and DataMapper.
+ * DEBUG keeps the per-record lines, INFO only the per-file ones, OFF writes nothing.
+ */
+enum class DebugLogLevel { DEBUG, INFO, OFF }
+
+object DebugLogSettings {
+    @Volatile
+    var level: DebugLogLevel = DebugLogLevel.DEBUG
+
+    fun isEnabled(level: DebugLogLevel): Boolean = level.ordinal >= this.level.ordinal
+}
+
+/**
+ * Applies payrep.debug-logs.level at startup; an unknown level keeps the default instead of failing the context.
+ */
+@Component
+class DebugLogSettingsInitializer(
+    @Value("\${payrep.debug-logs.level:DEBUG}") private val configuredLevel: String
+) {
+    private val logger = LoggerFactory.getLogger(DebugLogSettingsInitializer::class.java)
+
+    @PostConstruct
+    fun applyConfiguredLevel() {
+        val level = DebugLogLevel.values().firstOrNull { it.name == configuredLevel.trim().uppercase() }
+        if (level == null) {
+            logger.warn("Unknown payrep.debug-logs.level '$configuredLevel', expected one of " +
+                "${DebugLogLevel.values().joinToString()}; using ${DebugLogSettings.level}")
+            return
+        }
+        DebugLogSettings.level = level
+    }
+}
@@ -3,12 +3,15 @@ package com.payrep.service
 import com.payrep.domain.*
 import com.payrep.repository.*
 import com.payrep.service.*
+import com.fasterxml.jackson.databind.ObjectMapper
+import org.springframework.beans.factory.annotation.Value
 import org.springframework.scheduling.annotation.Scheduled
 import org.springframework.stereotype.Service
 import java.io.File
 import java.io.FileWriter
 import java.time.LocalDateTime
 import java.time.format.DateTimeFormatter
+import java.util.concurrent.locks.ReentrantLock
 import org.slf4j.LoggerFactory
 
 @Service
@@ -23,18 +26,40 @@ class FileIngestionService(
     private val eCommerceCardActivityRepository: ECommerceCardActivityRepository,
     private val posTerminalDataRepository: PosTerminalDataRepository,
     private val posTransactionDataRepository: PosTransactionDataRepository,
-    private val transactionVolumeRepository: TransactionVolumeRepository
+    private val transactionVolumeRepository: TransactionVolumeRepository,
+    @Value("\${payrep.drop-watch.require-verdict:false}") private val requireVerdict: Boolean
 ) {
     private val logger = LoggerFactory.getLogger(FileIngestionService::class.java)
+    private val objectMapper = ObjectMapper()
+    // The cron run and a watcher-triggered run must not pick up the same file
+    private val processingLock = ReentrantLock()
+
+    companion object {
+        const val VERDICT_SUFFIX = ".verdict.json"
+    }
     private val logFileName = "debug-logs/file-processing-${LocalDateTime.now().format(DateTimeFormatter.ofPattern("yyyy-MM-dd-HH-mm-ss"))}.log"
     
-    private fun logToFileAndConsole(message: String) {
+    private fun logToFileAndConsole(message: String, level: DebugLogLevel = DebugLogLevel.DEBUG) {
+        if (!DebugLogSettings.isEnabled(level)) return
         val timestamp = LocalDateTime.now().format(DateTimeFormatter.ofPattern("yyyy-MM-dd HH:mm:ss.SSS"))
         val logMessage = "[$timestamp] $message"
         
         // Console log
         logger.info(logMessage)
         
+        writeToLogFile(logMessage)
+    }
+
+    /**
+     * Debug log file only, for lines that already go to the console ungated.
+     */
+    private fun logToFile(message: String, level: DebugLogLevel = DebugLogLevel.DEBUG) {
+        if (!DebugLogSettings.isEnabled(level)) return
+        val timestamp = LocalDateTime.now().format(DateTimeFormatter.ofPattern("yyyy-MM-dd HH:mm:ss.SSS"))
+        writeToLogFile("[$timestamp] $message")
+    }
+
+    private fun writeToLogFile(logMessage: String) {
         // File log
         try {
             val logFile = File(logFileName)
@@ -49,18 +74,43 @@ class FileIngestionService(
 
     @Scheduled(cron = "0 */2 * * * ?") // Every 2 minutes - matches TPP 901 schedule
     fun processFiles() {
-        logger.info("Starting file processing job at ${LocalDateTime.now()}")
-        
-        val configs = fileConfigRepository.findAll()
-        logger.info("Found ${configs.size} file processing configurations")
-        
-        configs.forEach { config ->
-            logger.info("Processing config ID: ${config.id} for ${config.bankOrTPP.code} - ${config.fileType}")
-            logger.info("Directory: ${config.directoryPath}, Pattern: ${config.fileNamePattern}")
-            processConfig(config)
+        if (!processingLock.tryLock()) {
+            logger.info("Skipping file processing job: a previous run is still in progress")
+            return
+        }
+        try {
+            logger.info("Starting file processing job at ${LocalDateTime.now()}")
+            
+            val configs = fileConfigRepository.findAll()
+            logger.info("Found ${configs.size} file processing configurations")
+            
+            configs.forEach { config ->
+                logger.info("Processing config ID: ${config.id} for ${config.bankOrTPP.code} - ${config.fileType}")
+                logger.info("Directory: ${config.directoryPath}, Pattern: ${config.fileNamePattern}")
+                processConfig(config)
+            }
+            
+            logger.info("Completed file processing job at ${LocalDateTime.now()}")
+        } finally {
+            processingLock.unlock()
+        }
+    }
+
+    /**
+     * Runs the configs watching one directory right away, for the drop watcher to call once a file is ready.
+     * Returns the number of configs run, or null when another run holds the lock.
+     */
+    fun processDirectory(directoryPath: String): Int? {
+        if (!processingLock.tryLock()) return null
+        try {
+            val target = File(directoryPath).canonicalPath
+            val configs = fileConfigRepository.findAll().filter { File(it.directoryPath).canonicalPath == target }
+            logger.info("Processing ${configs.size} configs for $directoryPath on request")
+            configs.forEach { processConfig(it) }
+            return configs.size
+        } finally {
+            processingLock.unlock()
         }
-        
-        logger.info("Completed file processing job at ${LocalDateTime.now()}")
     }
 
     private fun processConfig(config: FileProcessingConfig) {
@@ -78,22 +128,16 @@ class FileIngestionService(
         val allFiles = directory.listFiles() ?: emptyArray()
         logger.info("Found ${allFiles.size} total files in directory")
         
-        if (allFiles.isNotEmpty()) {
-            logger.info("All files in directory:")
-            allFiles.forEach { file ->
-                logger.info("  - ${file.name} (matches pattern: ${file.name.matches(config.fileNamePattern.toRegex())})")
-            }
-        }
-
-        val files = directory.listFiles { file ->
-            val matches = file.name.matches(config.fileNamePattern.toRegex())
-            logger.info("File ${file.name} matches pattern ${config.fileNamePattern}: $matches")
+        val pattern = config.fileNamePattern.toRegex()
+        val files = allFiles.filter { file ->
+            val matches = file.isFile && file.name.matches(pattern)
+            logger.debug("File ${file.name} matches pattern ${config.fileNamePattern}: $matches")
             matches
-        } ?: emptyArray()
+        }
         
         logger.info("Found ${files.size} files matching pattern for ${config.fileType}")
 
-        files.forEach { file ->
+        files.filter { isReady(it) }.forEach { file ->
             logger.info("Processing file: ${file.name}")
             processFile(config, file)
         }
@@ -103,6 +147,34 @@ class FileIngestionService(
         }
     }
 
+    /**
+     * Checks the <name>.verdict.json the drop watcher (analyze-tpp-901-reports.py --watch) writes next to a file.
+     * A verdict for an earlier size or mtime means the file is still being written.
+     */
+    private fun isReady(file: File): Boolean {
+        val verdictFile = File(file.parentFile, file.name + VERDICT_SUFFIX)
+        if (!verdictFile.exists()) {
+            if (requireVerdict) logger.info("Skipping ${file.name}: no drop watcher verdict yet")
+            return !requireVerdict
+        }
+        val verdict = try {
+            objectMapper.readTree(verdictFile)
+        } catch (e: Exception) {
+            logger.warn("Skipping ${file.name}: unreadable verdict ${verdictFile.name}: ${e.message}")
+            return false
+        }
+        if (verdict.path("size").asLong(-1) != file.length() || verdict.path("mtimeMs").asLong(-1) != file.lastModified()) {
+            logger.info("Skipping ${file.name}: changed since its verdict, still being written")
+            return false
+        }
+        val status = verdict.path("status").asText()
+        if (status != "ready") {
+            logger.warn("Skipping ${file.name}: drop watcher verdict '$status' (${verdict.path("issues").joinToString { it.asText() }})")
+            return false
+        }
+        return true
+    }
+
     private fun processFile(config: FileProcessingConfig, file: File) {
         val importLog = ImportLog(
             fileProcessingConfig = config,
@@ -128,6 +200,10 @@ class FileIngestionService(
             val archiveDir = File("${config.directoryPath}/archive")
             archiveDir.mkdirs()
             file.renameTo(File("${archiveDir.absolutePath}/${file.name}"))
+            val verdictFile = File(file.parentFile, file.name + VERDICT_SUFFIX)
+            if (verdictFile.exists()) {
+                verdictFile.renameTo(File("${archiveDir.absolutePath}/${verdictFile.name}"))
+            }
         } catch (e: Exception) {
             logger.error("Error processing file ${file.name}", e)
             val failedLog = importLog.copy(status = ImportLog.ImportStatus.FAILED, errorMessage = e.message)
@@ -136,9 +212,9 @@ class FileIngestionService(
     }
 
     private fun saveData(fileName: String, records: List<Map<String, Any>>, entityType: String, processorCode: String) {
-        logToFileAndConsole("=== SAVE DATA DEBUG ===")
-        logToFileAndConsole("File: $fileName, Processor: $processorCode, Entity Type: $entityType")
-        logToFileAndConsole("Total records to process: ${records.size}")
+        logToFileAndConsole("=== SAVE DATA DEBUG ===", DebugLogLevel.INFO)
+        logToFileAndConsole("File: $fileName, Processor: $processorCode, Entity Type: $entityType", DebugLogLevel.INFO)
+        logToFileAndConsole("Total records to process: ${records.size}", DebugLogLevel.INFO)
         
         var successCount = 0
         var failureCount = 0
@@ -240,6 +316,8 @@ class FileIngestionService(
             }
         }
         logger.info("Completed saving ${records.size} records for entity type: $entityType")
+        // Ends the save phase for the benchmark's stage timings
+        logToFile("Completed saving ${records.size} records for entity type: $entityType", DebugLogLevel.INFO)
     }
     
     private fun determineEntityTypeFromFileName(fileName: String): String {
@@ -20,7 +20,8 @@ class FileParser(
     private val logger = LoggerFactory.getLogger(FileParser::class.java)
     private val logFileName = "debug-logs/file-processing-${LocalDateTime.now().format(DateTimeFormatter.ofPattern("yyyy-MM-dd-HH-mm-ss"))}.log"
 
-    private fun logToFile(message: String) {
+    private fun logToFile(message: String, level: DebugLogLevel = DebugLogLevel.DEBUG) {
+        if (!DebugLogSettings.isEnabled(level)) return
         val timestamp = LocalDateTime.now().format(DateTimeFormatter.ofPattern("yyyy-MM-dd HH:mm:ss.SSS"))
         val logMessage = "[$timestamp] $message"
         try {
@@ -52,7 +53,7 @@ class FileParser(
                          config.fileType in listOf("E-Commerce Card Activity", "POS Terminal Data", "POS Transaction Data", 
                                                    "ATM Terminal Data", "ATM Transaction Data", "Card Lifecycle", "Transaction Volume")
         logger.info("📄 File type '${config.fileType}' is CSV format: $isCSVFormat")
-        logToFile("Parser: File=${file.name}, ConfigId=${config.id}, CSVFormat=$isCSVFormat")
+        logToFile("Parser: File=${file.name}, ConfigId=${config.id}, CSVFormat=$isCSVFormat", DebugLogLevel.INFO)
         
         return when {
             isCSVFormat -> parseCsvFile(file, mappings)
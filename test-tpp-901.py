@@ -4,31 +4,41 @@ TPP 901 Real-Life Testing Script
 This script simulates how a real user would configure and test TPP 901 report processing.
 """
 
-import requests
+import argparse
 import json
 import time
 import os
 from datetime import datetime, timedelta
-import csv
 from typing import Dict, List, Any
 
+from payrep_tools.admin_client import AdminClient, Manifest, ManifestProvisioner
+from payrep_tools.fast_scan import scan_file
+from payrep_tools.header_history import push_aliases
+from payrep_tools.header_index import MappingSnapshot, export_snapshot
+from payrep_tools.institution_check import ConverterTable, export_converter_table
+from payrep_tools.processors import compare_headers, tpp_901
+from payrep_tools.import_monitor import ImportLogMonitor
+from payrep_tools.reconcile import Reconciler, processed_files
+from payrep_tools.report_types import TPP_901_FILE_TYPES, report_type_by_file_type
+
 class TPP901Tester:
-    def __init__(self, base_url="http://localhost:8080"):
+    def __init__(self, base_url="http://localhost:8080", max_workers=8):
         self.base_url = base_url
-        self.token = None
+        self.client = AdminClient(base_url, max_workers=max_workers)
         self.tpp_901_id = None
         self.config_ids = []
+        self.config_file_types = {}
         
+    @property
+    def token(self):
+        return self.client.token
+    
     def login(self, username="admin", password="admin123"):
         """Login and get JWT token"""
         print("🔐 Logging in as admin...")
-        response = requests.post(f"{self.base_url}/api/auth/login", json={
-            "username": username,
-            "password": password
-        })
+        response = self.client.login(username, password)
         
         if response.status_code == 200:
-            self.token = response.json()["token"]
             print("✅ Login successful")
             return True
         else:
@@ -36,15 +46,15 @@ class TPP901Tester:
             return False
     
     def get_headers(self):
-        """Get headers with JWT token"""
-        return {"Authorization": f"Bearer {self.token}", "Content-Type": "application/json"}
+        """Get headers with a JWT token that is refreshed before it expires"""
+        return self.client.headers()
     
     def setup_tpp_901(self):
         """Set up TPP 901 as a real user would via API"""
         print("\n🏦 Setting up TPP 901...")
         
         # First check if TPP 901 already exists
-        response = requests.get(f"{self.base_url}/api/admin/banks", headers=self.get_headers())
+        response = self.client.get("/api/admin/banks")
         if response.status_code == 200:
             banks = response.json()
             for bank in banks:
@@ -60,8 +70,7 @@ class TPP901Tester:
             "type": "TPP"
         }
         
-        response = requests.post(f"{self.base_url}/api/admin/banks", 
-                               json=tpp_data, headers=self.get_headers())
+        response = self.client.post("/api/admin/banks", tpp_data)
         
         if response.status_code == 200:
             result = response.json()
@@ -76,26 +85,17 @@ class TPP901Tester:
         """Configure file processing for TPP 901 reports"""
         print(f"\n⚙️ Configuring file processing with cron: {cron_schedule}")
         
-        # Report types that TPP 901 provides
+        # Report types that TPP 901 provides; patterns are shared with the analyzer's drop-directory scan
         report_configs = [
             {
-                "fileType": "E-Commerce Card Activity",
-                "directoryPath": "sample-data/901",
-                "fileNamePattern": "ecommerce_card_activity_\\d{4}-\\d{2}-\\d{2}\\.csv"
-            },
-            {
-                "fileType": "POS Terminal Data", 
+                "fileType": report_type.file_type,
                 "directoryPath": "sample-data/901",
-                "fileNamePattern": "pos_terminal_data_\\d{4}-\\d{2}-\\d{2}\\.csv"
-            },
-            {
-                "fileType": "POS Transaction Data",
-                "directoryPath": "sample-data/901", 
-                "fileNamePattern": "pos_transaction_data_\\d{4}-\\d{2}-\\d{2}\\.csv"
+                "fileNamePattern": report_type.file_name_pattern
             }
+            for report_type in map(report_type_by_file_type, TPP_901_FILE_TYPES)
         ]
         
-        for config in report_configs:
+        def submit(config):
             config_data = {
                 "bankOrTPPId": self.tpp_901_id,
                 "directoryPath": config["directoryPath"],
@@ -103,126 +103,166 @@ class TPP901Tester:
                 "scheduleTime": cron_schedule,
                 "fileType": config["fileType"]
             }
-            
-            response = requests.post(f"{self.base_url}/api/admin/file-configs",
-                                   json=config_data, headers=self.get_headers())
-            
+            return self.client.post("/api/admin/file-configs", config_data)
+        
+        # The configs are independent, so they are submitted concurrently over the pooled session
+        for config, response in zip(report_configs, self.client.map(submit, report_configs)):
             if response.status_code == 200:
                 result = response.json()
                 self.config_ids.append(result["id"])
+                self.config_file_types[result["id"]] = config["fileType"]
                 print(f"✅ Configured {config['fileType']} processing (ID: {result['id']})")
             else:
                 print(f"❌ Failed to configure {config['fileType']}: {response.status_code} - {response.text}")
         
         return len(self.config_ids) > 0
     
-    def analyze_report_structure(self):
-        """Analyze TPP 901 reports vs templates"""
+    def analyze_report_structure(self, processor=None):
+        """Analyze the newest report of each type the processor sends vs its template"""
+        processor = processor or tpp_901()
         print("\n🔍 Analyzing report structure and compatibility...")
         
-        analysis_results = {
-            "ecommerce_card_activity": self._analyze_ecommerce_reports(),
-            "pos_terminal_data": self._analyze_pos_terminal_reports(),
-            "pos_transaction_data": self._analyze_pos_transaction_reports()
-        }
+        analysis_results = {}
+        latest = processor.latest_files()
+        for config in processor.configs:
+            if config.report_type is None:
+                continue
+            print(f"   📊 Analyzing {config.file_type} reports...")
+            tpp_901_file = latest.get(config)
+            if tpp_901_file is None:
+                print(f"      ❌ No file matching {config.file_name_pattern} in {config.directory}")
+            tpp_901_columns = self._get_csv_columns(tpp_901_file) if tpp_901_file else []
+            template_columns = self._get_csv_columns(config.report_type.template_file)
+            overlap = compare_headers(tpp_901_columns, template_columns)
+            
+            analysis = {
+                "tpp_901_columns": tpp_901_columns,
+                "template_columns": template_columns,
+                "matching_columns": overlap["matching"],
+                "missing_in_tpp_901": overlap["missing"],
+                "extra_in_tpp_901": overlap["extra"],
+                "compatibility_score": overlap["score"]
+            }
+            
+            print(f"      ✅ Matching columns: {analysis['matching_columns']}")
+            print(f"      ⚠️ Missing in TPP {processor.code}: {analysis['missing_in_tpp_901']}")
+            print(f"      ℹ️ Extra in TPP {processor.code}: {analysis['extra_in_tpp_901']}")
+            print(f"      📈 Compatibility: {analysis['compatibility_score']:.1%}")
+            analysis_results[config.report_type.key] = analysis
         
         return analysis_results
     
-    def _analyze_ecommerce_reports(self):
-        """Analyze e-commerce card activity reports"""
-        print("   📊 Analyzing E-commerce Card Activity reports...")
-        
-        # Read TPP 901 sample
-        tpp_901_file = "sample-data/901/ecommerce_card_activity_2025-07-18.csv"
-        template_file = "sample-data/reports/E-CommerceCardActivity_001_2025-08-03.csv"
-        
-        tpp_901_columns = self._get_csv_columns(tpp_901_file)
-        template_columns = self._get_csv_columns(template_file)
-        
-        analysis = {
-            "tpp_901_columns": tpp_901_columns,
-            "template_columns": template_columns,
-            "matching_columns": list(set(tpp_901_columns) & set(template_columns)),
-            "missing_in_tpp_901": list(set(template_columns) - set(tpp_901_columns)),
-            "extra_in_tpp_901": list(set(tpp_901_columns) - set(template_columns)),
-            "compatibility_score": len(set(tpp_901_columns) & set(template_columns)) / len(set(tpp_901_columns) | set(template_columns))
-        }
-        
-        print(f"      ✅ Matching columns: {analysis['matching_columns']}")
-        print(f"      ⚠️ Missing in TPP 901: {analysis['missing_in_tpp_901']}")
-        print(f"      ℹ️ Extra in TPP 901: {analysis['extra_in_tpp_901']}")
-        print(f"      📈 Compatibility: {analysis['compatibility_score']:.1%}")
-        
-        return analysis
+    def _get_csv_columns(self, file_path):
+        """Get column names from CSV file"""
+        try:
+            return scan_file(file_path)["headers"]
+        except Exception as e:
+            print(f"      ❌ Error reading {file_path}: {e}")
+            return []
     
-    def _analyze_pos_terminal_reports(self):
-        """Analyze POS terminal data reports"""
-        print("   📊 Analyzing POS Terminal Data reports...")
-        
-        tpp_901_file = "sample-data/901/pos_terminal_data_2025-07-18.csv"
-        template_file = "sample-data/reports/POSTerminalData_001_2025-08-03.csv"
-        
-        tpp_901_columns = self._get_csv_columns(tpp_901_file)
-        template_columns = self._get_csv_columns(template_file)
-        
-        analysis = {
-            "tpp_901_columns": tpp_901_columns,
-            "template_columns": template_columns,
-            "matching_columns": list(set(tpp_901_columns) & set(template_columns)),
-            "missing_in_tpp_901": list(set(template_columns) - set(tpp_901_columns)),
-            "extra_in_tpp_901": list(set(tpp_901_columns) - set(template_columns)),
-            "compatibility_score": len(set(tpp_901_columns) & set(template_columns)) / len(set(tpp_901_columns) | set(template_columns))
-        }
+    def export_mapping_snapshot(self, path="mapping_snapshot.json"):
+        """Export file configs, column mappings and header definitions for the offline analyzer"""
+        print("\n📦 Exporting column mapping snapshot...")
         
-        print(f"      ✅ Matching columns: {analysis['matching_columns']}")
-        print(f"      ⚠️ Missing in TPP 901: {analysis['missing_in_tpp_901']}")
-        print(f"      ℹ️ Extra in TPP 901: {analysis['extra_in_tpp_901']}")
-        print(f"      📈 Compatibility: {analysis['compatibility_score']:.1%}")
+        response = self.client.get("/api/admin/file-configs")
+        if response.status_code != 200:
+            print(f"❌ Failed to get file configs: {response.status_code} - {response.text}")
+            return None
+        file_configs = response.json()
         
-        return analysis
-    
-    def _analyze_pos_transaction_reports(self):
-        """Analyze POS transaction data reports"""
-        print("   📊 Analyzing POS Transaction Data reports...")
-        
-        tpp_901_file = "sample-data/901/pos_transaction_data_2025-07-18.csv"
-        template_file = "sample-data/reports/POSTransactionData_001_2025-08-03.csv"
-        
-        tpp_901_columns = self._get_csv_columns(tpp_901_file)
-        template_columns = self._get_csv_columns(template_file)
-        
-        analysis = {
-            "tpp_901_columns": tpp_901_columns,
-            "template_columns": template_columns,
-            "matching_columns": list(set(tpp_901_columns) & set(template_columns)),
-            "missing_in_tpp_901": list(set(template_columns) - set(tpp_901_columns)),
-            "extra_in_tpp_901": list(set(tpp_901_columns) - set(template_columns)),
-            "compatibility_score": len(set(tpp_901_columns) & set(template_columns)) / len(set(tpp_901_columns) | set(template_columns))
-        }
+        column_mappings = {}
+        responses = self.client.map(
+            lambda config: self.client.get(f"/api/admin/file-configs/{config['id']}/column-mappings"), file_configs)
+        for config, response in zip(file_configs, responses):
+            if response.status_code == 200:
+                column_mappings[config["id"]] = response.json()
+            else:
+                print(f"⚠️ Failed to get column mappings for config {config['id']}: {response.status_code}")
         
-        print(f"      ✅ Matching columns: {analysis['matching_columns']}")
-        print(f"      ⚠️ Missing in TPP 901: {analysis['missing_in_tpp_901']}")
-        print(f"      ℹ️ Extra in TPP 901: {analysis['extra_in_tpp_901']}")
-        print(f"      📈 Compatibility: {analysis['compatibility_score']:.1%}")
+        response = self.client.get("/api/admin/headers")
+        if response.status_code != 200:
+            print(f"❌ Failed to get header definitions: {response.status_code} - {response.text}")
+            return None
+        header_definitions = response.json()
         
-        return analysis
+        export_snapshot(file_configs, column_mappings, header_definitions, path)
+        print(f"✅ Exported {len(file_configs)} file configs, {sum(map(len, column_mappings.values()))} column mappings "
+              f"and {len(header_definitions)} header definitions to {path}")
+        return path
     
-    def _get_csv_columns(self, file_path):
-        """Get column names from CSV file"""
+    def export_converter_table(self, path="converter_table.json"):
+        """Export banks/TPPs and institution ID converters for check-institution-ids.py"""
+        print("\n📦 Exporting institution converter table...")
         try:
-            with open(file_path, 'r') as f:
-                reader = csv.reader(f)
-                return next(reader)
-        except Exception as e:
-            print(f"      ❌ Error reading {file_path}: {e}")
-            return []
+            banks, converters = self.client.map(lambda fetch: fetch(),
+                                                [self.client.converter_settings, self.client.converters])
+        except RuntimeError as e:
+            print(f"❌ {e}")
+            return None
+        export_converter_table(banks, converters, path)
+        print(f"✅ Exported {len(banks)} banks/TPPs and {len(converters)} converter mappings to {path}")
+        return path
+    
+    def provision(self, manifest_path, dry_run=False):
+        """Apply a bank/TPP manifest idempotently; only differences from the admin API are sent"""
+        print(f"\n🏗️ Provisioning from {manifest_path}...")
+        provisioner = ManifestProvisioner(self.client, Manifest.load(manifest_path))
+        changes = provisioner.plan()
+        if not changes:
+            print("✅ Everything already matches the manifest")
+            return changes
+        
+        for change in changes:
+            print(f"   {'•' if dry_run else '→'} {change.describe()}")
+        if dry_run:
+            print(f"ℹ️ {len(changes)} changes planned (dry run, nothing sent)")
+            return changes
+        
+        started = time.time()
+        provisioner.apply(changes)
+        failed = [change for change in changes if change.status != 200]
+        for change in failed:
+            print(f"   ❌ {change.describe()}: {change.status} - {change.result}")
+        print(f"✅ Applied {len(changes) - len(failed)} of {len(changes)} changes in {time.time() - started:.1f}s "
+              f"({self.client.requests_sent} requests)")
+        return changes
+    
+    def push_header_aliases(self, proposals_path, dry_run=False):
+        """Add the HeaderAlias proposals written by analyze-tpp-901-reports.py --alias-proposals"""
+        print(f"\n🏷️ Pushing header alias proposals from {proposals_path}...")
+        with open(proposals_path, "r") as f:
+            proposals = json.load(f)
+        try:
+            actions = push_aliases(self.client, proposals, dry_run)
+        except RuntimeError as e:
+            print(f"❌ {e}")
+            return None
+        
+        for action in actions:
+            proposal = action["proposal"]
+            target = f"{proposal['entity_type']} / {proposal['key']}: '{proposal['alias']}'"
+            if action["action"] == "exists":
+                print(f"   ✓ {target} already an alias")
+            elif dry_run:
+                print(f"   • {action['action']} {target}")
+            elif action["status"] == 200:
+                print(f"   ✅ {action['action']} {target}")
+            else:
+                print(f"   ❌ {action['action']} {target}: {action['status']} - {action['error']}")
+            if not proposal.get("used_by_file_parser", True):
+                print("      ⚠️ the column mappings use another entityType, so FileParser will not consult it")
+        sent = [action for action in actions if "status" in action and action["action"] != "exists"]
+        if dry_run:
+            print(f"ℹ️ {sum(1 for a in actions if a['action'] != 'exists')} changes planned (dry run, nothing sent)")
+        else:
+            print(f"✅ Applied {sum(1 for a in sent if a['status'] == 200)} of {len(sent)} alias changes")
+        return actions
     
     def trigger_manual_processing(self):
         """Trigger manual processing to test the system"""
         print("\n🚀 Triggering manual file processing...")
         
-        response = requests.get(f"{self.base_url}/api/bi/process-reports?directory=sample-data/901",
-                              headers=self.get_headers())
+        response = self.client.get("/api/bi/process-reports?directory=sample-data/901")
         
         if response.status_code == 200:
             result = response.json()
@@ -232,11 +272,77 @@ class TPP901Tester:
             print(f"❌ Failed to trigger processing: {response.status_code} - {response.text}")
             return None
     
+    def watch_import_logs(self, directory="sample-data/901", timeout=600.0, debug_log_dir="debug-logs"):
+        """Follow each configured file through PENDING -> SUCCESS/FAILED and report time-to-processed"""
+        print("\n⏳ Watching import logs until every file is processed...")
+        
+        def report_transition(transition):
+            status_emoji = "✅" if transition.status == "SUCCESS" else "❌" if transition.status == "FAILED" else "⏳"
+            print(f"   {status_emoji} {transition.file_name} - {transition.status}")
+        
+        monitor = ImportLogMonitor(self.client,
+                                   debug_log_dir=debug_log_dir if os.path.isdir(debug_log_dir) else None,
+                                   on_transition=report_transition)
+        files = sorted(os.listdir(directory)) if os.path.isdir(directory) else []
+        for config_id in self.config_ids:
+            file_type = self.config_file_types.get(config_id)
+            report_type = report_type_by_file_type(file_type) if file_type else None
+            expected = [f for f in files if report_type and report_type.matches(f)]
+            monitor.watch(config_id, file_type or str(config_id), expected)
+        
+        try:
+            results = monitor.run_sync(timeout)
+        except RuntimeError as e:
+            print(f"❌ Could not read the import logs: {e}")
+            return None
+        print(f"📊 {len(results)} files watched with {monitor.polls} import-log requests")
+        for result in results:
+            seconds = result["time_to_processed_seconds"]
+            timing = f"processed in {seconds}s" if seconds is not None else "not processed"
+            print(f"   {result['file_name']}: {result['status']}, {timing}")
+            if result.get("error_message"):
+                print(f"      Error: {result['error_message']}")
+        return results
+    
+    def reconcile(self, directory="sample-data/901", processor_code="901", converter_table=None,
+                  mapping_snapshot=None, output=None):
+        """Compare row counts and amount sums per institution and date in the processed files with the DB"""
+        print("\n🧮 Reconciling processed files against ingested totals...")
+        try:
+            table = ConverterTable.load(converter_table) if converter_table else ConverterTable.from_api(self.client)
+            snapshot = MappingSnapshot.load(mapping_snapshot) if mapping_snapshot else None
+            result = Reconciler(self.client, table, snapshot).reconcile(processed_files(directory, processor_code))
+        except (RuntimeError, ValueError, OSError) as e:
+            print(f"❌ Reconciliation failed: {e}")
+            return None
+        
+        for summary in result["files"]:
+            print(f"   📄 {os.path.basename(summary['file'])}: {summary['rows']:,} rows in {summary['elapsed_seconds']}s")
+            for institution, rows in summary["unresolved_institutions"].items():
+                print(f"      🚫 {rows:,} rows for institution {institution} cannot be ingested")
+            if summary["undated_rows"]:
+                print(f"      🚫 {summary['undated_rows']:,} rows without a report date")
+        for file_path in result["skipped_files"]:
+            print(f"   🚫 {os.path.basename(file_path)}: no ingested totals for its report type, not reconciled")
+        for difference in result["differences"]:
+            delta = ", ".join(f"{field} {value:+,}" for field, value in difference["delta"].items())
+            detail = delta or difference["kind"].replace("_", " ")
+            print(f"   ⚠️ {difference['report_type']} {difference['report_date']} institution "
+                  f"{difference['institution']}: {detail}")
+        emoji = "✅" if not result["differences"] and not result["skipped_files"] else "⚠️"
+        print(f"{emoji} {result['matched']} of {result['keys']} institution-days match "
+              f"({result['api_batches']} API calls, {result['elapsed_seconds']}s)")
+        if output:
+            with open(output, "w") as f:
+                json.dump({"timestamp": datetime.now().isoformat(), **result}, f, indent=2)
+            print(f"📄 Reconciliation saved to: {output}")
+        return result
+    
     def monitor_import_logs(self):
         """Monitor import logs for processing results"""
         print("\n📋 Monitoring import logs...")
         
-        response = requests.get(f"{self.base_url}/api/admin/import-logs", headers=self.get_headers())
+        response = self.client.get("/api/admin/import-logs")
         
         if response.status_code == 200:
             logs = response.json()
@@ -245,7 +351,7 @@ class TPP901Tester:
             # Filter logs for TPP 901 configs
             tpp_901_logs = []
             for log in logs:
-                if hasattr(log, 'fileProcessingConfig') and log['fileProcessingConfig']['id'] in self.config_ids:
+                if (log.get('fileProcessingConfig') or {}).get('id') in self.config_ids:
                     tpp_901_logs.append(log)
             
             if tpp_901_logs:
@@ -339,12 +445,13 @@ class TPP901Tester:
         # Step 5: Trigger manual processing
         self.trigger_manual_processing()
         
-        # Step 6: Wait a bit and monitor logs
-        print("\n⏳ Waiting 10 seconds for processing...")
-        time.sleep(10)
-        self.monitor_import_logs()
+        # Step 6: Monitor logs until every file is processed
+        self.watch_import_logs()
         
-        # Step 7: Generate report
+        # Step 7: Reconcile file totals with what was ingested
+        self.reconcile()
+        
+        # Step 8: Generate report
         report = self.generate_compatibility_report(analysis_results)
         
         print("\n🎉 TPP 901 testing completed successfully!")
@@ -354,7 +461,55 @@ class TPP901Tester:
 
 def main():
     """Main function to run the test"""
-    tester = TPP901Tester()
+    parser = argparse.ArgumentParser(description="TPP 901 real-life test")
+    parser.add_argument("--export-mapping-snapshot", metavar="PATH",
+                        help="only export the column mapping / header definition snapshot for analyze-tpp-901-reports.py")
+    parser.add_argument("--export-converter-table", metavar="PATH",
+                        help="only export banks/TPPs and institution ID converters for check-institution-ids.py")
+    parser.add_argument("--provision", metavar="MANIFEST",
+                        help="only create or update the banks/TPPs, file configs and converters in a JSON manifest")
+    parser.add_argument("--push-header-aliases", metavar="PROPOSALS",
+                        help="only add the HeaderAlias proposals written by analyze-tpp-901-reports.py --alias-proposals")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="with --provision or --push-header-aliases, print the changes without sending them")
+    parser.add_argument("--reconcile", metavar="DIR",
+                        help="only compare per-institution, per-day totals of the processed files in DIR with the DB")
+    parser.add_argument("--processor", default="901", help="with --reconcile, the processor code of the files")
+    parser.add_argument("--converter-table", help="with --reconcile, a converter table file instead of the admin API")
+    parser.add_argument("--mapping-snapshot", help="with --reconcile, column mapping snapshot (default: seeded mappings)")
+    parser.add_argument("--output", help="with --reconcile, write the differences as JSON")
+    parser.add_argument("--workers", type=int, default=8, help="concurrent admin API requests")
+    args = parser.parse_args()
+    
+    tester = TPP901Tester(max_workers=args.workers)
+    
+    if args.export_mapping_snapshot:
+        if tester.login():
+            tester.export_mapping_snapshot(args.export_mapping_snapshot)
+        return
+    
+    if args.export_converter_table:
+        if tester.login():
+            tester.export_converter_table(args.export_converter_table)
+        return
+    
+    if args.provision:
+        if tester.login():
+            tester.provision(args.provision, args.dry_run)
+        return
+    
+    if args.push_header_aliases:
+        if tester.login():
+            tester.push_header_aliases(args.push_header_aliases, args.dry_run)
+        return
+    
+    if args.reconcile:
+        if tester.login():
+            result = tester.reconcile(args.reconcile, args.processor, args.converter_table, args.mapping_snapshot,
+                                      args.output)
+            if result is None or result["skipped_files"]:
+                raise SystemExit(1)
+        return
     
     # Ask user for cron schedule
     print("⏰ When would you like the reports to be processed?")
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Report Row Validator
+Splits processor drops into a clean file the ingestion cron can process in one go and a reject file with a
+reason code per record, so one bad date or amount no longer fails the whole file on every cron cycle.
+"""
+
+import argparse
+import json
+import os
+from datetime import datetime
+
+from payrep_tools.header_index import HeaderIndex, MappingSnapshot
+from payrep_tools.institution_check import ConverterTable
+from payrep_tools.report_types import REPORT_TYPES, match_report_type, report_type_by_key
+from payrep_tools.validator import FILE_FAILING_REASON, RowValidator
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Split report files into clean and reject files")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--out", required=True,
+                        help="drop directory the file config watches; rejects go to its rejects/ subdirectory")
+    parser.add_argument("--report-type", choices=[report_type.key for report_type in REPORT_TYPES],
+                        help="report type of every file (default: matched from each file name)")
+    parser.add_argument("--mapping-snapshot",
+                        help="column mapping / header definition snapshot exported with "
+                             "test-tpp-901.py --export-mapping-snapshot (default: seeded column mappings)")
+    parser.add_argument("--converter-table",
+                        help="also reject records whose institution ID saveData cannot convert "
+                             "(exported with test-tpp-901.py --export-converter-table)")
+    parser.add_argument("--processor", help="with --converter-table, the processor code of the files")
+    parser.add_argument("--reject-defaulted", action="store_true",
+                        help="also reject records where DataMapper would store 0 or the current date for a value it "
+                             "cannot parse (POS and e-commerce fields)")
+    parser.add_argument("--output", help="write the per-file results as JSON")
+    args = parser.parse_args()
+    if args.converter_table and not args.processor:
+        parser.error("--converter-table needs --processor")
+
+    snapshot = (MappingSnapshot.load(args.mapping_snapshot) if args.mapping_snapshot
+                else MappingSnapshot.seeded(REPORT_TYPES))
+    table = ConverterTable.load(args.converter_table) if args.converter_table else None
+    validator = RowValidator(HeaderIndex(snapshot), table, args.reject_defaulted)
+
+    results = []
+    for file_path in args.files:
+        report_type = report_type_by_key(args.report_type) if args.report_type else \
+            match_report_type(os.path.basename(file_path))
+        if report_type is None:
+            print(f"❌ {file_path}: no report type matches the file name; pass --report-type")
+            continue
+        try:
+            result = validator.validate(file_path, report_type, args.out, args.processor)
+        except (ValueError, OSError) as e:
+            print(f"❌ {file_path}: {e}")
+            continue
+        results.append(result)
+        emoji = "✅" if not result["rejected"] else "⚠️"
+        print(f"{emoji} {file_path}: {result['clean']:,} clean, {result['rejected']:,} rejected of "
+              f"{result['records']:,} records in {result['elapsed_seconds']}s ({result['records_per_second']:,}/s)")
+        for reason in result["reasons"]:
+            note = " (would have failed the whole file)" if reason["reason"] == FILE_FAILING_REASON else ""
+            print(f"   🚫 {reason['reason']} {reason['field']}: {reason['records']:,}{note}")
+        if result["unresolved_mappings"]:
+            print(f"   ⚠️ Mappings without a header: {', '.join(result['unresolved_mappings'])}")
+        if result["rejected"]:
+            print(f"   Rejects: {result['rejects_file']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"timestamp": datetime.now().isoformat(), "files": results}, f, indent=2)
+        print(f"📄 Results saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()